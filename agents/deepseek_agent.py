@@ -1,9 +1,15 @@
 
 import os
+import re
 import json
+from itertools import zip_longest
 from typing import List, Optional
 from pydantic import BaseModel
 from core.database import Registry, CardCreate
+from core.chunking import split_text, map_chunks, collapse_partials
+from core.llm_cache import llm_cache
+from core.instrumentation import timed
+from core.outbound import outbound
 
 try:
     import requests
@@ -17,6 +23,11 @@ load_dotenv()
 from rich.console import Console
 console = Console()
 
+CHUNK_TOKENS = 3000          # Presupuesto por trozo; por debajo se usa el prompt de un solo paso
+MAX_CANDIDATE_CARDS = 40     # Tarjetas parciales que pasan al reduce
+MAX_FINAL_CARDS = 10
+SECTION_SEPARATOR = "\n\n---\n\n"
+
 class DeepSeekCard(BaseModel):
     question: str
     answer: str
@@ -28,11 +39,14 @@ class DeepSeekAgent:
     """
     def __init__(self):
         self.api_key = os.getenv("DEEPSEEK_API_KEY")
-        self.base_url = "https://api.deepseek.com" # URL base oficial
+        # URL base oficial; DEEPSEEK_BASE_URL permite apuntar a un servidor compatible (p. ej. benchmarks/mock_llm.py)
+        self.base_url = os.getenv("DEEPSEEK_BASE_URL", "https://api.deepseek.com").rstrip("/")
 
-    def process_content(self, title: str, content: str):
+    def process_content(self, title: str, content: str, bypass_cache: bool = False):
         """
         Genera un resumen y un conjunto de flashcards usando DeepSeek.
+        Las respuestas se cachean en disco por (modelo, prompt, temperatura): un prompt repetido no llama a la API.
+        Los contenidos largos se resumen por trozos (map-reduce) en lugar de truncarse.
         """
         if not self.api_key:
             return None, []
@@ -41,6 +55,10 @@ class DeepSeekAgent:
         if "Transcripción Disponible" in content or "Error al raspar" in content or len(content) < 100:
             return f"Sin resumen: No hay suficiente contenido base para analizar '{title}'.", []
 
+        chunks = split_text(content, CHUNK_TOKENS)
+        if len(chunks) > 1:
+            return self._process_chunked(title, chunks, bypass_cache)
+
         prompt = f"""
         Analiza el siguiente contenido extraído de un video de YouTube titulado "{title}".
         
@@ -49,13 +67,101 @@ class DeepSeekAgent:
            [{{"question": "...", "answer": "..."}}, ...]
 
         Contenido:
-        {content[:15000]} # Limitamos para evitar contexto excesivo en V1
+        {content}
         
         Responde estrictamente en este formato:
         RESUMEN: [Tu resumen aquí]
         FLASHCARDS: [Tu JSON de flashcards aquí]
         """
+        full_text = self._complete(prompt, bypass_cache)
+        if full_text is None:
+            return None, []
+        return self._parse(full_text)
+
+    def _process_chunked(self, title: str, chunks: List[str], bypass_cache: bool = False):
+        """Map: resumen parcial + tarjetas por trozo (en paralelo). Reduce: resumen final y mejores tarjetas."""
+        partials = map_chunks(chunks, lambda chunk: self._summarise_chunk(title, chunk, bypass_cache))
+        if any(p is None for p in partials):
+            return None, []  # Los trozos resueltos quedan en caché: el reintento solo paga los que faltan
+
+        summaries = collapse_partials(
+            [summary for summary, _ in partials if summary],
+            lambda group: self._merge_summaries(title, group, bypass_cache),
+            CHUNK_TOKENS
+        )
+        if not summaries:
+            return None, []
+
+        # Candidatas repartidas entre todos los trozos (ronda), no solo las del principio
+        per_chunk = [cards for _, cards in partials if cards]
+        candidates = [c for rnd in zip_longest(*per_chunk) for c in rnd if c][:MAX_CANDIDATE_CARDS]
+        n_cards = min(MAX_FINAL_CARDS, 5 + len(chunks) // 2)
 
+        prompt = f"""
+        A partir de los resúmenes parciales (en orden) de un contenido extenso titulado "{title}"
+        y de las flashcards candidatas extraídas de cada parte:
+
+        1. Genera un RESUMEN EJECUTIVO de no más de 3 párrafos que integre todo el contenido.
+        2. Selecciona o reformula las {n_cards} mejores Flashcards de estudio (sin conceptos repetidos) en formato JSON exacto:
+           [{{"question": "...", "answer": "..."}}, ...]
+
+        Resúmenes parciales:
+        {SECTION_SEPARATOR.join(summaries)}
+
+        Flashcards candidatas:
+        {json.dumps(candidates, ensure_ascii=False)}
+
+        Responde estrictamente en este formato:
+        RESUMEN: [Tu resumen aquí]
+        FLASHCARDS: [Tu JSON de flashcards aquí]
+        """
+        full_text = self._complete(prompt, bypass_cache)
+        if full_text is None:
+            return None, []
+        resumen, cards = self._parse(full_text)
+        return resumen, cards or candidates[:n_cards]
+
+    def _summarise_chunk(self, title: str, chunk: str, bypass_cache: bool = False):
+        """(resumen parcial, tarjetas) de un trozo, o None si la llamada falla."""
+        # Sin "parte i de n": el prompt depende solo del trozo y así se cachea por trozo
+        prompt = f"""
+        Analiza el siguiente fragmento de un contenido extenso titulado "{title}".
+
+        1. Resume sus ideas clave en un párrafo.
+        2. Genera hasta 3 Flashcards de estudio sobre este fragmento en formato JSON exacto:
+           [{{"question": "...", "answer": "..."}}, ...]
+
+        Fragmento:
+        {chunk}
+
+        Responde estrictamente en este formato:
+        RESUMEN: [Tu resumen aquí]
+        FLASHCARDS: [Tu JSON de flashcards aquí]
+        """
+        full_text = self._complete(prompt, bypass_cache)
+        if full_text is None:
+            return None
+        return self._parse(full_text)
+
+    def _merge_summaries(self, title: str, summaries: List[str], bypass_cache: bool = False) -> Optional[str]:
+        """Nivel intermedio del reduce: funde varios resúmenes parciales consecutivos en uno."""
+        prompt = f"""
+        Funde en un único resumen de un párrafo los siguientes resúmenes parciales consecutivos
+        de un contenido titulado "{title}", conservando las ideas clave y su orden:
+
+        {SECTION_SEPARATOR.join(summaries)}
+
+        Responde estrictamente en este formato:
+        RESUMEN: [Tu resumen aquí]
+        """
+        full_text = self._complete(prompt, bypass_cache)
+        if full_text is None:
+            return None
+        resumen, _ = self._parse(full_text)
+        return resumen or None
+
+    def _complete(self, prompt: str, bypass_cache: bool = False) -> Optional[str]:
+        """Texto de la respuesta (cacheado en disco) o None si la API falla."""
         headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
@@ -67,49 +173,62 @@ class DeepSeekAgent:
             "temperature": 0.3
         }
 
-        try:
+        def _post():
             response = requests.post(f"{self.base_url}/chat/completions", headers=headers, json=data, timeout=60)
+            # Dentro de la llamada planificada: un 429/5xx se reintenta con backoff
             response.raise_for_status()
+            return response
+
+        def _call_api():
+            with timed("llm_request", agent="deepseek", model=data["model"]):
+                response = outbound.call("deepseek", _post)
             result = response.json()
-            full_text = result['choices'][0]['message']['content']
-            
-            # Parsing más robusto
-            resumen = ""
-            cards_json = []
-            
-            # Intentar extraer el resumen
-            if "RESUMEN:" in full_text:
-                if "FLASHCARDS:" in full_text:
-                    resumen = full_text.split("RESUMEN:")[1].split("FLASHCARDS:")[0].strip()
-                else:
-                    resumen = full_text.split("RESUMEN:")[1].strip()
-            
-            # Intentar extraer las flashcards (JSON)
-            if "FLASHCARDS:" in full_text:
-                json_part = full_text.split("FLASHCARDS:")[1].strip()
-                # Limpiar bloques de código markdown si existen
-                if "```json" in json_part:
-                    json_part = json_part.split("```json")[1].split("```")[0].strip()
-                elif "```" in json_part:
-                    json_part = json_part.split("```")[1].split("```")[0].strip()
-                
-                try:
-                    cards_json = json.loads(json_part)
-                except Exception as je:
-                    console.print(f"[yellow]Error parseando JSON de DeepSeek: {je}[/yellow]")
-                    # Intento desesperado: buscar el primer '[' y el último ']'
-                    import re
-                    match = re.search(r'\[\s*\{.*\}\s*\]', json_part, re.DOTALL)
-                    if match:
-                        try:
-                            cards_json = json.loads(match.group())
-                        except:
-                            pass
-            
-            return resumen, cards_json
-            
+            return result['choices'][0]['message']['content']
+
+        try:
+            return llm_cache.cached_call(
+                data["model"], prompt, _call_api,
+                temperature=data["temperature"], bypass=bypass_cache
+            )
         except Exception as e:
             console.print(f"[red]Error en DeepSeek API: {e}[/]")
-            return None, []
+            return None
+
+    @staticmethod
+    def _parse(full_text: str):
+        """Extrae (resumen, flashcards) del formato RESUMEN: ... FLASHCARDS: [...]."""
+        # Parsing más robusto
+        resumen = ""
+        cards_json = []
+        
+        # Intentar extraer el resumen
+        if "RESUMEN:" in full_text:
+            if "FLASHCARDS:" in full_text:
+                resumen = full_text.split("RESUMEN:")[1].split("FLASHCARDS:")[0].strip()
+            else:
+                resumen = full_text.split("RESUMEN:")[1].strip()
+        
+        # Intentar extraer las flashcards (JSON)
+        if "FLASHCARDS:" in full_text:
+            json_part = full_text.split("FLASHCARDS:")[1].strip()
+            # Limpiar bloques de código markdown si existen
+            if "```json" in json_part:
+                json_part = json_part.split("```json")[1].split("```")[0].strip()
+            elif "```" in json_part:
+                json_part = json_part.split("```")[1].split("```")[0].strip()
+            
+            try:
+                cards_json = json.loads(json_part)
+            except Exception as je:
+                console.print(f"[yellow]Error parseando JSON de DeepSeek: {je}[/yellow]")
+                # Intento desesperado: buscar el primer '[' y el último ']'
+                match = re.search(r'\[\s*\{.*\}\s*\]', json_part, re.DOTALL)
+                if match:
+                    try:
+                        cards_json = json.loads(match.group())
+                    except:
+                        pass
+        
+        return resumen, cards_json
 
 deepseek_agent = DeepSeekAgent()
@@ -13,6 +13,9 @@ from pydantic import TypeAdapter
 from core.models import StudyCard
 # Importamos la abstracción de SQLalchemy (Record) directamente, ya que el dashboard nos arroja un Registry.
 from core.database import Registry
+from core.llm_cache import llm_cache
+from core.instrumentation import timed
+from core.outbound import outbound, CircuitOpenError
 
 from rich.console import Console
 console = Console()
@@ -27,7 +30,7 @@ def get_client():
     api_key = os.environ.get("GOOGLE_API_KEY")
     return genai.Client(api_key=api_key) if api_key else None
 
-def generate_relationship_cards(record_a: Registry, record_b: Registry) -> List[StudyCard]:
+def generate_relationship_cards(record_a: Registry, record_b: Registry, bypass_cache: bool = False) -> List[StudyCard]:
     """
     Agente Pedagógico Match Forzado.
     Genera tarjetas (StudyCard) mediante inteligencia artificial centradas en la diferenciación 
@@ -84,23 +87,39 @@ def generate_relationship_cards(record_a: Registry, record_b: Registry) -> List[
         "gemini-1.5-flash"
     ]
 
+    adapter = TypeAdapter(List[StudyCard])
+
+    # Caché en disco por (modelo, prompt, temperatura, esquema)
+    _, cached = llm_cache.lookup_any(models_to_try, prompt, temperature=0.3, schema=list[StudyCard], bypass=bypass_cache)
+    if cached:
+        try:
+            return adapter.validate_python(json.loads(cached))
+        except Exception:
+            pass # Entrada corrupta: se regenera por red
+
     for model_name in models_to_try:
         try:
             # print() desactivado aquí si queremos mantener la pureza en el dashboard
             # Pero podemos usar rich si es invocado directamente.
-            response = client.models.generate_content(
-                model=model_name,
-                contents=prompt,
-                config=config,
-            )
+            with timed("llm_request", agent="relationship", model=model_name):
+                # Ritmo, reintentos con backoff ante 429/5xx y circuit breaker compartidos
+                response = outbound.call(
+                    "gemini", client.models.generate_content,
+                    model=model_name,
+                    contents=prompt,
+                    config=config,
+                )
             
             if response.text:
                 json_data = json.loads(response.text)
                 # Validar la salida de nuevo contra nuestro Core Pydantic para eliminar la posibilidad de disonancia
-                adapter = TypeAdapter(List[StudyCard])
                 cards = adapter.validate_python(json_data)
+                llm_cache.store(model_name, prompt, response.text, temperature=0.3, schema=list[StudyCard], bypass=bypass_cache)
                 return cards
                 
+        except CircuitOpenError:
+            # Gemini saturado o caído: los demás modelos comparten cuota y circuito
+            break
         except Exception as e:
             # Silenciar error para intentar el próximo modelo silenciosamente como pidió el blueprint
             # pero imprimir la excepcion si es el ultimo modelo
@@ -1,6 +1,8 @@
 import os
 import json
-from typing import List
+import threading
+from itertools import zip_longest
+from typing import Dict, List, Optional, Sequence
 
 try:
     from google import genai
@@ -15,6 +17,11 @@ from pydantic import TypeAdapter, BaseModel
 
 from core.models import StudyCard
 from core.database import Registry
+from core.chunking import split_text, map_chunks, estimate_tokens
+from core import instrumentation
+from core.llm_cache import llm_cache
+from core.instrumentation import timed
+from core.outbound import outbound, CircuitOpenError
 
 from rich.prompt import Confirm
 from dotenv import load_dotenv
@@ -22,12 +29,38 @@ from dotenv import load_dotenv
 # Cargar variables de entorno desde .env si existe
 load_dotenv()
 
+CHUNK_TOKENS = 3000   # Presupuesto por trozo; por debajo se usa el prompt de un solo paso
+MAX_DECK_CARDS = 15   # Tope del mazo combinado de un documento largo
+BATCH_RECORD_TOKENS = 1500  # Registros hasta este tamaño van en lote; los mayores, solos
+BATCH_MAX_TOKENS = 6000     # Contenido total por petición multi-registro
+BATCH_MAX_RECORDS = 15      # Acota también la salida (≈5 tarjetas por registro)
+
+# Definimos esquema simplificado para evitar errores de 'additionalProperties' en la API de Gemini
+class SimplifiedStudyCard(BaseModel):
+    parent_id: int
+    question: str
+    answer: str
+    card_type: str
+
+# Modo lote: un mazo por registro, identificado por su parent_id
+class BatchCard(BaseModel):
+    question: str
+    answer: str
+    card_type: str
+
+class BatchDeck(BaseModel):
+    parent_id: int
+    cards: List[BatchCard]
+
+_BATCH_ADAPTER = TypeAdapter(List[BatchDeck])
+_CARDS_ADAPTER = TypeAdapter(List[StudyCard])
+
 def get_client():
     """Obtiene el cliente estandarizado GenAI agarrando GOOGLE_API_KEY local."""
     api_key = os.environ.get("GOOGLE_API_KEY")
     return genai.Client(api_key=api_key) if api_key else None
 
-def generate_deck_from_registry(record: Registry, mockup_only: bool = False) -> List[StudyCard]:
+def generate_deck_from_registry(record: Registry, mockup_only: bool = False, bypass_cache: bool = False) -> List[StudyCard]:
     """
     Agente Pedagógico de Extracción.
     Genera tarjetas (StudyCard) mediante inteligencia artificial destilando el contenido de un solo registro.
@@ -76,21 +109,20 @@ def generate_deck_from_registry(record: Registry, mockup_only: bool = False) ->
             
         return cards
 
-    # Definimos esquema simplificado para evitar errores de 'additionalProperties' en la API de Gemini
-    class SimplifiedStudyCard(BaseModel):
-        parent_id: int
-        question: str
-        answer: str
-        card_type: str
+    chunks = split_text(record.content_raw, CHUNK_TOKENS)
+    if len(chunks) > 1:
+        return _deck_chunked(client, record, chunks, bypass_cache)
+    return _generate_cards(client, _deck_prompt(record.id, record.title, record.content_raw, record.meta_info), bypass_cache) or []
 
-    prompt = f"""
+def _deck_prompt(record_id: int, title: str, content: str, meta_info, cantidad: str = "entre 3 y 7 tarjetas según la densidad de la información") -> str:
+    return f"""
     Eres un profesor universitario de alto nivel, experto en pedagogía y Active Recall.
     Tu objetivo es leer el siguiente documento y extraer un mazo de Flashcards de ALTO RENDIMIENTO.
 
-    --- Registro (ID: {record.id}) ---
-    Título: {record.title}
-    Info Cruda: {record.content_raw}
-    Extra Metadatos: {record.meta_info}
+    --- Registro (ID: {record_id}) ---
+    Título: {title}
+    Info Cruda: {content}
+    Extra Metadatos: {meta_info}
 
     Reglas Mandatorias de Generación:
     1. NIVEL COGNITIVO: Mantén un nivel de complejidad Universitario Media-Alta. No hagas preguntas obvias; busca evaluar comprensión profunda y aplicación.
@@ -103,15 +135,60 @@ def generate_deck_from_registry(record: Registry, mockup_only: bool = False) ->
        - [Cloze]: Rellenar huecos usando la sintaxis: "La {{c1::palabra}} es {{c2::importante}}".
        - [Matching]: Emparejamiento (Almacenado como JSON de pares en 'question').
        - [MAQ]: Selección múltiple.
-    4. CANTIDAD: Genera entre 3 y 7 tarjetas según la densidad de la información.
-    5. REFERENCIA: Asigna 'parent_id' SIEMPRE a {record.id}.
+    4. CANTIDAD: Genera {cantidad}.
+    5. REFERENCIA: Asigna 'parent_id' SIEMPRE a {record_id}.
 
     Retorna estrictamente un ARRAY de objetos JSON que sigan el esquema StudyCard proporcionado.
     """
 
+def _deck_chunked(client, record: Registry, chunks: List[str], bypass_cache: bool = False) -> List[StudyCard]:
+    """
+    Map: tarjetas por trozo (en paralelo, cacheadas por trozo).
+    Reduce: intercala las tarjetas de todos los trozos, descarta preguntas repetidas y recorta a MAX_DECK_CARDS.
+    """
+    # Los hilos no tocan el objeto ORM: se copian antes los campos que usan los prompts
+    record_id, title, meta_info = record.id, record.title, record.meta_info
+    decks = map_chunks(chunks, lambda chunk: _generate_cards(
+        client, _deck_prompt(record_id, title, chunk, meta_info, cantidad="entre 2 y 4 tarjetas sobre este fragmento"), bypass_cache
+    ))
+
+    final_cards, seen = [], set()
+    for card in (c for rnd in zip_longest(*[d for d in decks if d]) for c in rnd if c):
+        key = " ".join(card.question.lower().split())
+        if key in seen:
+            continue
+        seen.add(key)
+        final_cards.append(card)
+        if len(final_cards) >= MAX_DECK_CARDS:
+            break
+    return final_cards
+
+def _to_study_cards(text: str) -> List[StudyCard]:
+    json_data = json.loads(text)
+    # Convertimos de SimplifiedStudyCard a StudyCard real
+    final_cards = []
+    for item in json_data:
+        final_cards.append(StudyCard(
+            parent_id=item['parent_id'],
+            question=item['question'],
+            answer=item['answer'],
+            card_type=item['card_type']
+        ))
+    return final_cards
+
+def _generate_cards(client, prompt: str, bypass_cache: bool = False) -> Optional[List[StudyCard]]:
+    """Tarjetas de la cadena de modelos Gemini (con caché en disco) o None si todos fallan."""
+    return _generate_structured(client, prompt, list[SimplifiedStudyCard], _to_study_cards, bypass_cache)
+
+def _generate_structured(client, prompt: str, schema, parse, bypass_cache: bool = False, report_errors: bool = True):
+    """
+    Llamada con salida estructurada ('schema') a la cadena de modelos Gemini.
+    parse(texto) valida la respuesta; solo se cachean las que superan la validación.
+    Retorna el resultado de parse o None si todos los modelos fallan.
+    """
     config = types.GenerateContentConfig(
         response_mime_type="application/json",
-        response_schema=list[SimplifiedStudyCard],
+        response_schema=schema,
         temperature=0.3
     )
 
@@ -121,30 +198,164 @@ def generate_deck_from_registry(record: Registry, mockup_only: bool = False) ->
         "gemini-2.0-flash"
     ]
 
+    # Caché en disco por (modelo, prompt, temperatura, esquema)
+    _, cached = llm_cache.lookup_any(models_to_try, prompt, temperature=0.3, schema=schema, bypass=bypass_cache)
+    if cached:
+        try:
+            return parse(cached)
+        except Exception:
+            pass # Entrada corrupta: se regenera por red
+
     for model_name in models_to_try:
         try:
-            response = client.models.generate_content(
-                model=model_name,
-                contents=prompt,
-                config=config,
-            )
+            with timed("llm_request", agent="study", model=model_name):
+                # Ritmo, reintentos con backoff ante 429/5xx y circuit breaker compartidos
+                response = outbound.call(
+                    "gemini", client.models.generate_content,
+                    model=model_name,
+                    contents=prompt,
+                    config=config,
+                )
             
             if response.text:
-                json_data = json.loads(response.text)
-                # Convertimos de SimplifiedStudyCard a StudyCard real
-                final_cards = []
-                for item in json_data:
-                    final_cards.append(StudyCard(
-                        parent_id=item['parent_id'],
-                        question=item['question'],
-                        answer=item['answer'],
-                        card_type=item['card_type']
-                    ))
-                return final_cards
+                result = parse(response.text)
+                llm_cache.store(model_name, prompt, response.text, temperature=0.3, schema=schema, bypass=bypass_cache)
+                return result
                 
+        except CircuitOpenError:
+            # Gemini saturado o caído: los demás modelos comparten cuota y circuito
+            break
         except Exception as e:
-            if model_name == models_to_try[-1]:
+            if report_errors and model_name == models_to_try[-1]:
                 console.print(f"[bold white on red]Error Fatal: Todos los modelos de Gemini fallaron. Último intento ({model_name}) dio el error: {e}[/]")
             continue
 
-    return []
+    return None
+
+# ----------------------------------------------------------------------------
+# Modo lote: varios registros cortos en una sola petición estructurada
+# ----------------------------------------------------------------------------
+
+def generate_decks_batch(records: Sequence[Registry], bypass_cache: bool = False, progress=None) -> Dict[int, List[StudyCard]]:
+    """
+    Genera los mazos de varios registros agrupando los cortos en peticiones multi-registro.
+    La respuesta es una lista de mazos con su 'parent_id', validada con TypeAdapter; los
+    lotes que fallan o llegan truncados se parten en dos automáticamente. Los registros
+    largos siguen el camino individual (troceado si hace falta).
+    Retorna {registry_id: [StudyCard, ...]} ([] si no se generó nada para ese registro).
+    progress(hechos, total) se invoca al terminar cada lote.
+    """
+    # Los hilos no tocan objetos ORM: se copian antes los campos que usan los prompts
+    items = [
+        {"id": r.id, "title": r.title, "content_raw": r.content_raw or "", "meta_info": r.meta_info}
+        for r in records
+    ]
+    results: Dict[int, List[StudyCard]] = {item["id"]: [] for item in items}
+    if not items:
+        return results
+
+    client = get_client()
+    small = [i for i in items if estimate_tokens(i["content_raw"]) <= BATCH_RECORD_TOKENS]
+    large_ids = {i["id"] for i in items} - {i["id"] for i in small}
+    if client is None:
+        small, large_ids = [], {i["id"] for i in items}  # Sin API: el camino individual genera el mockup heurístico
+
+    batches = _pack_batches(small)
+    total, done = len(items), 0
+    lock = threading.Lock()
+
+    def _run(batch: List[dict]):
+        nonlocal done
+        decks = _generate_batch(client, batch, bypass_cache)
+        with lock:
+            results.update(decks)
+            done += len(batch)
+            if progress:
+                progress(done, total)
+
+    map_chunks(batches, _run)
+    for record in records:
+        if record.id in large_ids:
+            results[record.id] = generate_deck_from_registry(record, bypass_cache=bypass_cache)
+            done += 1
+            if progress:
+                progress(done, total)
+    return results
+
+def _pack_batches(items: List[dict]) -> List[List[dict]]:
+    """Empaqueta registros consecutivos hasta BATCH_MAX_TOKENS de contenido o BATCH_MAX_RECORDS."""
+    batches, current, size = [], [], 0
+    for item in items:
+        tokens = estimate_tokens(item["content_raw"])
+        if current and (size + tokens > BATCH_MAX_TOKENS or len(current) >= BATCH_MAX_RECORDS):
+            batches.append(current)
+            current, size = [], 0
+        current.append(item)
+        size += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+def _batch_prompt(batch: List[dict]) -> str:
+    registros = "\n".join(
+        f"""
+    --- Registro (ID: {item['id']}) ---
+    Título: {item['title']}
+    Info Cruda: {item['content_raw']}
+    Extra Metadatos: {item['meta_info']}"""
+        for item in batch
+    )
+    return f"""
+    Eres un profesor universitario de alto nivel, experto en pedagogía y Active Recall.
+    Tu objetivo es leer los siguientes {len(batch)} documentos cortos y extraer, para CADA uno, un mazo de Flashcards de ALTO RENDIMIENTO.
+    {registros}
+
+    Reglas Mandatorias de Generación:
+    1. NIVEL COGNITIVO: Mantén un nivel de complejidad Universitario Media-Alta. No hagas preguntas obvias; busca evaluar comprensión profunda y aplicación.
+    2. PARAFRASEO: Nunca copies y pegues texto del documento. Reformula (parafrasea) las ideas para que el estudiante deba procesar el significado y no solo reconocer palabras.
+    3. DIVERSIDAD DE FORMATOS: Utiliza una mezcla variada de los siguientes tipos en el campo 'card_type':
+       - [Factual/Conceptual]: Preguntas directas o de desarrollo.
+       - [Reversible]: Conceptos con definiciones claras.
+       - [MCQ]: Opción múltiple (Almacena en 'question' como JSON: {{"prompt": "...", "options": {{"a": "...", "b": "..."}}}} y en 'answer' la letra).
+       - [TF]: Verdadero o Falso. (Respuesta 'v' o 'f').
+       - [Cloze]: Rellenar huecos usando la sintaxis: "La {{c1::palabra}} es {{c2::importante}}".
+    4. CANTIDAD: Genera entre 2 y 5 tarjetas por documento según la densidad de su información.
+    5. AISLAMIENTO: Cada tarjeta debe basarse solo en su documento; no mezcles ideas entre documentos.
+
+    Retorna estrictamente un ARRAY JSON con un objeto por documento: {{"parent_id": <ID del registro>, "cards": [...]}}.
+    """
+
+def _generate_batch(client, batch: List[dict], bypass_cache: bool = False, retry_missing: bool = True) -> Dict[int, List[StudyCard]]:
+    """Mazos de un lote; si la petición falla se parte en dos (hasta llegar a registros sueltos)."""
+    ids = {item["id"] for item in batch}
+
+    def _parse(text: str) -> Dict[int, List[StudyCard]]:
+        decks = _BATCH_ADAPTER.validate_json(text)
+        cards: Dict[int, List[StudyCard]] = {}
+        for deck in decks:
+            if deck.parent_id not in ids:
+                continue  # ID inventado por el modelo: se descarta
+            cards.setdefault(deck.parent_id, []).extend(_CARDS_ADAPTER.validate_python([
+                {"parent_id": deck.parent_id, "question": c.question, "answer": c.answer, "card_type": c.card_type}
+                for c in deck.cards
+            ]))
+        return cards
+
+    instrumentation.count("study_batch_requests")
+    instrumentation.count("study_batch_records", value=len(batch))
+    # Un fallo de un lote de varios registros no es definitivo: se parte en dos
+    decks = _generate_structured(client, _batch_prompt(batch), list[BatchDeck], _parse, bypass_cache, report_errors=len(batch) == 1)
+    if decks is None:
+        if len(batch) == 1:
+            return {batch[0]["id"]: []}
+        # Respuesta inválida o truncada (lote demasiado grande para la salida): partir en dos
+        half = len(batch) // 2
+        merged = _generate_batch(client, batch[:half], bypass_cache)
+        merged.update(_generate_batch(client, batch[half:], bypass_cache))
+        return merged
+
+    missing = [item for item in batch if not decks.get(item["id"])]
+    if missing and retry_missing and len(missing) < len(batch):
+        # El modelo omitió algunos documentos: un reintento solo con ellos
+        decks.update(_generate_batch(client, missing, bypass_cache, retry_missing=False))
+    return {item["id"]: decks.get(item["id"], []) for item in batch}
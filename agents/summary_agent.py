@@ -1,22 +1,29 @@
 
 import os
 import json
-from typing import Optional
+from typing import List, Optional
 
 from google import genai
 from google.genai import types
 from dotenv import load_dotenv
 
 from core.database import Registry
+from core.chunking import split_text, map_chunks, reduce_texts
+from core.llm_cache import llm_cache
+from core.instrumentation import timed
+from core.outbound import outbound, CircuitOpenError
 
 load_dotenv()
 
+CHUNK_TOKENS = 3000   # Presupuesto por trozo; por debajo se usa el prompt de un solo paso
+SECTION_SEPARATOR = "\n\n---\n\n"
+
 def get_client():
     """Obtiene el cliente GenAI."""
     api_key = os.environ.get("GOOGLE_API_KEY")
     return genai.Client(api_key=api_key) if api_key else None
 
-def generate_summary_from_registry(record: Registry) -> Optional[str]:
+def generate_summary_from_registry(record: Registry, bypass_cache: bool = False) -> Optional[str]:
     """
     Agente de Síntesis.
     Genera un resumen ejecutivo y estructurado de todas las ideas del registro.
@@ -44,25 +51,86 @@ def generate_summary_from_registry(record: Registry) -> Optional[str]:
     Responde únicamente con el texto del resumen en formato Markdown. No añadidas introducciones como "Aquí está el resumen".
     """
 
+    chunks = split_text(record.content_raw, CHUNK_TOKENS)
+    if len(chunks) > 1:
+        return _summarise_chunked(client, record, chunks, bypass_cache)
+    return _generate(client, prompt, bypass_cache)
+
+def _summarise_chunked(client, record: Registry, chunks: List[str], bypass_cache: bool = False) -> Optional[str]:
+    """Map-reduce: viñetas por trozo (en paralelo, cacheadas por trozo) y síntesis final sobre ellas."""
+    # Los hilos no tocan el objeto ORM: se copian antes los campos que usan los prompts
+    record_id, title = record.id, record.title
+
+    def _map(chunk: str) -> Optional[str]:
+        # Sin ID ni posición del trozo: el prompt solo depende de su texto y se cachea por trozo
+        return _generate(client, f"""
+    Eres un experto en síntesis de información. Resume en viñetas las ideas clave, datos y conclusiones
+    del siguiente fragmento de un documento más largo titulado "{title}".
+
+    Fragmento:
+    {chunk}
+
+    Responde únicamente con las viñetas en formato Markdown (máximo 150 palabras).
+    """, bypass_cache)
+
+    def _reduce(partials: List[str]) -> Optional[str]:
+        return _generate(client, f"""
+    Eres un experto en síntesis de información y gestión del conocimiento (PKM).
+    Tu objetivo es leer los resúmenes parciales (en orden) de las secciones de un documento extenso
+    y crear un RESUMEN EJECUTIVO DE ALTO NIVEL de todo el documento.
+
+    --- Registro (ID: {record_id}) ---
+    Título: {title}
+    Resúmenes parciales:
+    {SECTION_SEPARATOR.join(partials)}
+
+    Reglas del Resumen:
+    1. ESTRUCTURA: Usa viñetas para los puntos clave.
+    2. BREVEDAD: No más de 300 palabras.
+    3. VALOR: Enfócate en las ideas más importantes y conclusiones "accionables".
+    4. TONO: Profesional, claro y directo.
+
+    Responde únicamente con el texto del resumen en formato Markdown. No añadidas introducciones como "Aquí está el resumen".
+    """, bypass_cache)
+
+    partials = map_chunks(chunks, _map)
+    if any(p is None for p in partials):
+        return None  # Los trozos resueltos quedan en caché: el reintento solo paga los que faltan
+    return reduce_texts(partials, _reduce, CHUNK_TOKENS)
+
+def _generate(client, prompt: str, bypass_cache: bool = False) -> Optional[str]:
+    """Respuesta de la cadena de modelos Gemini (con caché en disco) o None."""
     models_to_try = [
         "gemini-2.5-flash",
         "gemini-2.0-flash",
         "gemini-1.5-flash"
     ]
 
+    # Caché en disco: un prompt idéntico ya resuelto por cualquier modelo de la cadena no se re-envía
+    _, cached = llm_cache.lookup_any(models_to_try, prompt, temperature=0.3, bypass=bypass_cache)
+    if cached:
+        return cached.strip()
+
     for model_name in models_to_try:
         try:
-            response = client.models.generate_content(
-                model=model_name,
-                contents=prompt,
-                config=types.GenerateContentConfig(
-                    temperature=0.3,
-                )
+            with timed("llm_request", agent="summary", model=model_name):
+                # Ritmo, reintentos con backoff ante 429/5xx y circuit breaker compartidos
+                response = outbound.call(
+                    "gemini", client.models.generate_content,
+                    model=model_name,
+                    contents=prompt,
+                    config=types.GenerateContentConfig(
+                        temperature=0.3,
+                    )
             )
             
             if response.text:
+                llm_cache.store(model_name, prompt, response.text, temperature=0.3, bypass=bypass_cache)
                 return response.text.strip()
                 
+        except CircuitOpenError:
+            # Gemini saturado o caído: los demás modelos comparten cuota y circuito
+            break
         except Exception as e:
             continue
 
@@ -0,0 +1,234 @@
+"""
+Generador determinista de corpus sintéticos para los benchmarks de Nexus.
+
+Misma semilla + mismo tamaño = misma BD, fila a fila, en cualquier máquina:
+los resultados de distintos commits son comparables.
+
+Distribuciones (aproximan una BD real de Nexus):
+- Tipos: mayoría youtube/file/web, pocas notas y conceptos.
+- Títulos y contenido: vocabulario con frecuencias Zipf (pocas palabras muy
+  comunes, cola larga de términos raros), longitudes según el tipo
+  (transcripciones largas, notas cortas).
+- Tags: 0-6 por registro, popularidad Zipf sobre ~500 etiquetas.
+- Cards: ~25 % de los registros son fuente de flashcards (3-25 cada uno);
+  next_review repartido entre -60 y +120 días, ~10 % sin repasar.
+- Links: ~0.5 por registro con enganche preferencial (los registros antiguos
+  acumulan más vínculos).
+"""
+import os
+import random
+import sqlite3
+from datetime import datetime, timedelta
+from typing import Iterator, List
+
+GENERATOR_VERSION = 2  # 2: texto en registry_content (comprimido)
+DEFAULT_SEED = 1234
+INSERT_CHUNK = 20_000  # Filas por executemany (memoria acotada también en 1M)
+
+# Fecha de referencia del corpus: las consultas SRS del benchmark la usan como 'now'
+# para que el nº de tarjetas vencidas no dependa del día en que se ejecuta.
+CORPUS_NOW = datetime(2026, 1, 15)
+
+SIZES = {"1k": 1_000, "10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+
+TYPE_WEIGHTS = [
+    ("youtube", 40), ("file", 25), ("web", 20), ("note", 12), ("concept", 2), ("app", 1)
+]
+FILE_EXTENSIONS = ["pdf", "md", "docx", "txt", "py", "xlsx", "png"]
+
+# Palabras reales (para que las consultas del benchmark encuentren resultados)
+# seguidas de una cola larga sintética.
+CORE_WORDS = [
+    "python", "aprendizaje", "memoria", "sistema", "datos", "red", "neuronal", "modelo",
+    "estudio", "historia", "economia", "fisica", "quimica", "algoritmo", "grafo", "busqueda",
+    "repaso", "concepto", "proyecto", "diseño", "arquitectura", "base", "consulta", "indice",
+    "cerebro", "video", "curso", "tutorial", "resumen", "analisis", "matematicas", "calculo",
+    "estadistica", "probabilidad", "optimizacion", "rendimiento", "cache", "servidor", "cliente",
+    "sqlite", "fastapi", "tarjeta", "pomodoro", "filosofia", "lenguaje", "gramatica", "musica",
+]
+VOCAB_SIZE = 5_000
+TAG_POOL = 500
+
+def _vocabulary() -> List[str]:
+    return CORE_WORDS + [f"term{i:04d}" for i in range(VOCAB_SIZE - len(CORE_WORDS))]
+
+def _zipf_weights(n: int, s: float = 1.1) -> List[float]:
+    return [1.0 / (rank ** s) for rank in range(1, n + 1)]
+
+def _cumulative(weights: List[float]) -> List[float]:
+    total, acc = 0.0, []
+    for w in weights:
+        total += w
+        acc.append(total)
+    return acc
+
+class CorpusGenerator:
+    """Produce filas (tuplas) listas para executemany, siempre en el mismo orden."""
+
+    def __init__(self, n_registry: int, seed: int = DEFAULT_SEED, now: datetime = CORPUS_NOW):
+        self.n = n_registry
+        self.seed = seed
+        self.now = now
+        self.vocab = _vocabulary()
+        self._vocab_cum = _cumulative(_zipf_weights(len(self.vocab)))
+        self._tag_cum = _cumulative(_zipf_weights(TAG_POOL, s=1.0))
+        self._types = [t for t, _ in TYPE_WEIGHTS]
+        self._type_cum = _cumulative([w for _, w in TYPE_WEIGHTS])
+
+    @staticmethod
+    def _ts(dt: datetime) -> str:
+        # Mismo formato que escribe el ORM (microsegundos incluidos)
+        return dt.strftime("%Y-%m-%d %H:%M:%S.%f")
+
+    def _words(self, rnd: random.Random, k: int) -> List[str]:
+        return rnd.choices(self.vocab, cum_weights=self._vocab_cum, k=k)
+
+    def registries(self) -> Iterator[tuple]:
+        rnd = random.Random(f"{self.seed}-registry")
+        base = self.now - timedelta(days=3 * 365)
+        content_len = {"youtube": (300, 900), "web": (120, 450), "file": (10, 60), "note": (30, 250)}
+
+        for i in range(1, self.n + 1):
+            r_type = rnd.choices(self._types, cum_weights=self._type_cum)[0]
+            title = " ".join(self._words(rnd, rnd.randint(3, 8))).capitalize()
+            if r_type == "youtube":
+                path = f"https://www.youtube.com/watch?v=syn{i:08d}"
+            elif r_type == "web":
+                path = f"https://example{rnd.randint(0, 999)}.org/articulo/{i}"
+            elif r_type == "file":
+                path = f"C:/Nexus/docs/{rnd.randint(0, 99)}/archivo_{i}.{rnd.choice(FILE_EXTENSIONS)}"
+            else:
+                path = f"nexus://{r_type}/{i}"
+
+            lo, hi = content_len.get(r_type, (10, 40))
+            content = " ".join(self._words(rnd, rnd.randint(lo, hi)))
+            summary = " ".join(self._words(rnd, rnd.randint(40, 120))) if r_type == "youtube" and rnd.random() < 0.6 else None
+
+            created = base + timedelta(seconds=rnd.randint(0, 3 * 365 * 86400))
+            modified = created + timedelta(seconds=rnd.randint(0, 30 * 86400))
+            viewed = self._ts(modified + timedelta(days=rnd.randint(0, 60))) if rnd.random() < 0.3 else None
+            is_source = 1 if rnd.random() < 0.25 else 0
+
+            yield (i, r_type, title, path, content, summary, "{}", is_source,
+                   self._ts(created), self._ts(modified), viewed)
+
+    def tags(self) -> Iterator[tuple]:
+        rnd = random.Random(f"{self.seed}-tags")
+        for i in range(1, self.n + 1):
+            k = min(rnd.choices(range(7), weights=[10, 25, 25, 18, 12, 6, 4])[0], 6)
+            values = set(rnd.choices(range(TAG_POOL), cum_weights=self._tag_cum, k=k))
+            for v in sorted(values):
+                yield (i, f"tema_{v:03d}")
+
+    def cards(self, flashcard_sources: Iterator[int]) -> Iterator[tuple]:
+        rnd = random.Random(f"{self.seed}-cards")
+        for parent_id in flashcard_sources:
+            for _ in range(rnd.randint(3, 25)):
+                if rnd.random() < 0.10:
+                    stability = difficulty = 0.0
+                    last = nxt = None
+                else:
+                    stability = round(rnd.uniform(0.5, 120.0), 3)
+                    difficulty = round(rnd.uniform(1.0, 10.0), 3)
+                    nxt_dt = self.now + timedelta(days=rnd.uniform(-60, 120))
+                    last = self._ts(nxt_dt - timedelta(days=max(stability, 1.0)))
+                    nxt = self._ts(nxt_dt)
+                question = "¿" + " ".join(self._words(rnd, rnd.randint(5, 14))) + "?"
+                answer = " ".join(self._words(rnd, rnd.randint(5, 30)))
+                yield (parent_id, question, answer, "Factual", difficulty, stability, last, nxt)
+
+    def links(self) -> Iterator[tuple]:
+        rnd = random.Random(f"{self.seed}-links")
+        targets: List[int] = [1]
+        relations = ["complementa", "referencia", "comparar", None]
+        for i in range(2, self.n + 1):
+            if rnd.random() < 0.5:
+                # Enganche preferencial: elegir un extremo de un vínculo previo
+                target = rnd.choice(targets)
+                if target != i:
+                    yield (i, target, rnd.choice(relations), None)
+                    targets.append(target)
+            targets.append(i)
+
+def _chunks(rows: Iterator[tuple], size: int = INSERT_CHUNK) -> Iterator[List[tuple]]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def corpus_is_current(db_path: str, n_registry: int, seed: int) -> bool:
+    """True si 'db_path' ya contiene el corpus de este tamaño/semilla/versión."""
+    if not os.path.exists(db_path):
+        return False
+    try:
+        con = sqlite3.connect(db_path)
+        try:
+            row = con.execute("SELECT n_registry, seed, version FROM bench_meta").fetchone()
+        finally:
+            con.close()
+    except sqlite3.Error:
+        return False
+    return row == (n_registry, seed, GENERATOR_VERSION)
+
+def populate(db_path: str, n_registry: int, seed: int = DEFAULT_SEED, progress=None):
+    """
+    Llena una BD con el esquema ya creado (init_db) con el corpus sintético.
+    Inserta con sqlite3 + executemany por bloques: los triggers FTS se mantienen activos.
+    El texto (content_raw, summary) va comprimido a registry_content, como en la app.
+    """
+    from core.database import encode_texts, register_sql_functions
+
+    gen = CorpusGenerator(n_registry, seed=seed)
+    con = sqlite3.connect(db_path)
+    register_sql_functions(con)  # Los triggers FTS leen el texto con nexus_text()
+    try:
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("PRAGMA synchronous=OFF")
+        sources = []
+
+        for chunk in _chunks(gen.registries()):
+            con.executemany(
+                "INSERT INTO registry (id, type, title, path_url, metadata, "
+                "is_flashcard_source, created_at, modified_at, last_viewed_at) VALUES (?,?,?,?,?,?,?,?,?)",
+                [row[:4] + row[6:] for row in chunk]
+            )
+            con.executemany(
+                "INSERT INTO registry_content (registry_id, codec, content_z, summary_z) VALUES (?,?,?,?)",
+                [(row[0], *encode_texts(row[4], row[5])) for row in chunk]
+            )
+            sources.extend(row[0] for row in chunk if row[7])
+            con.commit()
+            if progress:
+                progress("registry", chunk[-1][0])
+
+        for chunk in _chunks(gen.tags()):
+            con.executemany("INSERT OR IGNORE INTO tags (registry_id, value) VALUES (?, ?)", chunk)
+        con.commit()
+
+        for chunk in _chunks(gen.cards(iter(sources))):
+            con.executemany(
+                "INSERT INTO cards (parent_id, question, answer, type, difficulty, stability, last_review, next_review) "
+                "VALUES (?,?,?,?,?,?,?,?)",
+                chunk
+            )
+        con.commit()
+
+        for chunk in _chunks(gen.links()):
+            con.executemany(
+                "INSERT INTO nexus_links (source_id, target_id, relation_type, description) VALUES (?,?,?,?)",
+                chunk
+            )
+        con.commit()
+
+        con.execute("CREATE TABLE IF NOT EXISTS bench_meta (n_registry INTEGER, seed INTEGER, version INTEGER)")
+        con.execute("DELETE FROM bench_meta")
+        con.execute("INSERT INTO bench_meta VALUES (?, ?, ?)", (n_registry, seed, GENERATOR_VERSION))
+        con.commit()
+        con.execute("ANALYZE")
+        con.commit()
+    finally:
+        con.close()
@@ -0,0 +1,147 @@
+"""
+Servidor LLM simulado, compatible con /chat/completions (formato OpenAI/DeepSeek).
+
+Responde en el formato que espera DeepSeekAgent (RESUMEN: ... FLASHCARDS: [...])
+con texto determinista derivado del prompt, latencia configurable y una tasa
+opcional de 429 para ejercitar los reintentos de core.outbound. Permite probar
+de extremo a extremo optimizar_ia / reprocesar_fallidos sin gastar tokens.
+
+Uso:
+    python benchmarks/mock_llm.py --port 8765 --latency 0.5 --error-rate 0.05
+    DEEPSEEK_BASE_URL=http://127.0.0.1:8765 DEEPSEEK_API_KEY=mock python scripts/optimizar_ia.py
+
+O en proceso: optimizar_ia.py --mock (arranca uno en un puerto libre).
+"""
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_LATENCY = 0.2   # Segundos por respuesta
+DEFAULT_CARDS = 5
+
+def fake_completion(prompt: str, cards: int = DEFAULT_CARDS) -> str:
+    """Respuesta determinista (mismo prompt = mismo texto) en el formato de DeepSeekAgent."""
+    digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:12]
+    flashcards = [
+        {"question": f"Pregunta {i + 1} sobre el contenido {digest}", "answer": f"Respuesta {i + 1} ({digest})"}
+        for i in range(cards)
+    ]
+    summary = (
+        f"Resumen simulado {digest}. El contenido trata los puntos principales del material "
+        f"analizado y sus conclusiones. Generado por el servidor LLM de pruebas."
+    )
+    return f"RESUMEN: {summary}\nFLASHCARDS: {json.dumps(flashcards, ensure_ascii=False)}"
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "NexusMockLLM/1.0"
+
+    def log_message(self, format, *args):
+        pass  # Silencioso: los benchmarks imprimen su propio informe
+
+    def _send(self, status: int, payload: dict, headers: dict = None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send(404, {"error": {"message": "not found"}})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            data = json.loads(self.rfile.read(length) or b"{}")
+            prompt = "\n".join(m.get("content", "") for m in data.get("messages", []))
+        except (ValueError, AttributeError):
+            self._send(400, {"error": {"message": "invalid json"}})
+            return
+
+        srv = self.server
+        with srv.lock:
+            srv.requests += 1
+            srv.in_flight += 1
+            srv.max_in_flight = max(srv.max_in_flight, srv.in_flight)
+        try:
+            if srv.error_rate and srv.rng.random() < srv.error_rate:
+                with srv.lock:
+                    srv.throttled += 1
+                self._send(429, {"error": {"message": "rate limit (mock)"}}, {"Retry-After": "0"})
+                return
+            if srv.latency:
+                time.sleep(srv.latency)
+            self._send(200, {
+                "id": "mock-" + hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:8],
+                "object": "chat.completion",
+                "model": data.get("model", "mock"),
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": fake_completion(prompt, srv.cards)}}],
+            })
+        finally:
+            with srv.lock:
+                srv.in_flight -= 1
+
+class MockLLMServer(ThreadingHTTPServer):
+    """Servidor en hilo propio; 'url' es la base a usar como DEEPSEEK_BASE_URL."""
+    daemon_threads = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = DEFAULT_LATENCY,
+                 error_rate: float = 0.0, cards: int = DEFAULT_CARDS, seed: int = 1234):
+        super().__init__((host, port), _Handler)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.cards = cards
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.throttled = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockLLMServer":
+        self._thread = threading.Thread(target=self.serve_forever, name="nexus-mock-llm", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"requests": self.requests, "throttled": self.throttled, "max_in_flight": self.max_in_flight}
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor LLM simulado (compatible con DeepSeek/OpenAI).")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=DEFAULT_LATENCY, help="Segundos por respuesta")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fracción de respuestas 429")
+    parser.add_argument("--cards", type=int, default=DEFAULT_CARDS, help="Flashcards por respuesta")
+    args = parser.parse_args()
+
+    server = MockLLMServer(args.host, args.port, args.latency, args.error_rate, args.cards)
+    print(f"Mock LLM escuchando en {server.url} (latencia {args.latency}s, 429 {args.error_rate:.0%})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"Peticiones atendidas: {server.stats()}")
+
+if __name__ == "__main__":
+    main()
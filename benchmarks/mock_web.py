@@ -0,0 +1,293 @@
+"""
+Servidor web simulado para el motor de ingesta concurrente (modules.ingest_engine).
+
+Sirve páginas HTML deterministas para cualquier ruta, con latencia configurable, y
+cuenta las peticiones simultáneas en total y por dominio (cabecera Host). Con
+stub_client() cualquier URL (http://sitio3.test/pagina/7) se resuelve contra este
+servidor conservando su Host, así un solo proceso simula muchos dominios.
+
+Uso:
+    python benchmarks/mock_web.py --port 8766 --latency 0.2     # solo servidor
+    python benchmarks/mock_web.py --check                       # comprobación del motor
+
+--check ingesta un lote contra el servidor y verifica que se respetan el límite
+global y el de cada dominio y que la escritura va por lotes desde un solo hilo;
+después, con un lote sesgado hacia un dominio, que el resto de dominios no alarga
+el lote (las URLs en espera de su dominio no acaparan la concurrencia global).
+Sale con código 1 si alguna comprobación falla.
+"""
+import os
+import sys
+import time
+import math
+import hashlib
+import argparse
+import threading
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_LATENCY = 0.1   # Segundos por respuesta
+DEFAULT_PARAGRAPHS = 5
+
+def fake_page(host: str, path: str, paragraphs: int = DEFAULT_PARAGRAPHS) -> str:
+    """HTML determinista (misma URL = misma página) con título y párrafos distintos por URL."""
+    digest = hashlib.sha256(f"{host}{path}".encode("utf-8")).hexdigest()[:12]
+    body = "".join(
+        f"<p>Párrafo {i + 1} de la página {digest} servida por el servidor web de pruebas.</p>"
+        for i in range(paragraphs)
+    )
+    return (
+        f"<html><head><title>Página {digest}</title><script>var x = 1;</script></head>"
+        f"<body><nav>menú</nav><h1>{host}{path}</h1>{body}<footer>pie</footer></body></html>"
+    )
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "NexusMockWeb/1.0"
+
+    def log_message(self, format, *args):
+        pass  # Silencioso: el informe lo imprime quien lo usa
+
+    def do_GET(self):
+        srv = self.server
+        host = (self.headers.get("Host") or "").split(":")[0]
+        with srv.lock:
+            srv.requests += 1
+            srv.in_flight += 1
+            srv.max_in_flight = max(srv.max_in_flight, srv.in_flight)
+            srv.host_in_flight[host] += 1
+            srv.host_max_in_flight[host] = max(srv.host_max_in_flight[host], srv.host_in_flight[host])
+        try:
+            if srv.latency:
+                time.sleep(srv.latency)
+            body = fake_page(host, self.path, srv.paragraphs).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        finally:
+            with srv.lock:
+                srv.in_flight -= 1
+                srv.host_in_flight[host] -= 1
+
+class MockWebServer(ThreadingHTTPServer):
+    """Servidor en hilo propio; 'url' es la base a la que stub_client() redirige las peticiones."""
+    daemon_threads = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = DEFAULT_LATENCY,
+                 paragraphs: int = DEFAULT_PARAGRAPHS):
+        super().__init__((host, port), _Handler)
+        self.latency = latency
+        self.paragraphs = paragraphs
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.host_in_flight = defaultdict(int)
+        self.host_max_in_flight = defaultdict(int)
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockWebServer":
+        self._thread = threading.Thread(target=self.serve_forever, name="nexus-mock-web", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "requests": self.requests,
+                "max_in_flight": self.max_in_flight,
+                "host_max_in_flight": dict(self.host_max_in_flight),
+            }
+
+def stub_client(server: MockWebServer, **client_opts):
+    """httpx.AsyncClient que envía toda petición a 'server' manteniendo el Host de la URL original."""
+    import httpx
+
+    base = httpx.URL(server.url)
+
+    class _StubTransport(httpx.AsyncBaseTransport):
+        def __init__(self):
+            self._inner = httpx.AsyncHTTPTransport()
+
+        async def handle_async_request(self, request):
+            # La cabecera Host ya se fijó con la URL original: solo cambia a dónde se conecta
+            request.url = request.url.copy_with(scheme=base.scheme, host=base.host, port=base.port)
+            return await self._inner.handle_async_request(request)
+
+        async def aclose(self):
+            await self._inner.aclose()
+
+    return httpx.AsyncClient(transport=_StubTransport(), **client_opts)
+
+# ----------------------------------------------------------------------------
+# Comprobación del motor de ingesta (--check)
+# ----------------------------------------------------------------------------
+
+class RecordingDB:
+    """Destino de escritura en memoria que anota cada lote, su hilo y si hubo escrituras solapadas."""
+
+    def __init__(self):
+        self.batches = []
+        self.threads = []
+        self.tags = 0
+        self.overlapped = False
+        self._active = 0
+        self._lock = threading.Lock()
+        self._next_id = 1
+
+    def bulk_create_registries(self, batch):
+        with self._lock:
+            self._active += 1
+            self.overlapped |= self._active > 1
+        try:
+            time.sleep(0.01)  # Ventana para detectar dos escritores a la vez
+            with self._lock:
+                ids = list(range(self._next_id, self._next_id + len(batch)))
+                self._next_id += len(batch)
+                self.batches.append(len(batch))
+                self.threads.append(threading.current_thread().name)
+            return ids
+        finally:
+            with self._lock:
+                self._active -= 1
+
+    def bulk_add_tags(self, items):
+        self.tags += len(items)
+
+def _run_engine(url_list, max_concurrency: int, per_domain: int, batch_size: int, latency: float):
+    """Ingesta url_list con IngestEngine contra un servidor simulado nuevo. Retorna (creados, fallidos, s, stats, db)."""
+    import asyncio
+    # Sin límite de ritmo real que respetar: se mide la concurrencia del motor, no el token bucket
+    os.environ.setdefault("NEXUS_RATE_WEB", "1000/1000")
+    from modules.ingest_engine import IngestEngine
+
+    server = MockWebServer(latency=latency).start()
+    db = RecordingDB()
+
+    async def _run():
+        async with stub_client(server, timeout=10.0) as client:
+            engine = IngestEngine(
+                db_target=db, max_concurrency=max_concurrency, per_domain=per_domain,
+                batch_size=batch_size, client=client
+            )
+            return await engine.run(url_list, ["mock_web"])
+
+    start = time.perf_counter()
+    try:
+        created, failed = asyncio.run(_run())
+        # Antes de stop(): shutdown() espera hasta el siguiente sondeo de serve_forever (0,5 s)
+        elapsed = time.perf_counter() - start
+    finally:
+        server.stop()
+    return created, failed, elapsed, server.stats(), db
+
+def _report(title: str, checks) -> bool:
+    print(title)
+    for name, ok, detail in checks:
+        print(f"  {'OK   ' if ok else 'FALLO'} {name}: {detail}")
+    return all(ok for _, ok, _ in checks)
+
+def check_ingest_engine(urls: int = 120, domains: int = 6, max_concurrency: int = 8, per_domain: int = 2,
+                        batch_size: int = 25, latency: float = DEFAULT_LATENCY) -> bool:
+    """Ingesta 'urls' páginas de 'domains' dominios contra el servidor simulado y verifica límites y lotes."""
+    url_list = [f"http://sitio{i % domains}.test/pagina/{i}" for i in range(urls)]
+    created, failed, elapsed, stats, db = _run_engine(url_list, max_concurrency, per_domain, batch_size, latency)
+
+    # Límite efectivo: el global no se alcanza si los dominios no dan para tanto
+    expected_peak = min(max_concurrency, domains * per_domain)
+    host_peaks = stats["host_max_in_flight"]
+    checks = [
+        ("todas las URLs ingestadas", len(created) == urls and not failed,
+         f"{len(created)} creadas, {len(failed)} fallidas"),
+        ("una petición por URL", stats["requests"] == urls, f"{stats['requests']} peticiones"),
+        ("límite global respetado", stats["max_in_flight"] <= max_concurrency,
+         f"máx. {stats['max_in_flight']} en vuelo (límite {max_concurrency})"),
+        ("límite global alcanzado (hay paralelismo)", stats["max_in_flight"] == expected_peak,
+         f"máx. {stats['max_in_flight']} en vuelo (esperado {expected_peak})"),
+        ("límite por dominio respetado", max(host_peaks.values()) <= per_domain,
+         f"máx. por dominio {max(host_peaks.values())} (límite {per_domain})"),
+        ("escritura por lotes", len(db.batches) <= math.ceil(urls / batch_size) and sum(db.batches) == urls,
+         f"{len(db.batches)} lotes {db.batches}"),
+        # El resto final se vuelca al cerrar el motor, ya sin el hilo escritor
+        ("un solo hilo escritor, sin solapes", len(set(db.threads[:-1])) <= 1 and not db.overlapped,
+         f"hilos {db.threads}"),
+        ("tags en lote", db.tags == urls, f"{db.tags} tags"),
+    ]
+    return _report(f"Ingesta de {urls} URLs ({domains} dominios) en {elapsed:.2f}s", checks)
+
+def check_skewed_domains(hot: int = 40, spread: int = 80, max_concurrency: int = 8, per_domain: int = 2,
+                         batch_size: int = 25, latency: float = DEFAULT_LATENCY, slack: float = 1.2) -> bool:
+    """
+    Lote sesgado: 'hot' URLs de un mismo dominio por delante de 'spread' URLs de dominios
+    distintos. El dominio cargado marca la duración (va de per_domain en per_domain) y el
+    resto cabe en los cupos globales que deja libres: sumar 'spread' no debe alargar el lote
+    más allá de 'slack' veces lo que tarda el dominio cargado solo. Si las URLs en espera
+    acaparan la concurrencia global (bloqueo de cabeza de cola), la proporción se dispara.
+    """
+    hot_urls = [f"http://cargado.test/pagina/{i}" for i in range(hot)]
+    spread_urls = [f"http://sitio{i}.test/pagina/{i}" for i in range(spread)]
+    _, _, baseline, _, _ = _run_engine(hot_urls, max_concurrency, per_domain, batch_size, latency)
+    created, failed, elapsed, stats, _ = _run_engine(hot_urls + spread_urls, max_concurrency, per_domain,
+                                                     batch_size, latency)
+
+    # Cota inferior sin sobrecoste por petición: el dominio cargado o el límite global, lo que pese más
+    ideal = max(math.ceil(hot / per_domain), math.ceil((hot + spread) / max_concurrency)) * latency
+    hot_peak = stats["host_max_in_flight"].get("cargado.test", 0)
+    checks = [
+        ("todas las URLs ingestadas", len(created) == hot + spread and not failed,
+         f"{len(created)} creadas, {len(failed)} fallidas"),
+        ("límite global alcanzado pese al dominio cargado", stats["max_in_flight"] == max_concurrency,
+         f"máx. {stats['max_in_flight']} en vuelo (límite {max_concurrency})"),
+        ("límite por dominio respetado", hot_peak <= per_domain,
+         f"máx. en cargado.test {hot_peak} (límite {per_domain})"),
+        ("sin bloqueo de cabeza de cola", elapsed <= baseline * slack,
+         f"{elapsed:.2f}s frente a {baseline:.2f}s del dominio cargado solo "
+         f"(tolerancia x{slack}, ideal {ideal:.2f}s)"),
+    ]
+    return _report(f"Lote sesgado: {hot} URLs de un dominio + {spread} de dominios distintos en {elapsed:.2f}s", checks)
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor web simulado para el motor de ingesta.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--latency", type=float, default=DEFAULT_LATENCY, help="Segundos por respuesta")
+    parser.add_argument("--check", action="store_true", help="Comprobar límites y escritura por lotes de IngestEngine")
+    parser.add_argument("--urls", type=int, default=120)
+    parser.add_argument("--domains", type=int, default=6)
+    parser.add_argument("--max-concurrency", type=int, default=8)
+    parser.add_argument("--per-domain", type=int, default=2)
+    parser.add_argument("--batch-size", type=int, default=25)
+    args = parser.parse_args()
+
+    if args.check:
+        root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        if root_dir not in sys.path:
+            sys.path.insert(0, root_dir)
+        ok = check_ingest_engine(args.urls, args.domains, args.max_concurrency, args.per_domain,
+                                 args.batch_size, args.latency)
+        ok = check_skewed_domains(max_concurrency=args.max_concurrency, per_domain=args.per_domain,
+                                  batch_size=args.batch_size, latency=args.latency) and ok
+        sys.exit(0 if ok else 1)
+
+    server = MockWebServer(args.host, args.port, args.latency)
+    print(f"Mock web escuchando en {server.url} (latencia {args.latency}s)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"Peticiones atendidas: {server.stats()}")
+
+if __name__ == "__main__":
+    main()
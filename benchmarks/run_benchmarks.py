@@ -0,0 +1,360 @@
+"""
+Suite de benchmarks de rutas calientes de Nexus sobre corpus sintéticos.
+
+Mide search_registry (mezcla de consultas), la cola SRS, get_global_metrics,
+CRUD masivo y el exportador sobre BDs de 1k/10k/100k/1M registros, y guarda
+los tiempos en JSON para comparar entre commits.
+
+Uso:
+    python benchmarks/run_benchmarks.py                       # 1k,10k,100k
+    python benchmarks/run_benchmarks.py --sizes 1k,1m --repeat 3
+    python benchmarks/run_benchmarks.py --compare benchmarks/results/base.json
+
+Cada tamaño corre en un subproceso con NEXUS_DB_PATH apuntando a su corpus
+(core.database fija el engine al importarse). Los corpus se cachean en
+benchmarks/.data/ y solo se regeneran si cambian tamaño, semilla o versión.
+"""
+import os
+import sys
+
+# Forzar UTF-8 en Windows
+if sys.platform == "win32":
+    sys.stdout.reconfigure(encoding='utf-8', errors='replace')
+
+import json
+import time
+import shutil
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+from datetime import datetime
+
+# Setup paths
+current_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(current_dir)
+if root_dir not in sys.path:
+    sys.path.insert(0, root_dir)
+
+from rich.console import Console
+from rich.table import Table
+from rich import box
+
+from benchmarks.corpus import SIZES, DEFAULT_SEED, CORPUS_NOW, corpus_is_current, populate
+
+console = Console()
+
+DATA_DIR = os.path.join(current_dir, ".data")
+RESULTS_DIR = os.path.join(current_dir, "results")
+DEFAULT_SIZES = "1k,10k,100k"
+REGRESSION_THRESHOLD = 1.25  # mediana > 125 % de la base = regresión
+NOISE_FLOOR_MS = 2.0         # ...y además al menos 2 ms más lenta (evita falsos positivos sub-ms)
+BULK_BATCH = 1_000
+
+# ----------------------------------------------------------------------------
+# Medición
+# ----------------------------------------------------------------------------
+
+def _summary(samples_ms: list, rows) -> dict:
+    ordered = sorted(samples_ms)
+    p95_idx = min(len(ordered) - 1, max(0, round(0.95 * (len(ordered) - 1))))
+    return {
+        "median_ms": round(statistics.median(ordered), 3),
+        "min_ms": round(ordered[0], 3),
+        "p95_ms": round(ordered[p95_idx], 3),
+        "mean_ms": round(statistics.fmean(ordered), 3),
+        "repeat": len(ordered),
+        "rows": rows
+    }
+
+def _time(fn, repeat: int, warmup: int = 1) -> dict:
+    """Ejecuta fn() 'warmup' veces sin medir y luego 'repeat' veces. fn retorna nº de filas."""
+    rows = None
+    for _ in range(warmup):
+        rows = fn()
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        rows = fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return _summary(samples, rows)
+
+def _len(result) -> int:
+    if isinstance(result, tuple):
+        result = result[0]
+    return len(result) if hasattr(result, "__len__") else int(result or 0)
+
+# ----------------------------------------------------------------------------
+# Casos (se ejecutan dentro del subproceso, con la BD del corpus ya configurada)
+# ----------------------------------------------------------------------------
+
+def _search_cases(session):
+    from core.search_engine import search_registry, search_registry_page
+
+    def keyset_pages(pages: int = 5, **filters):
+        def run():
+            cursor, total = None, 0
+            for _ in range(pages):
+                records, cursor = search_registry_page(session, page_size=50, cursor=cursor, **filters)
+                total += len(records)
+                if not cursor:
+                    break
+            return total
+        return run
+
+    return {
+        "search.default_page": lambda: _len(search_registry(session, limit=50)),
+        "search.type_youtube": lambda: _len(search_registry(session, type_filter="youtube", limit=50)),
+        "search.name": lambda: _len(search_registry(session, inc_name_path="python", limit=50)),
+        "search.content_fts": lambda: _len(search_registry(session, inc_content="aprendizaje", limit=50)),
+        "search.content_rare_term": lambda: _len(search_registry(session, inc_content="term3999", limit=50)),
+        "search.tags_include": lambda: _len(search_registry(session, inc_tags="tema_000", limit=50)),
+        "search.tags_exclude": lambda: _len(search_registry(session, exc_tags="tema_000", limit=50)),
+        "search.extension_pdf": lambda: _len(search_registry(session, inc_extensions=["pdf"], limit=50)),
+        "search.order_vdesc": lambda: _len(search_registry(session, order_by="vdesc", limit=50)),
+        "search.with_relations": lambda: _len(search_registry(session, limit=50, with_tags=True, with_card_stats=True)),
+        "search.keyset_5_pages": keyset_pages(),
+        "search.keyset_5_pages_fts": keyset_pages(inc_content="memoria"),
+    }
+
+def _srs_cases(session):
+    from modules.study_queue import get_due_card_ids, load_cards, due_counts_by_topic, forecast_due_counts
+
+    # Equivalente a get_due_cards() pero con 'now' fijo (CORPUS_NOW)
+    def due_cards(shuffled=False):
+        return lambda: _len(load_cards(session, get_due_card_ids(session, shuffled=shuffled, limit=50, now=CORPUS_NOW)))
+
+    return {
+        "srs.get_due_cards_50": due_cards(),
+        "srs.get_due_cards_shuffled_50": due_cards(shuffled=True),
+        "srs.due_counts_by_topic": lambda: _len(due_counts_by_topic(session, now=CORPUS_NOW)),
+        "srs.forecast_30d": lambda: sum(forecast_due_counts(session, days=30, now=CORPUS_NOW)),
+    }
+
+def _metrics_cases():
+    from modules.analytics import get_global_metrics
+
+    return {
+        "metrics.global": lambda: get_global_metrics(use_cache=False)["registry_counts"]["total"],
+        "metrics.by_type": lambda: get_global_metrics("youtube", use_cache=False)["registry_counts"]["total"],
+        "metrics.by_tag": lambda: get_global_metrics("tema_001", use_cache=False)["registry_counts"]["total"],
+        "metrics.cached": lambda: get_global_metrics()["registry_counts"]["total"],
+    }
+
+def _bulk_crud(repeat: int) -> dict:
+    """Inserta y borra BULK_BATCH registros (+ tags + cards) por repetición; mide ambas fases."""
+    from sqlalchemy import delete
+    from core.database import SessionLocal, Registry, RegistryCreate, TagCreate, CardCreate, nx_db
+
+    insert_ms, delete_ms = [], []
+    for rep in range(repeat + 1):
+        items = [
+            RegistryCreate(type="note", title=f"Bench {rep}-{i}", path_url=f"nexus://bench/{rep}/{i}",
+                           content_raw=f"contenido de prueba {i}")
+            for i in range(BULK_BATCH)
+        ]
+        t0 = time.perf_counter()
+        with SessionLocal() as session:
+            ids = nx_db.bulk_create_registries_in_session(session, items)
+            nx_db.bulk_add_tags_in_session(session, [(rid, TagCreate(value="bench")) for rid in ids])
+            nx_db.bulk_create_cards_in_session(session, [
+                CardCreate(parent_id=rid, question="¿Q?", answer="A") for rid in ids[::4]
+            ])
+            session.commit()
+        t1 = time.perf_counter()
+        with SessionLocal() as session:
+            session.execute(delete(Registry).where(Registry.id.in_(ids)))
+            session.commit()
+        t2 = time.perf_counter()
+        if rep == 0:
+            continue  # calentamiento
+        insert_ms.append((t1 - t0) * 1000)
+        delete_ms.append((t2 - t1) * 1000)
+
+    return {
+        f"crud.bulk_insert_{BULK_BATCH}": _summary(insert_ms, BULK_BATCH),
+        f"crud.bulk_delete_{BULK_BATCH}": _summary(delete_ms, BULK_BATCH),
+    }
+
+def _export_cases(tmp_dir: str):
+    from modules.exporter import export_registries, backup_database
+
+    def export(fmt, compression=None):
+        def run():
+            path, rows = export_registries(tmp_dir, fmt=fmt, compression=compression, timestamp="bench")
+            os.remove(path)
+            return rows
+        return run
+
+    def backup():
+        dest = os.path.join(tmp_dir, "backup.db")
+        backup_database(dest)
+        os.remove(dest)
+        return 1
+
+    return {
+        "export.jsonl": export("jsonl"),
+        "export.csv_gzip": export("csv", "gzip"),
+        "export.backup": backup,
+    }
+
+def run_worker(size_label: str, repeat: int, seed: int, out_path: str):
+    """Cuerpo del subproceso: prepara el corpus de NEXUS_DB_PATH y corre todos los casos."""
+    from core.database import init_db, DB_PATH, SessionLocal, engine
+
+    n = SIZES[size_label]
+    setup_s = 0.0
+    if not corpus_is_current(DB_PATH, n, seed):
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(DB_PATH + suffix):
+                os.remove(DB_PATH + suffix)
+        t0 = time.perf_counter()
+        init_db()
+        engine.dispose()
+        populate(DB_PATH, n, seed=seed,
+                 progress=lambda table, i: console.print(f"[dim]  {table}: {i:,}/{n:,}[/dim]") if i % 100_000 == 0 else None)
+        setup_s = time.perf_counter() - t0
+
+    # Los casos caros (export) se repiten menos en corpus grandes
+    heavy_repeat = max(1, repeat if n <= 10_000 else repeat // 3)
+    results = {}
+    with SessionLocal() as session:
+        for name, fn in {**_search_cases(session), **_srs_cases(session)}.items():
+            results[name] = _time(fn, repeat)
+    for name, fn in _metrics_cases().items():
+        results[name] = _time(fn, repeat)
+    results.update(_bulk_crud(heavy_repeat))
+    tmp_dir = tempfile.mkdtemp(prefix="nexus_bench_export_")
+    try:
+        for name, fn in _export_cases(tmp_dir).items():
+            results[name] = _time(fn, heavy_repeat, warmup=0)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    with open(out_path, "w", encoding="utf-8") as fh:
+        json.dump({"n_registry": n, "corpus_setup_s": round(setup_s, 2), "cases": results}, fh)
+
+# ----------------------------------------------------------------------------
+# Orquestación, salida JSON y comparación
+# ----------------------------------------------------------------------------
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=root_dir, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def run_suite(sizes: list, repeat: int, seed: int, data_dir: str, rebuild: bool) -> dict:
+    os.makedirs(data_dir, exist_ok=True)
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": seed,
+            "repeat": repeat
+        },
+        "sizes": {}
+    }
+    for label in sizes:
+        db_path = os.path.join(data_dir, f"nexus_bench_{label}.db")
+        if rebuild and os.path.exists(db_path):
+            os.remove(db_path)
+        out_fd, out_path = tempfile.mkstemp(suffix=".json")
+        os.close(out_fd)
+        console.print(f"[bold cyan]▶ Corpus {label} ({SIZES[label]:,} registros)[/bold cyan]")
+        env = dict(os.environ, NEXUS_DB_PATH=db_path, NEXUS_LLM_CACHE_BYPASS="1")
+        try:
+            subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--worker", label,
+                 "--repeat", str(repeat), "--seed", str(seed), "--worker-out", out_path],
+                env=env, check=True
+            )
+            with open(out_path, encoding="utf-8") as fh:
+                report["sizes"][label] = json.load(fh)
+        finally:
+            os.remove(out_path)
+    return report
+
+def print_report(report: dict, baseline: dict = None, threshold: float = REGRESSION_THRESHOLD) -> int:
+    """Imprime los resultados (y el ratio contra 'baseline'). Retorna el nº de regresiones."""
+    regressions = 0
+    for label, data in report["sizes"].items():
+        base_cases = (baseline or {}).get("sizes", {}).get(label, {}).get("cases", {})
+        table = Table(title=f"Benchmarks — {label} ({data['n_registry']:,} registros)", box=box.ROUNDED)
+        table.add_column("Caso", style="bold bright_white")
+        table.add_column("Mediana ms", justify="right", style="bright_cyan")
+        table.add_column("p95 ms", justify="right")
+        table.add_column("Filas", justify="right", style="white")
+        if baseline:
+            table.add_column("Base ms", justify="right", style="white")
+            table.add_column("Ratio", justify="right")
+
+        for name, stats in data["cases"].items():
+            row = [name, f"{stats['median_ms']:.2f}", f"{stats['p95_ms']:.2f}", str(stats["rows"])]
+            if baseline:
+                base = base_cases.get(name)
+                if base and base["median_ms"] > 0:
+                    ratio = stats["median_ms"] / base["median_ms"]
+                    regressed = ratio > threshold and stats["median_ms"] - base["median_ms"] > NOISE_FLOOR_MS
+                    regressions += regressed
+                    style = "bold red" if regressed else ("green" if ratio < 1 / threshold else "white")
+                    row += [f"{base['median_ms']:.2f}", f"[{style}]{ratio:.2f}x[/{style}]"]
+                else:
+                    row += ["—", "—"]
+            table.add_row(*row)
+        console.print(table)
+
+    if baseline:
+        if regressions:
+            console.print(f"[bold white on red] {regressions} regresión(es) > {threshold:.2f}x respecto a {baseline['meta'].get('commit')} [/]")
+        else:
+            console.print(f"[bold green]✓ Sin regresiones respecto a {baseline['meta'].get('commit')}[/bold green]")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks de rutas calientes de Nexus")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help=f"Tamaños separados por coma: {', '.join(SIZES)}")
+    parser.add_argument("--repeat", type=int, default=5, help="Repeticiones medidas por caso")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--out", help="Ruta del JSON de resultados (por defecto benchmarks/results/)")
+    parser.add_argument("--compare", help="JSON de una ejecución anterior para detectar regresiones")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    parser.add_argument("--data-dir", default=DATA_DIR, help="Directorio de los corpus generados")
+    parser.add_argument("--rebuild", action="store_true", help="Regenerar los corpus aunque existan")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--worker-out", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.repeat, args.seed, args.worker_out)
+        return
+
+    sizes = [s.strip().lower() for s in args.sizes.split(",") if s.strip()]
+    unknown = [s for s in sizes if s not in SIZES]
+    if unknown:
+        parser.error(f"Tamaños desconocidos: {', '.join(unknown)} (usa {', '.join(SIZES)})")
+
+    report = run_suite(sizes, args.repeat, args.seed, args.data_dir, args.rebuild)
+
+    out_path = args.out or os.path.join(
+        RESULTS_DIR, f"bench_{report['meta']['commit']}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    with open(out_path, "w", encoding="utf-8") as fh:
+        json.dump(report, fh, indent=2, ensure_ascii=False)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as fh:
+            baseline = json.load(fh)
+    regressions = print_report(report, baseline, args.threshold)
+    console.print(f"[green]Resultados guardados en {out_path}[/green]")
+    sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 from datetime import datetime
@@ -6,7 +6,8 @@ from pydantic import BaseModel, HttpUrl
 from cloud_backend.database import get_db
 from cloud_backend.auth.jwt import verify_token
 # Imports de funcionalidad de Búsqueda movidos al Root de la jerarquía modular
-from core.search_engine import parse_query_string, search_registry
+from core.search_engine import parse_query_string, search_registry, search_registry_page
+from core.http_cache import conditional, make_etag, parse_fields, project
 from core.models import ResourceRecord
 from core.database import Registry, Tag
 
@@ -35,23 +36,36 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
 
 @router.get("/records/")
 def list_records(
+    request: Request,
+    response: Response,
     q: str = "",
     limit: int = 50,
     offset: int = 0,
+    cursor: str | None = None,
+    fields: str | None = None,
     user=Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
     Lista iterativa con soporte transparente a prefijos h: e: t: o:vdesc, etc.
+    Paginación por cursor: enviar el valor de la cabecera 'X-Next-Cursor' como ?cursor=.
+    'offset' se mantiene por compatibilidad y solo aplica cuando no se envía cursor.
+    'fields' proyecta cada registro (p. ej. fields=id,title,tags) y ETag/Last-Modified
+    permiten revalidar la página con un 304.
     """
+    try:
+        selected = parse_fields(fields, ResourceRecord.model_fields)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     filters = parse_query_string(q)
     inc_exts_list = [e.strip() for e in filters['inc_exts'].split(',')] if filters['inc_exts'] else None
     exc_exts_list = [e.strip() for e in filters['exc_exts'].split(',')] if filters['exc_exts'] else None
 
-    return search_registry(
+    search_kwargs = dict(
         db_session=db,
         inc_name_path=filters['inc_name'],
         exc_name_path=filters['exc_name'],
+        inc_content=filters['inc_content'],
         inc_tags=filters['inc_tags'],
         exc_tags=filters['exc_tags'],
         inc_extensions=inc_exts_list,
@@ -60,9 +74,28 @@ def list_records(
         record_ids_str=filters['inc_ids'],
         is_flashcard_source=filters['is_source'],
         order_by=filters['order_by'],
-        limit=limit,
-        offset=offset
+        with_content=selected is None or "content_raw" in selected
     )
+    next_cursor = None
+    if offset and not cursor:
+        results = search_registry(limit=limit, offset=offset, **search_kwargs)
+    else:
+        try:
+            results, next_cursor = search_registry_page(page_size=limit, cursor=cursor, **search_kwargs)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+
+    etag = make_etag(
+        sorted(selected) if selected else None, offset, next_cursor,
+        [(r.id, r.modified_at) for r in results]
+    )
+    last_modified = max((r.modified_at for r in results if r.modified_at), default=None)
+    cached = conditional(request, response, etag, last_modified)
+    if cached is not None:
+        return cached
+    return [project(r, selected) for r in results]
 
 @router.post("/records/")
 def create_record(
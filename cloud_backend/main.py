@@ -3,6 +3,7 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from cloud_backend.auth.router import router as auth_router
 from cloud_backend.api.router import router as api_router
+from core.http_cache import add_compression
 import os
 
 app = FastAPI(title="Nexus Cloud API")
@@ -16,7 +17,10 @@ app.add_middleware(
     ],
     allow_methods=["*"],
     allow_headers=["*"],
+    # Cabeceras de paginación y caché legibles desde el frontend
+    expose_headers=["X-Next-Cursor", "ETag", "Last-Modified"],
 )
+add_compression(app)
 
 app.include_router(auth_router)
 app.include_router(api_router, prefix="/api")
@@ -0,0 +1,72 @@
+"""Registry fingerprint columns
+
+Revision ID: 3b7c1f2a9d41
+Revises: e0cf319698a3
+Create Date: 2026-10-18 10:12:40.118206
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from core.fingerprint import canonical_key as make_canonical_key
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b7c1f2a9d41'
+down_revision: Union[str, None] = 'e0cf319698a3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Columnas de huella de core.database.Registry (deduplicación) y sus índices
+FINGERPRINT_COLUMNS = (
+    ('canonical_key', sa.Text()),
+    ('content_hash', sa.String(length=70)),
+    ('content_simhash', sa.BigInteger()),  # SimHash 64 bits con signo: INTEGER se desborda en Postgres
+)
+FINGERPRINT_INDEXES = (
+    ('ix_registry_canonical_key', 'canonical_key'),
+    ('ix_registry_content_hash', 'content_hash'),
+)
+BACKFILL_CHUNK = 1000
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table('registry'):
+        # Neon sin datos aún: migrate_sqlite_to_neon crea 'registry' con create_all ya completa
+        return
+    columns = {c['name'] for c in inspector.get_columns('registry')}
+    for name, type_ in FINGERPRINT_COLUMNS:
+        if name not in columns:
+            op.add_column('registry', sa.Column(name, type_, nullable=True))
+    indexes = {i['name'] for i in inspector.get_indexes('registry')}
+    for name, column in FINGERPRINT_INDEXES:
+        if name not in indexes:
+            op.create_index(name, 'registry', [column], unique=False)
+
+    # canonical_key se calcula en Python (core.fingerprint). Los hashes de contenido, más costosos,
+    # llegan con la próxima pasada de scripts/migrate_sqlite_to_neon.py (los calcula modules.dedup)
+    bind = op.get_bind()
+    rows = bind.execute(sa.text(
+        "SELECT id, path_url FROM registry WHERE canonical_key IS NULL AND path_url IS NOT NULL"
+    )).all()
+    update = sa.text("UPDATE registry SET canonical_key = :key WHERE id = :id")
+    params = [{'id': row.id, 'key': make_canonical_key(row.path_url)} for row in rows]
+    for start in range(0, len(params), BACKFILL_CHUNK):
+        bind.execute(update, params[start:start + BACKFILL_CHUNK])
+
+
+def downgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table('registry'):
+        return
+    indexes = {i['name'] for i in inspector.get_indexes('registry')}
+    for name, _ in FINGERPRINT_INDEXES:
+        if name in indexes:
+            op.drop_index(name, table_name='registry')
+    columns = {c['name'] for c in inspector.get_columns('registry')}
+    for name, _ in reversed(FINGERPRINT_COLUMNS):
+        if name in columns:
+            op.drop_column('registry', name)
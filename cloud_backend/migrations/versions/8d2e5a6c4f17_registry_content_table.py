@@ -0,0 +1,62 @@
+"""Registry text in registry_content
+
+Revision ID: 8d2e5a6c4f17
+Revises: 3b7c1f2a9d41
+Create Date: 2026-10-18 10:31:05.402871
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d2e5a6c4f17'
+down_revision: Union[str, None] = '3b7c1f2a9d41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table('registry'):
+        # Neon sin datos aún: migrate_sqlite_to_neon crea ambas tablas con create_all
+        return
+    if not inspector.has_table('registry_content'):
+        op.create_table('registry_content',
+        sa.Column('registry_id', sa.Integer(), nullable=False),
+        sa.Column('codec', sa.Integer(), server_default=sa.text('0'), nullable=False),
+        sa.Column('content_z', sa.LargeBinary(), nullable=True),
+        sa.Column('summary_z', sa.LargeBinary(), nullable=True),
+        sa.ForeignKeyConstraint(['registry_id'], ['registry.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('registry_id')
+        )
+
+    columns = {c['name'] for c in inspector.get_columns('registry')}
+    if 'content_raw' not in columns:
+        return
+    # En Postgres el texto va sin comprimir (codec 0): bytea UTF-8 que lee nexus_text con convert_from.
+    # Primero se copia y solo después se eliminan las columnas viejas
+    op.execute(
+        "INSERT INTO registry_content (registry_id, codec, content_z, summary_z) "
+        "SELECT id, 0, convert_to(content_raw, 'UTF8'), convert_to(summary, 'UTF8') FROM registry "
+        "WHERE content_raw IS NOT NULL OR summary IS NOT NULL "
+        "ON CONFLICT (registry_id) DO NOTHING"
+    )
+    op.drop_column('registry', 'summary')
+    op.drop_column('registry', 'content_raw')
+
+
+def downgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table('registry') or not inspector.has_table('registry_content'):
+        return
+    op.add_column('registry', sa.Column('content_raw', sa.Text(), nullable=True))
+    op.add_column('registry', sa.Column('summary', sa.Text(), nullable=True))
+    op.execute(
+        "UPDATE registry SET content_raw = convert_from(rc.content_z, 'UTF8'), "
+        "summary = convert_from(rc.summary_z, 'UTF8') "
+        "FROM registry_content rc WHERE rc.registry_id = registry.id AND rc.codec = 0"
+    )
+    op.drop_table('registry_content')
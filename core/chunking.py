@@ -0,0 +1,126 @@
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Sequence, TypeVar
+
+from core import instrumentation
+
+# ----------------------------------------------------------------------------
+# Troceado de textos largos y resumen map-reduce.
+# - split_text() corta en párrafos, luego frases y, como último recurso (p. ej.
+#   subtítulos automáticos sin puntuación), en palabras; después empaqueta las
+#   piezas de forma voraz hasta el presupuesto de tokens. El empaquetado es
+#   estable por prefijo: editar el final de una nota solo cambia los últimos
+#   trozos, y los primeros siguen siendo idénticos byte a byte.
+# - map_chunks() procesa los trozos en paralelo conservando el orden.
+# - collapse_partials()/reduce_texts() combinan resultados parciales; si no caben
+#   en un prompt, los agrupan y reducen por niveles (árbol).
+# La caché por trozo la da llm_cache: el prompt de cada trozo solo contiene su
+# texto (sin "parte i de n"), así que un trozo sin cambios es un acierto.
+# ----------------------------------------------------------------------------
+
+CHARS_PER_TOKEN = 4           # Aproximación conservadora para es/en
+DEFAULT_CHUNK_TOKENS = 3000   # ~12k caracteres por trozo: cabe holgado con el prompt
+CHUNK_WORKERS = 4             # Trozos simultáneos por documento (el ritmo global lo pone core.outbound)
+MAX_REDUCE_DEPTH = 4
+
+_PARAGRAPH = re.compile(r"\n\s*\n")
+_SENTENCE = re.compile(r"(?<=[.!?…;:])\s+")
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+def estimate_tokens(text: Optional[str]) -> int:
+    return (len(text or "") + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def _pieces(text: str, max_chars: int) -> List[str]:
+    """Unidades indivisibles (párrafo, frase o tramo de palabras) de como mucho max_chars."""
+    pieces = []
+    for paragraph in _PARAGRAPH.split(text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if len(paragraph) <= max_chars:
+            pieces.append(paragraph)
+            continue
+        for sentence in _SENTENCE.split(paragraph):
+            if len(sentence) <= max_chars:
+                pieces.append(sentence)
+                continue
+            # Sin puntuación útil: cortar en el último espacio antes del límite
+            start = 0
+            while start < len(sentence):
+                end = start + max_chars
+                if end < len(sentence):
+                    space = sentence.rfind(" ", start, end)
+                    end = space if space > start else end
+                pieces.append(sentence[start:end].strip())
+                start = end
+    return [p for p in pieces if p]
+
+def split_text(text: Optional[str], max_tokens: int = DEFAULT_CHUNK_TOKENS) -> List[str]:
+    """Trocea 'text' en fragmentos de como mucho max_tokens (estimados), respetando párrafos y frases."""
+    text = (text or "").strip()
+    if not text:
+        return []
+    max_chars = max(1, max_tokens * CHARS_PER_TOKEN)
+    if len(text) <= max_chars:
+        return [text]
+
+    chunks, current, size = [], [], 0
+    for piece in _pieces(text, max_chars):
+        # Las piezas se re-unen con una línea en blanco (2 caracteres)
+        added = len(piece) + (2 if current else 0)
+        if current and size + added > max_chars:
+            chunks.append("\n\n".join(current))
+            current, size = [], 0
+            added = len(piece)
+        current.append(piece)
+        size += added
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+def map_chunks(chunks: Sequence[T], fn: Callable[[T], R], workers: int = CHUNK_WORKERS) -> List[R]:
+    """Aplica fn a cada trozo en paralelo; resultados en el orden de entrada."""
+    instrumentation.count("chunked_map_items", value=len(chunks))
+    if len(chunks) <= 1 or workers <= 1:
+        return [fn(c) for c in chunks]
+    with ThreadPoolExecutor(max_workers=min(workers, len(chunks)), thread_name_prefix="nexus-chunk") as pool:
+        return list(pool.map(fn, chunks))
+
+def collapse_partials(
+    partials: Sequence[str],
+    combine: Callable[[List[str]], Optional[str]],
+    max_tokens: int = DEFAULT_CHUNK_TOKENS,
+    workers: int = CHUNK_WORKERS,
+    separator: str = "\n\n---\n\n",
+) -> List[str]:
+    """
+    Reduce por niveles los parciales hasta que juntos quepan en max_tokens:
+    cada nivel agrupa parciales consecutivos que caben y los combina en paralelo.
+    """
+    level = [p for p in partials if p]
+    for _ in range(MAX_REDUCE_DEPTH):
+        if len(level) <= 1 or estimate_tokens(separator.join(level)) <= max_tokens:
+            break
+        groups, current = [], []
+        for p in level:
+            if current and estimate_tokens(separator.join(current + [p])) > max_tokens:
+                groups.append(current)
+                current = []
+            current.append(p)
+        groups.append(current)
+        if len(groups) == len(level):
+            break  # Cada parcial ya llena un grupo: otro nivel no reduciría nada
+        level = [r for r in map_chunks(groups, combine, workers) if r]
+    return level
+
+def reduce_texts(
+    partials: Sequence[str],
+    combine: Callable[[List[str]], Optional[str]],
+    max_tokens: int = DEFAULT_CHUNK_TOKENS,
+    workers: int = CHUNK_WORKERS,
+) -> Optional[str]:
+    """Combina los parciales en un único texto con combine(lista) -> texto (ver collapse_partials)."""
+    level = collapse_partials(partials, combine, max_tokens, workers)
+    return combine(level) if level else None
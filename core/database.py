@@ -1,17 +1,34 @@
 import os
 import json
+import sqlite3
+import threading
+import zlib
 from datetime import datetime, timezone
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 
 from sqlalchemy import (
-    create_engine, Column, Integer, String, Text, Float, JSON, 
-    DateTime, ForeignKey, event, text
+    create_engine, Column, Integer, BigInteger, String, Text, Float, JSON, LargeBinary,
+    DateTime, ForeignKey, Index, event, text, insert, select, update, inspect, or_
 )
-from sqlalchemy.orm import declarative_base, sessionmaker, relationship
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import declarative_base, sessionmaker, relationship, joinedload, Session
+from sqlalchemy.sql.functions import FunctionElement
 from sqlalchemy.engine import Engine
 from pydantic import BaseModel, Field, ConfigDict
 from rich.console import Console
 
+from core import instrumentation
+from core.fingerprint import fingerprint_fields, canonical_key as make_canonical_key, SIMHASH_BANDS, SIMHASH_BAND_BITS
+from core.instrumentation import timed
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
 console = Console()
 
 def sanitize_db_string(val):
@@ -20,18 +37,87 @@ def sanitize_db_string(val):
         return val.encode('utf-8', 'replace').decode('utf-8')
     return val
 
+# ----------------------------------------------------------------------------
+# Texto comprimido de los registros (tabla registry_content)
+# content_raw y summary viven fuera de 'registry', comprimidos con un codec por fila:
+# 0 = UTF-8 plano, 1 = zlib, 2 = zstd (solo si 'zstandard' está instalado).
+# Los textos cortos se guardan planos: la cabecera del compresor no compensa.
+# La cadena vacía se guarda siempre como b'' (los filtros "tiene contenido" miran length()).
+# Fuera de SQLite (PostgreSQL de cloud_backend) no hay nexus_text(): ahí se guarda siempre
+# plano y las consultas leen el BLOB con convert_from().
+# ----------------------------------------------------------------------------
+
+CODEC_PLAIN, CODEC_ZLIB, CODEC_ZSTD = 0, 1, 2
+TEXT_CODEC = CODEC_ZSTD if zstandard else CODEC_ZLIB
+COMPRESS_MIN_BYTES = 200
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 9
+
+def _compress(data: Optional[bytes], codec: int) -> Optional[bytes]:
+    if not data or codec == CODEC_PLAIN:
+        return data
+    if codec == CODEC_ZSTD:
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return zlib.compress(data, ZLIB_LEVEL)
+
+def decode_text(blob, codec) -> Optional[str]:
+    """Texto original de un BLOB de registry_content (también registrada en SQLite como nexus_text)."""
+    if blob is None or isinstance(blob, str):
+        return blob
+    blob = bytes(blob)
+    if blob and codec == CODEC_ZLIB:
+        blob = zlib.decompress(blob)
+    elif blob and codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("Texto comprimido con zstd: instala 'zstandard' para leer esta base de datos")
+        blob = zstandard.ZstdDecompressor().decompress(blob)
+    return blob.decode('utf-8')
+
+def encode_texts(content_raw: Optional[str], summary: Optional[str], codec: Optional[int] = None) -> Tuple[int, Optional[bytes], Optional[bytes]]:
+    """(codec, content_z, summary_z) para una fila de registry_content; un mismo codec para ambos campos."""
+    raw = [None if v is None else v.encode('utf-8', 'replace') for v in (content_raw, summary)]
+    if codec is None:
+        codec = TEXT_CODEC if sum(len(b) for b in raw if b) >= COMPRESS_MIN_BYTES else CODEC_PLAIN
+    return (codec, _compress(raw[0], codec), _compress(raw[1], codec))
+
+def register_sql_functions(dbapi_connection):
+    """Funciones SQL de Nexus: nexus_text(blob, codec) descomprime el texto (vista del índice FTS5, filtros)."""
+    dbapi_connection.create_function("nexus_text", 2, decode_text, deterministic=True)
+
+class nexus_text(FunctionElement):
+    """nexus_text(blob, codec) en consultas: función registrada en SQLite, convert_from() en PostgreSQL."""
+    type = Text()
+    name = 'nexus_text'
+    inherit_cache = True
+
+@compiles(nexus_text, 'sqlite')
+def _compile_nexus_text_sqlite(element, compiler, **kw):
+    return f"nexus_text({compiler.process(element.clauses, **kw)})"
+
+@compiles(nexus_text)
+def _compile_nexus_text_plain(element, compiler, **kw):
+    # Sin nexus_text() el texto se guarda plano (codec 0): basta con decodificar el BLOB
+    blob = list(element.clauses)[0]
+    return f"convert_from({compiler.process(blob, **kw)}, 'UTF8')"
+
 # ----------------------------------------------------------------------------
 # 1. SQLAlchemy / Database Setup
 # ----------------------------------------------------------------------------
 
 # Ruta de la base de datos: En la raíz de Nexus (un nivel arriba de /core)
-DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'nexus.db')
+# NEXUS_DB_PATH permite apuntar a otra BD (p. ej. los corpus sintéticos de benchmarks/)
+DB_PATH = os.environ.get(
+    "NEXUS_DB_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'nexus.db')
+)
 
 # Asegurarse de que el directorio padre existe
 os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
 
 # Crear el engine usando SQLite
 engine = create_engine(f"sqlite:///{DB_PATH}")
+# Perfilador SQL (solo activo con la instrumentación encendida)
+instrumentation.register_engine(engine)
 
 # Escuchar en la conexión para habilitar las opciones como WAL
 @event.listens_for(engine, "connect")
@@ -43,10 +129,98 @@ def set_sqlite_pragma(dbapi_connection, connection_record):
     cursor.execute("PRAGMA foreign_keys=ON")
     cursor.execute("PRAGMA synchronous=NORMAL")
     cursor.close()
+    register_sql_functions(dbapi_connection)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+def get_db():
+    """Dependencia FastAPI: una sesión del pool por petición, cerrada siempre al terminar."""
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+# Versión de datos: se incrementa tras cada commit con escrituras.
+# Las cachés derivadas (métricas, etc.) la comparan para saber si siguen vigentes.
+_data_version = 0
+
+def data_version() -> int:
+    return _data_version
+
+def bump_data_version():
+    global _data_version
+    _data_version += 1
+
+# PRAGMA data_version cambia en una conexión cada vez que OTRA conexión commitea sobre el
+# mismo fichero, también desde otros procesos (TUI, scripts). Se lee siempre sobre una
+# conexión dedicada de solo lectura: en las del pool el valor no es comparable entre sí.
+_file_version_conn = None
+_file_version_lock = threading.Lock()
+
+def db_file_version() -> int:
+    global _file_version_conn
+    with _file_version_lock:
+        if _file_version_conn is None:
+            _file_version_conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+        return _file_version_conn.execute("PRAGMA data_version").fetchone()[0]
+
+def store_version() -> Tuple[int, int]:
+    """Versión para cachés: escrituras de este proceso (data_version) y de cualquier otro (db_file_version)."""
+    return (data_version(), db_file_version())
+
+# Versión del grafo: solo cambia al escribir en nexus_links o al borrar registros
+# (create_link, delete_registry, fusiones de duplicados). La usa core.graph.
+_graph_version = 0
+
+def graph_version() -> int:
+    return _graph_version
+
+def bump_graph_version():
+    global _graph_version
+    _graph_version += 1
+
+def mark_session_dirty(session):
+    """Marca la sesión como escritora; al commitear se invalida la versión de datos."""
+    session.info['nexus_dirty'] = True
+
+def mark_graph_dirty(session):
+    """Marca la sesión como escritora de vínculos; al commitear se invalida el grafo."""
+    session.info['nexus_graph_dirty'] = True
+
+def _touches_graph(obj, deleted: bool) -> bool:
+    return isinstance(obj, NexusLink) or (deleted and isinstance(obj, Registry))
+
+@event.listens_for(Session, "after_flush")
+def _flag_flush(session, flush_context):
+    mark_session_dirty(session)
+    if any(_touches_graph(o, False) for o in session.new) or \
+       any(_touches_graph(o, False) for o in session.dirty) or \
+       any(_touches_graph(o, True) for o in session.deleted):
+        mark_graph_dirty(session)
+
+@event.listens_for(Session, "do_orm_execute")
+def _flag_orm_dml(orm_execute_state):
+    # query(...).update()/delete() e insert() ORM no pasan por flush
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        mark_session_dirty(orm_execute_state.session)
+        mapper = orm_execute_state.bind_mapper
+        if mapper is not None and (mapper.class_ is NexusLink or (orm_execute_state.is_delete and mapper.class_ is Registry)):
+            mark_graph_dirty(orm_execute_state.session)
+
+@event.listens_for(Session, "after_commit")
+def _bump_on_commit(session):
+    if session.info.pop('nexus_dirty', False):
+        bump_data_version()
+    if session.info.pop('nexus_graph_dirty', False):
+        bump_graph_version()
+
+@event.listens_for(Session, "after_rollback")
+def _clear_on_rollback(session):
+    session.info.pop('nexus_dirty', None)
+    session.info.pop('nexus_graph_dirty', None)
+
 # ----------------------------------------------------------------------------
 # 2. SQLAlchemy Models
 # ----------------------------------------------------------------------------
@@ -57,13 +231,24 @@ class Registry(Base):
     Almacena CUALQUIER tipo de recurso indexado.
     """
     __tablename__ = 'registry'
+    __table_args__ = (
+        # Chequeo de duplicados en create_registry (y garantía a nivel de BD)
+        Index('ux_registry_path_url', 'path_url', unique=True),
+        # Filtro por tipo + orden por defecto del explorador
+        Index('ix_registry_type_modified', 'type', 'modified_at'),
+        Index('ix_registry_modified_at', 'modified_at'),
+        # Orden o:vdesc / o:vasc (paginación keyset)
+        Index('ix_registry_last_viewed_at', 'last_viewed_at'),
+        # Deduplicación: misma identidad (URL canónica / ID de video) o mismo contenido
+        Index('ix_registry_canonical_key', 'canonical_key'),
+        Index('ix_registry_content_hash', 'content_hash'),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     type = Column(String, nullable=False) # file, youtube, web, note, concept, app, account
     title = Column(Text, nullable=True)
     path_url = Column(Text, nullable=True)
-    content_raw = Column(Text, nullable=True)
-    summary = Column(Text, nullable=True) # Resumen destilado por IA
+    # content_raw y summary (resumen destilado por IA): atributos híbridos sobre registry_content
     
     # Python atributo será 'meta_info', pero en la base de datos se llama 'metadata'
     # Esto previene choques con 'Base.metadata'
@@ -74,6 +259,11 @@ class Registry(Base):
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc).replace(tzinfo=None))
     modified_at = Column(DateTime, default=lambda: datetime.now(timezone.utc).replace(tzinfo=None), onupdate=lambda: datetime.now(timezone.utc).replace(tzinfo=None))
     last_viewed_at = Column(DateTime, nullable=True)
+
+    # Huellas (core.fingerprint), calculadas al insertar/actualizar
+    canonical_key = Column(Text, nullable=True)      # 'youtube:<id>', URL canónica o ruta
+    content_hash = Column(String(70), nullable=True) # SHA-256 del texto normalizado ('file:<sha256>' en archivos)
+    content_simhash = Column(BigInteger, nullable=True) # SimHash 64 bits (con signo) para casi-duplicados
     
     # --- Relaciones ---
     tags = relationship("Tag", back_populates="registry", cascade="all, delete-orphan")
@@ -91,6 +281,90 @@ class Registry(Base):
         back_populates="target",
         cascade="all, delete-orphan"
     )
+    # Texto comprimido: se carga al primer acceso (o en lote con selectinload en los listados)
+    text_row = relationship(
+        "RegistryContent",
+        uselist=False,
+        back_populates="registry",
+        cascade="all, delete-orphan",
+        passive_deletes=True
+    )
+
+    # --- Texto (content_raw / summary) ---
+    # En Python se leen y asignan como columnas normales; en consultas
+    # (filter, select) son una subconsulta correlacionada con nexus_text().
+    # Fuera de sesión hace falta haberlo cargado antes (joinedload/selectinload de text_row):
+    # no se relee de nexus.db porque el registro puede venir de staging o de la nube.
+
+    @hybrid_property
+    def content_raw(self) -> Optional[str]:
+        row = self.text_row
+        return row.texts()[0] if row is not None else None
+
+    @content_raw.inplace.setter
+    def _content_raw_setter(self, value: Optional[str]):
+        self._set_texts(content_raw=value)
+
+    @content_raw.inplace.expression
+    @classmethod
+    def _content_raw_expression(cls):
+        return _text_expression(RegistryContent.content_z)
+
+    @hybrid_property
+    def summary(self) -> Optional[str]:
+        row = self.text_row
+        return row.texts()[1] if row is not None else None
+
+    @summary.inplace.setter
+    def _summary_setter(self, value: Optional[str]):
+        self._set_texts(summary=value)
+
+    @summary.inplace.expression
+    @classmethod
+    def _summary_expression(cls):
+        return _text_expression(RegistryContent.summary_z)
+
+    def _set_texts(self, **changes):
+        row = self.text_row
+        current = row.texts() if row is not None else (None, None)
+        content_raw = changes.get('content_raw', current[0])
+        summary = changes.get('summary', current[1])
+        if (content_raw, summary) == current:
+            return
+        if row is None:
+            row = self.text_row = RegistryContent()
+        row.store(content_raw, summary)
+        # El cambio vive en registry_content: tocar modified_at marca el registro
+        # (onupdate, huellas en before_update, ETags de la API)
+        self.modified_at = datetime.now(timezone.utc).replace(tzinfo=None)
+
+def _text_expression(column):
+    return (
+        select(nexus_text(column, RegistryContent.codec))
+        .where(RegistryContent.registry_id == Registry.id)
+        .correlate_except(RegistryContent)
+        .scalar_subquery()
+    )
+
+FINGERPRINT_SOURCES = ('type', 'path_url', 'meta_info')
+
+def _content_changed(target) -> bool:
+    row = inspect(target).dict.get('text_row')
+    return row is not None and inspect(row).attrs.content_z.history.has_changes()
+
+def apply_fingerprint(target):
+    for key, value in fingerprint_fields(target.type, target.path_url, target.content_raw, target.meta_info).items():
+        setattr(target, key, value)
+
+@event.listens_for(Registry, "before_insert")
+def _fingerprint_on_insert(mapper, connection, target):
+    apply_fingerprint(target)
+
+@event.listens_for(Registry, "before_update")
+def _fingerprint_on_update(mapper, connection, target):
+    state = inspect(target)
+    if _content_changed(target) or any(state.attrs[attr].history.has_changes() for attr in FINGERPRINT_SOURCES):
+        apply_fingerprint(target)
 
 class Tag(Base):
     """
@@ -98,6 +372,10 @@ class Tag(Base):
     Modelo tag-a-registro (uno a muchos)
     """
     __tablename__ = 'tags'
+    __table_args__ = (
+        # La PK es (registry_id, value); este índice cubre las búsquedas por valor
+        Index('ix_tags_value_registry', 'value', 'registry_id'),
+    )
     
     registry_id = Column(Integer, ForeignKey('registry.id', ondelete="CASCADE"), primary_key=True)
     value = Column(String, primary_key=True)
@@ -110,6 +388,10 @@ class NexusLink(Base):
     Conecta cualquier par de registros.
     """
     __tablename__ = 'nexus_links'
+    __table_args__ = (
+        Index('ix_links_source', 'source_id'),
+        Index('ix_links_target', 'target_id'),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     source_id = Column(Integer, ForeignKey('registry.id', ondelete="CASCADE"), nullable=False)
@@ -126,6 +408,11 @@ class Card(Base):
     Preguntas del sistema de repetición espaciada asociadas a registros.
     """
     __tablename__ = 'cards'
+    __table_args__ = (
+        # Cola de repaso global (get_due_cards, métricas) y por tema
+        Index('ix_cards_next_review', 'next_review'),
+        Index('ix_cards_parent_next_review', 'parent_id', 'next_review'),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     parent_id = Column(Integer, ForeignKey('registry.id', ondelete="CASCADE"), nullable=False)
@@ -139,6 +426,141 @@ class Card(Base):
     
     registry = relationship("Registry", back_populates="cards")
 
+class ReviewLog(Base):
+    """
+    Tabla 5: review_log (Historial de Repasos)
+    Una fila por calificación: permite reajustar los parámetros FSRS sobre la historia real.
+    rating usa la escala FSRS: 1 Again, 2 Hard, 3 Good, 4 Easy.
+    """
+    __tablename__ = 'review_log'
+    __table_args__ = (
+        Index('ix_review_log_card_time', 'card_id', 'reviewed_at'),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    card_id = Column(Integer, ForeignKey('cards.id', ondelete="CASCADE"), nullable=False)
+    reviewed_at = Column(DateTime, nullable=False, default=lambda: datetime.now(timezone.utc).replace(tzinfo=None))
+    rating = Column(Integer, nullable=False)
+    elapsed_days = Column(Float, default=0.0)      # Días desde el repaso anterior
+    scheduled_days = Column(Integer, default=0)    # Intervalo asignado tras este repaso
+    stability_before = Column(Float, nullable=True)
+    difficulty_before = Column(Float, nullable=True)
+    stability_after = Column(Float, nullable=True)
+    difficulty_after = Column(Float, nullable=True)
+    response_seconds = Column(Float, nullable=True)
+    source = Column(String, nullable=True)         # tui | web
+
+class PipelineJob(Base):
+    """
+    Tabla 6: pipeline_jobs (Cola persistente del Pipeline de YouTube)
+    Un registro por video con su etapa alcanzada, para reanudar tras un corte
+    sin volver a descargar ni resumir lo ya hecho.
+    Estados: queued -> fetched -> summarised -> promoted -> removed | kept (o failed)
+    """
+    __tablename__ = 'pipeline_jobs'
+    __table_args__ = (
+        Index('ix_pipeline_jobs_state', 'state'),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    video_url = Column(Text, nullable=False, unique=True)
+    playlist_url = Column(Text, nullable=True)
+    playlist_item_id = Column(String, nullable=True) # Necesario para borrarlo de la playlist
+    title = Column(Text, nullable=True)
+    state = Column(String, nullable=False, default='queued')
+    staging_id = Column(Integer, nullable=True)   # ID en staging_buffer.db tras 'fetched'
+    summary = Column(Text, nullable=True)         # Resultado DeepSeek tras 'summarised'
+    cards = Column(JSON, nullable=True)
+    registry_id = Column(Integer, nullable=True)  # ID en nexus.db tras 'promoted'
+    attempts = Column(Integer, default=0)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc).replace(tzinfo=None))
+    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc).replace(tzinfo=None), onupdate=lambda: datetime.now(timezone.utc).replace(tzinfo=None))
+
+class AIBatchJob(Base):
+    """
+    Tabla 7: ai_batch_jobs (Checkpoint de los lotes de IA)
+    Una fila por (lote, registro) con su estado: permite reanudar optimizar_ia /
+    reprocesar_fallidos tras un corte y no reintentar sin fin los que fallan.
+    Estados: pending -> done | failed
+    """
+    __tablename__ = 'ai_batch_jobs'
+    __table_args__ = (
+        Index('ux_ai_batch_jobs_batch_registry', 'batch', 'registry_id', unique=True),
+        Index('ix_ai_batch_jobs_batch_state', 'batch', 'state'),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    batch = Column(String, nullable=False)          # Nombre del lote (optimizar_ia, reprocesar_fallidos...)
+    registry_id = Column(Integer, nullable=False)
+    task = Column(String, nullable=False)           # FULL_IA | ONLY_CARDS | REPROCESS
+    state = Column(String, nullable=False, default='pending')
+    attempts = Column(Integer, default=0)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc).replace(tzinfo=None))
+    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc).replace(tzinfo=None), onupdate=lambda: datetime.now(timezone.utc).replace(tzinfo=None))
+
+class RegistryEmbedding(Base):
+    """
+    Tabla 8: registry_embeddings (Índice vectorial)
+    Fila de la matriz de vectores (core.embeddings) de cada registro por proveedor.
+    Los triggers de EMBEDDING_DDL borran la fila cuando cambia el texto del registro:
+    el siguiente refresh solo re-embebe los que faltan.
+    """
+    __tablename__ = 'registry_embeddings'
+
+    provider = Column(String, primary_key=True)
+    registry_id = Column(Integer, primary_key=True)
+    row = Column(Integer, nullable=False)
+
+class RegistrySimhashBand(Base):
+    """
+    Tabla 10: registry_simhash_bands (Bandas LSH del SimHash)
+    Una fila por banda de content_simhash, mantenida por los triggers de SIMHASH_BAND_DDL:
+    los casi-duplicados de un registro se buscan por índice en sus cubetas, sin leer todas las firmas.
+    """
+    __tablename__ = 'registry_simhash_bands'
+    __table_args__ = (
+        Index('ix_registry_simhash_bands_registry', 'registry_id'),
+    )
+
+    band = Column(Integer, primary_key=True)
+    value = Column(Integer, primary_key=True)
+    registry_id = Column(Integer, primary_key=True)
+
+class RegistryContent(Base):
+    """
+    Tabla 9: registry_content (Texto de los registros)
+    content_raw y summary comprimidos (ver encode_texts), fuera de 'registry' para que
+    listados y filtros recorran filas estrechas. Registry los expone como atributos.
+    """
+    __tablename__ = 'registry_content'
+
+    registry_id = Column(Integer, ForeignKey('registry.id', ondelete='CASCADE'), primary_key=True)
+    codec = Column(Integer, nullable=False, default=CODEC_PLAIN)
+    content_z = Column(LargeBinary, nullable=True)
+    summary_z = Column(LargeBinary, nullable=True)
+
+    registry = relationship("Registry", back_populates="text_row")
+
+    def texts(self) -> Tuple[Optional[str], Optional[str]]:
+        """(content_raw, summary) descomprimidos; se reutilizan mientras no cambien los BLOBs."""
+        key = (self.codec, self.content_z, self.summary_z)
+        cached = self.__dict__.get('_plain')
+        if cached is None or any(a is not b for a, b in zip(cached[0], key)):
+            cached = self._plain = (key, (decode_text(self.content_z, self.codec), decode_text(self.summary_z, self.codec)))
+        return cached[1]
+
+    def store(self, content_raw: Optional[str], summary: Optional[str]):
+        self.codec, self.content_z, self.summary_z = encode_texts(content_raw, summary)
+
+@event.listens_for(RegistryContent, "before_insert")
+@event.listens_for(RegistryContent, "before_update")
+def _plain_text_outside_sqlite(mapper, connection, target):
+    # Sin nexus_text() (PostgreSQL) las consultas leen el BLOB tal cual: se guarda plano
+    if connection.dialect.name != 'sqlite' and target.codec != CODEC_PLAIN:
+        target.codec, target.content_z, target.summary_z = encode_texts(*target.texts(), codec=CODEC_PLAIN)
+
 # ----------------------------------------------------------------------------
 # 3. Pydantic Schemas (Data Validation)
 # ----------------------------------------------------------------------------
@@ -175,6 +597,258 @@ class CardCreate(BaseModel):
 # 4. CRUD Operations
 # ----------------------------------------------------------------------------
 
+# Índice de texto completo (FTS5) en modo "external content": el índice lee el texto de la
+# vista registry_text (registry + registry_content descomprimido con nexus_text) y los
+# triggers de ambas tablas mantienen sincronizado el índice invertido.
+FTS_TABLE = 'registry_fts'
+TEXT_VIEW = 'registry_text'
+
+FTS_DDL = [
+    f"""CREATE VIEW IF NOT EXISTS {TEXT_VIEW} AS
+        SELECT r.id AS id, r.title AS title, r.path_url AS path_url,
+               nexus_text(c.content_z, c.codec) AS content_raw,
+               nexus_text(c.summary_z, c.codec) AS summary
+        FROM registry r LEFT JOIN registry_content c ON c.registry_id = r.id""",
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        title, path_url, content_raw, summary,
+        content='{TEXT_VIEW}', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 1'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS registry_fts_ai AFTER INSERT ON registry BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, path_url, content_raw, summary)
+        SELECT id, title, path_url, content_raw, summary FROM {TEXT_VIEW} WHERE id = new.id;
+    END""",
+    # BEFORE: el texto aún existe (el ON DELETE CASCADE de registry_content va antes que los AFTER)
+    f"""CREATE TRIGGER IF NOT EXISTS registry_fts_bd BEFORE DELETE ON registry BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, path_url, content_raw, summary)
+        SELECT 'delete', id, title, path_url, content_raw, summary FROM {TEXT_VIEW} WHERE id = old.id;
+    END""",
+    # Solo reindexa si cambian columnas de texto (no en cada update de last_viewed_at)
+    f"""CREATE TRIGGER IF NOT EXISTS registry_fts_au AFTER UPDATE OF title, path_url ON registry BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, path_url, content_raw, summary)
+        SELECT 'delete', old.id, old.title, old.path_url, content_raw, summary FROM {TEXT_VIEW} WHERE id = old.id;
+        INSERT INTO {FTS_TABLE}(rowid, title, path_url, content_raw, summary)
+        SELECT id, title, path_url, content_raw, summary FROM {TEXT_VIEW} WHERE id = new.id;
+    END""",
+    # Texto nuevo: el registro estaba indexado sin él (el INSERT de registry va primero)
+    f"""CREATE TRIGGER IF NOT EXISTS registry_content_fts_ai AFTER INSERT ON registry_content BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, path_url, content_raw, summary)
+        SELECT 'delete', id, title, path_url, NULL, NULL FROM registry WHERE id = new.registry_id;
+        INSERT INTO {FTS_TABLE}(rowid, title, path_url, content_raw, summary)
+        SELECT id, title, path_url, content_raw, summary FROM {TEXT_VIEW} WHERE id = new.registry_id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS registry_content_fts_au AFTER UPDATE ON registry_content BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, path_url, content_raw, summary)
+        SELECT 'delete', id, title, path_url, nexus_text(old.content_z, old.codec), nexus_text(old.summary_z, old.codec)
+        FROM registry WHERE id = old.registry_id;
+        INSERT INTO {FTS_TABLE}(rowid, title, path_url, content_raw, summary)
+        SELECT id, title, path_url, content_raw, summary FROM {TEXT_VIEW} WHERE id = new.registry_id;
+    END""",
+    # Si el borrado viene en cascada desde registry, el registro ya no existe y no hay nada que hacer
+    f"""CREATE TRIGGER IF NOT EXISTS registry_content_fts_ad AFTER DELETE ON registry_content BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, path_url, content_raw, summary)
+        SELECT 'delete', id, title, path_url, nexus_text(old.content_z, old.codec), nexus_text(old.summary_z, old.codec)
+        FROM registry WHERE id = old.registry_id;
+        INSERT INTO {FTS_TABLE}(rowid, title, path_url, content_raw, summary)
+        SELECT id, title, path_url, NULL, NULL FROM registry WHERE id = old.registry_id;
+    END""",
+]
+
+# Invalidación de vectores: mismos textos que el índice FTS (un update de last_viewed_at no los toca)
+EMBEDDING_DDL = [
+    """CREATE TRIGGER IF NOT EXISTS registry_embeddings_au AFTER UPDATE OF title ON registry BEGIN
+        DELETE FROM registry_embeddings WHERE registry_id = old.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS registry_embeddings_ad AFTER DELETE ON registry BEGIN
+        DELETE FROM registry_embeddings WHERE registry_id = old.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS registry_content_embeddings_ai AFTER INSERT ON registry_content BEGIN
+        DELETE FROM registry_embeddings WHERE registry_id = new.registry_id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS registry_content_embeddings_au AFTER UPDATE ON registry_content BEGIN
+        DELETE FROM registry_embeddings WHERE registry_id = old.registry_id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS registry_content_embeddings_ad AFTER DELETE ON registry_content BEGIN
+        DELETE FROM registry_embeddings WHERE registry_id = old.registry_id;
+    END""",
+]
+
+# Bandas del SimHash: se recalculan en SQL cada vez que se escribe content_simhash
+# (ORM, inserts masivos, backfill de modules.dedup o updates directos)
+def _simhash_bands_select(row: str, join: str = "") -> str:
+    """SELECT (band, value, registry_id) de las bandas de '{row}.content_simhash' (ver core.fingerprint.simhash_bands)."""
+    bands = " UNION ALL ".join(f"SELECT {i} AS band" for i in range(SIMHASH_BANDS))
+    return (
+        f"SELECT b.band, ({row}.content_simhash >> (b.band * {SIMHASH_BAND_BITS})) & {(1 << SIMHASH_BAND_BITS) - 1}, {row}.id "
+        f"FROM ({bands}) AS b {join} WHERE {row}.content_simhash IS NOT NULL"
+    )
+
+SIMHASH_BAND_DDL = [
+    f"""CREATE TRIGGER IF NOT EXISTS registry_simhash_ai AFTER INSERT ON registry BEGIN
+        INSERT INTO registry_simhash_bands (band, value, registry_id) {_simhash_bands_select('new')};
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS registry_simhash_au AFTER UPDATE OF content_simhash ON registry BEGIN
+        DELETE FROM registry_simhash_bands WHERE registry_id = old.id;
+        INSERT INTO registry_simhash_bands (band, value, registry_id) {_simhash_bands_select('new')};
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS registry_simhash_ad AFTER DELETE ON registry BEGIN
+        DELETE FROM registry_simhash_bands WHERE registry_id = old.id;
+    END""",
+]
+
+# Triggers del esquema anterior (texto en columnas de registry); los sustituyen los de arriba
+LEGACY_TEXT_TRIGGERS = ('registry_fts_ai', 'registry_fts_ad', 'registry_fts_au', 'registry_embeddings_au')
+
+def ensure_embedding_triggers(conn):
+    """Crea los triggers que invalidan los vectores de un registro al cambiar su texto."""
+    for ddl in EMBEDDING_DDL:
+        conn.execute(text(ddl))
+    conn.commit()
+
+def ensure_simhash_bands(conn):
+    """Crea los triggers de registry_simhash_bands y, en bases existentes, rellena las bandas una vez."""
+    exists = conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type='trigger' AND name='registry_simhash_ai'")
+    ).first() is not None
+    for ddl in SIMHASH_BAND_DDL:
+        conn.execute(text(ddl))
+    if not exists:
+        console.print("[yellow]Aplicando parche a base de datos: Indexando bandas SimHash (casi-duplicados)...[/yellow]")
+        conn.execute(text("DELETE FROM registry_simhash_bands"))
+        conn.execute(text(
+            "INSERT INTO registry_simhash_bands (band, value, registry_id) "
+            + _simhash_bands_select("r", join="CROSS JOIN registry AS r")
+        ))
+    conn.commit()
+
+def ensure_fts_index(conn) -> bool:
+    """
+    Crea (si no existe) el índice FTS5 sobre registry_text y sus triggers de sincronización.
+    En bases existentes reconstruye el índice una sola vez. Retorna False si el SQLite
+    instalado no fue compilado con FTS5 (el buscador cae entonces al modo ILIKE).
+    """
+    exists = conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type='table' AND name=:n"), {"n": FTS_TABLE}
+    ).first() is not None
+
+    try:
+        for ddl in FTS_DDL:
+            conn.execute(text(ddl))
+        if not exists:
+            console.print("[yellow]Aplicando parche a base de datos: Construyendo índice FTS5 de búsqueda...[/yellow]")
+            conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES('rebuild')"))
+        conn.commit()
+        return True
+    except Exception as fts_err:
+        conn.rollback()
+        console.print(f"[yellow]Aviso: FTS5 no disponible, la búsqueda usará ILIKE ({fts_err})[/yellow]")
+        return False
+
+def ensure_indexes(conn) -> List[str]:
+    """
+    Construye en bases de datos existentes los índices declarados en los modelos
+    (create_all no los añade a tablas que ya existen). Es idempotente.
+    Retorna la lista de índices creados en esta llamada.
+    """
+    existing = {
+        row[0] for row in conn.execute(text("SELECT name FROM sqlite_master WHERE type='index'"))
+    }
+    created = []
+    for table in Base.metadata.sorted_tables:
+        for idx in table.indexes:
+            if idx.name in existing:
+                continue
+            # Índice único ya sustituido por su versión no única (datos duplicados): no reintentar
+            # el CREATE UNIQUE INDEX (recorre la tabla entera) en cada arranque
+            if idx.unique and idx.name.replace('ux_', 'ix_', 1) in existing:
+                continue
+            console.print(f"[yellow]Aplicando parche a base de datos: Creando índice {idx.name}...[/yellow]")
+            try:
+                # Savepoint por índice: si falla, no se deshacen los ya creados en esta llamada
+                with conn.begin_nested():
+                    idx.create(bind=conn)
+                created.append(idx.name)
+            except IntegrityError:
+                # Datos heredados con path_url repetidos: el índice único no es posible,
+                # se crea uno normal para no perder la aceleración de la consulta.
+                cols = ", ".join(c.name for c in idx.columns)
+                fallback_name = idx.name.replace('ux_', 'ix_', 1)
+                console.print(f"[yellow]Aviso: Hay duplicados en {table.name}({cols}); se crea {fallback_name} no único.[/yellow]")
+                conn.execute(text(f"CREATE INDEX IF NOT EXISTS {fallback_name} ON {table.name} ({cols})"))
+                created.append(fallback_name)
+    if created:
+        # Refrescar estadísticas del planificador para que use los índices nuevos
+        conn.execute(text("PRAGMA optimize"))
+    conn.commit()
+    return created
+
+def ensure_fingerprint_columns(conn):
+    """
+    Añade las columnas de huella a registry (también en el buffer de staging) y rellena
+    canonical_key de los registros existentes. Los hashes de contenido, más costosos,
+    los completa modules.dedup.backfill_fingerprints.
+    """
+    columns = [row[1] for row in conn.execute(text("PRAGMA table_info(registry)"))]
+    if 'canonical_key' in columns:
+        return
+    console.print("[yellow]Aplicando parche a base de datos: Añadiendo columnas de huella (deduplicación)...[/yellow]")
+    conn.execute(text("ALTER TABLE registry ADD COLUMN canonical_key TEXT"))
+    conn.execute(text("ALTER TABLE registry ADD COLUMN content_hash VARCHAR(70)"))
+    conn.execute(text("ALTER TABLE registry ADD COLUMN content_simhash INTEGER"))
+    rows = conn.execute(text("SELECT id, path_url FROM registry WHERE path_url IS NOT NULL")).all()
+    updates = [{"k": make_canonical_key(path), "i": rid} for rid, path in rows]
+    if updates:
+        conn.execute(text("UPDATE registry SET canonical_key = :k WHERE id = :i"), updates)
+    conn.commit()
+
+def ensure_content_table(conn, batch_size: int = 1000) -> bool:
+    """
+    Mueve content_raw y summary de las columnas de registry a registry_content (comprimidos),
+    elimina las columnas antiguas y compacta el archivo con VACUUM. También en el buffer de
+    staging. El índice FTS5 se reconstruye después en ensure_fts_index. Retorna True si migró.
+    """
+    columns = [row[1] for row in conn.execute(text("PRAGMA table_info(registry)"))]
+    if 'content_raw' not in columns:
+        return False
+    console.print("[yellow]Aplicando parche a base de datos: Comprimiendo content_raw/summary en registry_content...[/yellow]")
+    # Los triggers y el índice FTS5 antiguos leen las columnas que se van a borrar
+    for name in LEGACY_TEXT_TRIGGERS:
+        conn.execute(text(f"DROP TRIGGER IF EXISTS {name}"))
+    conn.execute(text(f"DROP TABLE IF EXISTS {FTS_TABLE}"))
+
+    stmt = insert(RegistryContent.__table__).prefix_with("OR REPLACE")
+    last_id, moved = 0, 0
+    while True:
+        rows = conn.execute(
+            text("SELECT id, content_raw, summary FROM registry WHERE id > :last ORDER BY id LIMIT :n"),
+            {"last": last_id, "n": batch_size}
+        ).all()
+        if not rows:
+            break
+        values = []
+        for rid, content_raw, summary in rows:
+            if content_raw is None and summary is None:
+                continue
+            codec, content_z, summary_z = encode_texts(content_raw, summary)
+            values.append({"registry_id": rid, "codec": codec, "content_z": content_z, "summary_z": summary_z})
+        if values:
+            conn.execute(stmt, values)
+        moved += len(values)
+        last_id = rows[-1][0]
+
+    conn.execute(text("ALTER TABLE registry DROP COLUMN content_raw"))
+    conn.execute(text("ALTER TABLE registry DROP COLUMN summary"))
+    conn.commit()
+    console.print(f"[yellow]Aplicando parche a base de datos: {moved} textos comprimidos; compactando archivo (VACUUM)...[/yellow]")
+    conn.exec_driver_sql("VACUUM")
+    # En modo WAL el VACUUM se escribe primero en el -wal: volcarlo para que el archivo encoja ya
+    conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.commit()
+    return True
+
+# Tamaño de lote para cláusulas IN(...) (SQLite limita el número de variables por sentencia)
+BULK_IN_CHUNK = 500
+
 def init_db():
     """Crea las tablas en la base de datos si no existen."""
     try:
@@ -190,6 +864,13 @@ def init_db():
                 conn.execute(text("ALTER TABLE registry ADD COLUMN last_viewed_at DATETIME"))
                 conn.commit()
 
+            ensure_fingerprint_columns(conn)
+            ensure_content_table(conn)
+            ensure_indexes(conn)
+            ensure_fts_index(conn)
+            ensure_embedding_triggers(conn)
+            ensure_simhash_bands(conn)
+
         console.print(f"[bold green]✓ Base de datos Nexus (SQLite WAL) inicializada correctamente en:[/] {DB_PATH}")
     except Exception as db_err:
         console.print(f"[bold red]❌ Error crítico al inicializar o parchear la base de datos Nexus:[/] {db_err}")
@@ -201,6 +882,7 @@ class NexusCRUD:
     def __init__(self):
         self.Session = SessionLocal
         
+    @timed("crud", op="create_registry")
     def create_registry(self, data: RegistryCreate) -> Registry:
         """Crea un nuevo registro usando los esquemas de Pydantic."""
         
@@ -213,7 +895,11 @@ class NexusCRUD:
         with self.Session() as session:
             # Validación: Evitar duplicados por path_url (excepto notas donde path_url puede ser nulo, pero si existe se bloquea)
             if data.path_url:
-                existing = session.query(Registry).filter(Registry.path_url == data.path_url).first()
+                # También por clave canónica: youtu.be/ID, watch?v=ID&list=... o una URL con utm_* son el mismo recurso
+                key = make_canonical_key(data.path_url)
+                existing = session.query(Registry).filter(
+                    or_(Registry.path_url == data.path_url, Registry.canonical_key == key)
+                ).first()
                 if existing:
                     console.print(f"[bold white on red]❌ Error de Duplicado:[/] El registro con la ruta/URL '{data.path_url}' ya existe en el Súper Schema (ID {existing.id}). Operación bloqueada.")
                     raise ValueError(f"Registro Duplicado: {data.path_url}")
@@ -228,9 +914,11 @@ class NexusCRUD:
             session.add(reg)
             session.commit()
             session.refresh(reg)
+            reg.text_row  # Cargar el texto antes de separarlo de la sesión
             console.print(f"[blue]Registry creado:[/] ID {reg.id} (Tipo: {reg.type})")
             return reg
             
+    @timed("crud", op="get_registry")
     def get_registry(self, registry_id: int) -> Optional[Registry]:
         """Obtiene un registro a partir de su ID."""
         from sqlalchemy.orm import joinedload
@@ -238,12 +926,60 @@ class NexusCRUD:
             # Devolvemos el registro separado pero cargado
             # (Ten en cuenta que usar las relaciones fuera de sesión puede requerir eager_loading)
             reg = session.query(Registry).options(
-                joinedload(Registry.tags)
+                joinedload(Registry.tags), joinedload(Registry.text_row)
             ).filter(Registry.id == registry_id).first()
             if reg:
                 session.expunge(reg)
             return reg
             
+    @timed("crud", op="find_by_url")
+    def find_registry_by_url(self, url: str) -> Optional[Registry]:
+        """
+        Registro ya existente para 'url' (coincidencia exacta o por clave canónica), o None.
+        Permite cortar la ingesta antes de descargar o llamar al LLM.
+        """
+        key = make_canonical_key(url)
+        if not key:
+            return None
+        with self.Session() as session:
+            reg = session.query(Registry).options(joinedload(Registry.text_row)).filter(
+                or_(Registry.path_url == url, Registry.canonical_key == key)
+            ).order_by(Registry.id).first()
+            if reg:
+                session.expunge(reg)
+            return reg
+
+    @timed("crud", op="find_by_content_hash")
+    def find_registry_by_content_hash(self, content_hash: str) -> Optional[Registry]:
+        """Primer registro con ese content_hash (copias exactas de un archivo o texto), o None."""
+        if not content_hash:
+            return None
+        with self.Session() as session:
+            reg = session.query(Registry).options(joinedload(Registry.text_row)).filter(
+                Registry.content_hash == content_hash
+            ).order_by(Registry.id).first()
+            if reg:
+                session.expunge(reg)
+            return reg
+
+    def existing_canonical_keys_in_session(self, session, urls: List[str]) -> Dict[str, int]:
+        """URL -> ID del registro que ya la representa (por clave canónica), para un lote de URLs."""
+        # No commitea — responsabilidad del llamador
+        by_key: Dict[str, List[str]] = {}
+        for url in urls:
+            key = make_canonical_key(url)
+            if key:
+                by_key.setdefault(key, []).append(url)
+        found: Dict[str, int] = {}
+        keys = list(by_key)
+        for i in range(0, len(keys), BULK_IN_CHUNK):
+            chunk = keys[i:i + BULK_IN_CHUNK]
+            for reg_id, key in session.execute(select(Registry.id, Registry.canonical_key).where(Registry.canonical_key.in_(chunk))):
+                for url in by_key[key]:
+                    found.setdefault(url, reg_id)
+        return found
+
+    @timed("crud", op="add_tag")
     def add_tag(self, registry_id: int, tag_data: TagCreate) -> Tag:
         """Añade una única etiqueta al registro."""
         # Limpieza del valor de la etiqueta
@@ -255,6 +991,7 @@ class NexusCRUD:
             session.commit()
             return tag
             
+    @timed("crud", op="create_link")
     def create_link(self, link_data: NexusLinkCreate) -> NexusLink:
         """Crea una relación entre dos registros."""
         with self.Session() as session:
@@ -265,6 +1002,7 @@ class NexusCRUD:
             console.print(f"[magenta]Link Creado:[/] Entre {link.source_id} y {link.target_id}")
             return link
 
+    @timed("crud", op="create_card")
     def create_card(self, card_data: CardCreate) -> Card:
         """Adiciona una nueva flashcard."""
         with self.Session() as session:
@@ -275,6 +1013,7 @@ class NexusCRUD:
             console.print(f"[yellow]Card Creada:[/] Asociada al registro ID {card.parent_id}")
             return card
 
+    @timed("crud", op="delete_registry")
     def delete_registry(self, registry_id: int) -> bool:
         """Elimina un registro física y lógicamente de la Base de Datos, destruyendo dependencias por si SQLite no activó el PRAGMA CASCADE."""
         with self.Session() as session:
@@ -283,20 +1022,208 @@ class NexusCRUD:
             session.query(Tag).filter(Tag.registry_id == registry_id).delete(synchronize_session=False)
             session.query(NexusLink).filter(or_(NexusLink.source_id == registry_id, NexusLink.target_id == registry_id)).delete(synchronize_session=False)
             session.query(Card).filter(Card.parent_id == registry_id).delete(synchronize_session=False)
+            session.query(RegistryContent).filter(RegistryContent.registry_id == registry_id).delete(synchronize_session=False)
             
             # Matar registro principal
             deleted = session.query(Registry).filter(Registry.id == registry_id).delete(synchronize_session=False)
             session.commit()
             return deleted > 0
 
+    @timed("crud", op="update_summary")
     def update_summary(self, registry_id: int, summary_text: str) -> bool:
         """Actualiza el resumen de un registro."""
         with self.Session() as session:
-            rows = session.query(Registry).filter(Registry.id == registry_id).update({
-                Registry.summary: summary_text
-            })
+            updated = self.update_summary_in_session(session, registry_id, summary_text)
+            session.commit()
+            return updated
+
+    # ------------------------------------------------------------------------
+    # INGESTA MASIVA (UNA SOLA TRANSACCIÓN POR LOTE)
+    # ------------------------------------------------------------------------
+
+    @timed("crud", op="bulk_create_registries")
+    def bulk_create_registries(self, items: List[RegistryCreate]) -> List[Optional[int]]:
+        """
+        Inserta un lote de registros en una sola transacción.
+        Retorna los IDs nuevos alineados con 'items' (None para los duplicados omitidos).
+        """
+        with self.Session() as session:
+            ids = self.bulk_create_registries_in_session(session, items)
+            session.commit()
+            console.print(f"[blue]Registry bulk:[/] {sum(1 for i in ids if i is not None)}/{len(items)} creados")
+            return ids
+
+    @timed("crud", op="bulk_add_tags")
+    def bulk_add_tags(self, pairs: List[Tuple[int, TagCreate]]) -> int:
+        """Añade etiquetas (registry_id, TagCreate) en lote. Retorna cuántas se insertaron."""
+        with self.Session() as session:
+            inserted = self.bulk_add_tags_in_session(session, pairs)
             session.commit()
-            return rows > 0
+            return inserted
+
+    @timed("crud", op="bulk_create_cards")
+    def bulk_create_cards(self, cards: List[CardCreate]) -> List[int]:
+        """Inserta un lote de flashcards en una sola transacción. Retorna sus IDs."""
+        with self.Session() as session:
+            ids = self.bulk_create_cards_in_session(session, cards)
+            session.commit()
+            console.print(f"[yellow]Cards bulk:[/] {len(ids)} creadas")
+            return ids
+
+    def bulk_create_registries_in_session(self, session, items: List[RegistryCreate]) -> List[Optional[int]]:
+        """Versión en sesión de bulk_create_registries."""
+        # No commitea — responsabilidad del llamador
+        rows = []
+        for data in items:
+            row = data.model_dump()
+            for field in ('title', 'path_url', 'content_raw', 'summary'):
+                if row[field]:
+                    row[field] = sanitize_db_string(row[field])
+            if not row['content_raw'] or not row['content_raw'].strip():
+                row['content_raw'] = f"(Auto-Descripción) Título: {row['title']} | Ruta: {row['path_url']}"
+            # El insert ORM masivo no dispara before_insert: huellas calculadas aquí
+            row.update(fingerprint_fields(row['type'], row['path_url'], row['content_raw'], row['meta_info']))
+            rows.append(row)
+
+        # Dedupe set-based contra la BD (una consulta por bloque de IN) y dentro del propio lote,
+        # por path_url exacto y por clave canónica
+        urls = list({r['path_url'] for r in rows if r['path_url']})
+        keys = list({r['canonical_key'] for r in rows if r['canonical_key']})
+        taken = set()
+        taken_keys = set()
+        for i in range(0, len(urls), BULK_IN_CHUNK):
+            chunk = urls[i:i + BULK_IN_CHUNK]
+            taken.update(session.scalars(select(Registry.path_url).where(Registry.path_url.in_(chunk))))
+        for i in range(0, len(keys), BULK_IN_CHUNK):
+            chunk = keys[i:i + BULK_IN_CHUNK]
+            taken_keys.update(session.scalars(select(Registry.canonical_key).where(Registry.canonical_key.in_(chunk))))
+
+        to_insert = []
+        positions = []
+        for pos, row in enumerate(rows):
+            url, key = row['path_url'], row['canonical_key']
+            if url:
+                if url in taken or (key and key in taken_keys):
+                    continue
+                taken.add(url)
+                if key:
+                    taken_keys.add(key)
+            to_insert.append(row)
+            positions.append(pos)
+
+        ids: List[Optional[int]] = [None] * len(rows)
+        if to_insert:
+            texts = [(row.pop('content_raw'), row.pop('summary')) for row in to_insert]
+            new_ids = session.scalars(
+                insert(Registry).returning(Registry.id, sort_by_parameter_order=True),
+                to_insert
+            ).all()
+            for pos, new_id in zip(positions, new_ids):
+                ids[pos] = new_id
+            content_rows = []
+            for new_id, (content_raw, summary) in zip(new_ids, texts):
+                codec, content_z, summary_z = encode_texts(content_raw, summary)
+                content_rows.append({"registry_id": new_id, "codec": codec, "content_z": content_z, "summary_z": summary_z})
+            session.execute(insert(RegistryContent), content_rows)
+        return ids
+
+    def bulk_add_tags_in_session(self, session, pairs: List[Tuple[int, TagCreate]]) -> int:
+        """Versión en sesión de bulk_add_tags (ignora etiquetas ya existentes, como add_tag)."""
+        # No commitea — responsabilidad del llamador
+        rows = {
+            (reg_id, sanitize_db_string(tag.value))
+            for reg_id, tag in pairs if reg_id is not None and tag.value
+        }
+        if not rows:
+            return 0
+        stmt = sqlite_insert(Tag.__table__).on_conflict_do_nothing()
+        result = session.connection().execute(stmt, [{"registry_id": r, "value": v} for r, v in rows])
+        # Insert Core directo: no pasa por los eventos ORM de la sesión
+        mark_session_dirty(session)
+        return max(result.rowcount, 0)
+
+    def bulk_create_cards_in_session(self, session, cards: List[CardCreate]) -> List[int]:
+        """Versión en sesión de bulk_create_cards."""
+        # No commitea — responsabilidad del llamador
+        if not cards:
+            return []
+        return session.scalars(
+            insert(Card).returning(Card.id, sort_by_parameter_order=True),
+            [c.model_dump() for c in cards]
+        ).all()
+
+    def bulk_update_registries_in_session(self, session, rows: List[Dict[str, Any]]) -> int:
+        """
+        UPDATE por clave primaria en lote: cada dict lleva 'id' y las columnas a cambiar
+        (mismas claves en todas las filas). Retorna cuántas filas se enviaron.
+        """
+        # No commitea — responsabilidad del llamador
+        if not rows:
+            return 0
+        for row in rows:
+            for field in ('title', 'path_url', 'content_raw', 'summary'):
+                if row.get(field):
+                    row[field] = sanitize_db_string(row[field])
+        text_fields = [f for f in ('content_raw', 'summary') if f in rows[0]]
+        if text_fields:
+            now = datetime.now(timezone.utc).replace(tzinfo=None)
+            texts = [{"id": row["id"], **{f: row.pop(f) for f in text_fields}} for row in rows]
+            for row in rows:
+                # El texto vive en registry_content: el registro se marca como modificado igualmente
+                row.setdefault("modified_at", now)
+        session.execute(update(Registry), rows)
+        if text_fields:
+            self.bulk_store_texts_in_session(session, texts)
+        return len(rows)
+
+    def bulk_store_texts_in_session(self, session, rows: List[Dict[str, Any]]) -> int:
+        """
+        Escribe content_raw / summary en registry_content (upsert por registro). Cada dict lleva
+        'id' y uno o ambos campos; el que falte conserva su valor. No toca la fila de registry.
+        """
+        # No commitea — responsabilidad del llamador
+        if not rows:
+            return 0
+        partial = [r["id"] for r in rows if not ('content_raw' in r and 'summary' in r)]
+        current: Dict[int, Tuple[Optional[str], Optional[str]]] = {}
+        for i in range(0, len(partial), BULK_IN_CHUNK):
+            chunk = partial[i:i + BULK_IN_CHUNK]
+            for rid, codec, content_z, summary_z in session.execute(
+                select(RegistryContent.registry_id, RegistryContent.codec, RegistryContent.content_z, RegistryContent.summary_z)
+                .where(RegistryContent.registry_id.in_(chunk))
+            ):
+                current[rid] = (decode_text(content_z, codec), decode_text(summary_z, codec))
+        values = []
+        for r in rows:
+            content_raw, summary = current.get(r["id"], (None, None))
+            codec, content_z, summary_z = encode_texts(
+                sanitize_db_string(r.get('content_raw', content_raw)), sanitize_db_string(r.get('summary', summary))
+            )
+            values.append({"registry_id": r["id"], "codec": codec, "content_z": content_z, "summary_z": summary_z})
+        stmt = sqlite_insert(RegistryContent.__table__)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['registry_id'],
+            set_={c: stmt.excluded[c] for c in ('codec', 'content_z', 'summary_z')}
+        )
+        session.connection().execute(stmt, values)
+        # Upsert Core directo: no pasa por los eventos ORM de la sesión
+        mark_session_dirty(session)
+        return len(values)
+
+    def bulk_delete_registries_in_session(self, session, registry_ids: List[int]) -> int:
+        """Versión en lote de delete_registry_in_session (misma cascada manual defensiva)."""
+        from sqlalchemy import or_
+        # No commitea — responsabilidad del llamador
+        deleted = 0
+        ids = list(registry_ids)
+        for i in range(0, len(ids), BULK_IN_CHUNK):
+            chunk = ids[i:i + BULK_IN_CHUNK]
+            session.query(Tag).filter(Tag.registry_id.in_(chunk)).delete(synchronize_session=False)
+            session.query(NexusLink).filter(or_(NexusLink.source_id.in_(chunk), NexusLink.target_id.in_(chunk))).delete(synchronize_session=False)
+            session.query(Card).filter(Card.parent_id.in_(chunk)).delete(synchronize_session=False)
+            session.query(RegistryContent).filter(RegistryContent.registry_id.in_(chunk)).delete(synchronize_session=False)
+            deleted += session.query(Registry).filter(Registry.id.in_(chunk)).delete(synchronize_session=False)
+        return deleted
 
     def update_last_viewed_in_session(self, session, registry_id: int) -> bool:
         """Actualiza la fecha de última visualización usando una sesión existente."""
@@ -332,6 +1259,7 @@ class NexusCRUD:
         session.query(Tag).filter(Tag.registry_id == registry_id).delete(synchronize_session=False)
         session.query(NexusLink).filter(or_(NexusLink.source_id == registry_id, NexusLink.target_id == registry_id)).delete(synchronize_session=False)
         session.query(Card).filter(Card.parent_id == registry_id).delete(synchronize_session=False)
+        session.query(RegistryContent).filter(RegistryContent.registry_id == registry_id).delete(synchronize_session=False)
         
         deleted = session.query(Registry).filter(Registry.id == registry_id).delete(synchronize_session=False)
         return deleted > 0
@@ -339,9 +1267,12 @@ class NexusCRUD:
     def update_summary_in_session(self, session, registry_id: int, summary_text: str) -> bool:
         """Actualiza el resumen usando una sesión existente."""
         # No commitea — responsabilidad del llamador
+        # El UPDATE solo toca modified_at (onupdate); el texto va a registry_content
         rows = session.query(Registry).filter(Registry.id == registry_id).update({
-            Registry.summary: summary_text
+            Registry.modified_at: datetime.now(timezone.utc).replace(tzinfo=None)
         })
+        if rows:
+            self.bulk_store_texts_in_session(session, [{"id": registry_id, "summary": summary_text}])
         return rows > 0
 
     def create_link_in_session(self, session, link_data: NexusLinkCreate) -> NexusLink:
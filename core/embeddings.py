@@ -0,0 +1,478 @@
+import os
+import re
+import json
+import time
+import zlib
+import threading
+import unicodedata
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import event, select, delete, func, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from core.database import SessionLocal, Registry, NexusLink, RegistryEmbedding, DB_PATH, BULK_IN_CHUNK, data_version
+from core.instrumentation import timed
+from rich.console import Console
+
+console = Console()
+
+# ----------------------------------------------------------------------------
+# Índice vectorial de registros (búsqueda por similitud y sugerencia de vínculos).
+# - Proveedor enchufable: por defecto un vectorizador por hashing determinista
+#   (sin red ni modelos); con NEXUS_EMBEDDINGS=st:<modelo> un modelo local de
+#   sentence-transformers en CPU.
+# - Vectores float32 normalizados en una matriz mapeada en memoria (un archivo por
+#   BD y proveedor); la tabla registry_embeddings guarda registro -> fila.
+# - Búsqueda exacta top-k por fuerza bruta con NumPy (producto escalar por bloques).
+# - Refresco incremental: los triggers de la BD invalidan la fila cuando cambia
+#   el título, contenido o resumen; refresh() solo embebe los que faltan.
+#   Las búsquedas de la API son de solo lectura: el refresco corre en segundo
+#   plano tras los commits (watch_writes) o con scripts/indexar_embeddings.py.
+# ----------------------------------------------------------------------------
+
+EMBEDDINGS_DIR = os.environ.get(
+    "NEXUS_EMBEDDINGS_DIR",
+    os.path.join(os.path.dirname(DB_PATH), "embeddings")
+)
+DEFAULT_PROVIDER = "hashing"
+HASHING_DIM = 512
+MAX_TEXT_CHARS = 8000        # Texto por registro que entra en el vector (inicio de la transcripción)
+REFRESH_BATCH = 256          # Registros por lote de embebido + commit
+SEARCH_REFRESH_LIMIT = 500   # Pendientes que una búsqueda (TUI, scripts) embebe antes de responder
+SEARCH_BLOCK_ROWS = 65_536   # Filas por bloque del producto escalar (memoria acotada)
+COMPACT_GARBAGE_RATIO = 0.25 # Compacta la matriz si más de este % de filas están huérfanas
+MAPPING_TTL = 30.0           # Segundos antes de releer el mapa registro -> fila (otros procesos)
+DEFAULT_MIN_SCORE = 0.10
+
+# Palabras vacías (es/en): en un vectorizador sin IDF dominarían la similitud
+STOPWORDS = frozenset("""
+a al algo algun alguna algunas alguno algunos ante antes aqui asi aun bajo bien cada casi como con contra cual
+cuando de del desde donde dos el ella ellas ellos en entre era eran es esa esas ese eso esos esta estaba estado
+estan estar este esto estos fue fueron ha hace hacer han hasta hay la las le les lo los mas me mi mientras mismo
+mucho muy nada ni no nos nosotros o otra otras otro otros para pero poco por porque que quien se sea ser si sin
+sobre solo son su sus tambien tan tanto te tiene tienen todo todos tu un una unas uno unos usted vamos y ya yo
+about after all also an and any are as at be been but by can could did do does for from had has have he her his
+how if in into is it its just more most no not of on one or other our out over she so some such than that the
+their them then there these they this those through to too up very was we were what when which who will with
+would you your
+""".split())
+
+_COMBINING = re.compile(r"[\u0300-\u036f]")
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """
+    Palabras en minúsculas, sin acentos, de 3+ caracteres y sin palabras vacías.
+    Plural simple recortado ('recetas' -> 'receta') para que singular y plural coincidan.
+    """
+    if not text:
+        return []
+    text = _COMBINING.sub("", unicodedata.normalize("NFKD", text.lower()))
+    return [
+        w[:-1] if len(w) > 4 and w.endswith("s") else w
+        for w in _WORD.findall(text) if len(w) > 2 and not w.isdigit() and w not in STOPWORDS
+    ]
+
+def registry_text(title: Optional[str], summary: Optional[str], content_raw: Optional[str]) -> str:
+    """Texto que representa a un registro (el título pesa doble)."""
+    title = title or ""
+    return f"{title}\n{title}\n{summary or ''}\n{(content_raw or '')[:MAX_TEXT_CHARS]}"
+
+# ----------------------------------------------------------------------------
+# 1. Proveedores
+# ----------------------------------------------------------------------------
+
+class HashingEmbedder:
+    """
+    Vectorizador por hashing (unigramas + bigramas, CRC32 con signo, tf sublineal).
+    Determinista entre procesos y máquinas; no necesita red ni entrenamiento.
+    """
+    def __init__(self, dim: int = HASHING_DIM):
+        self.dim = int(dim)
+        self.name = f"hashing-{self.dim}"
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            words = tokenize(text)
+            features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+            if not features:
+                continue
+            hashes = np.fromiter((zlib.crc32(f.encode("utf-8")) for f in features), dtype=np.uint32, count=len(features))
+            signs = np.where(hashes & np.uint32(0x80000000), -1.0, 1.0)
+            v = np.bincount((hashes % self.dim).astype(np.intp), weights=signs, minlength=self.dim)
+            v = np.sign(v) * np.log1p(np.abs(v))
+            norm = np.linalg.norm(v)
+            if norm > 0:
+                out[i] = v / norm
+        return out
+
+class SentenceTransformerEmbedder:
+    """Modelo local de sentence-transformers (CPU). Dependencia opcional."""
+    def __init__(self, model_name: str = "paraphrase-multilingual-MiniLM-L12-v2"):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError:
+            raise ImportError("sentence-transformers no está instalado (pip install sentence-transformers)")
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.dim = int(self.model.get_sentence_embedding_dimension())
+        self.name = f"st-{model_name.replace('/', '_')}"
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = self.model.encode(list(texts), batch_size=32, normalize_embeddings=True, show_progress_bar=False)
+        return np.asarray(vectors, dtype=np.float32)
+
+# Proveedores por nombre: NEXUS_EMBEDDINGS='<nombre>' o '<nombre>:<argumento>'
+PROVIDERS: Dict[str, Callable[..., object]] = {
+    "hashing": lambda arg=None: HashingEmbedder(int(arg) if arg else HASHING_DIM),
+    "st": lambda arg=None: SentenceTransformerEmbedder(arg) if arg else SentenceTransformerEmbedder(),
+}
+
+def register_provider(name: str, factory: Callable[..., object]):
+    """Registra un proveedor: factory(arg) -> objeto con 'name', 'dim' y embed(textos) -> float32[n, dim]."""
+    PROVIDERS[name] = factory
+
+def get_embedder(spec: Optional[str] = None):
+    """Instancia el proveedor de 'spec' (o NEXUS_EMBEDDINGS). Si no está disponible cae al de hashing."""
+    spec = spec or os.environ.get("NEXUS_EMBEDDINGS", DEFAULT_PROVIDER)
+    name, _, arg = spec.partition(":")
+    factory = PROVIDERS.get(name)
+    if factory is None:
+        console.print(f"[yellow]Aviso: Proveedor de embeddings '{name}' desconocido; se usa hashing.[/yellow]")
+        return HashingEmbedder()
+    try:
+        return factory(arg or None)
+    except Exception as e:
+        console.print(f"[yellow]Aviso: Proveedor de embeddings '{name}' no disponible ({e}); se usa hashing.[/yellow]")
+        return HashingEmbedder()
+
+# ----------------------------------------------------------------------------
+# 2. Almacén
+# ----------------------------------------------------------------------------
+
+class EmbeddingStore:
+    """
+    Matriz de vectores de la BD actual para un proveedor. Las escrituras (refresh)
+    van serializadas por un lock; un proceso escritor a la vez por BD.
+    """
+    def __init__(self, embedder=None, directory: str = EMBEDDINGS_DIR):
+        self._embedder = embedder
+        self.directory = directory
+        self._lock = threading.RLock()
+        self._matrix: Optional[np.memmap] = None
+        self._meta: Optional[dict] = None
+        self._row_ids: Optional[np.ndarray] = None   # fila -> registry_id (-1 = huérfana)
+        self._id_rows: Dict[int, int] = {}
+        self._mapping_at = 0.0
+        # Refresco en segundo plano (watch_writes / refresh_in_background)
+        self._bg_lock = threading.Lock()
+        self._bg_thread: Optional[threading.Thread] = None
+        self._bg_pending = False
+        self._seen_version: Optional[int] = None
+
+    @property
+    def embedder(self):
+        if self._embedder is None:
+            self._embedder = get_embedder()
+        return self._embedder
+
+    @property
+    def provider(self) -> str:
+        return self.embedder.name
+
+    def _base_path(self) -> str:
+        stem = os.path.splitext(os.path.basename(DB_PATH))[0]
+        return os.path.join(self.directory, f"{stem}.{self.provider}")
+
+    # --- Archivo de vectores ----------------------------------------------
+
+    def _open(self, create: bool = True) -> bool:
+        """Abre la matriz del proveedor. Con create=False no escribe nada: retorna False si aún no existe."""
+        if self._meta is not None:
+            return True
+        base = self._base_path()
+        meta_path = base + ".json"
+        meta = None
+        if os.path.exists(meta_path):
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("dim") != self.embedder.dim or not os.path.exists(base + ".f32"):
+                meta = None
+        if meta is None:
+            if not create:
+                return False
+            # Archivo nuevo o incompatible: se descarta también el mapa de la BD
+            os.makedirs(self.directory, exist_ok=True)
+            meta = {"provider": self.provider, "dim": self.embedder.dim, "rows": 0, "capacity": 0}
+            open(base + ".f32", "wb").close()
+            with SessionLocal() as session:
+                session.execute(delete(RegistryEmbedding).where(RegistryEmbedding.provider == self.provider))
+                session.commit()
+            self._write_meta(meta)
+        self._meta = meta
+        self._map_matrix()
+        return True
+
+    def _map_matrix(self):
+        capacity, dim = self._meta["capacity"], self._meta["dim"]
+        self._matrix = (
+            np.memmap(self._base_path() + ".f32", dtype=np.float32, mode="r+", shape=(capacity, dim))
+            if capacity else None
+        )
+
+    def _write_meta(self, meta: dict):
+        path = self._base_path() + ".json"
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(path + ".tmp", path)
+
+    def _ensure_capacity(self, rows: int):
+        if rows <= self._meta["capacity"]:
+            return
+        capacity = max(rows, int(self._meta["capacity"] * 1.5), 1024)
+        if self._matrix is not None:
+            self._matrix.flush()
+            self._matrix = None
+        with open(self._base_path() + ".f32", "r+b") as f:
+            f.truncate(capacity * self._meta["dim"] * 4)
+        self._meta["capacity"] = capacity
+        self._map_matrix()
+
+    def _load_mapping(self, session, force: bool = False):
+        if not force and self._row_ids is not None and time.monotonic() - self._mapping_at < MAPPING_TTL:
+            return
+        pairs = session.execute(
+            select(RegistryEmbedding.registry_id, RegistryEmbedding.row)
+            .where(RegistryEmbedding.provider == self.provider)
+        ).all()
+        row_ids = np.full(self._meta["rows"], -1, dtype=np.int64)
+        id_rows = {}
+        for rid, row in pairs:
+            if row < len(row_ids):
+                row_ids[row] = rid
+                id_rows[rid] = row
+        self._row_ids, self._id_rows = row_ids, id_rows
+        self._mapping_at = time.monotonic()
+
+    # --- Refresco incremental ---------------------------------------------
+
+    @timed("embeddings", step="refresh")
+    def refresh(self, limit: Optional[int] = None, progress=None) -> int:
+        """
+        Embebe los registros sin vector vigente (nuevos o con texto cambiado).
+        Retorna cuántos embebió. 'progress(hechos, total)' tras cada lote.
+        """
+        with self._lock:
+            self._open()
+            done = 0
+            with SessionLocal() as session:
+                embedded = select(RegistryEmbedding.registry_id).where(RegistryEmbedding.provider == self.provider)
+                missing = select(Registry.id).where(Registry.id.not_in(embedded)).order_by(Registry.id)
+                if limit:
+                    missing = missing.limit(limit)
+                pending = session.scalars(missing).all()
+                for i in range(0, len(pending), REFRESH_BATCH):
+                    chunk = pending[i:i + REFRESH_BATCH]
+                    rows = session.execute(
+                        select(Registry.id, Registry.title, Registry.summary, Registry.content_raw)
+                        .where(Registry.id.in_(chunk)).order_by(Registry.id)
+                    ).all()
+                    if not rows:
+                        continue
+                    vectors = self.embedder.embed([registry_text(t, s, c) for _, t, s, c in rows])
+                    start = self._meta["rows"]
+                    self._ensure_capacity(start + len(rows))
+                    self._matrix[start:start + len(rows)] = vectors
+                    self._matrix.flush()
+                    # Meta antes que el mapa: un corte deja filas sin dueño, nunca un mapa a filas sin escribir
+                    self._meta["rows"] = start + len(rows)
+                    self._write_meta(self._meta)
+                    stmt = sqlite_insert(RegistryEmbedding.__table__).values([
+                        {"provider": self.provider, "registry_id": rid, "row": start + n}
+                        for n, (rid, *_rest) in enumerate(rows)
+                    ])
+                    session.execute(stmt.on_conflict_do_update(
+                        index_elements=["provider", "registry_id"], set_={"row": stmt.excluded.row}
+                    ))
+                    session.commit()
+                    done += len(rows)
+                    if progress:
+                        progress(done, len(pending))
+                if done:
+                    self._load_mapping(session, force=True)
+                    self._maybe_compact(session)
+            return done
+
+    def _maybe_compact(self, session):
+        """Reescribe la matriz sin filas huérfanas (re-embebidos y borrados) si superan el umbral."""
+        total = self._meta["rows"]
+        live = len(self._id_rows)
+        if total < 1024 or (total - live) <= total * COMPACT_GARBAGE_RATIO:
+            return
+        order = sorted(self._id_rows.items(), key=lambda kv: kv[1])
+        rows = np.fromiter((row for _, row in order), dtype=np.int64, count=len(order))
+        compacted = np.array(self._matrix[rows]) if len(rows) else np.zeros((0, self._meta["dim"]), np.float32)
+        base = self._base_path()
+        self._matrix.flush()
+        self._matrix = None
+        compacted.tofile(base + ".f32.tmp")
+        os.replace(base + ".f32.tmp", base + ".f32")
+        self._meta.update(rows=len(order), capacity=len(order))
+        self._write_meta(self._meta)
+        for i in range(0, len(order), BULK_IN_CHUNK):
+            session.execute(update(RegistryEmbedding), [
+                {"provider": self.provider, "registry_id": rid, "row": n}
+                for n, (rid, _) in enumerate(order[i:i + BULK_IN_CHUNK], start=i)
+            ])
+        session.commit()
+        self._map_matrix()
+        self._load_mapping(session, force=True)
+
+    # --- Búsqueda ---------------------------------------------------------
+
+    def _top_k(self, query: np.ndarray, k: int, exclude: Iterable[int] = (), min_score: float = DEFAULT_MIN_SCORE) -> List[Tuple[int, float]]:
+        total = self._meta["rows"]
+        if self._matrix is None or total == 0 or k <= 0:
+            return []
+        excluded = set(exclude)
+        best_ids, best_scores = np.empty(0, np.int64), np.empty(0, np.float32)
+        for start in range(0, total, SEARCH_BLOCK_ROWS):
+            block = np.asarray(self._matrix[start:min(total, start + SEARCH_BLOCK_ROWS)])
+            scores = block @ query
+            ids = self._row_ids[start:start + len(block)]
+            scores[ids < 0] = -np.inf
+            take = min(len(scores), k + len(excluded))
+            top = np.argpartition(-scores, take - 1)[:take] if take < len(scores) else np.arange(len(scores))
+            best_ids = np.concatenate([best_ids, ids[top]])
+            best_scores = np.concatenate([best_scores, scores[top]])
+        order = np.argsort(-best_scores, kind="stable")
+        result = []
+        for i in order:
+            rid, score = int(best_ids[i]), float(best_scores[i])
+            if score < min_score:
+                break
+            if rid < 0 or rid in excluded:
+                continue
+            result.append((rid, round(score, 4)))
+            if len(result) >= k:
+                break
+        return result
+
+    def _ready(self, refresh_limit: Optional[int] = SEARCH_REFRESH_LIMIT) -> bool:
+        # refresh_limit=0: solo lectura (sin índice todavía no hay nada que buscar)
+        if refresh_limit:
+            self.refresh(limit=refresh_limit)
+        elif not self._open(create=False):
+            return False
+        with SessionLocal() as session:
+            self._load_mapping(session)
+        return True
+
+    def vector_for(self, registry_id: int) -> Optional[np.ndarray]:
+        row = self._id_rows.get(registry_id)
+        if row is None or self._matrix is None:
+            return None
+        return np.array(self._matrix[row])
+
+    @timed("embeddings", step="search")
+    def search(self, query: str, k: int = 50, min_score: float = DEFAULT_MIN_SCORE,
+               refresh_limit: Optional[int] = SEARCH_REFRESH_LIMIT) -> List[Tuple[int, float]]:
+        """
+        Registros más parecidos a 'query': IDs ('42' o '42,57') usan el vector de esos
+        registros (que se excluyen del resultado); cualquier otro texto se embebe.
+        Antes embebe hasta 'refresh_limit' pendientes; con 0 no escribe nada (peticiones GET).
+        Retorna [(registry_id, similitud)] de mayor a menor.
+        """
+        with self._lock:
+            if not self._ready(refresh_limit):
+                return []
+            terms = [t.strip() for t in query.replace(",", " ").split() if t.strip()]
+            seed_ids = [int(t) for t in terms if t.isdigit()]
+            words = [t for t in terms if not t.isdigit()]
+            parts = [v for v in (self.vector_for(i) for i in seed_ids) if v is not None]
+            if words:
+                parts.append(self.embedder.embed([" ".join(words)])[0])
+            if not parts:
+                return []
+            q = np.mean(parts, axis=0).astype(np.float32)
+            norm = np.linalg.norm(q)
+            if norm == 0:
+                return []
+            return self._top_k(q / norm, k, exclude=seed_ids, min_score=min_score)
+
+    def suggest_links(self, registry_id: int, k: int = 10, min_score: float = DEFAULT_MIN_SCORE) -> List[Tuple[int, float]]:
+        """Registros parecidos a 'registry_id' que aún no están vinculados con él."""
+        with self._lock:
+            self._ready()
+            q = self.vector_for(registry_id)
+            if q is None:
+                return []
+            with SessionLocal() as session:
+                linked = set(session.scalars(
+                    select(NexusLink.target_id).where(NexusLink.source_id == registry_id)
+                )) | set(session.scalars(
+                    select(NexusLink.source_id).where(NexusLink.target_id == registry_id)
+                ))
+            return self._top_k(q, k, exclude=linked | {registry_id}, min_score=min_score)
+
+    # --- Refresco en segundo plano -----------------------------------------
+
+    def refresh_in_background(self, limit: Optional[int] = None):
+        """Pide un refresh() en un hilo propio; las peticiones mientras corre se juntan en una pasada más."""
+        with self._bg_lock:
+            self._bg_pending = True
+            if self._bg_thread is not None:
+                return
+            self._bg_thread = threading.Thread(
+                target=self._background_refresh, args=(limit,), name="nexus-embeddings", daemon=True
+            )
+            self._bg_thread.start()
+
+    def _background_refresh(self, limit: Optional[int]):
+        while True:
+            with self._bg_lock:
+                if not self._bg_pending:
+                    self._bg_thread = None
+                    return
+                self._bg_pending = False
+            try:
+                self.refresh(limit=limit)
+            except Exception as e:
+                console.print(f"[yellow]Aviso: falló el refresco de embeddings en segundo plano: {e}[/yellow]")
+
+    def watch_writes(self, session_factory=SessionLocal):
+        """
+        Refresca en segundo plano tras cada commit con escrituras de las sesiones de
+        'session_factory' (la BD principal: staging y la nube no tocan este índice).
+        """
+        if self._seen_version is not None:
+            return
+        self._seen_version = data_version()
+
+        def _after_commit(session):
+            version = data_version()
+            if version == self._seen_version or threading.current_thread() is self._bg_thread:
+                return
+            self._seen_version = version
+            self.refresh_in_background()
+
+        event.listen(session_factory, "after_commit", _after_commit)
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._open()
+            with SessionLocal() as session:
+                self._load_mapping(session, force=True)
+                total = session.scalar(select(func.count(Registry.id)))
+            return {
+                "provider": self.provider,
+                "dim": self._meta["dim"],
+                "embedded": len(self._id_rows),
+                "pending": max(0, (total or 0) - len(self._id_rows)),
+                "rows": self._meta["rows"],
+                "bytes": self._meta["capacity"] * self._meta["dim"] * 4,
+            }
+
+# Instancia compartida (abre el archivo y el proveedor en el primer uso)
+embedding_store = EmbeddingStore()
@@ -0,0 +1,165 @@
+import re
+import hashlib
+import unicodedata
+from typing import List, Optional
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+import numpy as np
+
+# ----------------------------------------------------------------------------
+# Huellas de identidad y de contenido para deduplicar registros.
+# - canonical_key: identidad del recurso (misma URL escrita de otra forma -> misma clave).
+# - content_hash: SHA-256 del texto normalizado (duplicados exactos con distinta URL).
+# - content_simhash: firma SimHash de 64 bits (casi-duplicados por distancia de Hamming).
+# Funciones puras, sin acceso a la BD: las usa core.database al insertar.
+# ----------------------------------------------------------------------------
+
+# Parámetros de seguimiento/campaña que no cambian el recurso
+TRACKING_PARAMS = {
+    "fbclid", "gclid", "dclid", "msclkid", "yclid", "igshid", "mc_cid", "mc_eid",
+    "ref", "ref_src", "ref_url", "referrer", "si", "feature", "spm", "_hsenc", "_hsmi",
+}
+TRACKING_PREFIXES = ("utm_", "pk_", "mtm_", "hsa_")
+# Subdominios incluidos (m., music.): en YouTube solo el ID del video identifica el recurso
+YOUTUBE_HOSTS = ("youtube.com", "youtu.be", "youtube-nocookie.com")
+_YT_ID = re.compile(r"^[A-Za-z0-9_-]{11}$")
+
+SIMHASH_BITS = 64
+SHINGLE_SIZE = 3
+NEAR_DUPLICATE_DISTANCE = 3  # Bits distintos tolerados entre dos SimHash "casi iguales"
+# Bandas LSH: con distancia <= 3 y 4 bandas de 16 bits, dos firmas cercanas
+# coinciden en al menos una banda (principio del palomar).
+SIMHASH_BANDS = 4
+SIMHASH_BAND_BITS = SIMHASH_BITS // SIMHASH_BANDS
+
+def youtube_video_id(url: str) -> Optional[str]:
+    """ID del video para cualquier variante de URL de YouTube (watch, youtu.be, shorts, embed, live)."""
+    try:
+        parts = urlsplit(url.strip())
+    except ValueError:
+        return None
+    host = parts.netloc.lower().split(":")[0]
+    if not any(host == h or host.endswith("." + h) for h in YOUTUBE_HOSTS):
+        return None
+
+    candidate = None
+    segments = [s for s in parts.path.split("/") if s]
+    if host.endswith("youtu.be"):
+        candidate = segments[0] if segments else None
+    elif segments and segments[0] in ("shorts", "embed", "live", "v", "e") and len(segments) > 1:
+        candidate = segments[1]
+    else:
+        for key, value in parse_qsl(parts.query):
+            if key == "v":
+                candidate = value
+                break
+    if candidate and _YT_ID.match(candidate):
+        return candidate
+    return None
+
+def canonical_url(url: str) -> str:
+    """
+    Forma canónica de una URL http(s): esquema/host en minúsculas, sin 'www.',
+    sin fragmento ni parámetros de seguimiento, query ordenada y sin '/' final.
+    """
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    if host.endswith(":80") and parts.scheme == "http":
+        host = host[:-3]
+    elif host.endswith(":443") and parts.scheme == "https":
+        host = host[:-4]
+
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if k.lower() not in TRACKING_PARAMS and not k.lower().startswith(TRACKING_PREFIXES)
+    )
+    path = parts.path.rstrip("/") or "/"
+    # http y https apuntan al mismo recurso a efectos de deduplicación
+    return urlunsplit(("https", host, path, urlencode(query), ""))
+
+def canonical_key(path_url: Optional[str]) -> Optional[str]:
+    """
+    Clave de identidad de un registro a partir de su path_url:
+    'youtube:<id>' para videos, la URL canónica para la web y la ruta tal cual
+    (normalizada a '/') para archivos y recursos internos.
+    """
+    if not path_url or not path_url.strip():
+        return None
+    value = path_url.strip()
+    video_id = youtube_video_id(value)
+    if video_id:
+        return f"youtube:{video_id}"
+    if value.lower().startswith(("http://", "https://")):
+        try:
+            return canonical_url(value)
+        except ValueError:
+            return value
+    return value.replace("\\", "/")
+
+_NON_WORD = re.compile(r"[^\w]+", re.UNICODE)
+
+def normalize_text(text: Optional[str]) -> str:
+    """Minúsculas, sin acentos ni puntuación y con espacios colapsados."""
+    if not text:
+        return ""
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(_NON_WORD.sub(" ", text.lower()).split())
+
+def content_sha256(text: Optional[str]) -> Optional[str]:
+    """SHA-256 del texto normalizado (None si no hay texto útil)."""
+    normalized = normalize_text(text)
+    if not normalized:
+        return None
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+def simhash(text: Optional[str]) -> Optional[int]:
+    """
+    SimHash de 64 bits sobre shingles de 3 palabras del texto normalizado.
+    Se retorna con signo (cabe en un INTEGER de SQLite).
+    """
+    words = normalize_text(text).split()
+    if not words:
+        return None
+    if len(words) < SHINGLE_SIZE:
+        shingles = [" ".join(words)]
+    else:
+        shingles = [" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)]
+
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(sh.encode("utf-8"), digest_size=8).digest(), "big") for sh in set(shingles)),
+        dtype=np.uint64
+    )
+    # Votación por bit vectorizada: +1 si el bit está activo en el shingle, -1 si no
+    bits = (hashes[:, None] >> np.arange(SIMHASH_BITS, dtype=np.uint64)) & np.uint64(1)
+    votes = 2 * bits.sum(axis=0, dtype=np.int64) - len(hashes)
+    value = int(np.sum(np.left_shift(np.uint64(1), np.arange(SIMHASH_BITS, dtype=np.uint64))[votes > 0], dtype=np.uint64))
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+def hamming_distance(a: int, b: int) -> int:
+    return ((a ^ b) & ((1 << 64) - 1)).bit_count()
+
+def simhash_bands(sig: int) -> List[int]:
+    """Valor de cada banda de la firma (mismo cálculo que los triggers de registry_simhash_bands)."""
+    mask = (1 << SIMHASH_BAND_BITS) - 1
+    return [(sig >> (band * SIMHASH_BAND_BITS)) & mask for band in range(SIMHASH_BANDS)]
+
+# Texto de relleno que ponen create_registry y el scraper cuando no hay contenido real:
+# no debe marcar como duplicados registros distintos.
+_PLACEHOLDER_PREFIXES = ("(Auto-Descripción)", "(Video guardado sin Transcripción", "Error al raspar")
+
+def fingerprint_fields(r_type: Optional[str], path_url: Optional[str], content_raw: Optional[str], meta_info: Optional[dict] = None) -> dict:
+    """Columnas de huella para un registro (canonical_key, content_hash, content_simhash)."""
+    fields = {"canonical_key": canonical_key(path_url), "content_hash": None, "content_simhash": None}
+    # Archivos: el hash binario del archivo completo identifica copias aunque no tengan texto
+    if r_type == "file" and meta_info and meta_info.get("sha256"):
+        fields["content_hash"] = f"file:{meta_info['sha256']}"
+        if content_raw and not content_raw.startswith(_PLACEHOLDER_PREFIXES):
+            fields["content_simhash"] = simhash(content_raw)
+        return fields
+    if content_raw and not content_raw.startswith(_PLACEHOLDER_PREFIXES):
+        fields["content_hash"] = content_sha256(content_raw)
+        fields["content_simhash"] = simhash(content_raw)
+    return fields
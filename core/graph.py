@@ -0,0 +1,259 @@
+import time
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import select, func
+
+from core.database import SessionLocal, Registry, NexusLink, graph_version, BULK_IN_CHUNK
+from core.instrumentation import timed
+
+# ----------------------------------------------------------------------------
+# Grafo de vínculos (nexus_links) en memoria como adyacencia CSR (NumPy int32).
+# - Los nodos son los registros que aparecen en algún vínculo, indexados 0..n-1
+#   en el orden de su id; 'ids' traduce índice -> registry_id.
+# - Dos CSR: saliente (dirigido, para PageRank y rutas dirigidas) y no dirigido
+#   (vecindarios, rutas y componentes, como muestra el panel de vínculos).
+# - Se reconstruye cuando cambia graph_version() (create_link, delete_registry,
+#   fusiones...) o, pasado GRAPH_TTL, si la huella de nexus_links difiere
+#   (escrituras desde otro proceso: web_server vs. dashboard).
+# - Cada recorrido expande la frontera entera por nivel con operaciones
+#   vectorizadas; PageRank y componentes se calculan una vez por versión.
+# ----------------------------------------------------------------------------
+
+GRAPH_TTL = 30.0          # Segundos antes de comprobar la huella de nexus_links
+PAGERANK_DAMPING = 0.85
+PAGERANK_TOL = 1e-8
+PAGERANK_MAX_ITER = 100
+MAX_HOPS = 6              # Tope de saltos para vecindarios (el grafo es pequeño pero denso en hubs)
+
+def _build_csr(src: np.ndarray, dst: np.ndarray, n: int) -> Tuple[np.ndarray, np.ndarray]:
+    """(indptr, indices) de las aristas src -> dst, ordenadas por origen y destino."""
+    order = np.lexsort((dst, src))
+    indices = dst[order].astype(np.int32)
+    indptr = np.zeros(n + 1, dtype=np.int32)
+    np.cumsum(np.bincount(src, minlength=n), out=indptr[1:])
+    return indptr, indices
+
+def _gather(indptr: np.ndarray, indices: np.ndarray, frontier: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Vecinos de toda la frontera en una pasada: (vecino, nodo de la frontera del que viene)."""
+    starts = indptr[frontier]
+    counts = indptr[frontier + 1] - starts
+    total = int(counts.sum())
+    if not total:
+        return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32)
+    offsets = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(total)
+    return indices[offsets], np.repeat(frontier, counts)
+
+class LinkGraph:
+    """Instantánea inmutable del grafo de vínculos."""
+
+    def __init__(self, pairs: np.ndarray, fingerprint: tuple = ()):
+        pairs = np.asarray(pairs, dtype=np.int64).reshape(-1, 2)
+        pairs = pairs[pairs[:, 0] != pairs[:, 1]]  # Autovínculos: no aportan recorrido
+        self.fingerprint = fingerprint
+        self.ids = np.unique(pairs)
+        n = self.n = len(self.ids)
+
+        src = np.searchsorted(self.ids, pairs[:, 0]).astype(np.int32)
+        dst = np.searchsorted(self.ids, pairs[:, 1]).astype(np.int32)
+        # Vínculos repetidos (mismo par, distinto relation_type) cuentan una vez
+        edges = np.unique(src.astype(np.int64) * max(n, 1) + dst)
+        src, dst = (edges // max(n, 1)).astype(np.int32), (edges % max(n, 1)).astype(np.int32)
+        self.edges = len(edges)
+        self.out_indptr, self.out_indices = _build_csr(src, dst, n)
+
+        both = np.unique(np.concatenate([edges, dst.astype(np.int64) * max(n, 1) + src]))
+        self.indptr, self.indices = _build_csr((both // max(n, 1)).astype(np.int32), (both % max(n, 1)).astype(np.int32), n)
+
+        self._pagerank = None
+        self._components = None
+
+    @classmethod
+    def load(cls, session) -> "LinkGraph":
+        rows = session.execute(select(NexusLink.source_id, NexusLink.target_id)).all()
+        return cls(np.array(rows, dtype=np.int64), link_fingerprint(session))
+
+    # --- Traducción registry_id <-> índice ----------------------------------
+
+    def index_of(self, registry_id: int) -> Optional[int]:
+        i = int(np.searchsorted(self.ids, registry_id))
+        return i if i < self.n and self.ids[i] == registry_id else None
+
+    def degree(self, registry_id: int) -> int:
+        i = self.index_of(registry_id)
+        return 0 if i is None else int(self.indptr[i + 1] - self.indptr[i])
+
+    # --- Recorridos -----------------------------------------------------------
+
+    def neighbourhood(self, registry_id: int, hops: int = 1, directed: bool = False) -> Dict[int, int]:
+        """Registros a como mucho 'hops' saltos: {registry_id: distancia}. Excluye el origen."""
+        start = self.index_of(registry_id)
+        if start is None:
+            return {}
+        indptr, indices = (self.out_indptr, self.out_indices) if directed else (self.indptr, self.indices)
+        dist = np.full(self.n, -1, dtype=np.int32)
+        dist[start] = 0
+        frontier = np.array([start], dtype=np.int32)
+        for level in range(1, min(hops, MAX_HOPS) + 1):
+            nxt, _ = _gather(indptr, indices, frontier)
+            nxt = np.unique(nxt[dist[nxt] < 0])
+            if not len(nxt):
+                break
+            dist[nxt] = level
+            frontier = nxt
+        found = np.flatnonzero(dist > 0)
+        return dict(zip(self.ids[found].tolist(), dist[found].tolist()))
+
+    def shortest_path(self, source_id: int, target_id: int, directed: bool = False) -> Optional[List[int]]:
+        """Ruta más corta (en saltos) como lista de registry_id, o None si no están conectados."""
+        s, t = self.index_of(source_id), self.index_of(target_id)
+        if s is None or t is None:
+            return [source_id] if source_id == target_id else None
+        indptr, indices = (self.out_indptr, self.out_indices) if directed else (self.indptr, self.indices)
+        parent = np.full(self.n, -1, dtype=np.int32)
+        parent[s] = s
+        frontier = np.array([s], dtype=np.int32)
+        while len(frontier) and parent[t] < 0:
+            nxt, origin = _gather(indptr, indices, frontier)
+            fresh = parent[nxt] < 0
+            nxt, origin = nxt[fresh], origin[fresh]
+            nxt, first = np.unique(nxt, return_index=True)
+            parent[nxt] = origin[first]
+            frontier = nxt
+        if parent[t] < 0:
+            return None
+        path = [t]
+        while path[-1] != s:
+            path.append(int(parent[path[-1]]))
+        return self.ids[path[::-1]].tolist()
+
+    # --- Métricas globales (una vez por instantánea) --------------------------
+
+    def pagerank(self) -> np.ndarray:
+        """PageRank sobre los vínculos dirigidos (masa de los nodos sin salida repartida uniformemente)."""
+        if self._pagerank is None:
+            n = self.n
+            if not n:
+                self._pagerank = np.empty(0, dtype=np.float64)
+                return self._pagerank
+            out_deg = np.diff(self.out_indptr).astype(np.float64)
+            src = np.repeat(np.arange(n, dtype=np.int32), np.diff(self.out_indptr))
+            dst = self.out_indices
+            dangling = out_deg == 0
+            inv_deg = np.divide(1.0, out_deg, out=np.zeros(n), where=~dangling)
+            rank = np.full(n, 1.0 / n)
+            for _ in range(PAGERANK_MAX_ITER):
+                flow = np.bincount(dst, weights=(rank * inv_deg)[src], minlength=n)
+                new = PAGERANK_DAMPING * (flow + rank[dangling].sum() / n) + (1.0 - PAGERANK_DAMPING) / n
+                done = np.abs(new - rank).sum() < PAGERANK_TOL
+                rank = new
+                if done:
+                    break
+            self._pagerank = rank
+        return self._pagerank
+
+    def components(self) -> np.ndarray:
+        """Etiqueta de componente (débilmente conexa) por nodo: el menor índice de su componente."""
+        if self._components is None:
+            labels = np.arange(self.n, dtype=np.int32)
+            src = np.repeat(np.arange(self.n, dtype=np.int32), np.diff(self.indptr))
+            dst = self.indices
+            while True:
+                # Propaga el mínimo por las aristas y comprime caminos (salto de punteros)
+                new = labels.copy()
+                np.minimum.at(new, src, labels[dst])
+                while True:
+                    jumped = new[new]
+                    if np.array_equal(jumped, new):
+                        break
+                    new = jumped
+                if np.array_equal(new, labels):
+                    break
+                labels = new
+            self._components = labels
+        return self._components
+
+    def centrality(self, registry_id: int) -> float:
+        i = self.index_of(registry_id)
+        return 0.0 if i is None else float(self.pagerank()[i])
+
+    def top_central(self, limit: int = 20) -> List[Tuple[int, float]]:
+        rank = self.pagerank()
+        if not len(rank):
+            return []
+        limit = min(limit, len(rank))
+        top = np.argpartition(-rank, limit - 1)[:limit]
+        top = top[np.argsort(-rank[top], kind="stable")]
+        return list(zip(self.ids[top].tolist(), rank[top].tolist()))
+
+    def component_groups(self, min_size: int = 2) -> List[List[int]]:
+        """Componentes como listas de registry_id, de mayor a menor."""
+        labels = self.components()
+        if not len(labels):
+            return []
+        order = np.argsort(labels, kind="stable")
+        cuts = np.flatnonzero(np.diff(labels[order])) + 1
+        groups = [self.ids[g].tolist() for g in np.split(order, cuts) if len(g) >= min_size]
+        groups.sort(key=len, reverse=True)
+        return groups
+
+    def stats(self) -> dict:
+        labels = self.components()
+        sizes = np.bincount(labels) if len(labels) else np.empty(0, dtype=np.int64)
+        return {
+            "nodes": self.n,
+            "edges": self.edges,
+            "components": int(np.count_nonzero(sizes)),
+            "largest_component": int(sizes.max()) if len(sizes) else 0,
+            "avg_degree": round(float(np.diff(self.indptr).mean()), 2) if self.n else 0.0,
+        }
+
+def link_fingerprint(session) -> tuple:
+    """Huella barata de nexus_links para detectar escrituras de otros procesos."""
+    return tuple(session.execute(select(
+        func.count(NexusLink.id), func.max(NexusLink.id),
+        func.total(NexusLink.source_id), func.total(NexusLink.target_id)
+    )).one())
+
+class GraphCache:
+    """Mantiene la instantánea vigente del grafo; seguro entre hilos."""
+
+    def __init__(self, session_factory=SessionLocal):
+        self.Session = session_factory
+        self._lock = threading.Lock()
+        self._graph: Optional[LinkGraph] = None
+        self._version = None
+        self._checked_at = 0.0
+
+    @timed("graph", step="get")
+    def get(self) -> LinkGraph:
+        with self._lock:
+            version = graph_version()
+            fresh = self._graph is not None and self._version == version
+            if fresh and time.monotonic() - self._checked_at < GRAPH_TTL:
+                return self._graph
+            with self.Session() as session:
+                if fresh and link_fingerprint(session) == self._graph.fingerprint:
+                    self._checked_at = time.monotonic()
+                    return self._graph
+                self._graph = LinkGraph.load(session)
+            self._version = version
+            self._checked_at = time.monotonic()
+            return self._graph
+
+    def invalidate(self):
+        """Fuerza la reconstrucción (p. ej. tras escribir vínculos con SQL crudo)."""
+        with self._lock:
+            self._graph = None
+
+link_graph = GraphCache()
+
+def registry_titles(session, registry_ids: Sequence[int]) -> Dict[int, str]:
+    """id -> título en una consulta por bloque (en lugar de una por vínculo)."""
+    ids = list(registry_ids)
+    titles = {}
+    for i in range(0, len(ids), BULK_IN_CHUNK):
+        chunk = ids[i:i + BULK_IN_CHUNK]
+        titles.update(session.execute(select(Registry.id, Registry.title).where(Registry.id.in_(chunk))).all())
+    return titles
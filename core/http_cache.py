@@ -0,0 +1,138 @@
+import hashlib
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Callable, Iterable, Optional
+
+from fastapi import Request, Response
+from fastapi.middleware.gzip import GZipMiddleware
+
+from core.database import store_version
+
+try:
+    from brotli_asgi import BrotliMiddleware
+except ImportError:
+    BrotliMiddleware = None
+
+# ----------------------------------------------------------------------------
+# Utilidades HTTP compartidas por web_server.py y cloud_backend:
+# validadores condicionales (ETag / Last-Modified -> 304), proyección de campos
+# (?fields=) y una caché TTL en proceso invalidada por store_version().
+# ----------------------------------------------------------------------------
+
+# Sin 'no-cache' el navegador podría servir la copia sin revalidar; así siempre
+# pregunta, pero la respuesta es un 304 vacío mientras nada cambie.
+CACHE_CONTROL = "private, no-cache"
+
+def make_etag(*parts: Any) -> str:
+    """ETag débil a partir de cualquier combinación de valores (ids, fechas, versiones...)."""
+    digest = hashlib.blake2b(repr(parts).encode("utf-8"), digest_size=12).hexdigest()
+    return f'W/"{digest}"'
+
+def _as_utc(dt: Optional[datetime]) -> Optional[datetime]:
+    if dt is None:
+        return None
+    # SQLite guarda UTC sin tzinfo; se trunca a segundos (resolución de Last-Modified)
+    dt = dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt.astimezone(timezone.utc)
+    return dt.replace(microsecond=0)
+
+def not_modified(request: Request, etag: str, last_modified: Optional[datetime] = None) -> bool:
+    """
+    Evalúa la petición condicional (RFC 9110): If-None-Match tiene prioridad
+    sobre If-Modified-Since.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        candidates = {tag.strip() for tag in if_none_match.split(",")}
+        # Comparación débil: W/"x" equivale a "x"
+        weak = etag[2:] if etag.startswith("W/") else etag
+        return "*" in candidates or etag in candidates or weak in candidates
+
+    if_modified_since = request.headers.get("if-modified-since")
+    last_modified = _as_utc(last_modified)
+    if if_modified_since and last_modified is not None:
+        try:
+            return last_modified <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+def set_validators(response: Response, etag: str, last_modified: Optional[datetime] = None):
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    last_modified = _as_utc(last_modified)
+    if last_modified is not None:
+        response.headers["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+
+def conditional(request: Request, response: Response, etag: str, last_modified: Optional[datetime] = None) -> Optional[Response]:
+    """
+    Fija ETag/Last-Modified en 'response'. Si el cliente ya tiene esa versión
+    retorna un Response 304 (el endpoint debe devolverlo tal cual); si no, None.
+    """
+    set_validators(response, etag, last_modified)
+    if not_modified(request, etag, last_modified):
+        cached = Response(status_code=304)
+        set_validators(cached, etag, last_modified)
+        return cached
+    return None
+
+def parse_fields(fields: Optional[str], allowed: Iterable[str]) -> Optional[set]:
+    """
+    '?fields=id,title,tags' -> {'id','title','tags'}. None = todos los campos.
+    Lanza ValueError si se piden campos inexistentes.
+    """
+    if not fields:
+        return None
+    requested = {f.strip() for f in fields.split(",") if f.strip()}
+    unknown = requested - set(allowed)
+    if unknown:
+        raise ValueError(f"Campos desconocidos en 'fields': {', '.join(sorted(unknown))}")
+    return requested
+
+def project(item, fields: Optional[set]) -> dict:
+    """Serializa un modelo Pydantic o dict quedándose solo con 'fields' (None = todo)."""
+    data = item.model_dump() if hasattr(item, "model_dump") else dict(item)
+    if fields is None:
+        return data
+    return {k: v for k, v in data.items() if k in fields}
+
+class TTLCache:
+    """
+    Caché en proceso para respuestas costosas (p. ej. /api/stats).
+    Una entrada vale hasta que vence 'ttl' o cambia store_version(): escrituras
+    en este proceso y en cualquier otro sobre el mismo nexus.db (TUI, scripts).
+    """
+
+    def __init__(self, ttl: float = 30.0):
+        self.ttl = ttl
+        self._entries = {}  # clave -> (store_version, timestamp, valor)
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key: Any, compute: Callable[[], Any]) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+        version = store_version()
+        if entry and entry[0] == version and time.monotonic() - entry[1] < self.ttl:
+            return entry[2]
+
+        value = compute()
+        with self._lock:
+            self._entries[key] = (version, time.monotonic(), value)
+        return value
+
+    def invalidate(self, key: Any = None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+COMPRESS_MIN_SIZE = 1024  # Respuestas más pequeñas no compensan el coste de comprimir
+
+def add_compression(app):
+    """Brotli si 'brotli-asgi' está instalado (con gzip de reserva); si no, solo gzip."""
+    if BrotliMiddleware is not None:
+        app.add_middleware(BrotliMiddleware, minimum_size=COMPRESS_MIN_SIZE, gzip_fallback=True)
+    else:
+        app.add_middleware(GZipMiddleware, minimum_size=COMPRESS_MIN_SIZE)
@@ -0,0 +1,304 @@
+import os
+import re
+import time
+import threading
+import functools
+import contextvars
+from bisect import bisect_left
+from collections import Counter
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import event
+
+# ----------------------------------------------------------------------------
+# Instrumentación de rutas calientes: temporizadores (histogramas), contadores
+# y un perfilador de sentencias SQL con detección de patrones N+1.
+#
+# Desactivada (por defecto) cuesta una comprobación de bandera por llamada y los
+# listeners SQL ni siquiera están registrados. Se activa con NEXUS_INSTRUMENTATION=1,
+# con enable() o desde el panel de diagnóstico del TUI.
+# ----------------------------------------------------------------------------
+
+PREFIX = "nexus_"
+# Límites de los histogramas (segundos): de 1 ms (SQL) a 60 s (LLM / scraping)
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Misma SELECT repetida más de N veces dentro de un ámbito = sospecha de N+1
+N_PLUS_ONE_THRESHOLD = 10
+MAX_TRACKED_STATEMENTS = 500
+
+_enabled = os.environ.get("NEXUS_INSTRUMENTATION", "0") == "1"
+_lock = threading.Lock()
+
+LabelKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+_counters: Dict[LabelKey, float] = {}
+_histograms: Dict[LabelKey, list] = {}       # clave -> [cuentas por bucket..., +Inf, suma]
+_statements: Dict[str, list] = {}            # SQL -> [ejecuciones, segundos totales, máximo]
+_n_plus_one: Dict[Tuple[str, str], int] = {} # (ámbito, SQL) -> repeticiones máximas observadas
+
+_engines = []
+_scope: contextvars.ContextVar = contextvars.ContextVar("nexus_profile_scope", default=None)
+
+def is_enabled() -> bool:
+    return _enabled
+
+def _key(name: str, labels: dict) -> LabelKey:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+# ----------------------------------------------------------------------------
+# Primitivas: contadores y temporizadores
+# ----------------------------------------------------------------------------
+
+def count(name: str, value: float = 1, **labels):
+    """Incrementa el contador 'nexus_<name>_total'."""
+    if not _enabled:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+def observe(name: str, seconds: float, **labels):
+    """Registra una duración en el histograma 'nexus_<name>_seconds'."""
+    if not _enabled:
+        return
+    key = _key(name, labels)
+    idx = bisect_left(BUCKETS, seconds)
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = [0] * (len(BUCKETS) + 2)
+        hist[idx] += 1
+        hist[-1] += seconds
+
+class _Scope:
+    """Ámbito de perfilado: agrupa las sentencias SQL de una operación para detectar N+1."""
+    __slots__ = ("name", "selects")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.selects = Counter()
+
+class timed:
+    """
+    Temporizador usable como context manager o como decorador:
+
+        with timed("llm_request", agent="summary", model=m): ...
+
+        @timed("search_registry")
+        def search_registry(...): ...
+
+    Registra la duración en 'nexus_<name>_seconds' y, si hubo excepción,
+    incrementa 'nexus_<name>_errors_total'. Abre un ámbito de perfilado SQL
+    si no hay uno activo.
+    """
+    __slots__ = ("name", "labels", "_t0", "_token")
+
+    def __init__(self, name: str, **labels):
+        self.name = name
+        self.labels = labels
+        self._t0 = None
+        self._token = None
+
+    def __enter__(self):
+        if _enabled:
+            self._t0 = time.perf_counter()
+            if _scope.get() is None:
+                self._token = _scope.set(_Scope(self.name))
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._t0 is None:
+            return False
+        observe(self.name, time.perf_counter() - self._t0, **self.labels)
+        if exc_type is not None:
+            count(f"{self.name}_errors", error=exc_type.__name__, **self.labels)
+        if self._token is not None:
+            _scope.reset(self._token)
+            self._token = None
+        self._t0 = None
+        return False
+
+    def __call__(self, fn):
+        name, labels = self.name, self.labels
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            # Instancia nueva por llamada: el decorador es reentrante y seguro entre hilos
+            with timed(name, **labels):
+                return fn(*args, **kwargs)
+        return wrapper
+
+class profile_scope:
+    """Ámbito explícito de perfilado SQL (p. ej. una petición HTTP o una pantalla del TUI)."""
+    __slots__ = ("name", "_token")
+
+    def __init__(self, name: str):
+        self.name = name
+        self._token = None
+
+    def __enter__(self):
+        if _enabled:
+            self._token = _scope.set(_Scope(self.name))
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._token is not None:
+            _scope.reset(self._token)
+            self._token = None
+        return False
+
+# ----------------------------------------------------------------------------
+# Perfilador SQL (listeners de SQLAlchemy, solo registrados mientras está activo)
+# ----------------------------------------------------------------------------
+
+_WS = re.compile(r"\s+")
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("nexus_t0", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("nexus_t0")
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    sql = _WS.sub(" ", statement).strip()
+    op = sql.split(" ", 1)[0].lower() if sql else "unknown"
+    observe("sql_statement", elapsed, op=op)
+
+    with _lock:
+        stats = _statements.get(sql)
+        if stats is None and len(_statements) < MAX_TRACKED_STATEMENTS:
+            stats = _statements[sql] = [0, 0.0, 0.0]
+        if stats is not None:
+            stats[0] += 1
+            stats[1] += elapsed
+            stats[2] = max(stats[2], elapsed)
+
+    scope = _scope.get()
+    if scope is not None and op == "select" and not executemany:
+        scope.selects[sql] += 1
+        repeats = scope.selects[sql]
+        if repeats > N_PLUS_ONE_THRESHOLD:
+            key = (scope.name, sql)
+            with _lock:
+                _n_plus_one[key] = max(_n_plus_one.get(key, 0), repeats)
+            # Se cuenta una vez por ámbito: al cruzar el umbral
+            if repeats == N_PLUS_ONE_THRESHOLD + 1:
+                count("sql_n_plus_one", scope=scope.name)
+
+def register_engine(engine):
+    """Declara un engine a perfilar (core.database registra el de nexus.db)."""
+    if engine not in _engines:
+        _engines.append(engine)
+        if _enabled:
+            _attach(engine)
+
+def _attach(engine):
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+def _detach(engine):
+    if event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.remove(engine, "before_cursor_execute", _before_cursor_execute)
+        event.remove(engine, "after_cursor_execute", _after_cursor_execute)
+
+def enable():
+    global _enabled
+    _enabled = True
+    for engine in _engines:
+        _attach(engine)
+
+def disable():
+    global _enabled
+    _enabled = False
+    for engine in _engines:
+        _detach(engine)
+
+def reset():
+    """Descarta todas las métricas acumuladas."""
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+        _statements.clear()
+        _n_plus_one.clear()
+
+# ----------------------------------------------------------------------------
+# Exposición: texto Prometheus (/api/metrics) e instantánea para el TUI
+# ----------------------------------------------------------------------------
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(pairs, extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(pairs) + ([extra] if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+def render_prometheus() -> str:
+    """Formato de exposición de texto de Prometheus (versión 0.0.4)."""
+    with _lock:
+        counters = dict(_counters)
+        histograms = {k: list(v) for k, v in _histograms.items()}
+
+    lines = []
+    for name in sorted({n for n, _ in counters}):
+        metric = f"{PREFIX}{name}_total"
+        lines.append(f"# TYPE {metric} counter")
+        for (n, labels), value in sorted(counters.items()):
+            if n == name:
+                lines.append(f"{metric}{_labels(labels)} {value:g}")
+
+    for name in sorted({n for n, _ in histograms}):
+        metric = f"{PREFIX}{name}_seconds"
+        lines.append(f"# TYPE {metric} histogram")
+        for (n, labels), hist in sorted(histograms.items()):
+            if n != name:
+                continue
+            cumulative = 0
+            for bound, bucket_count in zip(BUCKETS, hist):
+                cumulative += bucket_count
+                lines.append(f"{metric}_bucket{_labels(labels, ('le', f'{bound:g}'))} {cumulative}")
+            cumulative += hist[len(BUCKETS)]
+            lines.append(f"{metric}_bucket{_labels(labels, ('le', '+Inf'))} {cumulative}")
+            lines.append(f"{metric}_sum{_labels(labels)} {hist[-1]:.6f}")
+            lines.append(f"{metric}_count{_labels(labels)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+def snapshot(top: int = 10) -> dict:
+    """Resumen legible: temporizadores y SQL más costosos, y sospechas de N+1."""
+    with _lock:
+        timers = []
+        for (name, labels), hist in _histograms.items():
+            calls = sum(hist[:-1])
+            if calls:
+                timers.append({
+                    "name": name,
+                    "labels": dict(labels),
+                    "calls": calls,
+                    "total_s": hist[-1],
+                    "avg_ms": hist[-1] / calls * 1000
+                })
+        statements = [
+            {"sql": sql, "calls": s[0], "total_s": s[1], "max_ms": s[2] * 1000}
+            for sql, s in _statements.items()
+        ]
+        n_plus_one = [
+            {"scope": scope, "sql": sql, "repeats": repeats}
+            for (scope, sql), repeats in _n_plus_one.items()
+        ]
+        counters = {f"{n}{_labels(l)}": v for (n, l), v in _counters.items()}
+
+    timers.sort(key=lambda t: t["total_s"], reverse=True)
+    statements.sort(key=lambda s: s["total_s"], reverse=True)
+    n_plus_one.sort(key=lambda n: n["repeats"], reverse=True)
+    return {
+        "enabled": _enabled,
+        "timers": timers[:top],
+        "statements": statements[:top],
+        "n_plus_one": n_plus_one[:top],
+        "counters": counters
+    }
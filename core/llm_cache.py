@@ -0,0 +1,263 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Any, Callable, Iterable, Optional, Tuple
+
+from rich.console import Console
+
+from core import instrumentation
+
+console = Console()
+
+# ----------------------------------------------------------------------------
+# Caché de respuestas LLM direccionada por contenido
+# ----------------------------------------------------------------------------
+# Clave = SHA-256 de (modelo, prompt, temperatura, esquema). Un prompt idéntico
+# (re-ejecución de optimizar_ia / reprocesar_fallidos) no vuelve a gastar tokens.
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CACHE_PATH = os.environ.get("NEXUS_LLM_CACHE_PATH", os.path.join(ROOT_DIR, "llm_cache.db"))
+DEFAULT_TTL = 30 * 24 * 3600          # 30 días
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024 # 256 MB
+EVICT_TARGET = 0.9                    # Al desbordar se recorta hasta el 90% del máximo
+
+_DDL = """
+CREATE TABLE IF NOT EXISTS llm_cache (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    response TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL
+)
+"""
+
+def _env_flag(name: str) -> bool:
+    return os.environ.get(name, "").strip().lower() in ("1", "true", "yes", "on")
+
+def schema_fingerprint(schema: Any) -> Optional[str]:
+    """Representación estable de un esquema de salida (modelo Pydantic, list[Model], dict o None)."""
+    if schema is None:
+        return None
+    if isinstance(schema, (str, dict, list)):
+        return json.dumps(schema, sort_keys=True, ensure_ascii=False, default=str)
+    try:
+        from pydantic import TypeAdapter
+        return json.dumps(TypeAdapter(schema).json_schema(), sort_keys=True)
+    except Exception:
+        return repr(schema)
+
+class LLMCache:
+    """
+    Caché en disco (SQLite) para respuestas de modelos de lenguaje.
+    - TTL: las entradas más antiguas que 'ttl' segundos se consideran fallos y se reemplazan.
+    - LRU acotado por tamaño: al superar 'max_bytes' se descartan las de acceso más antiguo.
+    - Contadores hits/misses por proceso (ver stats()).
+    - Bypass: atributo 'bypass', variable NEXUS_LLM_CACHE_BYPASS=1 o parámetro por llamada.
+    """
+    def __init__(
+        self,
+        path: str = CACHE_PATH,
+        ttl: float = DEFAULT_TTL,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        bypass: Optional[bool] = None
+    ):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.bypass = _env_flag("NEXUS_LLM_CACHE_BYPASS") if bypass is None else bypass
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._ready = False
+
+    # --- Infraestructura ---
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30)
+        if not self._ready:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(_DDL)
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_cache_last_access ON llm_cache (last_access)")
+            conn.commit()
+            self._ready = True
+        return conn
+
+    @staticmethod
+    def make_key(model: str, prompt: str, temperature: Optional[float] = None, schema: Any = None) -> str:
+        payload = json.dumps({
+            "model": model,
+            "prompt": prompt,
+            "temperature": temperature,
+            "schema": schema_fingerprint(schema),
+        }, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    # --- API básica ---
+
+    def get(self, key: str) -> Optional[str]:
+        """Respuesta cacheada o None (expirada o inexistente). Actualiza last_access en aciertos."""
+        now = time.time()
+        with self._lock:
+            try:
+                conn = self._connect()
+                try:
+                    row = conn.execute("SELECT response, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+                    if row is None:
+                        instrumentation.count("llm_cache_lookups", result="miss")
+                        return None
+                    if self.ttl and now - row[1] > self.ttl:
+                        conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                        conn.commit()
+                        instrumentation.count("llm_cache_lookups", result="expired")
+                        return None
+                    conn.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (now, key))
+                    conn.commit()
+                    instrumentation.count("llm_cache_lookups", result="hit")
+                    return row[0]
+                finally:
+                    conn.close()
+            except sqlite3.Error as e:
+                console.print(f"[yellow]Aviso: Caché LLM no disponible ({e}).[/yellow]")
+                return None
+
+    def set(self, key: str, model: str, response: str):
+        """Guarda una respuesta y aplica la expulsión LRU si se supera el tamaño máximo."""
+        if not response:
+            return
+        now = time.time()
+        size = len(response.encode("utf-8"))
+        with self._lock:
+            try:
+                conn = self._connect()
+                try:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO llm_cache (key, model, response, size, created_at, last_access) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        (key, model, response, size, now, now)
+                    )
+                    self._evict(conn)
+                    conn.commit()
+                finally:
+                    conn.close()
+            except sqlite3.Error as e:
+                console.print(f"[yellow]Aviso: No se pudo escribir en la caché LLM ({e}).[/yellow]")
+
+    def _evict(self, conn: sqlite3.Connection):
+        """Elimina expiradas y, si el total supera max_bytes, las menos usadas recientemente."""
+        if self.ttl:
+            conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (time.time() - self.ttl,))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        target = int(self.max_bytes * EVICT_TARGET)
+        to_delete = []
+        for key, size in conn.execute("SELECT key, size FROM llm_cache ORDER BY last_access ASC"):
+            if total <= target:
+                break
+            to_delete.append((key,))
+            total -= size
+        conn.executemany("DELETE FROM llm_cache WHERE key = ?", to_delete)
+
+    # --- Helpers para los agentes ---
+
+    def cached_call(
+        self,
+        model: str,
+        prompt: str,
+        fn: Callable[[], Optional[str]],
+        temperature: Optional[float] = None,
+        schema: Any = None,
+        bypass: bool = False
+    ) -> Optional[str]:
+        """
+        Retorna la respuesta cacheada o ejecuta fn() (la llamada de red) y guarda su texto.
+        Las respuestas vacías/None no se cachean para poder reintentar.
+        """
+        if bypass or self.bypass:
+            return fn()
+        key = self.make_key(model, prompt, temperature, schema)
+        cached = self.get(key)
+        if cached is not None:
+            self.hits += 1
+            return cached
+        self.misses += 1
+        response = fn()
+        if response:
+            self.set(key, model, response)
+        return response
+
+    def lookup_any(
+        self,
+        models: Iterable[str],
+        prompt: str,
+        temperature: Optional[float] = None,
+        schema: Any = None,
+        bypass: bool = False
+    ) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Busca el prompt bajo cualquiera de los modelos de la cadena de fallback.
+        Retorna (modelo, respuesta) o (None, None). Evita re-llamar al modelo primario
+        si la respuesta original vino de un modelo secundario.
+        """
+        if bypass or self.bypass:
+            return None, None
+        for model in models:
+            cached = self.get(self.make_key(model, prompt, temperature, schema))
+            if cached is not None:
+                self.hits += 1
+                return model, cached
+        return None, None
+
+    def store(self, model: str, prompt: str, response: Optional[str], temperature: Optional[float] = None, schema: Any = None, bypass: bool = False):
+        """Registra un fallo de caché resuelto por red (complemento de lookup_any)."""
+        if bypass or self.bypass:
+            return
+        self.misses += 1
+        if response:
+            self.set(self.make_key(model, prompt, temperature, schema), model, response)
+
+    def stats(self) -> dict:
+        entries, total = 0, 0
+        with self._lock:
+            try:
+                conn = self._connect()
+                try:
+                    entries, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache").fetchone()
+                finally:
+                    conn.close()
+            except sqlite3.Error:
+                pass
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            "entries": entries,
+            "bytes": total,
+            "bypass": self.bypass,
+        }
+
+    def clear(self):
+        with self._lock:
+            conn = self._connect()
+            try:
+                conn.execute("DELETE FROM llm_cache")
+                conn.commit()
+            finally:
+                conn.close()
+
+    def print_stats(self):
+        s = self.stats()
+        if s["bypass"]:
+            console.print("[dim]Caché LLM desactivada (bypass).[/dim]")
+            return
+        console.print(
+            f"[dim]Caché LLM: {s['hits']} aciertos / {s['misses']} fallos "
+            f"({s['hit_rate']:.0%}) │ {s['entries']} entradas, {s['bytes'] / 1024 / 1024:.1f} MB[/dim]"
+        )
+
+llm_cache = LLMCache()
@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Optional, Dict, Any, Literal
+from typing import Optional, Dict, Any, List, Literal
 from pydantic import BaseModel, Field
 
 # Definición de tipos permitidos para el registro
@@ -21,6 +21,11 @@ class ResourceRecord(BaseModel):
     created_at: datetime = Field(default_factory=datetime.utcnow)
     modified_at: datetime = Field(default_factory=datetime.utcnow)
     last_viewed_at: Optional[datetime] = None
+    # Relaciones precargadas en lote por search_registry (with_tags / with_card_stats)
+    tags: List[str] = Field(default_factory=list, description="Valores de etiqueta del registro")
+    card_count: Optional[int] = Field(default=None, description="Total de flashcards hijas")
+    due_count: Optional[int] = Field(default=None, description="Flashcards pendientes de repaso")
+    similarity: Optional[float] = Field(default=None, description="Similitud coseno en búsquedas sim:")
 
 
 class NexusLink(BaseModel):
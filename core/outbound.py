@@ -0,0 +1,314 @@
+import os
+import time
+import random
+import asyncio
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from core import instrumentation
+
+# ----------------------------------------------------------------------------
+# Planificador de peticiones salientes compartido (YouTube, Gemini, DeepSeek, web).
+# Por proveedor: token bucket (ritmo sostenido + ráfaga), reintentos con backoff
+# exponencial y jitter ante 429/5xx/bloqueos, y un circuit breaker que deja de
+# llamar a un proveedor caído durante un tiempo. Seguro entre hilos; acall() para
+# código asyncio (ingest_engine).
+# ----------------------------------------------------------------------------
+
+@dataclass(frozen=True)
+class ProviderPolicy:
+    rate: float                   # Peticiones por segundo sostenidas
+    burst: int                    # Ráfaga máxima (capacidad del bucket)
+    max_retries: int = 3
+    base_delay: float = 1.0       # Backoff: base * 2^intento, con jitter completo
+    max_delay: float = 60.0
+    failure_threshold: int = 5    # Fallos consecutivos que abren el circuito
+    reset_timeout: float = 60.0   # Segundos con el circuito abierto antes de probar de nuevo
+
+DEFAULT_POLICIES: Dict[str, ProviderPolicy] = {
+    # yt-dlp + transcripciones: los bloqueos de IP duran, mejor pausar que insistir
+    "youtube": ProviderPolicy(rate=1.0, burst=3, max_retries=3, base_delay=5.0, max_delay=120.0,
+                              failure_threshold=3, reset_timeout=300.0),
+    "youtube_api": ProviderPolicy(rate=5.0, burst=10),
+    # Nivel gratuito de Gemini: ~15 peticiones/minuto
+    "gemini": ProviderPolicy(rate=0.25, burst=3, base_delay=2.0),
+    "deepseek": ProviderPolicy(rate=1.0, burst=4, base_delay=2.0),
+    "web": ProviderPolicy(rate=8.0, burst=16, max_retries=2, max_delay=20.0, failure_threshold=20, reset_timeout=30.0),
+}
+
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+# Excepciones sin código HTTP que indican saturación o red (por nombre: no importamos cada librería)
+RETRYABLE_NAMES = {
+    "Timeout", "ConnectTimeout", "ReadTimeout", "ConnectionError", "ConnectError", "ReadError",
+    "RemoteProtocolError", "TransportError", "RemoteDisconnected",
+    "RequestBlocked", "IpBlocked", "TooManyRequests", "YouTubeRequestFailed",
+}
+THROTTLE_HINTS = ("429", "too many requests", "rate limit", "quota", "ipblocked", "requestblocked")
+
+class CircuitOpenError(RuntimeError):
+    """El proveedor acumuló fallos y su circuito está abierto: no se hace la llamada."""
+
+class TokenBucket:
+    """
+    Token bucket con reservas: cada llamada descuenta su ficha de inmediato (aunque
+    deje el saldo en negativo) y recibe cuánto debe esperar. Así los llamadores
+    concurrentes quedan espaciados al ritmo del proveedor sin despertar a la vez.
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = float(capacity)
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, tokens: float = 1.0) -> float:
+        """Toma 'tokens' y retorna los segundos de espera antes de usarlos."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens -= tokens
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def penalize(self, seconds: float):
+        """Vacía el bucket y lo endeuda 'seconds' (p. ej. tras un 429 con Retry-After)."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self._tokens, 0.0) - seconds * self.rate
+
+    @property
+    def available(self) -> float:
+        with self._lock:
+            self._refill(time.monotonic())
+            return self._tokens
+
+class CircuitBreaker:
+    """closed -> (N fallos) -> open -> (reset_timeout) -> half_open -> 1 prueba -> closed/open."""
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open":
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self.state = "half_open"
+                self._probe_in_flight = False
+            # half_open: una sola petición de prueba a la vez
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self) -> bool:
+        """Retorna True si este fallo abre el circuito."""
+        with self._lock:
+            self.failures += 1
+            self._probe_in_flight = False
+            if self.state == "half_open" or (self.state == "closed" and self.failures >= self.failure_threshold):
+                self.state = "open"
+                self._opened_at = time.monotonic()
+                return True
+            return False
+
+    def retry_in(self) -> float:
+        with self._lock:
+            if self.state != "open":
+                return 0.0
+            return max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+
+class _Provider:
+    __slots__ = ("name", "policy", "bucket", "breaker", "stats")
+
+    def __init__(self, name: str, policy: ProviderPolicy):
+        self.name = name
+        self.policy = policy
+        self.bucket = TokenBucket(policy.rate, policy.burst)
+        self.breaker = CircuitBreaker(policy.failure_threshold, policy.reset_timeout)
+        self.stats = {"ok": 0, "retries": 0, "errors": 0, "rejected": 0, "throttled": 0, "waited_s": 0.0}
+
+def _policy_from_env(name: str, policy: ProviderPolicy) -> ProviderPolicy:
+    """NEXUS_RATE_<PROVEEDOR>='ritmo/ráfaga' (ej. NEXUS_RATE_GEMINI=0.5/5) ajusta los límites."""
+    raw = os.environ.get(f"NEXUS_RATE_{name.upper()}")
+    if not raw:
+        return policy
+    try:
+        rate, _, burst = raw.partition("/")
+        return ProviderPolicy(**{**policy.__dict__, "rate": float(rate), "burst": int(burst or policy.burst)})
+    except ValueError:
+        return policy
+
+def classify_error(exc: BaseException) -> Tuple[bool, bool, Optional[float]]:
+    """
+    (reintentable, es_limitación, retry_after) para una excepción de cualquier cliente
+    (requests, httpx, google-genai, youtube-transcript-api, yt-dlp).
+    """
+    response = getattr(exc, "response", None)
+    status = getattr(response, "status_code", None)
+    if status is None:
+        code = getattr(exc, "code", None) or getattr(exc, "status_code", None)
+        status = code if isinstance(code, int) else None
+
+    retry_after = None
+    headers = getattr(response, "headers", None)
+    if headers is not None:
+        try:
+            retry_after = float(headers.get("Retry-After"))
+        except (TypeError, ValueError):
+            retry_after = None
+
+    message = f"{type(exc).__name__} {exc}".lower()
+    throttled = status == 429 or any(hint in message for hint in THROTTLE_HINTS)
+    if status is not None:
+        return status in RETRYABLE_STATUS, throttled, retry_after
+    if throttled or type(exc).__name__ in RETRYABLE_NAMES or isinstance(exc, (TimeoutError, ConnectionError)):
+        return True, throttled, retry_after
+    return False, False, None
+
+class OutboundScheduler:
+    """Registro de proveedores y punto único de paso de las llamadas salientes."""
+
+    def __init__(self, policies: Optional[Dict[str, ProviderPolicy]] = None):
+        self._policies = dict(policies or DEFAULT_POLICIES)
+        self._providers: Dict[str, _Provider] = {}
+        self._lock = threading.Lock()
+
+    def provider(self, name: str) -> _Provider:
+        with self._lock:
+            p = self._providers.get(name)
+            if p is None:
+                policy = _policy_from_env(name, self._policies.get(name, DEFAULT_POLICIES["web"]))
+                p = self._providers[name] = _Provider(name, policy)
+            return p
+
+    # --- Lógica común síncrona / asíncrona ---------------------------------
+
+    def _admit(self, p: _Provider) -> float:
+        """Comprueba el circuito y reserva una ficha. Retorna la espera en segundos."""
+        if not p.breaker.allow():
+            p.stats["rejected"] += 1
+            instrumentation.count("outbound_requests", provider=p.name, outcome="rejected")
+            raise CircuitOpenError(
+                f"Circuito abierto para '{p.name}' tras {p.breaker.failures} fallos; "
+                f"reintento en {p.breaker.retry_in():.0f}s"
+            )
+        wait = p.bucket.reserve()
+        if wait > 0:
+            p.stats["waited_s"] += wait
+            instrumentation.observe("outbound_wait", wait, provider=p.name)
+        return wait
+
+    def _on_success(self, p: _Provider, elapsed: float):
+        p.breaker.record_success()
+        p.stats["ok"] += 1
+        instrumentation.count("outbound_requests", provider=p.name, outcome="ok")
+        instrumentation.observe("outbound_request", elapsed, provider=p.name)
+
+    def _on_failure(self, p: _Provider, exc: BaseException, attempt: int) -> float:
+        """Registra el fallo; retorna el backoff antes del siguiente intento o relanza 'exc'."""
+        retryable, throttled, retry_after = classify_error(exc)
+        if not retryable:
+            # Error del cliente (4xx, sin transcripción...): el proveedor está sano
+            p.breaker.record_success()
+            p.stats["errors"] += 1
+            instrumentation.count("outbound_requests", provider=p.name, outcome="client_error")
+            raise exc
+
+        if p.breaker.record_failure():
+            instrumentation.count("outbound_circuit_open", provider=p.name)
+        delay = min(p.policy.max_delay, p.policy.base_delay * (2 ** attempt))
+        delay = random.uniform(0, delay)  # Jitter completo: evita reintentos sincronizados
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, p.policy.max_delay))
+        if throttled:
+            # El proveedor pidió frenar: frena a todos los llamadores, no solo a este
+            p.stats["throttled"] += 1
+            p.bucket.penalize(delay)
+
+        if attempt >= p.policy.max_retries or p.breaker.state == "open":
+            p.stats["errors"] += 1
+            instrumentation.count("outbound_requests", provider=p.name, outcome="error")
+            raise exc
+        p.stats["retries"] += 1
+        instrumentation.count("outbound_requests", provider=p.name, outcome="retry")
+        return delay
+
+    # --- API pública -------------------------------------------------------
+
+    def call(self, provider: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Ejecuta fn(*args, **kwargs) respetando el ritmo, reintentos y circuito de 'provider'."""
+        p = self.provider(provider)
+        attempt = 0
+        while True:
+            wait = self._admit(p)
+            if wait > 0:
+                time.sleep(wait)
+            start = time.perf_counter()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as exc:
+                time.sleep(self._on_failure(p, exc, attempt))
+                attempt += 1
+                continue
+            self._on_success(p, time.perf_counter() - start)
+            return result
+
+    async def acall(self, provider: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Versión asyncio de call(): fn debe retornar un awaitable."""
+        p = self.provider(provider)
+        attempt = 0
+        while True:
+            wait = self._admit(p)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            start = time.perf_counter()
+            try:
+                result = await fn(*args, **kwargs)
+            except Exception as exc:
+                await asyncio.sleep(self._on_failure(p, exc, attempt))
+                attempt += 1
+                continue
+            self._on_success(p, time.perf_counter() - start)
+            return result
+
+    def is_open(self, provider: str) -> bool:
+        """True si el circuito de 'provider' está abierto (las llamadas se rechazarían)."""
+        return self.provider(provider).breaker.retry_in() > 0
+
+    def stats(self) -> Dict[str, dict]:
+        """Estado por proveedor (circuito, fichas disponibles y contadores) para el TUI y la API."""
+        with self._lock:
+            providers = list(self._providers.values())
+        return {
+            p.name: {
+                "state": p.breaker.state,
+                "retry_in_s": round(p.breaker.retry_in(), 1),
+                "tokens": round(p.bucket.available, 2),
+                "rate": p.policy.rate,
+                "burst": p.policy.burst,
+                **{k: (round(v, 2) if isinstance(v, float) else v) for k, v in p.stats.items()},
+            }
+            for p in providers
+        }
+
+# Instancia compartida por agentes, scraper y motores de ingesta
+outbound = OutboundScheduler()
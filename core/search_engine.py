@@ -1,15 +1,157 @@
-from typing import Optional, List
-from sqlalchemy import or_, and_, not_, func
-from sqlalchemy.orm import Session
+import json
+import base64
+from datetime import datetime, timezone
+from typing import Optional, List, Tuple
+from sqlalchemy import or_, and_, not_, func, text, case, Integer, Float
+from sqlalchemy.orm import Session, selectinload
 
-from core.database import Registry, Tag
+from core.database import Registry, RegistryContent, Tag, Card, FTS_TABLE, BULK_IN_CHUNK, engine as main_engine
 from core.models import ResourceRecord
+from core.instrumentation import timed
 
+# Cache por URL de engine: ¿existe el índice FTS5 en esa BD? (Postgres/Staging no lo tienen)
+_fts_available_cache = {}
+
+def fts_available(db_session: Session) -> bool:
+    """Indica si la BD de la sesión tiene el índice FTS5 'registry_fts' disponible."""
+    bind = db_session.get_bind()
+    key = str(bind.url)
+    if key not in _fts_available_cache:
+        if bind.dialect.name != 'sqlite':
+            _fts_available_cache[key] = False
+        else:
+            row = db_session.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type='table' AND name=:n"), {"n": FTS_TABLE}
+            ).first()
+            _fts_available_cache[key] = row is not None
+    return _fts_available_cache[key]
+
+def build_fts_match(terms: List[str]) -> str:
+    """
+    Convierte términos de usuario en una expresión MATCH de FTS5 segura.
+    Cada término se cita como frase (escapando comillas) y se busca por prefijo;
+    varios términos se combinan con AND implícito.
+    """
+    phrases = []
+    for term in terms:
+        tokens = term.replace('"', ' ').split()
+        if tokens:
+            phrases.append('"' + " ".join(tokens) + '"*')
+    return " ".join(phrases)
+
+# ----------------------------------------------------------------------------
+# Paginación por cursor (keyset)
+# ----------------------------------------------------------------------------
+# Cada modo de orden tiene una clave total (columna, id). El cursor guarda la clave
+# del último registro entregado, así la página N cuesta lo mismo que la página 1
+# y los empates en modified_at ya no reordenan resultados entre páginas.
+# Los modos 'rank' (FTS bm25) y 'sim' (similitud vectorial) no tienen clave
+# persistente: su cursor guarda un offset.
+
+SORT_MODES = ('modified', 'vdesc', 'vasc', 'rank', 'sim')
+OFFSET_MODES = ('rank', 'sim')
+SIM_TOP_K = 200  # Candidatos del índice vectorial que pasan a los filtros SQL (sim:)
+
+def _sort_mode(db_session: Session, order_by: Optional[str], inc_content: Optional[str], similar_to: Optional[str] = None) -> str:
+    if order_by in ('vdesc', 'vasc'):
+        return order_by
+    if similar_to and similar_to.strip():
+        return 'sim'
+    if inc_content:
+        terms = [t.strip() for t in inc_content.split(',') if t.strip()]
+        if build_fts_match(terms) and fts_available(db_session):
+            return 'rank'
+    return 'modified'
+
+def encode_cursor(mode: str, value=None, last_id: Optional[int] = None, offset: Optional[int] = None) -> str:
+    """Serializa la posición de paginación como token opaco (base64 url-safe)."""
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    payload = {"m": mode, "v": value, "i": last_id} if mode not in OFFSET_MODES else {"m": mode, "o": offset}
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor: str) -> dict:
+    """Decodifica un cursor. Lanza ValueError si el token está corrupto o manipulado."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        data = json.loads(raw)
+        if data.get("m") not in SORT_MODES:
+            raise ValueError
+        if data["m"] in OFFSET_MODES:
+            data["o"] = int(data.get("o") or 0)
+        else:
+            data["i"] = int(data["i"])
+            if data.get("v") is not None:
+                data["v"] = datetime.fromisoformat(data["v"])
+        return data
+    except Exception:
+        raise ValueError("Cursor de paginación inválido")
+
+def _keyset_segments(column, descending: bool, value, last_id: int) -> list:
+    """
+    Predicados 'después de (value, last_id)' como segmentos que se consultan en orden.
+    Los NULL van al final en DESC y al principio en ASC (convención de SQLite); en vez de
+    un OR con 'IS NULL' (que obliga a recorrer el índice completo) cada región se consulta
+    por separado, de modo que cada segmento es una búsqueda por rango sobre el índice.
+    """
+    if descending:
+        if value is None:
+            return [and_(column.is_(None), Registry.id < last_id)]
+        return [
+            and_(column <= value, or_(column < value, Registry.id < last_id)),
+            column.is_(None)
+        ]
+    if value is None:
+        return [and_(column.is_(None), Registry.id > last_id), column.isnot(None)]
+    return [and_(column >= value, or_(column > value, Registry.id > last_id))]
+
+@timed("search_attach_relations")
+def attach_relations(
+    db_session: Session,
+    records: List[ResourceRecord],
+    with_tags: bool = True,
+    with_card_stats: bool = False
+) -> List[ResourceRecord]:
+    """
+    Completa tags / card_count / due_count de una página de ResourceRecord con
+    una consulta agrupada IN(...) por relación (en vez de una consulta por fila).
+    """
+    if not records or not (with_tags or with_card_stats):
+        return records
+    by_id = {r.id: r for r in records}
+    ids = list(by_id)
+
+    for i in range(0, len(ids), BULK_IN_CHUNK):
+        chunk = ids[i:i + BULK_IN_CHUNK]
+        if with_tags:
+            for registry_id, value in db_session.query(Tag.registry_id, Tag.value).filter(
+                Tag.registry_id.in_(chunk)
+            ).order_by(Tag.registry_id, Tag.value):
+                by_id[registry_id].tags.append(value)
+
+        if with_card_stats:
+            now = datetime.now(timezone.utc)
+            due_expr = case(((Card.next_review == None) | (Card.next_review <= now), 1), else_=0)
+            stats = dict(
+                (parent_id, (total, due or 0)) for parent_id, total, due in db_session.query(
+                    Card.parent_id, func.count(Card.id), func.sum(due_expr)
+                ).filter(Card.parent_id.in_(chunk)).group_by(Card.parent_id)
+            )
+            for registry_id in chunk:
+                total, due = stats.get(registry_id, (0, 0))
+                by_id[registry_id].card_count = total
+                by_id[registry_id].due_count = int(due)
+
+    return records
+
+@timed("search_registry")
 def search_registry(
     db_session: Session,
     type_filter: Optional[str] = None,
     inc_name_path: Optional[str] = None,
     exc_name_path: Optional[str] = None,
+    inc_content: Optional[str] = None,
     inc_tags: Optional[str] = None,
     exc_tags: Optional[str] = None,
     inc_extensions: Optional[List[str]] = None,
@@ -18,15 +160,33 @@ def search_registry(
     record_ids_str: Optional[str] = None,
     is_flashcard_source: Optional[str] = None,
     order_by: Optional[str] = None,
+    similar_to: Optional[str] = None,
     limit: int = 50,
-    offset: int = 0
+    offset: int = 0,
+    cursor: Optional[str] = None,
+    with_tags: bool = False,
+    with_card_stats: bool = False,
+    with_content: bool = True
 ) -> List[ResourceRecord]:
     """
     Motor maestro de búsqueda para Nexus.
     Retorna siempre una lista de instancias Pydantic ResourceRecord.
     Soporta Inclusión, Exclusión, tags especiales (__web__) y filtros de contenido.
+    'inc_content' usa el índice FTS5 (ranking bm25) sobre título, ruta, contenido y resumen;
+    si la BD no tiene FTS5 cae a ILIKE sobre las mismas columnas.
+    'similar_to' (prefijo sim:) restringe a los SIM_TOP_K registros más parecidos a un
+    texto o a unos IDs según el índice vectorial (core.embeddings) y ordena por similitud.
+    'cursor' (ver search_registry_page) sustituye a 'offset' con paginación keyset.
+    'with_tags' / 'with_card_stats' precargan etiquetas y conteos de tarjetas en lote.
+    'with_content' carga content_raw (registry_content) solo para la página, en una consulta;
+    con False los registros llegan sin él.
     """
     query = db_session.query(Registry)
+    if with_content:
+        query = query.options(selectinload(Registry.text_row))
+    fts_rank = None
+    sim_order = None
+    sim_scores = {}
 
     # 1. Filtro estricto por Tipo (file, youtube, note, etc.)
     if type_filter:
@@ -54,6 +214,42 @@ def search_registry(
                 )
             )
 
+    # 2b. Búsqueda de texto completo (prefijo c:) — FTS5 con ranking bm25
+    if inc_content:
+        content_terms = [t.strip() for t in inc_content.split(',') if t.strip()]
+        match_expr = build_fts_match(content_terms)
+        if match_expr and fts_available(db_session):
+            fts_sub = text(
+                f"SELECT rowid AS registry_id, bm25({FTS_TABLE}) AS rank "
+                f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :fts_match"
+            ).bindparams(fts_match=match_expr).columns(registry_id=Integer, rank=Float).subquery('fts')
+            query = query.join(fts_sub, fts_sub.c.registry_id == Registry.id)
+            fts_rank = fts_sub.c.rank
+        else:
+            # Fallback: semántica de subcadena original
+            for term in content_terms:
+                query = query.filter(
+                    or_(
+                        Registry.title.ilike(f"%{term}%"),
+                        Registry.path_url.ilike(f"%{term}%"),
+                        Registry.content_raw.ilike(f"%{term}%"),
+                        Registry.summary.ilike(f"%{term}%")
+                    )
+                )
+
+    # 2c. Similitud semántica (prefijo sim:) — top-k del índice vectorial
+    # El índice es el de nexus.db y aquí solo se lee: lo refresca watch_writes en segundo plano
+    if similar_to and similar_to.strip():
+        if db_session.get_bind().url != main_engine.url:
+            raise ValueError("La búsqueda sim: solo está disponible sobre la base de datos principal (nexus.db)")
+        from core.embeddings import embedding_store
+        ranking = embedding_store.search(similar_to, k=SIM_TOP_K, refresh_limit=0)
+        sim_scores = dict(ranking)
+        if not ranking:
+            return []
+        query = query.filter(Registry.id.in_(list(sim_scores)))
+        sim_order = case({rid: pos for pos, (rid, _) in enumerate(ranking)}, value=Registry.id)
+
     # 3. Etiquetas (Inclusiones y Exclusiones)
     # Se usan Subqueries IN() y NOT IN() hacia la tabla Tag para máxima optimización y precisión
     if inc_tags:
@@ -122,12 +318,14 @@ def search_registry(
     # 5. Tiene Información (has_info) -> 's' o 'n'
     if has_info:
         has_info_val = has_info.lower().strip()
+        # Texto no vacío sin descomprimir: la cadena vacía se guarda siempre como b''
+        has_text = db_session.query(RegistryContent.registry_id).filter(func.length(RegistryContent.content_z) > 0)
         if has_info_val == 's':
             # 's': Obliga a que tenga 'content_raw' y no esté vacío, O tenga alguna etiqueta asociada en Tag.
             # Según tu Blueprint es "Registros que sí tengan content_raw o metadata de tags"
             query = query.filter(
                 or_(
-                    and_(Registry.content_raw.isnot(None), Registry.content_raw != ""),
+                    Registry.id.in_(has_text),
                     Registry.id.in_(db_session.query(Tag.registry_id))
                 )
             )
@@ -135,7 +333,7 @@ def search_registry(
             # 'n': Son únicamente archivos de indexado rápido "crudos", sin raw description ni tags.
             query = query.filter(
                 and_(
-                    or_(Registry.content_raw.is_(None), Registry.content_raw == ""),
+                    not_(Registry.id.in_(has_text)),
                     not_(Registry.id.in_(db_session.query(Tag.registry_id)))
                 )
             )
@@ -176,18 +374,44 @@ def search_registry(
                 not_(Registry.id.in_(db_session.query(Card.parent_id)))
             ))
 
-    # 8. Paginador y Orden (Dinámico)
-    if order_by == 'vdesc':
-        query = query.order_by(Registry.last_viewed_at.desc().nulls_last())
-    elif order_by == 'vasc':
-        query = query.order_by(Registry.last_viewed_at.asc().nulls_first())
+    # 8. Paginador y Orden (Dinámico). 'id' desempata para que el orden sea total y estable.
+    if order_by in ('vdesc', 'vasc'):
+        mode = order_by
+    elif sim_order is not None:
+        mode = 'sim'
+    elif fts_rank is not None:
+        mode = 'rank'
     else:
-        query = query.order_by(Registry.modified_at.desc())
-        
-    query = query.limit(limit).offset(offset)
-    
+        mode = _sort_mode(db_session, order_by, None)
+    position = decode_cursor(cursor) if cursor else None
+    if position and position["m"] != mode:
+        raise ValueError("El cursor no corresponde al orden solicitado")
+
+    if mode == 'vdesc':
+        query = query.order_by(Registry.last_viewed_at.desc().nulls_last(), Registry.id.desc())
+    elif mode == 'vasc':
+        query = query.order_by(Registry.last_viewed_at.asc().nulls_first(), Registry.id.asc())
+    elif mode == 'sim':
+        query = query.order_by(sim_order.asc(), Registry.id.desc())
+    elif mode == 'rank':
+        # bm25 devuelve valores negativos: menor = más relevante
+        query = query.order_by(fts_rank.asc(), Registry.modified_at.desc(), Registry.id.desc())
+    else:
+        query = query.order_by(Registry.modified_at.desc(), Registry.id.desc())
+
     # 9. Ejecución SQL
-    results = query.all()
+    if position and mode not in OFFSET_MODES:
+        column = Registry.modified_at if mode == 'modified' else Registry.last_viewed_at
+        results = []
+        for segment in _keyset_segments(column, mode != 'vasc', position["v"], position["i"]):
+            remaining = None if limit is None else limit - len(results)
+            if remaining is not None and remaining <= 0:
+                break
+            results.extend(query.filter(segment).limit(remaining).all())
+    else:
+        if position:
+            offset = position["o"]
+        results = query.limit(limit).offset(offset).all()
     
     # 10. Mapeo estricto a Pydantic (Tal y como nos pidió la Base)
     pydantic_results: List[ResourceRecord] = []
@@ -199,22 +423,52 @@ def search_registry(
             type=row.type,
             title=row.title or "",
             path_url=row.path_url or "",
-            content_raw=row.content_raw,
+            content_raw=row.content_raw if with_content else None,
             metadata_dict=meta,
             is_flashcard_source=bool(row.is_flashcard_source),
             created_at=row.created_at,
             modified_at=row.modified_at,
-            last_viewed_at=row.last_viewed_at
+            last_viewed_at=row.last_viewed_at,
+            similarity=sim_scores.get(row.id)
         )
         pydantic_results.append(rr)
 
-    return pydantic_results
+    # 11. Relaciones en lote (una consulta por relación para toda la página)
+    return attach_relations(db_session, pydantic_results, with_tags=with_tags, with_card_stats=with_card_stats)
+
+def search_registry_page(
+    db_session: Session,
+    page_size: int = 50,
+    cursor: Optional[str] = None,
+    **filters
+) -> Tuple[List[ResourceRecord], Optional[str]]:
+    """
+    Una página de search_registry con paginación keyset.
+    Retorna (registros, cursor_siguiente); cursor_siguiente es None en la última página.
+    'filters' acepta los mismos argumentos de filtro que search_registry.
+    """
+    filters.pop('limit', None)
+    filters.pop('offset', None)
+    rows = search_registry(db_session, limit=page_size + 1, cursor=cursor, **filters)
+    if len(rows) <= page_size:
+        return rows, None
+
+    rows = rows[:page_size]
+    mode = _sort_mode(db_session, filters.get('order_by'), filters.get('inc_content'), filters.get('similar_to'))
+    last = rows[-1]
+    if mode in OFFSET_MODES:
+        prev_offset = decode_cursor(cursor)["o"] if cursor else 0
+        return rows, encode_cursor(mode, offset=prev_offset + page_size)
+    value = last.modified_at if mode == 'modified' else last.last_viewed_at
+    return rows, encode_cursor(mode, value, last.id)
 
 def parse_query_string(query_str: str) -> dict:
     """
     Parses a smart query string into a dict of filters for search_registry.
     Example: 'python t:docs e:pdf -t:old i:1-50'
     - Default/No prefix: inc_name
+    - c: Texto completo (contenido/resumen) con ranking bm25
+    - sim: Similitud semántica con un registro (sim:42) o un texto (sim:redes,neuronales)
     - t: Tag to include
     - -t: Tag to exclude
     - e: Extension to include
@@ -223,16 +477,18 @@ def parse_query_string(query_str: str) -> dict:
     - s: Source (s:y, s:n)
     """
     filters = {
-        'inc_name': [], 'exc_name': [], 
+        'inc_name': [], 'exc_name': [], 'inc_content': [],
         'inc_tags': [], 'exc_tags': [],
         'inc_exts': [], 'exc_exts': [],
         'inc_ids': "", 'is_source': "",
-        'has_info': "", 'order_by': ""
+        'has_info': "", 'order_by': "", 'similar': []
     }
     
     parts = query_str.split()
     for p in parts:
-        if p.startswith('t:'):
+        if p.startswith('sim:'):
+            filters['similar'].append(p[4:])
+        elif p.startswith('t:'):
             filters['inc_tags'].append(p[2:])
         elif p.startswith('-t:'):
             filters['exc_tags'].append(p[3:])
@@ -240,6 +496,8 @@ def parse_query_string(query_str: str) -> dict:
             filters['inc_exts'].append(p[2:])
         elif p.startswith('-e:'):
             filters['exc_exts'].append(p[3:])
+        elif p.startswith('c:'):
+            filters['inc_content'].append(p[2:])
         elif p.startswith('i:'):
             filters['inc_ids'] = p[2:]
         elif p.startswith('s:'):
@@ -261,6 +519,7 @@ def parse_query_string(query_str: str) -> dict:
     return {
         'inc_name': ",".join(filters['inc_name']),
         'exc_name': ",".join(filters['exc_name']),
+        'inc_content': ",".join(filters['inc_content']),
         'inc_tags': ",".join(filters['inc_tags']),
         'exc_tags': ",".join(filters['exc_tags']),
         'inc_exts': ",".join(filters['inc_exts']),
@@ -268,5 +527,6 @@ def parse_query_string(query_str: str) -> dict:
         'inc_ids': filters['inc_ids'],
         'is_source': filters['is_source'],
         'has_info': filters['has_info'],
-        'order_by': filters['order_by']
+        'order_by': filters['order_by'],
+        'similar': ",".join(filters['similar'])
     }
@@ -4,7 +4,7 @@ from datetime import datetime
 from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.engine import Engine
-from core.database import Base, NexusCRUD, Registry, RegistryCreate, nx_db
+from core.database import Base, NexusCRUD, Registry, RegistryCreate, nx_db, ensure_fingerprint_columns, ensure_content_table, register_sql_functions
 from rich.console import Console
 
 console = Console()
@@ -33,6 +33,8 @@ def set_sqlite_pragma(dbapi_connection, connection_record):
     cursor.execute("PRAGMA journal_mode=WAL")
     cursor.execute("PRAGMA foreign_keys=ON")
     cursor.close()
+    # content_raw/summary se filtran con nexus_text() (texto comprimido)
+    register_sql_functions(dbapi_connection)
 
 # Session y CRUD para Staging
 if staging_engine:
@@ -64,9 +66,18 @@ class StagingCRUD(NexusCRUD):
             return None
         return super().get_registry(registry_id)
 
+    def find_registry_by_url(self, url):
+        if self.Session is None:
+            return None
+        return super().find_registry_by_url(url)
+
     def init_staging(self):
         if staging_engine:
             Base.metadata.create_all(bind=staging_engine)
+            # Buffers creados antes de las columnas de huella o del texto comprimido
+            with staging_engine.connect() as conn:
+                ensure_fingerprint_columns(conn)
+                ensure_content_table(conn)
             return True
         return False
 
@@ -0,0 +1,383 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import and_, bindparam, case, delete, func, not_, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from core.database import SessionLocal, Registry, RegistryContent, Card, AIBatchJob, CardCreate, nx_db, BULK_IN_CHUNK, nexus_text
+from core.fingerprint import fingerprint_fields
+from core.instrumentation import timed
+from core.outbound import outbound, CircuitOpenError
+from rich.console import Console
+
+console = Console()
+
+# ----------------------------------------------------------------------------
+# Procesador de IA por lotes (optimizar_ia, reprocesar_fallidos).
+# - Clasificación del trabajo con una sola consulta agrupada (sin COUNT por registro).
+# - Llamadas al LLM en paralelo acotado (hilos); el ritmo por proveedor lo pone core.outbound.
+# - Resultados persistidos en transacciones por lotes desde un único hilo escritor.
+# - Checkpoint en la tabla ai_batch_jobs: un corte no pierde lo ya guardado y los
+#   registros que fallan repetidamente dejan de reintentarse.
+# ----------------------------------------------------------------------------
+
+DEFAULT_WORKERS = 8        # Llamadas simultáneas (DeepSeek tarda decenas de segundos por respuesta)
+DEFAULT_COMMIT_EVERY = 20  # Resultados por transacción de escritura
+MAX_ATTEMPTS = 3           # Fallos tras los que un registro se salta en siguientes pasadas
+LOAD_CHUNK = 100           # Registros cuyo contenido se carga de la BD a la vez
+
+TASKS = ("FULL_IA", "ONLY_CARDS", "REPROCESS")
+
+@dataclass
+class BatchResult:
+    """Salida de un handler para un registro. Solo se escriben los campos no nulos."""
+    registry_id: int
+    task: str
+    ok: bool
+    summary: Optional[str] = None
+    cards: List[dict] = field(default_factory=list)
+    content_raw: Optional[str] = None
+    title: Optional[str] = None
+    error: Optional[str] = None
+    deferred: bool = False  # No se llegó a intentar (circuito abierto): sigue 'pending' sin gastar intento
+
+@dataclass
+class BatchReport:
+    """Resultado de una pasada del procesador."""
+    planned: int = 0
+    skipped: int = 0        # Fallidos MAX_ATTEMPTS veces en pasadas anteriores
+    done: int = 0
+    failed: int = 0
+    deferred: int = 0       # Pendientes para la próxima pasada por circuito abierto
+    cards: int = 0
+    interrupted: bool = False
+    halted: Optional[str] = None  # Motivo si se dejó de enviar trabajo (proveedor caído)
+    elapsed_s: float = 0.0
+
+# ----------------------------------------------------------------------------
+# 1. Clasificación
+# ----------------------------------------------------------------------------
+
+def _has_transcript(content_raw):
+    return and_(
+        content_raw.is_not(None),
+        func.length(content_raw) > 200,
+        content_raw.not_like('%Transcripcion Disponible%'),
+        content_raw.not_like('%Transcripción Disponible%'),
+        content_raw.not_like('%IpBlocked%'),
+    )
+
+def _has_summary(summary):
+    return and_(
+        summary.is_not(None),
+        func.length(summary) > 50,
+        summary.not_like('%Sin resumen%'),
+    )
+
+def _texts_cte(registry_type: str):
+    """
+    content_raw/summary descomprimidos una sola vez por registro del tipo (CTE materializada):
+    los filtros de abajo los citan varias veces y cada cita de Registry.content_raw descomprimiría de nuevo.
+    """
+    return (
+        select(
+            RegistryContent.registry_id,
+            nexus_text(RegistryContent.content_z, RegistryContent.codec).label("content_raw"),
+            nexus_text(RegistryContent.summary_z, RegistryContent.codec).label("summary"),
+        )
+        .join(Registry, Registry.id == RegistryContent.registry_id)
+        .where(Registry.type == registry_type)
+        .cte("texts")
+        .prefix_with("MATERIALIZED")
+    )
+
+def classify_ai_work(session, registry_type: str = "youtube") -> List[Tuple[int, str]]:
+    """
+    (registry_id, tarea) de los registros con transcripción útil a los que les falta IA:
+    FULL_IA si no tienen resumen, ONLY_CARDS si tienen resumen pero ninguna tarjeta.
+    Una consulta: el recuento de tarjetas va en una subconsulta agrupada.
+    """
+    card_counts = (
+        select(Card.parent_id, func.count(Card.id).label("n"))
+        .group_by(Card.parent_id)
+        .subquery()
+    )
+    # Sin fila de texto no hay transcripción: basta recorrer la CTE
+    texts = _texts_cte(registry_type)
+    has_transcript = _has_transcript(texts.c.content_raw)
+    job = case(
+        (and_(has_transcript, not_(_has_summary(texts.c.summary))), "FULL_IA"),
+        (and_(has_transcript, func.coalesce(card_counts.c.n, 0) == 0), "ONLY_CARDS"),
+        else_=None
+    )
+    rows = session.execute(
+        select(texts.c.registry_id, job.label("job"))
+        .outerjoin(card_counts, card_counts.c.parent_id == texts.c.registry_id)
+        .order_by(texts.c.registry_id)
+    ).all()
+    return [(rid, task) for rid, task in rows if task]
+
+def classify_failed_videos(session) -> List[Tuple[int, str]]:
+    """Videos bloqueados, sin transcripción o sin resumen (tarea REPROCESS: re-scraping + IA)."""
+    texts = _texts_cte('youtube')
+    ids = session.scalars(
+        select(Registry.id).outerjoin(texts, texts.c.registry_id == Registry.id).where(
+            Registry.type == 'youtube',
+            texts.c.content_raw.like('%IpBlocked%')
+            | texts.c.content_raw.like('%Sin Transcripción Disponible%')
+            | texts.c.summary.is_(None)
+            | (texts.c.summary == '')
+        ).order_by(Registry.id)
+    ).all()
+    return [(rid, "REPROCESS") for rid in ids]
+
+# ----------------------------------------------------------------------------
+# 2. Handlers (se ejecutan en hilos del pool: sin acceso a la BD)
+# ----------------------------------------------------------------------------
+
+def valid_cards(cards) -> List[dict]:
+    """Flashcards con pregunta y respuesta no vacías (descarta lo que el LLM devuelva mal formado)."""
+    if not isinstance(cards, list):
+        return []
+    return [
+        c for c in cards
+        if isinstance(c, dict) and str(c.get('question') or '').strip() and str(c.get('answer') or '').strip()
+    ]
+
+def deepseek_handler(item: dict) -> BatchResult:
+    """FULL_IA / ONLY_CARDS con DeepSeek sobre el contenido ya guardado."""
+    from agents.deepseek_agent import deepseek_agent
+    resumen, cards = deepseek_agent.process_content(item['title'] or "", item['content_raw'] or "")
+    if resumen is None and outbound.is_open("deepseek"):
+        # El agente traga la excepción: sin esto, cada registro gastaría un intento contra un proveedor caído
+        raise CircuitOpenError("Circuito de DeepSeek abierto")
+    cards = valid_cards(cards)
+    if item['task'] == "FULL_IA":
+        if resumen and "Sin resumen" not in resumen:
+            return BatchResult(item['id'], item['task'], True, summary=resumen, cards=cards)
+        return BatchResult(item['id'], item['task'], False, error="DeepSeek no generó un resumen útil")
+    if cards:
+        return BatchResult(item['id'], item['task'], True, cards=cards)
+    return BatchResult(item['id'], item['task'], False, error="DeepSeek no generó flashcards")
+
+# ----------------------------------------------------------------------------
+# 3. Procesador
+# ----------------------------------------------------------------------------
+
+class AIBatchProcessor:
+    """
+    Ejecuta 'handler(item) -> BatchResult' sobre una lista de (registry_id, tarea).
+    - batch: nombre del lote en la tabla de checkpoint (un lote por script).
+    - max_workers: llamadas en vuelo a la vez.
+    - commit_every: resultados por transacción.
+    item = {'id', 'task', 'title', 'path_url', 'content_raw'}.
+    """
+    def __init__(
+        self,
+        batch: str,
+        handler: Callable[[dict], BatchResult] = deepseek_handler,
+        max_workers: int = DEFAULT_WORKERS,
+        commit_every: int = DEFAULT_COMMIT_EVERY,
+        max_attempts: int = MAX_ATTEMPTS,
+        card_type: str = "DeepSeek_AI"
+    ):
+        self.batch = batch
+        self.handler = handler
+        self.max_workers = max(1, max_workers)
+        self.commit_every = max(1, commit_every)
+        self.max_attempts = max_attempts
+        self.card_type = card_type
+
+    # --- Checkpoint ---------------------------------------------------------
+
+    def plan(self, session, targets: List[Tuple[int, str]], retry_failed: bool = False) -> Tuple[List[Tuple[int, str]], int]:
+        """
+        Registra los objetivos en el checkpoint y retorna (pendientes, saltados).
+        Los pendientes de una pasada interrumpida van primero.
+        """
+        known = {
+            rid: (state, attempts or 0)
+            for rid, state, attempts in session.execute(
+                select(AIBatchJob.registry_id, AIBatchJob.state, AIBatchJob.attempts)
+                .where(AIBatchJob.batch == self.batch)
+            )
+        }
+        todo, skipped = [], 0
+        for rid, task in targets:
+            state, attempts = known.get(rid, (None, 0))
+            if state == "failed" and attempts >= self.max_attempts and not retry_failed:
+                skipped += 1
+                continue
+            todo.append((rid, task))
+
+        rows = [{"batch": self.batch, "registry_id": rid, "task": task, "state": "pending", "attempts": 0} for rid, task in todo]
+        for i in range(0, len(rows), BULK_IN_CHUNK):
+            stmt = sqlite_insert(AIBatchJob.__table__).values(rows[i:i + BULK_IN_CHUNK])
+            set_ = {"task": stmt.excluded.task, "state": "pending"}
+            if retry_failed:
+                set_["attempts"] = 0
+            stmt = stmt.on_conflict_do_update(index_elements=['batch', 'registry_id'], set_=set_)
+            session.execute(stmt)
+        session.commit()
+
+        interrupted = {rid for rid, (state, _) in known.items() if state == "pending"}
+        todo.sort(key=lambda t: (t[0] not in interrupted, t[0]))
+        return todo, skipped
+
+    def reset(self):
+        """Borra el checkpoint del lote (la próxima pasada reintenta todo)."""
+        with SessionLocal() as session:
+            session.execute(delete(AIBatchJob).where(AIBatchJob.batch == self.batch))
+            session.commit()
+
+    def checkpoint_status(self) -> Dict[str, int]:
+        with SessionLocal() as session:
+            return dict(session.execute(
+                select(AIBatchJob.state, func.count(AIBatchJob.id))
+                .where(AIBatchJob.batch == self.batch)
+                .group_by(AIBatchJob.state)
+            ).all())
+
+    # --- Lectura / escritura (solo en el hilo principal) --------------------
+
+    def _items(self, session, todo: List[Tuple[int, str]]) -> Iterator[dict]:
+        """Carga el contenido por bloques: en memoria solo lo que está en vuelo."""
+        for i in range(0, len(todo), LOAD_CHUNK):
+            chunk = todo[i:i + LOAD_CHUNK]
+            rows = {
+                rid: (title, path_url, content_raw)
+                for rid, title, path_url, content_raw in session.execute(
+                    select(Registry.id, Registry.title, Registry.path_url, Registry.content_raw)
+                    .where(Registry.id.in_([rid for rid, _ in chunk]))
+                )
+            }
+            for rid, task in chunk:
+                if rid in rows:
+                    title, path_url, content_raw = rows[rid]
+                    yield {"id": rid, "task": task, "title": title, "path_url": path_url, "content_raw": content_raw}
+
+    def _run_handler(self, item: dict) -> BatchResult:
+        try:
+            return self.handler(item)
+        except CircuitOpenError as e:
+            return BatchResult(item['id'], item['task'], False, error=str(e), deferred=True)
+        except Exception as e:
+            return BatchResult(item['id'], item['task'], False, error=f"{type(e).__name__}: {e}")
+
+    def _persist(self, session, results: List[BatchResult], report: BatchReport):
+        """Una transacción: campos del registro, reemplazo de tarjetas y estado del checkpoint."""
+        ok = [r for r in results if r.ok]
+        deferred = [r for r in results if r.deferred]
+        results = [r for r in results if not r.deferred]
+
+        # bulk_update_registries_in_session exige las mismas columnas en todas las filas
+        groups: Dict[tuple, List[dict]] = {}
+        for r in ok:
+            row = {"id": r.registry_id}
+            for name in ("summary", "title", "content_raw"):
+                value = getattr(r, name)
+                if value is not None:
+                    row[name] = value
+            if r.content_raw is not None:
+                # El UPDATE masivo no dispara los eventos de huella
+                fp = fingerprint_fields("youtube", None, r.content_raw)
+                row["content_hash"], row["content_simhash"] = fp["content_hash"], fp["content_simhash"]
+            if len(row) > 1:
+                groups.setdefault(tuple(sorted(row)), []).append(row)
+        for rows in groups.values():
+            nx_db.bulk_update_registries_in_session(session, rows)
+
+        with_cards = [r for r in ok if r.cards]
+        parent_ids = [r.registry_id for r in with_cards]
+        for i in range(0, len(parent_ids), BULK_IN_CHUNK):
+            session.execute(delete(Card).where(Card.parent_id.in_(parent_ids[i:i + BULK_IN_CHUNK])))
+        new_cards = nx_db.bulk_create_cards_in_session(session, [
+            CardCreate(parent_id=r.registry_id, question=str(c['question']), answer=str(c['answer']), type=self.card_type)
+            for r in with_cards for c in r.cards
+        ])
+
+        jobs = AIBatchJob.__table__
+        if results:
+            session.execute(
+                update(jobs)
+                .where(jobs.c.batch == self.batch, jobs.c.registry_id == bindparam("rid"))
+                .values(state=bindparam("new_state"), attempts=jobs.c.attempts + bindparam("failed"), error=bindparam("err")),
+                [
+                    {"rid": r.registry_id, "new_state": "done" if r.ok else "failed",
+                     "failed": 0 if r.ok else 1, "err": None if r.ok else (r.error or "")[:500]}
+                    for r in results
+                ]
+            )
+        session.commit()
+
+        report.done += len(ok)
+        report.failed += len(results) - len(ok)
+        report.deferred += len(deferred)
+        report.cards += len(new_cards)
+
+    # --- Ejecución ----------------------------------------------------------
+
+    @timed("ai_batch")
+    def run(
+        self,
+        targets: List[Tuple[int, str]],
+        retry_failed: bool = False,
+        on_result: Optional[Callable[[BatchResult], None]] = None
+    ) -> BatchReport:
+        """
+        Procesa los objetivos y retorna el informe. Ctrl+C detiene el envío de trabajo nuevo,
+        guarda lo ya recibido y deja el resto 'pending' para la próxima pasada.
+        """
+        report = BatchReport()
+        start = time.perf_counter()
+        with SessionLocal() as session:
+            todo, report.skipped = self.plan(session, targets, retry_failed=retry_failed)
+            report.planned = len(todo)
+            if not todo:
+                return report
+
+            items = self._items(session, todo)
+            max_in_flight = self.max_workers * 2  # Cola corta: memoria acotada y corte rápido
+            pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="nexus-ai")
+            in_flight = set()
+            buffer: List[BatchResult] = []
+            try:
+                exhausted = False
+                while True:
+                    while not exhausted and len(in_flight) < max_in_flight:
+                        item = next(items, None)
+                        if item is None:
+                            exhausted = True
+                            break
+                        in_flight.add(pool.submit(self._run_handler, item))
+                    if not in_flight:
+                        break
+                    finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for f in finished:
+                        result = f.result()
+                        buffer.append(result)
+                        if result.deferred and not exhausted:
+                            # Proveedor caído: se termina lo que está en vuelo y no se envía más
+                            exhausted = True
+                            report.halted = result.error
+                        if on_result:
+                            on_result(result)
+                    if len(buffer) >= self.commit_every:
+                        with timed("ai_batch_step", step="persist"):
+                            self._persist(session, buffer, report)
+                        buffer = []
+            except KeyboardInterrupt:
+                report.interrupted = True
+                # Si el corte llegó a mitad de una escritura, el lote sigue en 'buffer'
+                session.rollback()
+                # Lo ya terminado se guarda; lo que estaba en vuelo queda 'pending'
+                buffer.extend(f.result() for f in in_flight if f.done() and not f.cancelled())
+            finally:
+                pool.shutdown(wait=not report.interrupted, cancel_futures=True)
+                if buffer:
+                    self._persist(session, buffer, report)
+
+        report.elapsed_s = time.perf_counter() - start
+        return report
@@ -1,10 +1,20 @@
+import time
+import threading
 from datetime import datetime, timezone
-from core.database import SessionLocal, Registry, Card, NexusLink, Tag
-from sqlalchemy import func
+from core.database import SessionLocal, Registry, Card, NexusLink, Tag, store_version
+from sqlalchemy import func, case, select, or_
 
-def get_global_metrics():
-    """Calcula y devuelve las métricas globales del sistema Nexus."""
-    metrics = {
+# Las métricas se recalculan solo si hubo escrituras (store_version, también de otros procesos) o si vence el TTL:
+# 'due_today' depende del reloj, así que no puede cachearse indefinidamente.
+METRICS_TTL = 60.0
+
+REGISTRY_TYPES = ("file", "youtube", "web", "note", "concept", "app", "account")
+
+_metrics_cache = {}  # filtro normalizado -> (store_version, timestamp, metrics)
+_metrics_lock = threading.Lock()
+
+def _empty_metrics() -> dict:
+    return {
         "registry_counts": {
             "file": 0, "youtube": 0, "web": 0, "note": 0, "concept": 0, "app": 0, "account": 0, "total": 0
         },
@@ -21,44 +31,97 @@ def get_global_metrics():
             "retention_desc": "N/A"
         }
     }
-    
+
+def _scope_ids(filtro: str):
+    """
+    Subconsulta de IDs de registry para un filtro de área/tag/tipo.
+    Un tipo conocido (youtube, note...) filtra por tipo; cualquier otro texto por etiqueta.
+    """
+    if filtro.lower() in REGISTRY_TYPES:
+        return select(Registry.id).where(Registry.type == filtro.lower())
+    return select(Tag.registry_id).where(Tag.value.ilike(f"%{filtro}%"))
+
+def compute_metrics(filtro: str = "") -> dict:
+    """
+    Calcula las métricas en dos pasadas SQL:
+    1) composición de registros agrupada por tipo;
+    2) agregación condicional sobre cards + subconsultas escalares de vínculos y tags.
+    """
+    metrics = _empty_metrics()
+    now = datetime.now(timezone.utc)
+    scope = _scope_ids(filtro) if filtro else None
+
     with SessionLocal() as session:
         # 1. Composición del Cerebro (Registros)
-        registry_stats = session.query(Registry.type, func.count(Registry.id)).group_by(Registry.type).all()
-        for r_type, count in registry_stats:
+        reg_q = select(Registry.type, func.count(Registry.id)).group_by(Registry.type)
+        if scope is not None:
+            reg_q = reg_q.where(Registry.id.in_(scope))
+        for r_type, count in session.execute(reg_q):
             metrics["registry_counts"][r_type] = count
             metrics["registry_counts"]["total"] += count
-            
-        # 2. Red Neuronal (Vínculos y Tags)
-        metrics["network"]["total_links"] = session.query(func.count(NexusLink.id)).scalar() or 0
-        metrics["network"]["unique_tags"] = session.query(func.count(func.distinct(Tag.value))).scalar() or 0
-        
-        # 3. Madurez Cognitiva (SRS)
-        now = datetime.now(timezone.utc)
-        
-        total_cards = session.query(func.count(Card.id)).scalar() or 0
-        metrics["srs"]["total_cards"] = total_cards
-        
-        if total_cards > 0:
-            due_today = session.query(func.count(Card.id)).filter(
-                (Card.next_review == None) | (Card.next_review <= now)
-            ).scalar() or 0
-            
-            metrics["srs"]["due_today"] = due_today
-            metrics["srs"]["due_future"] = total_cards - due_today
-            
-            avg_diff = session.query(func.avg(Card.difficulty)).filter(Card.difficulty > 0).scalar() or 0.0
-            avg_stab = session.query(func.avg(Card.stability)).filter(Card.stability > 0).scalar() or 0.0
-            
-            metrics["srs"]["avg_difficulty"] = float(avg_diff)
-            metrics["srs"]["avg_stability"] = float(avg_stab)
-            
-            # Interpretar dificultad (1-10 por SM-2/FSRS adaptado)
-            if avg_diff < 3.0:
-                metrics["srs"]["retention_desc"] = "Alta (Fácil)"
-            elif 3.0 <= avg_diff <= 6.0:
-                metrics["srs"]["retention_desc"] = "Media (Estable)"
-            else:
-                metrics["srs"]["retention_desc"] = "Baja (Difícil)"
+
+        # 2. Red Neuronal + Madurez Cognitiva en un solo SELECT
+        links_q = select(func.count(NexusLink.id))
+        tags_q = select(func.count(func.distinct(Tag.value)))
+        if scope is not None:
+            links_q = links_q.where(or_(NexusLink.source_id.in_(scope), NexusLink.target_id.in_(scope)))
+            tags_q = tags_q.where(Tag.registry_id.in_(scope))
+
+        due = (Card.next_review == None) | (Card.next_review <= now)
+        cards_q = select(
+            func.count(Card.id),
+            func.coalesce(func.sum(case((due, 1), else_=0)), 0),
+            func.avg(case((Card.difficulty > 0, Card.difficulty))),
+            func.avg(case((Card.stability > 0, Card.stability))),
+            links_q.scalar_subquery(),
+            tags_q.scalar_subquery()
+        )
+        if scope is not None:
+            cards_q = cards_q.where(Card.parent_id.in_(scope))
+
+        total_cards, due_today, avg_diff, avg_stab, total_links, unique_tags = session.execute(cards_q).one()
+
+    metrics["network"]["total_links"] = total_links or 0
+    metrics["network"]["unique_tags"] = unique_tags or 0
+
+    total_cards = total_cards or 0
+    metrics["srs"]["total_cards"] = total_cards
+    if total_cards > 0:
+        avg_diff = float(avg_diff or 0.0)
+        metrics["srs"]["due_today"] = int(due_today)
+        metrics["srs"]["due_future"] = total_cards - int(due_today)
+        metrics["srs"]["avg_difficulty"] = avg_diff
+        metrics["srs"]["avg_stability"] = float(avg_stab or 0.0)
+
+        # Interpretar dificultad (1-10 por SM-2/FSRS adaptado)
+        if avg_diff < 3.0:
+            metrics["srs"]["retention_desc"] = "Alta (Fácil)"
+        elif 3.0 <= avg_diff <= 6.0:
+            metrics["srs"]["retention_desc"] = "Media (Estable)"
+        else:
+            metrics["srs"]["retention_desc"] = "Baja (Difícil)"
 
     return metrics
+
+def get_global_metrics(filtro: str = "", use_cache: bool = True) -> dict:
+    """
+    Calcula y devuelve las métricas globales del sistema Nexus (o de un área/tag/tipo).
+    El resultado se cachea hasta la próxima escritura en la BD o el vencimiento de METRICS_TTL.
+    """
+    key = (filtro or "").strip()
+    version = store_version()
+    if use_cache:
+        with _metrics_lock:
+            cached = _metrics_cache.get(key)
+        if cached and cached[0] == version and time.monotonic() - cached[1] < METRICS_TTL:
+            return cached[2]
+
+    metrics = compute_metrics(key)
+    with _metrics_lock:
+        _metrics_cache[key] = (version, time.monotonic(), metrics)
+    return metrics
+
+def invalidate_metrics():
+    """Descarta todas las métricas cacheadas (p. ej. tras escrituras fuera del ORM)."""
+    with _metrics_lock:
+        _metrics_cache.clear()
@@ -0,0 +1,85 @@
+import threading
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, Optional
+
+# ----------------------------------------------------------------------------
+# Trabajos en segundo plano para la API web (ingesta, scraping, IA...).
+# Un pool propio y pequeño: las tareas largas nunca ocupan los hilos que
+# atienden peticiones, así /api/stats y demás siguen respondiendo al instante.
+# ----------------------------------------------------------------------------
+
+JOB_STATES = ("queued", "running", "done", "error")
+MAX_WORKERS = 2      # Ingestas simultáneas (scraping + escritura SQLite)
+MAX_RETAINED = 500   # Trabajos terminados que se conservan para consultar su estado
+
+class JobManager:
+    """Registro en memoria de trabajos lanzados desde la API y su estado."""
+
+    def __init__(self, max_workers: int = MAX_WORKERS, max_retained: int = MAX_RETAINED):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="nexus-job")
+        self._jobs: "OrderedDict[str, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.max_retained = max_retained
+
+    def submit(self, kind: str, fn: Callable[..., Any], *args, **kwargs) -> str:
+        """Encola fn(*args, **kwargs) y retorna el ID del trabajo."""
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._jobs[job_id] = {
+                "id": job_id,
+                "kind": kind,
+                "status": "queued",
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "started_at": None,
+                "finished_at": None,
+                "result": None,
+                "error": None
+            }
+            self._evict()
+        self._executor.submit(self._run, job_id, fn, args, kwargs)
+        return job_id
+
+    def _run(self, job_id: str, fn, args, kwargs):
+        self._update(job_id, status="running", started_at=datetime.now(timezone.utc).isoformat())
+        try:
+            result = fn(*args, **kwargs)
+            self._update(job_id, status="done", result=result)
+        except Exception as e:
+            traceback.print_exc()
+            self._update(job_id, status="error", error=str(e))
+        finally:
+            self._update(job_id, finished_at=datetime.now(timezone.utc).isoformat())
+
+    def _update(self, job_id: str, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.update(fields)
+
+    def _evict(self):
+        # Descarta los trabajos terminados más antiguos por encima del límite
+        if len(self._jobs) <= self.max_retained:
+            return
+        for old_id in [jid for jid, j in self._jobs.items() if j["status"] in ("done", "error")]:
+            if len(self._jobs) <= self.max_retained:
+                break
+            del self._jobs[old_id]
+
+    def get(self, job_id: str) -> Optional[dict]:
+        """Copia del estado del trabajo, o None si no existe (o ya fue descartado)."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def list(self, limit: int = 50) -> list:
+        with self._lock:
+            return [dict(j) for j in reversed(list(self._jobs.values())[-limit:])]
+
+    def shutdown(self, wait: bool = False):
+        self._executor.shutdown(wait=wait)
+
+job_manager = JobManager()
@@ -0,0 +1,202 @@
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+from sqlalchemy import and_, func, or_, select
+
+from core.database import (
+    Registry, RegistrySimhashBand, Tag, TagCreate, NexusLink, Card, PipelineJob, nx_db, mark_session_dirty, BULK_IN_CHUNK
+)
+from core.fingerprint import fingerprint_fields, hamming_distance, simhash_bands, NEAR_DUPLICATE_DISTANCE, SIMHASH_BANDS
+from core.instrumentation import timed
+
+# ----------------------------------------------------------------------------
+# Deduplicación de registros sobre las columnas de huella (core.fingerprint):
+# relleno de huellas en BDs existentes, grupos exactos (misma clave canónica o
+# mismo contenido), casi-duplicados por SimHash y fusión de registros.
+# ----------------------------------------------------------------------------
+
+BACKFILL_BATCH = 1000
+MAX_BUCKET = 500  # Cubetas degeneradas (miles de firmas idénticas) ya salen como duplicados exactos
+
+@timed("dedup", step="backfill")
+def backfill_fingerprints(session, batch_size: int = BACKFILL_BATCH, progress=None) -> int:
+    """
+    Calcula content_hash/content_simhash de los registros que aún no los tienen
+    (BDs anteriores a las columnas de huella). Commitea por lotes; retorna cuántos rellenó.
+    """
+    done = 0
+    last_id = 0
+    while True:
+        rows = session.execute(
+            select(Registry.id, Registry.type, Registry.path_url, Registry.content_raw, Registry.meta_info)
+            .where(Registry.id > last_id, Registry.content_hash.is_(None))
+            .order_by(Registry.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            return done
+        updates = []
+        for rid, r_type, path_url, content_raw, meta_info in rows:
+            fields = fingerprint_fields(r_type, path_url, content_raw, meta_info)
+            # Sin contenido útil se marca con cadena vacía para no recalcularlo en cada pasada
+            fields["content_hash"] = fields["content_hash"] or ""
+            updates.append({"id": rid, **fields})
+        nx_db.bulk_update_registries_in_session(session, updates)
+        session.commit()
+        done += len(rows)
+        last_id = rows[-1][0]
+        if progress:
+            progress(done)
+
+def find_exact_duplicates(session, by: str = "canonical_key") -> List[List[int]]:
+    """Grupos de IDs (ordenados) que comparten 'canonical_key' o 'content_hash'."""
+    column = {"canonical_key": Registry.canonical_key, "content_hash": Registry.content_hash}[by]
+    rows = session.execute(
+        select(column, func.group_concat(Registry.id))
+        .where(column.is_not(None), column != "")
+        .group_by(column)
+        .having(func.count(Registry.id) > 1)
+    ).all()
+    return sorted(sorted(int(i) for i in ids.split(",")) for _, ids in rows)
+
+@timed("dedup", step="near_duplicates")
+def find_near_duplicates(
+    session,
+    registry_id: Optional[int] = None,
+    max_distance: int = NEAR_DUPLICATE_DISTANCE,
+    limit: int = 200
+) -> List[dict]:
+    """
+    Pares de registros con SimHash a distancia de Hamming <= max_distance.
+    Con 'registry_id' solo se buscan los parecidos a ese registro: los candidatos salen
+    del índice de registry_simhash_bands (las cubetas de sus bandas), no de todas las firmas.
+    Retorna [{'a': id, 'b': id, 'distance': d}] ordenado por distancia.
+    """
+    pairs = []
+    if registry_id is not None:
+        target = session.scalar(select(Registry.content_simhash).where(Registry.id == registry_id))
+        if target is None:
+            return []
+        candidates = select(Registry.id, Registry.content_simhash).where(
+            Registry.content_simhash.is_not(None), Registry.id != registry_id
+        )
+        if max_distance < SIMHASH_BANDS:
+            in_bucket = or_(*(
+                and_(RegistrySimhashBand.band == band, RegistrySimhashBand.value == value)
+                for band, value in enumerate(simhash_bands(target))
+            ))
+            candidates = candidates.where(Registry.id.in_(select(RegistrySimhashBand.registry_id).where(in_bucket)))
+        for rid, sig in session.execute(candidates):
+            d = hamming_distance(target, sig)
+            if d <= max_distance:
+                pairs.append({"a": registry_id, "b": rid, "distance": d})
+    else:
+        # Las bandas solo garantizan no perder pares si max_distance < SIMHASH_BANDS
+        signatures = session.execute(
+            select(Registry.id, Registry.content_simhash).where(Registry.content_simhash.is_not(None))
+        ).all()
+        banded = [(rid, sig, simhash_bands(sig)) for rid, sig in signatures]
+        seen = set()
+        for band in range(SIMHASH_BANDS):
+            buckets: Dict[int, List[tuple]] = defaultdict(list)
+            for rid, sig, values in banded:
+                buckets[values[band]].append((rid, sig))
+            for members in buckets.values():
+                if len(members) < 2 or len(members) > MAX_BUCKET:
+                    continue
+                for i in range(len(members)):
+                    a_id, a_sig = members[i]
+                    for b_id, b_sig in members[i + 1:]:
+                        key = (a_id, b_id) if a_id < b_id else (b_id, a_id)
+                        if key in seen:
+                            continue
+                        seen.add(key)
+                        d = hamming_distance(a_sig, b_sig)
+                        if d <= max_distance:
+                            pairs.append({"a": key[0], "b": key[1], "distance": d})
+
+    pairs.sort(key=lambda p: (p["distance"], p["a"], p["b"]))
+    return pairs[:limit] if limit else pairs
+
+def pick_survivor(session, ids: List[int]) -> int:
+    """Registro a conservar en una fusión: el que más tarjetas tiene; a igualdad, el más antiguo."""
+    counts = dict(session.execute(
+        select(Card.parent_id, func.count(Card.id)).where(Card.parent_id.in_(ids)).group_by(Card.parent_id)
+    ).all())
+    return min(ids, key=lambda i: (-counts.get(i, 0), i))
+
+@timed("dedup", step="merge")
+def merge_registries_in_session(session, keep_id: int, drop_ids: List[int]) -> dict:
+    """
+    Fusiona 'drop_ids' en 'keep_id': mueve tarjetas (con su historial), tags y vínculos,
+    completa resumen/metadatos vacíos del superviviente y elimina los duplicados.
+    """
+    # No commitea — responsabilidad del llamador
+    drop_ids = [i for i in dict.fromkeys(drop_ids) if i != keep_id]
+    keep = session.get(Registry, keep_id)
+    if keep is None:
+        raise ValueError(f"Registro {keep_id} no encontrado")
+    drops = session.query(Registry).filter(Registry.id.in_(drop_ids)).order_by(Registry.id).all()
+    if not drops:
+        return {"kept": keep_id, "merged": [], "cards": 0, "tags": 0, "links": 0}
+    drop_ids = [d.id for d in drops]
+
+    # 1. Campos del superviviente: se conserva lo suyo y se completa lo que falte
+    meta = dict(keep.meta_info or {})
+    for d in drops:
+        if not keep.summary and d.summary:
+            keep.summary = d.summary
+        if d.is_flashcard_source:
+            keep.is_flashcard_source = 1
+        for k, v in (d.meta_info or {}).items():
+            meta.setdefault(k, v)
+    meta["merged_from"] = sorted(set(meta.get("merged_from", [])) | {d.path_url for d in drops if d.path_url})
+    keep.meta_info = meta
+
+    # 2. Tarjetas (review_log las sigue por card_id) y jobs del pipeline
+    cards = session.query(Card).filter(Card.parent_id.in_(drop_ids)).update(
+        {Card.parent_id: keep_id}, synchronize_session=False
+    )
+    session.query(PipelineJob).filter(PipelineJob.registry_id.in_(drop_ids)).update(
+        {PipelineJob.registry_id: keep_id}, synchronize_session=False
+    )
+
+    # 3. Tags (ignorando los que el superviviente ya tiene)
+    values = set(session.scalars(select(Tag.value).where(Tag.registry_id.in_(drop_ids))))
+    tags = nx_db.bulk_add_tags_in_session(session, [(keep_id, TagCreate(value=v)) for v in values])
+
+    # 4. Vínculos: se reapuntan, y se descartan los que quedan en bucle o repetidos
+    links = session.query(NexusLink).filter(NexusLink.source_id.in_(drop_ids)).update(
+        {NexusLink.source_id: keep_id}, synchronize_session=False
+    )
+    links += session.query(NexusLink).filter(NexusLink.target_id.in_(drop_ids)).update(
+        {NexusLink.target_id: keep_id}, synchronize_session=False
+    )
+    session.query(NexusLink).filter(
+        NexusLink.source_id == keep_id, NexusLink.target_id == keep_id
+    ).delete(synchronize_session=False)
+    keep_links = session.execute(
+        select(NexusLink.id, NexusLink.source_id, NexusLink.target_id, NexusLink.relation_type)
+        .where((NexusLink.source_id == keep_id) | (NexusLink.target_id == keep_id))
+        .order_by(NexusLink.id)
+    ).all()
+    seen, repeated = set(), []
+    for link_id, src, dst, rel in keep_links:
+        if (src, dst, rel) in seen:
+            repeated.append(link_id)
+        seen.add((src, dst, rel))
+    for i in range(0, len(repeated), BULK_IN_CHUNK):
+        session.query(NexusLink).filter(NexusLink.id.in_(repeated[i:i + BULK_IN_CHUNK])).delete(synchronize_session=False)
+
+    # 5. Borrar los duplicados (sus tags restantes incluidos)
+    session.flush()
+    nx_db.bulk_delete_registries_in_session(session, drop_ids)
+    mark_session_dirty(session)
+    return {"kept": keep_id, "merged": drop_ids, "cards": cards, "tags": tags, "links": links}
+
+def merge_registries(keep_id: int, drop_ids: List[int]) -> dict:
+    """Versión con transacción propia de merge_registries_in_session."""
+    with nx_db.Session() as session:
+        result = merge_registries_in_session(session, keep_id, drop_ids)
+        session.commit()
+        return result
@@ -1,59 +1,197 @@
 
+import io
 import os
 import csv
+import gzip
+import json
 import sqlite3
-import shutil
 from datetime import datetime
-from core.database import nx_db, SessionLocal, Registry, Tag
+from typing import Iterator, List, Optional
+from sqlalchemy import select
+from core.database import SessionLocal, Registry, Tag, DB_PATH
 
-def export_to_google_drive():
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+# Destino por defecto: Google Drive (G:) en Windows. Configurable con NEXUS_EXPORT_DIR o por parámetro.
+DEFAULT_EXPORT_DIR = os.environ.get("NEXUS_EXPORT_DIR", r"G:\Mi unidad\Nexus_Data")
+
+EXPORT_FORMATS = ("csv", "jsonl", "parquet")
+EXPORT_COMPRESSIONS = (None, "gzip", "zstd")
+EXPORT_FIELDS = ['id', 'tipo', 'titulo', 'url_ruta', 'resumen', 'contenido_raw', 'tags', 'fecha_creacion']
+
+EXPORT_BATCH_SIZE = 1000  # Filas por lote (yield_per): la memoria no crece con el tamaño de la BD
+BACKUP_PAGES = 256        # Páginas SQLite copiadas por paso de backup()
+
+# ----------------------------------------------------------------------------
+# A. Snapshot consistente de la BD (API de backup en línea de SQLite)
+# ----------------------------------------------------------------------------
+
+def backup_database(dest_path: str, source_path: str = DB_PATH, pages: int = BACKUP_PAGES) -> str:
+    """
+    Copia nexus.db con sqlite3.Connection.backup() por páginas.
+    A diferencia de shutil.copy2, respeta el WAL y produce un snapshot consistente
+    aunque otra conexión esté escribiendo.
+    """
+    src = sqlite3.connect(source_path)
+    dst = sqlite3.connect(dest_path)
+    try:
+        with dst:
+            src.backup(dst, pages=pages)
+    finally:
+        dst.close()
+        src.close()
+    return dest_path
+
+# ----------------------------------------------------------------------------
+# B. Lectura en streaming (lotes + tags en bloque)
+# ----------------------------------------------------------------------------
+
+def iter_registry_batches(session, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[List[dict]]:
     """
-    Exporta la base de datos actual y genera un reporte CSV en Google Drive (Unidad G:).
+    Recorre 'registry' en lotes con yield_per (sin materializar toda la tabla) y
+    adjunta las tags de cada lote con una sola consulta IN(...).
     """
-    # 1. Definir rutas en G:
-    g_drive_base = r"G:\Mi unidad\Nexus_Data"
-    if not os.path.exists(r"G:\Mi unidad"):
-        return False, "No se detecto la unidad Google Drive (G:). Asegura que el cliente de escritorio este abierto."
+    stmt = select(
+        Registry.id, Registry.type, Registry.title, Registry.path_url,
+        Registry.summary, Registry.content_raw, Registry.created_at
+    ).order_by(Registry.id).execution_options(yield_per=batch_size)
+
+    # Conexión aparte para las tags: el cursor del lote principal sigue abierto
+    with SessionLocal() as tag_session:
+        for partition in session.execute(stmt).partitions():
+            ids = [row.id for row in partition]
+            tags_by_id = {}
+            for registry_id, value in tag_session.execute(
+                select(Tag.registry_id, Tag.value).where(Tag.registry_id.in_(ids)).order_by(Tag.registry_id, Tag.value)
+            ):
+                tags_by_id.setdefault(registry_id, []).append(value)
 
-    if not os.path.exists(g_drive_base):
-        os.makedirs(g_drive_base)
+            yield [{
+                'id': r.id,
+                'tipo': r.type,
+                'titulo': r.title,
+                'url_ruta': r.path_url,
+                'resumen': r.summary if r.summary else "",
+                'contenido_raw': r.content_raw if r.content_raw else "",
+                'tags': ", ".join(tags_by_id.get(r.id, [])),
+                'fecha_creacion': r.created_at.strftime("%Y-%m-%d %H:%M:%S") if r.created_at else ""
+            } for r in partition]
+
+# ----------------------------------------------------------------------------
+# C. Escritores (CSV / JSONL / Parquet, con compresión opcional)
+# ----------------------------------------------------------------------------
+
+def _open_text(path: str, compression: Optional[str], encoding: str):
+    """Abre un flujo de texto con compresión gzip/zstd transparente."""
+    if compression == "gzip":
+        return gzip.open(path, "wt", encoding=encoding, newline="")
+    if compression == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Compresión zstd no disponible (pip install zstandard).")
+        raw = open(path, "wb")
+        writer = zstandard.ZstdCompressor(level=10).stream_writer(raw, closefd=True)
+        return io.TextIOWrapper(writer, encoding=encoding, newline="")
+    return open(path, "w", encoding=encoding, newline="")
+
+def _export_path(dest_dir: str, fmt: str, compression: Optional[str], timestamp: str) -> str:
+    name = f"nexus_registros_{timestamp}.{fmt}"
+    if fmt != "parquet" and compression:
+        name += ".gz" if compression == "gzip" else ".zst"
+    return os.path.join(dest_dir, name)
+
+def export_registries(
+    dest_dir: str,
+    fmt: str = "csv",
+    compression: Optional[str] = None,
+    batch_size: int = EXPORT_BATCH_SIZE,
+    timestamp: Optional[str] = None
+) -> tuple:
+    """
+    Exporta todos los registros (con tags) en streaming. Retorna (ruta, filas).
+    fmt: csv | jsonl | parquet. compression: None | gzip | zstd
+    (en Parquet la compresión se aplica por columna dentro del archivo).
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Formato no soportado: {fmt}. Usa uno de {EXPORT_FORMATS}")
+    if compression not in EXPORT_COMPRESSIONS:
+        raise ValueError(f"Compresión no soportada: {compression}. Usa uno de {EXPORT_COMPRESSIONS}")
+    if fmt == "parquet" and pq is None:
+        raise RuntimeError("Exportación Parquet no disponible (pip install pyarrow).")
+
+    timestamp = timestamp or datetime.now().strftime("%Y%m%d_%H%M%S")
+    path = _export_path(dest_dir, fmt, compression, timestamp)
+    total = 0
+
+    with SessionLocal() as session:
+        batches = iter_registry_batches(session, batch_size=batch_size)
+
+        if fmt == "parquet":
+            schema = pa.schema([
+                ('id', pa.int64()), ('tipo', pa.string()), ('titulo', pa.string()),
+                ('url_ruta', pa.string()), ('resumen', pa.string()), ('contenido_raw', pa.string()),
+                ('tags', pa.string()), ('fecha_creacion', pa.string())
+            ])
+            # Un row group por lote: la memoria queda acotada a 'batch_size' filas
+            with pq.ParquetWriter(path, schema, compression=compression or "snappy") as writer:
+                for batch in batches:
+                    writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                    total += len(batch)
+            return path, total
+
+        # utf-8-sig en CSV para que Excel detecte la codificación
+        encoding = "utf-8-sig" if fmt == "csv" else "utf-8"
+        with _open_text(path, compression, encoding) as fh:
+            if fmt == "csv":
+                writer = csv.DictWriter(fh, fieldnames=EXPORT_FIELDS)
+                writer.writeheader()
+                for batch in batches:
+                    writer.writerows(batch)
+                    total += len(batch)
+            else:
+                for batch in batches:
+                    fh.writelines(json.dumps(row, ensure_ascii=False) + "\n" for row in batch)
+                    total += len(batch)
+
+    return path, total
+
+def export_to_google_drive(
+    target_dir: Optional[str] = None,
+    fmt: str = "csv",
+    compression: Optional[str] = None
+):
+    """
+    Exporta la base de datos actual (snapshot consistente) y genera un reporte
+    de registros en el directorio destino (por defecto Google Drive, Unidad G:).
+    """
+    # 1. Definir rutas destino
+    dest_dir = target_dir or DEFAULT_EXPORT_DIR
+    drive_root = os.path.dirname(dest_dir.rstrip("\\/"))
+    if target_dir is None and dest_dir.upper().startswith("G:") and not os.path.exists(drive_root):
+        return False, "No se detecto la unidad Google Drive (G:). Asegura que el cliente de escritorio este abierto o define NEXUS_EXPORT_DIR."
+
+    os.makedirs(dest_dir, exist_ok=True)
 
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    db_export_path = os.path.join(g_drive_base, f"nexus_backup_{timestamp}.db")
-    csv_export_path = os.path.join(g_drive_base, f"nexus_registros_{timestamp}.csv")
+    db_export_path = os.path.join(dest_dir, f"nexus_backup_{timestamp}.db")
 
     try:
-        # --- A. Exportar Base de Datos (Copia Fisica) ---
-        # Cerramos conexiones/flushing no es necesario con copy2 si no es vital, 
-        # pero es mejor copiar el archivo nexus.db de la raiz.
-        source_db = r"c:\Users\DELL\Proyectos\nexus\nexus.db"
-        if os.path.exists(source_db):
-            shutil.copy2(source_db, db_export_path)
-            
-        # --- B. Exportar a CSV (Para lectura facil/descarga) ---
-        with SessionLocal() as session:
-            registries = session.query(Registry).all()
-            
-            with open(csv_export_path, 'w', encoding='utf-8-sig', newline='') as csvfile:
-                fieldnames = ['id', 'tipo', 'titulo', 'url_ruta', 'resumen', 'contenido_raw', 'tags', 'fecha_creacion']
-                writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-                writer.writeheader()
-                
-                for r in registries:
-                    # Obtener tags
-                    tags = ", ".join([t.value for t in r.tags])
-                    
-                    writer.writerow({
-                        'id': r.id,
-                        'tipo': r.type,
-                        'titulo': r.title,
-                        'url_ruta': r.path_url,
-                        'resumen': r.summary if r.summary else "",
-                        'contenido_raw': r.content_raw if r.content_raw else "",
-                        'tags': tags,
-                        'fecha_creacion': r.created_at.strftime("%Y-%m-%d %H:%M:%S") if r.created_at else ""
-                    })
-
-        return True, g_drive_base
+        # --- A. Exportar Base de Datos (backup en línea, consistente con WAL) ---
+        if os.path.exists(DB_PATH):
+            backup_database(db_export_path)
+
+        # --- B. Exportar registros (streaming) ---
+        export_registries(dest_dir, fmt=fmt, compression=compression, timestamp=timestamp)
+
+        return True, dest_dir
     except Exception as e:
         return False, str(e)
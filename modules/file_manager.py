@@ -1,16 +1,53 @@
-import os
+import hashlib
 from pathlib import Path
-from typing import List, Optional
+from typing import List, Optional, Tuple
 
 from core.database import nx_db, RegistryCreate, TagCreate
 from core.models import ResourceRecord
+from core.instrumentation import timed
 from rich.console import Console
 
 console = Console()
 
 # Definimos extensiones que consideramos texto plano directamente legible
 TEXT_EXTENSIONS = {'.txt', '.md', '.csv', '.json', '.xml', '.py', '.js', '.html', '.css', '.ini', '.yaml', '.yml'}
+PREVIEW_CHARS = 5000
+HASH_BLOCK = 1 << 20  # Lectura por bloques de 1 MiB: memoria acotada también con archivos enormes
 
+def read_file_fingerprint(path: str, ext: str) -> Tuple[Optional[str], str]:
+    """
+    Una sola lectura del archivo: vista previa de texto (si la extensión es de texto plano)
+    y hash SHA-256 del contenido completo. Lanza OSError si no se puede leer.
+    """
+    digest = hashlib.sha256()
+    preview = None
+    with open(path, 'rb') as f:
+        block = f.read(HASH_BLOCK)
+        if ext in TEXT_EXTENSIONS:
+            # 5000 caracteres ocupan como mucho 4 bytes cada uno en UTF-8
+            preview = block[:PREVIEW_CHARS * 4].decode('utf-8', errors='ignore')[:PREVIEW_CHARS]
+            if len(preview) == PREVIEW_CHARS:
+                preview += "\n...[Contenido truncado]"
+        while block:
+            digest.update(block)
+            block = f.read(HASH_BLOCK)
+    return preview, digest.hexdigest()
+
+def build_file_meta(ext: str, size_bytes: int, mtime_ns: Optional[int] = None, sha256: Optional[str] = None, source: str = "local_file_manager") -> dict:
+    """Estructura del campo 'meta_info' de los registros tipo 'file'."""
+    meta = {
+        "extension": ext.lstrip('.'),
+        "size_bytes": size_bytes,
+        "source": source
+    }
+    # mtime/hash permiten a la reindexación incremental detectar cambios sin releer el archivo
+    if mtime_ns is not None:
+        meta["mtime_ns"] = mtime_ns
+    if sha256 is not None:
+        meta["sha256"] = sha256
+    return meta
+
+@timed("ingest", source="file")
 def ingest_local_file(filepath: str, tags: List[str]) -> Optional[ResourceRecord]:
     """
     Ingesta un archivo local en la base de datos maestra de Nexus.
@@ -30,30 +67,31 @@ def ingest_local_file(filepath: str, tags: List[str]) -> Optional[ResourceRecord
     ext = file_path_obj.suffix.lower()
     
     try:
-        size_bytes = file_path_obj.stat().st_size
+        stat = file_path_obj.stat()
+        size_bytes, mtime_ns = stat.st_size, stat.st_mtime_ns
     except Exception as e:
         console.print(f"[yellow]Advertencia:[/] No se pudo obtener el tamaño de {filepath}. Error: {e}")
-        size_bytes = 0
+        size_bytes, mtime_ns = 0, None
 
-    # 3. Manejo de Texto Plano (Lectura Rápida)
+    # 3. Vista previa de texto plano + hash de contenido (una sola lectura)
+    # Leemos como mucho 5000 caracteres para evitar saturar la base de datos
+    # con archivos de texto masivos (ej. logs gigantes)
     content_raw = None
-    if ext in TEXT_EXTENSIONS:
-        try:
-            # Leemos los primeros 5000 caracteres para evitar saturar la base de datos
-            # con archivos de texto masivos (ej. logs gigantes)
-            with open(file_path_obj, 'r', encoding='utf-8', errors='ignore') as f:
-                content_raw = f.read(5000)
-                if len(content_raw) == 5000:
-                    content_raw += "\n...[Contenido truncado]"
-        except Exception as e:
-            console.print(f"[yellow]Advertencia:[/] No se pudo extraer texto parcial de {filepath}. Error: {e}")
+    sha256 = None
+    try:
+        content_raw, sha256 = read_file_fingerprint(str(file_path_obj), ext)
+    except Exception as e:
+        console.print(f"[yellow]Advertencia:[/] No se pudo extraer texto parcial de {filepath}. Error: {e}")
+
+    # Copia exacta de un archivo ya indexado (mismo contenido, otra ruta): no se duplica
+    if sha256:
+        copy_of = nx_db.find_registry_by_content_hash(f"file:{sha256}")
+        if copy_of is not None:
+            console.print(f"[yellow]Aviso:[/] '{title}' es una copia idéntica del registro ID {copy_of.id} ({copy_of.path_url}). No se duplica.")
+            return None
 
     # Estructura del diccionario JSON para el campo 'meta_info' (metadatos base)
-    meta_info = {
-        "extension": ext.lstrip('.'),
-        "size_bytes": size_bytes,
-        "source": "local_file_manager"
-    }
+    meta_info = build_file_meta(ext, size_bytes, mtime_ns=mtime_ns, sha256=sha256)
 
     # 4. Inserción estricta en la Base de Datos a través del ORM (Pydantic Mapped)
     file_record_data = RegistryCreate(
@@ -0,0 +1,277 @@
+import os
+import re
+import fnmatch
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, select
+
+from core.database import SessionLocal, Registry, RegistryCreate, TagCreate, nx_db
+from core.instrumentation import timed
+from core.fingerprint import fingerprint_fields
+from modules.file_manager import build_file_meta, read_file_fingerprint
+from rich.console import Console
+
+console = Console()
+
+# ----------------------------------------------------------------------------
+# Indexador incremental de carpetas.
+# Recorre el árbol con os.scandir, compara (tamaño, mtime) con lo guardado en
+# meta_info y solo relee/hashea los archivos nuevos o modificados; las escrituras
+# van en lotes (una transacción por lote). Una reindexación sin cambios no abre
+# ningún archivo: solo stat + una consulta.
+# ----------------------------------------------------------------------------
+
+DEFAULT_IGNORE = (
+    ".git", ".svn", ".hg", "__pycache__", "node_modules", ".venv", "venv", ".idea", ".vscode",
+    "$RECYCLE.BIN", "System Volume Information",
+    "*.tmp", "*.temp", "*.swp", "~$*", ".DS_Store", "Thumbs.db", "desktop.ini",
+)
+DEFAULT_MAX_THREADS = 8   # Lecturas de disco en paralelo (vista previa + hash)
+DEFAULT_BATCH_SIZE = 500  # Archivos por transacción de escritura
+INDEXER_SOURCE = "local_folder_indexer"
+
+@dataclass
+class IndexReport:
+    """Resultado de una pasada del indexador."""
+    scanned: int = 0
+    unchanged: int = 0
+    created: int = 0
+    updated: int = 0
+    touched: int = 0      # mtime distinto pero mismo hash: solo se actualiza meta_info
+    deleted: int = 0
+    errors: List[str] = field(default_factory=list)
+
+def _to_posix(path: str) -> str:
+    # Mismo formato que Path.absolute().as_posix() en ingest_local_file
+    return path.replace(os.sep, "/")
+
+class FolderIndexer:
+    """
+    Indexa (y reindexa) un árbol de directorios como registros tipo 'file'.
+    - extensions: solo estas extensiones (con o sin punto); None = todas.
+    - ignore: patrones glob contra el nombre o la ruta relativa (directorios y archivos).
+    - prune_missing: elimina los registros de archivos borrados del disco bajo 'root'.
+    """
+    def __init__(
+        self,
+        root: str,
+        tags: Optional[List[str]] = None,
+        extensions: Optional[Iterable[str]] = None,
+        ignore: Iterable[str] = DEFAULT_IGNORE,
+        max_threads: int = DEFAULT_MAX_THREADS,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        prune_missing: bool = True,
+        db_target=nx_db
+    ):
+        self.root = os.path.abspath(root)
+        self.tags = [t.strip().lower() for t in (tags or []) if t and t.strip()]
+        self.extensions = (
+            {e.lower() if e.startswith(".") else f".{e.lower()}" for e in extensions}
+            if extensions else None
+        )
+        self.ignore = tuple(ignore)
+        # Un único regex con todos los globs: se evalúa una vez por entrada del disco
+        self._ignore_re = re.compile("|".join(fnmatch.translate(p) for p in self.ignore)) if self.ignore else None
+        self.max_threads = max(1, max_threads)
+        self.batch_size = max(1, batch_size)
+        self.prune_missing = prune_missing
+        self.db_target = db_target
+
+    # ------------------------------------------------------------------------
+    # 1. Recorrido del disco
+    # ------------------------------------------------------------------------
+
+    def _ignored(self, name: str, rel_path: str) -> bool:
+        if self._ignore_re is None:
+            return False
+        return bool(self._ignore_re.match(name) or self._ignore_re.match(rel_path))
+
+    def scan(self, report: IndexReport) -> Dict[str, Tuple[int, int]]:
+        """Ruta posix -> (tamaño, mtime_ns) de todos los archivos indexables bajo 'root'."""
+        found: Dict[str, Tuple[int, int]] = {}
+        stack = [self.root]
+        root_len = len(self.root.rstrip(os.sep)) + 1
+        while stack:
+            current = stack.pop()
+            try:
+                it = os.scandir(current)
+            except OSError as e:
+                report.errors.append(f"{current}: {e}")
+                continue
+            with it:
+                for entry in it:
+                    rel = _to_posix(entry.path[root_len:])
+                    if self._ignored(entry.name, rel):
+                        continue
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                            continue
+                        if not entry.is_file(follow_symlinks=False):
+                            continue
+                        if self.extensions is not None and os.path.splitext(entry.name)[1].lower() not in self.extensions:
+                            continue
+                        # En Windows el stat viene gratis del propio listado del directorio
+                        st = entry.stat(follow_symlinks=False)
+                    except OSError as e:
+                        report.errors.append(f"{entry.path}: {e}")
+                        continue
+                    found[_to_posix(entry.path)] = (st.st_size, st.st_mtime_ns)
+        report.scanned = len(found)
+        return found
+
+    # ------------------------------------------------------------------------
+    # 2. Estado conocido en la BD
+    # ------------------------------------------------------------------------
+
+    def _known(self, session) -> Dict[str, Tuple[int, Optional[int], Optional[int], Optional[str]]]:
+        """Ruta -> (id, tamaño, mtime_ns, sha256) de los registros 'file' bajo 'root'."""
+        prefix = _to_posix(self.root).rstrip("/") + "/"
+        # Rango [prefix, prefix con '/' -> '0') en lugar de LIKE: aprovecha el índice único de path_url
+        upper = prefix[:-1] + chr(ord("/") + 1)
+        rows = session.execute(
+            select(
+                Registry.id, Registry.path_url,
+                func.json_extract(Registry.meta_info, "$.size_bytes"),
+                func.json_extract(Registry.meta_info, "$.mtime_ns"),
+                func.json_extract(Registry.meta_info, "$.sha256"),
+            ).where(
+                Registry.type == "file",
+                Registry.path_url >= prefix,
+                Registry.path_url < upper
+            )
+        )
+        return {path: (rid, size, mtime, sha) for rid, path, size, mtime, sha in rows}
+
+    # ------------------------------------------------------------------------
+    # 3. Lectura en paralelo + escritura por lotes
+    # ------------------------------------------------------------------------
+
+    @staticmethod
+    def _read(path: str):
+        ext = os.path.splitext(path)[1].lower()
+        try:
+            preview, sha256 = read_file_fingerprint(path, ext)
+            return path, ext, preview, sha256, None
+        except OSError as e:
+            return path, ext, None, None, str(e)
+
+    def _write_batch(self, session, results, stats: Dict[str, Tuple[int, int]], known, report: IndexReport):
+        new_items: List[RegistryCreate] = []
+        changed_rows: List[dict] = []
+        touched: Dict[int, Tuple[int, int]] = {}
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+
+        for path, ext, preview, sha256, error in results:
+            if error:
+                report.errors.append(f"{path}: {error}")
+                continue
+            size, mtime_ns = stats[path]
+            previous = known.get(path)
+            if previous is None:
+                new_items.append(RegistryCreate(
+                    type="file",
+                    title=os.path.basename(path),
+                    path_url=path,
+                    content_raw=preview,
+                    meta_info=build_file_meta(ext, size, mtime_ns=mtime_ns, sha256=sha256, source=INDEXER_SOURCE)
+                ))
+            elif previous[3] == sha256:
+                touched[previous[0]] = (size, mtime_ns)
+            else:
+                changed_rows.append({"id": previous[0], "path": path, "content_raw": preview, "sha256": sha256, "size": size, "mtime_ns": mtime_ns, "ext": ext})
+
+        if new_items:
+            ids = self.db_target.bulk_create_registries_in_session(session, new_items)
+            report.created += sum(1 for i in ids if i is not None)
+            if self.tags:
+                self.db_target.bulk_add_tags_in_session(
+                    session, [(i, TagCreate(value=t)) for i in ids if i is not None for t in self.tags]
+                )
+
+        # meta_info se fusiona con la existente: conserva claves añadidas a mano (tema, etc.)
+        update_ids = [r["id"] for r in changed_rows] + list(touched)
+        if update_ids:
+            current_meta = dict(session.execute(
+                select(Registry.id, Registry.meta_info).where(Registry.id.in_(update_ids))
+            ).all())
+            rows = []
+            for r in changed_rows:
+                meta = dict(current_meta.get(r["id"]) or {})
+                meta.update(build_file_meta(r["ext"], r["size"], mtime_ns=r["mtime_ns"], sha256=r["sha256"], source=meta.get("source", INDEXER_SOURCE)))
+                content = r["content_raw"]
+                if not content or not content.strip():
+                    content = f"(Auto-Descripción) Título: {os.path.basename(r['path'])} | Ruta: {r['path']}"
+                fp = fingerprint_fields("file", r["path"], content, meta)
+                rows.append({
+                    "id": r["id"], "content_raw": content, "meta_info": meta, "modified_at": now,
+                    "content_hash": fp["content_hash"], "content_simhash": fp["content_simhash"]
+                })
+            self.db_target.bulk_update_registries_in_session(session, rows)
+            report.updated += len(rows)
+
+            meta_rows = []
+            for rid, (size, mtime_ns) in touched.items():
+                meta = dict(current_meta.get(rid) or {})
+                meta.update({"size_bytes": size, "mtime_ns": mtime_ns})
+                meta_rows.append({"id": rid, "meta_info": meta})
+            self.db_target.bulk_update_registries_in_session(session, meta_rows)
+            report.touched += len(meta_rows)
+
+        session.commit()
+
+    @timed("folder_index")
+    def run(self, progress=None) -> IndexReport:
+        """
+        Una pasada completa: escanea, detecta altas/cambios/bajas y escribe por lotes.
+        'progress(procesados, total)' se invoca tras cada lote.
+        """
+        report = IndexReport()
+        if not os.path.isdir(self.root):
+            report.errors.append(f"{self.root}: no es un directorio")
+            return report
+
+        with timed("folder_index_step", step="scan"):
+            stats = self.scan(report)
+
+        with SessionLocal() as session:
+            known = self._known(session)
+
+            # Solo se leen los archivos nuevos o con (tamaño, mtime) distintos a los guardados
+            pending = [
+                path for path, (size, mtime_ns) in stats.items()
+                if path not in known or known[path][1] != size or known[path][2] != mtime_ns
+            ]
+            report.unchanged = len(stats) - len(pending)
+
+            if pending:
+                with ThreadPoolExecutor(max_workers=self.max_threads, thread_name_prefix="nexus-index") as pool:
+                    batches = [pending[i:i + self.batch_size] for i in range(0, len(pending), self.batch_size)]
+                    # Un lote de lectura por delante: el disco trabaja mientras se escribe el anterior
+                    in_flight = [pool.submit(self._read, p) for p in batches[0]]
+                    for n, batch in enumerate(batches):
+                        next_flight = [pool.submit(self._read, p) for p in batches[n + 1]] if n + 1 < len(batches) else []
+                        with timed("folder_index_step", step="write"):
+                            self._write_batch(session, [f.result() for f in in_flight], stats, known, report)
+                        in_flight = next_flight
+                        if progress:
+                            progress(min((n + 1) * self.batch_size, len(pending)), len(pending))
+
+            if self.prune_missing:
+                # Solo archivos que ya no existen: los excluidos por extensión/ignore conservan su registro
+                missing = [
+                    rid for path, (rid, *_rest) in known.items()
+                    if path not in stats and not os.path.exists(path)
+                ]
+                if missing:
+                    report.deleted = self.db_target.bulk_delete_registries_in_session(session, missing)
+                    session.commit()
+
+        return report
+
+def index_folder(root: str, tags: Optional[List[str]] = None, **kwargs) -> IndexReport:
+    """Atajo: FolderIndexer(root, tags, **kwargs).run()."""
+    return FolderIndexer(root, tags=tags, **kwargs).run()
@@ -0,0 +1,282 @@
+import asyncio
+import heapq
+import itertools
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+from urllib.parse import urlparse
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+from core.database import nx_db, RegistryCreate, TagCreate
+from core.instrumentation import timed
+from core.fingerprint import canonical_key
+from core.outbound import outbound
+from modules.web_scraper import (
+    WEB_HEADERS, is_youtube_domain,
+    _extract_youtube, _parse_generic_web, _orphan_web_record
+)
+from rich.console import Console
+
+console = Console()
+
+# Límites por defecto del motor de ingesta concurrente
+DEFAULT_MAX_CONCURRENCY = 8   # Peticiones en vuelo en total
+DEFAULT_PER_DOMAIN = 2        # Peticiones en vuelo por dominio (evita baneos)
+DEFAULT_MAX_THREADS = 4       # Hilos para yt-dlp / transcripciones / parseo HTML
+DEFAULT_BATCH_SIZE = 25       # Registros por transacción de escritura
+DEFAULT_TIMEOUT = 10.0
+
+def _domain_key(netloc: str) -> str:
+    """Agrupa variantes de un mismo host (www., youtu.be) bajo una sola clave de límite."""
+    netloc = netloc.lower()
+    if is_youtube_domain(netloc):
+        return "youtube"
+    return netloc[4:] if netloc.startswith("www.") else netloc
+
+class _DomainDispatcher:
+    """
+    Reparte las URLs del lote entre los workers respetando el cupo por dominio.
+    Entrega siempre la siguiente URL del dominio con más pendientes que tenga cupo libre:
+    el dominio más cargado marca la duración del lote y no debe quedar a la espera detrás
+    de dominios con poca cola. Se usa solo desde el bucle de eventos.
+    """
+    def __init__(self, urls: List[str], per_domain: int):
+        self.per_domain = per_domain
+        self._queues = defaultdict(deque)
+        for url in urls:
+            self._queues[_domain_key(urlparse(url).netloc)].append(url)
+        self._pending = len(urls)
+        self._in_flight = defaultdict(int)
+        self._seq = itertools.count()  # Desempate estable en el heap
+        # Dominios con URLs pendientes y cupo libre, cada uno una sola vez: (-pendientes, seq, dominio)
+        self._ready = [(-len(q), next(self._seq), d) for d, q in self._queues.items()]
+        heapq.heapify(self._ready)
+        self._cond = asyncio.Condition()
+
+    def _push(self, domain: str):
+        heapq.heappush(self._ready, (-len(self._queues[domain]), next(self._seq), domain))
+
+    async def take(self) -> Optional[Tuple[str, str]]:
+        """(dominio, url) siguiente, esperando cupo si hace falta. None cuando no quedan URLs."""
+        async with self._cond:
+            while not self._ready:
+                if not self._pending:
+                    return None
+                await self._cond.wait()
+            _, _, domain = heapq.heappop(self._ready)
+            url = self._queues[domain].popleft()
+            self._pending -= 1
+            self._in_flight[domain] += 1
+            if self._queues[domain] and self._in_flight[domain] < self.per_domain:
+                self._push(domain)
+            if not self._pending:
+                self._cond.notify_all()  # Los workers en espera ya pueden terminar
+            return domain, url
+
+    async def release(self, domain: str):
+        """Libera el cupo de 'domain'; si vuelve a tener cupo y pendientes, despierta a un worker."""
+        async with self._cond:
+            self._in_flight[domain] -= 1
+            if self._queues[domain] and self._in_flight[domain] == self.per_domain - 1:
+                self._push(domain)
+                self._cond.notify()
+
+class IngestEngine:
+    """
+    Motor asyncio para ingestar lotes de URLs en paralelo.
+    - Límite global (max_concurrency workers) y por dominio de peticiones simultáneas.
+    - Un único httpx.AsyncClient compartido (pool de conexiones keep-alive).
+    - yt-dlp, transcripciones y parseo HTML (bloqueantes) en un ThreadPool acotado.
+    - Escritura a la BD en lotes (bulk_create_registries) desde un único hilo escritor.
+    """
+    def __init__(
+        self,
+        db_target=nx_db,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        per_domain: int = DEFAULT_PER_DOMAIN,
+        max_threads: int = DEFAULT_MAX_THREADS,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        timeout: float = DEFAULT_TIMEOUT,
+        client: Optional["httpx.AsyncClient"] = None
+    ):
+        self.db_target = db_target
+        self.max_concurrency = max(1, max_concurrency)
+        self.per_domain = max(1, per_domain)
+        self.max_threads = max(1, max_threads)
+        self.batch_size = max(1, batch_size)
+        self.timeout = timeout
+        # Cliente inyectable (ej. benchmarks/mock_web.py: stub_client() contra el servidor de pruebas)
+        self._external_client = client
+
+    async def run(self, urls: List[str], tags: List[str]) -> Tuple[List[int], List[str]]:
+        """Procesa todas las URLs y retorna (IDs creados, URLs fallidas)."""
+        urls = [u.strip() for u in urls if u and u.strip()]
+        self._success: List[int] = []
+        self._failed: List[str] = []
+        self._pending: List[RegistryCreate] = []
+        self._tags = tags
+        urls = self._skip_known(urls)
+        self._done = 0
+        self._total = len(urls)
+        if not urls:
+            return self._success, self._failed
+
+        dispatcher = _DomainDispatcher(urls, self.per_domain)
+        self._pool = ThreadPoolExecutor(max_workers=self.max_threads, thread_name_prefix="nexus-ingest")
+        # SQLite admite un solo escritor: serializamos las escrituras en un hilo dedicado
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="nexus-writer")
+        self._write_lock = asyncio.Lock()
+
+        client = self._external_client or httpx.AsyncClient(
+            headers=WEB_HEADERS,
+            timeout=self.timeout,
+            follow_redirects=True,
+            limits=httpx.Limits(
+                max_connections=self.max_concurrency,
+                max_keepalive_connections=self.max_concurrency
+            )
+        )
+        try:
+            workers = min(self.max_concurrency, len(urls))
+            await asyncio.gather(*(self._worker(client, dispatcher) for _ in range(workers)))
+        finally:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._writer.shutdown(wait=True)
+            try:
+                # Volcar lo que quede en el buffer (también tras Ctrl+C / cancelación)
+                if self._pending:
+                    batch, self._pending = self._pending, []
+                    self._flush(batch)
+            finally:
+                if self._external_client is None:
+                    await client.aclose()
+
+        return self._success, self._failed
+
+    def _skip_known(self, urls: List[str]) -> List[str]:
+        """
+        Descarta antes de descargar nada las URLs cuya clave canónica ya existe en la BD
+        (cuentan como éxito con el ID existente) y las variantes repetidas dentro del lote.
+        """
+        unique, seen = [], set()
+        for url in urls:
+            key = canonical_key(url)
+            if key in seen:
+                continue
+            seen.add(key)
+            unique.append(url)
+
+        db = self.db_target
+        if not hasattr(db, "existing_canonical_keys_in_session") or getattr(db, "Session", None) is None:
+            return unique
+        with db.Session() as session:
+            known = db.existing_canonical_keys_in_session(session, unique)
+            if known and self._tags:
+                db.bulk_add_tags_in_session(session, [
+                    (reg_id, TagCreate(value=t)) for reg_id in set(known.values()) for t in self._tags
+                ])
+                session.commit()
+        if known:
+            console.print(f"[cyan]↺ {len(known)} URL(s) ya indexadas: se omiten sin descargar.[/cyan]")
+            self._success.extend(known.values())
+        return [u for u in unique if u not in known]
+
+    async def _worker(self, client, dispatcher: _DomainDispatcher):
+        """Procesa URLs del repartidor hasta agotarlas. El cupo del dominio se libera antes de escribir."""
+        while (item := await dispatcher.take()) is not None:
+            domain, url = item
+            try:
+                data = await self._extract(client, url)
+            finally:
+                await dispatcher.release(domain)
+            await self._collect(url, data)
+
+    async def _extract(self, client, url: str) -> Optional[RegistryCreate]:
+        """Descarga/extrae una URL. None si la extracción falla."""
+        parsed = urlparse(url)
+        loop = asyncio.get_running_loop()
+        try:
+            if is_youtube_domain(parsed.netloc.lower()):
+                return await loop.run_in_executor(self._pool, _extract_youtube, url, parsed)
+            return await self._fetch_web(client, url, loop)
+        except Exception as e:
+            console.print(f"[yellow]Aviso: Falló la extracción de {url}: {e}[/yellow]")
+            return None
+
+    async def _collect(self, url: str, data: Optional[RegistryCreate]):
+        """Anota el resultado y encola el registro; vuelca el lote al llegar a batch_size."""
+        loop = asyncio.get_running_loop()
+        self._done += 1
+        console.print(f"[bold cyan][{self._done}/{self._total}][/] {'✓' if data else '✗'} [dim]{url}[/]")
+        if data is None:
+            self._failed.append(url)
+            return
+
+        self._pending.append(data)
+        if len(self._pending) >= self.batch_size:
+            async with self._write_lock:
+                batch, self._pending = self._pending, []
+                await loop.run_in_executor(self._writer, self._flush, batch)
+
+    async def _fetch_web(self, client, url: str, loop) -> RegistryCreate:
+        """GET asíncrono + parseo HTML en hilo. Si la página falla se guarda la URL huérfana."""
+        async def _get():
+            res = await client.get(url)
+            res.raise_for_status()
+            return res
+
+        try:
+            with timed("ingest_step", step="web_fetch"):
+                res = await outbound.acall("web", _get)
+        except Exception as e:
+            console.print(f"[yellow]Aviso: Error conectando a {url}. Se guardará la URL huérfana. ({e})[/yellow]")
+            return _orphan_web_record(url)
+        return await loop.run_in_executor(self._pool, _parse_generic_web, url, res.text)
+
+    @timed("ingest_step", step="flush_batch")
+    def _flush(self, batch: List[RegistryCreate]):
+        """Escribe un lote de registros y sus tags (bloqueante, se ejecuta en el hilo escritor)."""
+        if not batch:
+            return
+        db = self.db_target
+        try:
+            if hasattr(db, "bulk_create_registries"):
+                ids = db.bulk_create_registries(batch)
+                if self._tags:
+                    db.bulk_add_tags([
+                        (reg_id, TagCreate(value=t)) for reg_id in ids if reg_id is not None for t in self._tags
+                    ])
+            else:
+                # Destinos simples (ej. MockDB de scripts) sin API masiva
+                ids = []
+                for data in batch:
+                    try:
+                        reg = db.create_registry(data)
+                        for t in self._tags:
+                            db.add_tag(reg.id, TagCreate(value=t))
+                        ids.append(reg.id)
+                    except Exception:
+                        ids.append(None)
+        except Exception as e:
+            console.print(f"[bold white on red]Error guardando lote en base de datos: {e}[/]")
+            ids = [None] * len(batch)
+
+        for data, reg_id in zip(batch, ids):
+            if reg_id is None:
+                self._failed.append(data.path_url)
+            else:
+                self._success.append(reg_id)
+
+def ingest_urls_concurrently(
+    urls: List[str],
+    tags: List[str],
+    db_target=nx_db,
+    **engine_opts
+) -> Tuple[List[int], List[str]]:
+    """Punto de entrada síncrono del motor: ejecuta IngestEngine.run en un event loop nuevo."""
+    engine = IngestEngine(db_target=db_target, **engine_opts)
+    return asyncio.run(engine.run(urls, tags))
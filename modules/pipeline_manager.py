@@ -1,30 +1,323 @@
-
 import os
 import json
-import time
+import queue
+import threading
 from datetime import datetime
 from modules.web_scraper import get_playlist_video_urls, ingest_web_resource
+from modules.ai_batch import valid_cards
 from agents.deepseek_agent import deepseek_agent
-from core.database import nx_db, RegistryCreate, CardCreate, TagCreate
+from core.database import nx_db, Registry, PipelineJob, RegistryCreate, CardCreate, TagCreate
 from core.staging_db import staging_db
+from core.outbound import outbound
+from core.instrumentation import timed
 from rich.console import Console
 from rich.progress import Progress
+from sqlalchemy import case
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
 console = Console()
 
 QUEUE_FILE = r"G:\Mi unidad\Nexus_Staging\playlists_queue.txt"
 HISTORY_FILE = r"G:\Mi unidad\Nexus_Staging\playlists_history.json"
 
+# Etapas del pipeline por video (orden estricto). 'failed': agotó MAX_JOB_ATTEMPTS antes de llegar a Nexus;
+# 'kept': ya en Nexus pero se deja en la playlist (sin playlist_item_id o borrado fallido MAX_JOB_ATTEMPTS veces)
+JOB_STATES = ("queued", "fetched", "summarised", "promoted", "removed", "kept", "failed")
+TERMINAL_STATES = ("removed", "kept", "failed")
+MAX_JOB_ATTEMPTS = 3  # Fallos tras los que un job deja de reintentarse
+
+# El ritmo de descargas de YouTube (mitiga bloqueos de IP) y de DeepSeek lo marca
+# el planificador compartido core.outbound, no una pausa fija por etapa.
+
 from modules.youtube_manager import YouTubeManager
 
+# ----------------------------------------------------------------------------
+# Cola persistente de trabajos (tabla pipeline_jobs en nexus.db)
+# ----------------------------------------------------------------------------
+
+def enqueue_videos(playlist_url: str, videos: list) -> int:
+    """Encola los videos de una playlist. Los ya conocidos (por URL) se ignoran. Retorna los nuevos."""
+    if not videos:
+        return 0
+    rows = [{
+        "video_url": v['url'],
+        "playlist_url": playlist_url,
+        "playlist_item_id": v.get('playlist_item_id'),
+        "title": v.get('title'),
+        "state": "queued",
+        "attempts": 0,
+    } for v in videos]
+    with nx_db.Session() as session:
+        stmt = sqlite_insert(PipelineJob.__table__).on_conflict_do_nothing(index_elements=['video_url'])
+        result = session.connection().execute(stmt, rows)
+        session.commit()
+        return max(result.rowcount, 0)
+
+def advance_job(session, job_id: int, from_state: str, to_state: str, **fields) -> bool:
+    """
+    Transición idempotente (compare-and-set): solo avanza si el job sigue en 'from_state'.
+    No commitea — responsabilidad del llamador.
+    """
+    values = {PipelineJob.state: to_state, PipelineJob.error: None}
+    for k, v in fields.items():
+        values[getattr(PipelineJob, k)] = v
+    rows = session.query(PipelineJob).filter(
+        PipelineJob.id == job_id, PipelineJob.state == from_state
+    ).update(values, synchronize_session=False)
+    return rows > 0
+
+def _record_job_error(job_id: int, error: str):
+    """
+    Guarda el error y suma un intento sin cambiar la etapa (se reintenta en la próxima corrida).
+    Al llegar a MAX_JOB_ATTEMPTS un job aún no promovido pasa a 'failed' y no se reintenta más;
+    uno ya promovido pasa a 'kept' (el dato ya está en Nexus, solo queda en la playlist).
+    """
+    attempts = PipelineJob.attempts + 1
+    with nx_db.Session() as session:
+        session.query(PipelineJob).filter(PipelineJob.id == job_id).update({
+            PipelineJob.error: str(error)[:500],
+            PipelineJob.attempts: attempts,
+            PipelineJob.state: case(
+                ((attempts >= MAX_JOB_ATTEMPTS) & PipelineJob.state.in_(JOB_STATES[:3]), "failed"),
+                ((attempts >= MAX_JOB_ATTEMPTS) & (PipelineJob.state == "promoted"), "kept"),
+                else_=PipelineJob.state
+            )
+        }, synchronize_session=False)
+        session.commit()
+
+def get_pending_jobs(include_promoted: bool = True) -> list:
+    """
+    Jobs no terminados, en orden de llegada (detached de la sesión).
+    include_promoted=False omite los 'promoted': sin API de YouTube no hay borrado que
+    intentar y esperan en la tabla a una corrida con API.
+    """
+    states = TERMINAL_STATES if include_promoted else TERMINAL_STATES + ("promoted",)
+    with nx_db.Session() as session:
+        jobs = session.query(PipelineJob).filter(
+            PipelineJob.state.notin_(states)
+        ).order_by(PipelineJob.id).all()
+        session.expunge_all()
+        return jobs
+
+def get_job_counts() -> dict:
+    """Conteo de jobs por estado (para paneles de estado)."""
+    from sqlalchemy import func
+    with nx_db.Session() as session:
+        return dict(session.query(PipelineJob.state, func.count(PipelineJob.id)).group_by(PipelineJob.state).all())
+
+# ----------------------------------------------------------------------------
+# Etapas
+# ----------------------------------------------------------------------------
+
+@timed("pipeline_stage", stage="fetch")
+def _stage_fetch(job) -> bool:
+    """queued -> fetched: descarga transcripción/metadatos a Staging (G:)."""
+    # Video ya centralizado en Nexus (otra URL del mismo ID): sin descarga ni DeepSeek
+    existing = nx_db.find_registry_by_url(job.video_url)
+    if existing is not None:
+        with nx_db.Session() as session:
+            advance_job(session, job.id, "queued", "promoted", registry_id=existing.id)
+            session.commit()
+        job.state, job.registry_id = "promoted", existing.id
+        console.print(f"     [cyan]↺ Ya estaba en Nexus (ID {existing.id}); se omiten descarga e IA.[/cyan]")
+        return True
+
+    staging_id = None
+    # Reanudación: si un corte ocurrió tras guardar en staging, reutilizamos ese registro
+    if staging_db.Session is not None:
+        with staging_db.Session() as s_session:
+            existing = s_session.query(Registry.id).filter(Registry.path_url == job.video_url).first()
+            if existing:
+                staging_id = existing[0]
+
+    if staging_id is None:
+        reg_staging = ingest_web_resource(job.video_url, ["pipeline_staging"], db_target=staging_db)
+        if not reg_staging:
+            _record_job_error(job.id, "Fallo ingesta a Staging")
+            console.print(f"     [bold red]⚠️  Fallo ingesta de video {job.video_url}[/bold red]")
+            return False
+        staging_id = reg_staging.id
+
+    with nx_db.Session() as session:
+        advance_job(session, job.id, "queued", "fetched", staging_id=staging_id)
+        session.commit()
+    job.state, job.staging_id = "fetched", staging_id
+    return True
+
+@timed("pipeline_stage", stage="summarise")
+def _stage_summarise(job) -> bool:
+    """fetched -> summarised: genera resumen y flashcards con DeepSeek."""
+    reg_staging = staging_db.get_registry(job.staging_id) if job.staging_id else None
+    if not reg_staging:
+        _record_job_error(job.id, f"Registro de staging {job.staging_id} no encontrado")
+        return False
+
+    console.print(f"     • Generando Inteligencia con DeepSeek: [italic]{reg_staging.title}[/italic]")
+    resumen, cards = deepseek_agent.process_content(reg_staging.title, reg_staging.content_raw)
+    if resumen is None:
+        # Sin resumen no se avanza: el job queda en 'fetched' para la próxima corrida
+        if outbound.is_open("deepseek"):
+            # Proveedor caído (circuito abierto): no cuenta como intento del job
+            console.print("     [yellow]⚠️  Circuito de DeepSeek abierto; se reintentará en la próxima corrida.[/yellow]")
+        else:
+            _record_job_error(job.id, "DeepSeek no devolvió resumen")
+            console.print(f"     [bold red]⚠️  DeepSeek no devolvió resumen para {job.video_url}[/bold red]")
+        return False
+    cards = valid_cards(cards)
+
+    with nx_db.Session() as session:
+        advance_job(session, job.id, "fetched", "summarised", summary=resumen, cards=cards)
+        session.commit()
+    job.state, job.summary, job.cards = "summarised", resumen, cards
+    return True
+
+@timed("pipeline_stage", stage="promote")
+def _stage_promote(job) -> bool:
+    """summarised -> promoted: centraliza en Nexus (registro + tag + cards + estado en una transacción)."""
+    reg_staging = staging_db.get_registry(job.staging_id) if job.staging_id else None
+    if not reg_staging:
+        _record_job_error(job.id, f"Registro de staging {job.staging_id} no encontrado")
+        return False
+
+    try:
+        data_final = RegistryCreate(
+            type="youtube",
+            title=reg_staging.title,
+            path_url=reg_staging.path_url,
+            content_raw=reg_staging.content_raw,
+            summary=job.summary,
+            meta_info=reg_staging.meta_info,
+            is_flashcard_source=True
+        )
+        # Mismo fichero nexus.db: el alta del registro y el avance del job son atómicos
+        with nx_db.Session() as session:
+            reg_nexus_id = nx_db.bulk_create_registries_in_session(session, [data_final])[0]
+            if reg_nexus_id is None:
+                # Ya centralizado por otra vía tras la descarga: se vincula el job a ese registro
+                existing_id = nx_db.existing_canonical_keys_in_session(session, [data_final.path_url]).get(data_final.path_url)
+                if existing_id is None:
+                    raise ValueError(f"Registro Duplicado: {data_final.path_url}")
+                advance_job(session, job.id, "summarised", "promoted", registry_id=existing_id)
+                session.commit()
+                console.print(f"     [cyan]↺ Ya estaba en Nexus (ID {existing_id}); se vincula sin duplicar.[/cyan]")
+                job.state, job.registry_id = "promoted", existing_id
+                return True
+
+            nx_db.bulk_add_tags_in_session(session, [(reg_nexus_id, TagCreate(value="YouTube_Pipeline"))])
+            nx_db.bulk_create_cards_in_session(session, [
+                CardCreate(
+                    parent_id=reg_nexus_id,
+                    question=c['question'],
+                    answer=c['answer'],
+                    type="DeepSeek_AI"
+                ) for c in valid_cards(job.cards)
+            ])
+            advance_job(session, job.id, "summarised", "promoted", registry_id=reg_nexus_id)
+            session.commit()
+
+        console.print(f"     [bold green]✅ Centralizado en Nexus ID {reg_nexus_id}[/bold green]")
+        job.state, job.registry_id = "promoted", reg_nexus_id
+        return True
+    except Exception as e:
+        _record_job_error(job.id, e)
+        console.print(f"     [bold red]❌ Error moviendo a Nexus: {e}[/bold red]")
+        return False
+
+@timed("pipeline_stage", stage="remove")
+def _stage_remove(job, yt_manager) -> bool:
+    """promoted -> removed: elimina el video de la playlist de YouTube (gestión de cola)."""
+    if not job.playlist_item_id:
+        # Encolado por yt-dlp o video suelto: no hay item que borrar, el job termina aquí
+        with nx_db.Session() as session:
+            advance_job(session, job.id, "promoted", "kept")
+            session.commit()
+        job.state = "kept"
+        return False
+    if not yt_manager:
+        # Queda 'promoted' a la espera de una corrida con API (get_pending_jobs no lo recarga sin ella)
+        return False
+    if yt_manager.remove_video_from_playlist(job.playlist_item_id):
+        with nx_db.Session() as session:
+            advance_job(session, job.id, "promoted", "removed")
+            session.commit()
+        job.state = "removed"
+        console.print(f"     [bold blue]🗑️  Video eliminado de la playlist de YouTube (Cola despejada).[/bold blue]")
+        return True
+    _record_job_error(job.id, "No se pudo eliminar de la playlist")
+    console.print(f"     [yellow]⚠️ No se pudo eliminar de YouTube, pero el dato ya esta en Nexus.[/yellow]")
+    return False
+
+def _run_stage_worker(stage_fn, from_state: str, in_q: queue.Queue, out_q: queue.Queue, stop: threading.Event):
+    """
+    Consume jobs de in_q, aplica la etapa a los que están en 'from_state' y pasa los exitosos a out_q.
+    Los jobs ya más avanzados (reanudación) pasan directo. None = fin de cola.
+    """
+    while not stop.is_set():
+        job = in_q.get()
+        if job is None:
+            break
+        if job.state == from_state:
+            try:
+                ok = stage_fn(job)
+            except Exception as e:
+                _record_job_error(job.id, e)
+                console.print(f"     [bold red]❌ Error en etapa '{from_state}' de {job.video_url}: {e}[/bold red]")
+                ok = False
+            if not ok:
+                continue
+        out_q.put(job)
+    out_q.put(None)
+
+def process_pending_jobs(yt_manager=None) -> dict:
+    """
+    Procesa todos los jobs pendientes como pipeline por etapas:
+    [descarga] -> [DeepSeek] -> [promoción + borrado de playlist].
+    Cada etapa corre en su hilo, así la descarga del video N+1 se solapa con la IA del video N.
+    Retorna el conteo final por estado.
+    """
+    jobs = get_pending_jobs(include_promoted=yt_manager is not None)
+    if not jobs:
+        return get_job_counts()
+
+    console.print(f"[bold cyan]🚀 Procesando {len(jobs)} videos pendientes (reanudando desde su última etapa)...[/bold cyan]")
+
+    stop = threading.Event()
+    fetch_q, summarise_q, promote_q = queue.Queue(), queue.Queue(maxsize=4), queue.Queue()
+    workers = [
+        threading.Thread(target=_run_stage_worker, args=(_stage_fetch, "queued", fetch_q, summarise_q, stop), daemon=True),
+        threading.Thread(target=_run_stage_worker, args=(_stage_summarise, "fetched", summarise_q, promote_q, stop), daemon=True),
+    ]
+    for w in workers:
+        w.start()
+    for job in jobs:
+        fetch_q.put(job)
+    fetch_q.put(None)
+
+    try:
+        while True:
+            job = promote_q.get()
+            if job is None:
+                break
+            if job.state == "summarised" and not _stage_promote(job):
+                continue
+            if job.state == "promoted":
+                _stage_remove(job, yt_manager)
+    except KeyboardInterrupt:
+        stop.set()
+        console.print("\n[bold yellow]⚠️  Pipeline interrumpido. El progreso por video quedó guardado; se reanudará en la próxima corrida.[/bold yellow]")
+        raise
+
+    return get_job_counts()
+
 def run_youtube_pipeline():
     """
     Ejecuta el plan de trabajo automatizado para playlists:
-    1. Lee cola de playlists.
+    1. Lee cola de playlists y encola sus videos en pipeline_jobs (persistente).
     2. Descarga a Staging (G:).
     3. Procesa con DeepSeek.
     4. Mueve a Nexus Local.
     5. Opcional: Elimina el video de la playlist de YouTube (via API).
+    Un corte a mitad de playlist se reanuda desde la última etapa completada de cada video.
     """
     # Asegurar que el Buffer de Staging esté inicializado
     staging_db.init_staging()
@@ -40,37 +333,31 @@ def run_youtube_pipeline():
             console.print(f"[yellow]Aviso: No se pudo conectar con YouTube API. Se usará Modo Scraping (Modo Rescate). {e}[/yellow]")
             yt_manager = None
 
+    playlists_urls = []
+    history = []
     if not os.path.exists(QUEUE_FILE):
         console.print(f"[yellow]Aviso: No se encontro el archivo de cola en {QUEUE_FILE}[/yellow]")
-        return
-
-    # Cargar historial
-    history = []
-    if os.path.exists(HISTORY_FILE):
-        with open(HISTORY_FILE, 'r') as f:
-            history = json.load(f)
-
-    with open(QUEUE_FILE, 'r') as f:
-        playlists_urls = [line.strip() for line in f if line.strip() and line.strip() not in history]
-
-    if not playlists_urls:
-        console.print("[green]No hay nuevas playlists para procesar en la cola.[/green]")
-        return
+    else:
+        # Cargar historial
+        if os.path.exists(HISTORY_FILE):
+            with open(HISTORY_FILE, 'r') as f:
+                history = json.load(f)
 
-    console.print(f"[bold cyan]🚀 Iniciando Pipeline para {len(playlists_urls)} playlists...[/bold cyan]")
+        with open(QUEUE_FILE, 'r') as f:
+            playlists_urls = [line.strip() for line in f if line.strip() and line.strip() not in history]
 
     for p_url in playlists_urls:
-        console.print(f"\n[bold yellow]📂 Procesando Playlist:[/] {p_url}")
-        
+        console.print(f"\n[bold yellow]📂 Encolando Playlist:[/] {p_url}")
+
         videos_to_process = []
         playlist_id = None
-        
+
         # Intentar obtener videos via API oficial si esta disponible
         if yt_manager:
             playlist_id = yt_manager.get_playlist_id_from_url(p_url)
             if playlist_id:
                 videos_to_process = yt_manager.get_playlist_items(playlist_id)
-        
+
         # Fallback a yt-dlp si la API fallo o no esta disponible
         if not videos_to_process:
             raw_urls = get_playlist_video_urls(p_url)
@@ -80,67 +367,18 @@ def run_youtube_pipeline():
                 # Si no es playlist, es un video individual. Lo agregamos para procesar.
                 videos_to_process = [{'url': p_url, 'title': p_url, 'playlist_item_id': None}]
 
-        console.print(f"   • {len(videos_to_process)} recursos detectados para procesar.")
-        
-        for v_data in videos_to_process:
-            v_url = v_data['url']
-            v_item_id = v_data['playlist_item_id']
-            
-            console.print(f"\n   [cyan]»[/] Procesando: [italic]{v_data['title']}[/italic]")
-            
-            # 2. Descarga masiva a Staging (G:)
-            reg_staging = ingest_web_resource(v_url, ["pipeline_staging"], db_target=staging_db)
-            
-            if reg_staging:
-                # 3. Procesamiento Inteligente con DeepSeek
-                console.print(f"     • Generando Inteligencia con DeepSeek...")
-                resumen, cards = deepseek_agent.process_content(reg_staging.title, reg_staging.content_raw)
-                
-                # 4. Centralizacion en Nexus (Local SSD)
-                try:
-                    data_final = RegistryCreate(
-                        type="youtube",
-                        title=reg_staging.title,
-                        path_url=reg_staging.path_url,
-                        content_raw=reg_staging.content_raw,
-                        summary=resumen,
-                        meta_info=reg_staging.meta_info,
-                        is_flashcard_source=True
-                    )
-                    reg_nexus = nx_db.create_registry(data_final)
-                    
-                    # Agregar tags y cards
-                    nx_db.add_tag(reg_nexus.id, TagCreate(value="YouTube_Pipeline"))
-                    for c in cards:
-                        nx_db.create_card(CardCreate(
-                            parent_id=reg_nexus.id,
-                            question=c['question'],
-                            answer=c['answer'],
-                            type="DeepSeek_AI"
-                        ))
-                    
-                    console.print(f"     [bold green]✅ Centralizado en Nexus ID {reg_nexus.id}[/bold green]")
-                    
-                    # 5. ELIMINACIÓN DEL HISTORIAL DE YOUTUBE (Gestión de Cola)
-                    if yt_manager and v_item_id:
-                        if yt_manager.remove_video_from_playlist(v_item_id):
-                            console.print(f"     [bold blue]🗑️  Video eliminado de la playlist de YouTube (Cola despejada).[/bold blue]")
-                        else:
-                            console.print(f"     [yellow]⚠️ No se pudo eliminar de YouTube, pero el dato ya esta en Nexus.[/yellow]")
-
-                except Exception as e:
-                    console.print(f"     [bold red]❌ Error moviendo a Nexus: {e}[/bold red]")
-            else:
-                console.print(f"     [bold red]⚠️  Fallo ingesta de video {v_url}[/bold red]")
-            
-            # Pequeña pausa para mitigar bloqueos de IP (Rate Limiting)
-            time.sleep(2)
+        new_jobs = enqueue_videos(p_url, videos_to_process)
+        console.print(f"   • {len(videos_to_process)} recursos detectados, {new_jobs} nuevos en la cola persistente.")
 
-        # Actualizar historial local
+        # La playlist ya quedó persistida en pipeline_jobs: se marca en el historial de inmediato
         history.append(p_url)
         with open(HISTORY_FILE, 'w') as f:
             json.dump(history, f)
-        
-        console.print(f"[green]✓ Playlist {p_url} completada.[/green]")
 
-    console.print("\n[bold green]🏁 Pipeline finalizado con exito.[/bold green]")
+    counts = process_pending_jobs(yt_manager)
+    if not playlists_urls and not any(counts.get(s) for s in JOB_STATES if s not in TERMINAL_STATES):
+        console.print("[green]No hay nuevas playlists ni videos pendientes en la cola.[/green]")
+        return
+
+    resumen = " │ ".join(f"{s}: {counts.get(s, 0)}" for s in JOB_STATES)
+    console.print(f"\n[bold green]🏁 Pipeline finalizado.[/bold green] [white]{resumen}[/white]")
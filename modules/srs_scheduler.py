@@ -0,0 +1,333 @@
+import os
+import json
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import select, update
+
+from core.database import Card, ReviewLog
+
+# ----------------------------------------------------------------------------
+# Planificador FSRS (Free Spaced Repetition Scheduler, variante 4.5) vectorizado
+# ----------------------------------------------------------------------------
+# Todas las fórmulas operan sobre arrays NumPy: la misma función sirve para una
+# tarjeta (TUI / API) o para lotes completos (reprogramación masiva, simulación).
+#
+# Escala de calificación FSRS: 1 Again, 2 Hard, 3 Good, 4 Easy.
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PARAMS_PATH = os.environ.get("NEXUS_FSRS_PARAMS", os.path.join(ROOT_DIR, "fsrs_params.json"))
+
+DEFAULT_WEIGHTS = (
+    0.4872, 1.4003, 3.7145, 13.8206, 5.1618, 1.2298, 0.8975, 0.031, 1.6474,
+    0.1367, 1.0461, 2.1072, 0.0793, 0.3246, 1.587, 0.2272, 2.8755
+)
+# Límites de cada peso durante la optimización
+WEIGHT_BOUNDS = (
+    (0.1, 100.0), (0.1, 100.0), (0.1, 100.0), (0.1, 100.0), (1.0, 10.0), (0.1, 5.0),
+    (0.1, 5.0), (0.0, 0.75), (0.0, 4.0), (0.0, 0.8), (0.01, 3.0), (0.5, 5.0),
+    (0.01, 0.2), (0.01, 0.9), (0.01, 3.0), (0.0, 1.0), (1.0, 6.0)
+)
+
+DECAY = -0.5
+FACTOR = 0.9 ** (1 / DECAY) - 1  # 19/81: R(t=S) = 0.9
+DEFAULT_RETENTION = 0.9
+MAXIMUM_INTERVAL = 36500
+
+# Calificaciones de cada interfaz -> escala FSRS
+TUI_GRADE_TO_RATING = {1: 1, 2: 3, 3: 4}           # Malo / Bueno / Fácil
+WEB_QUALITY_TO_RATING = {0: 1, 1: 2, 2: 3, 3: 4}   # Olvidado / Difícil / Bien / Fácil
+SLOW_EASY_SECONDS = 15.0                            # 'Fácil' lento cuenta como 'Bueno'
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def _naive(dt: Optional[datetime]) -> Optional[datetime]:
+    return dt.replace(tzinfo=None) if dt is not None and dt.tzinfo is not None else dt
+
+class FSRSScheduler:
+    """Motor de repetición espaciada compartido por el TUI y la API web."""
+
+    def __init__(
+        self,
+        weights: Optional[Sequence[float]] = None,
+        desired_retention: float = DEFAULT_RETENTION,
+        maximum_interval: int = MAXIMUM_INTERVAL
+    ):
+        self.w = np.asarray(weights if weights is not None else DEFAULT_WEIGHTS, dtype=np.float64)
+        self.desired_retention = desired_retention
+        self.maximum_interval = maximum_interval
+
+    # --- Persistencia de parámetros ---
+
+    @classmethod
+    def load(cls, path: str = PARAMS_PATH) -> "FSRSScheduler":
+        """Crea el planificador con los parámetros optimizados si existen (si no, los por defecto)."""
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                return cls(
+                    weights=data.get("weights"),
+                    desired_retention=data.get("desired_retention", DEFAULT_RETENTION),
+                    maximum_interval=data.get("maximum_interval", MAXIMUM_INTERVAL)
+                )
+            except (OSError, ValueError):
+                pass
+        return cls()
+
+    def save(self, path: str = PARAMS_PATH, **extra):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({
+                "weights": [round(float(x), 4) for x in self.w],
+                "desired_retention": self.desired_retention,
+                "maximum_interval": self.maximum_interval,
+                **extra
+            }, f, indent=2)
+
+    # --- Fórmulas (vectorizadas) ---
+
+    @staticmethod
+    def retrievability(elapsed_days, stability) -> np.ndarray:
+        """Probabilidad de recuerdo tras 'elapsed_days' con estabilidad 'stability'."""
+        t = np.maximum(np.asarray(elapsed_days, dtype=np.float64), 0.0)
+        s = np.maximum(np.asarray(stability, dtype=np.float64), 0.01)
+        return np.power(1.0 + FACTOR * t / s, DECAY)
+
+    def intervals(self, stability) -> np.ndarray:
+        """Días hasta el próximo repaso para alcanzar la retención deseada."""
+        s = np.asarray(stability, dtype=np.float64)
+        raw = s / FACTOR * (np.power(self.desired_retention, 1.0 / DECAY) - 1.0)
+        return np.clip(np.rint(raw), 1, self.maximum_interval).astype(np.int64)
+
+    def _init_difficulty(self, rating, w=None) -> np.ndarray:
+        w = self.w if w is None else w
+        return np.clip(w[4] - (np.asarray(rating) - 3) * w[5], 1.0, 10.0)
+
+    def next_states(self, stability, difficulty, elapsed_days, rating, w=None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Nuevos (estabilidad, dificultad) tras calificar. Acepta escalares o arrays.
+        Una estabilidad <= 0 indica tarjeta nueva (primer repaso).
+        """
+        w = self.w if w is None else w
+        s = np.asarray(stability, dtype=np.float64)
+        g = np.asarray(rating, dtype=np.int64)
+        d = np.clip(np.asarray(difficulty, dtype=np.float64), 1.0, 10.0)
+        is_new = ~(s > 0)
+        s_safe = np.where(is_new, 1.0, s)
+
+        # Tarjetas nuevas
+        s0 = w[np.clip(g - 1, 0, 3)]
+        d0 = self._init_difficulty(g, w)
+
+        # Dificultad con reversión a la media
+        d_next = d - w[6] * (g - 3)
+        d_next = np.clip(w[7] * self._init_difficulty(3, w) + (1 - w[7]) * d_next, 1.0, 10.0)
+
+        r = self.retrievability(elapsed_days, s_safe)
+        hard = np.where(g == 2, w[15], 1.0)
+        easy = np.where(g == 4, w[16], 1.0)
+        s_recall = s_safe * (
+            np.exp(w[8]) * (11 - d) * np.power(s_safe, -w[9]) * (np.exp(w[10] * (1 - r)) - 1) * hard * easy + 1
+        )
+        s_forget = np.minimum(
+            w[11] * np.power(d, -w[12]) * (np.power(s_safe + 1, w[13]) - 1) * np.exp(w[14] * (1 - r)),
+            s_safe
+        )
+
+        new_s = np.where(is_new, s0, np.where(g == 1, s_forget, s_recall))
+        new_d = np.where(is_new, d0, d_next)
+        return np.maximum(new_s, 0.01), new_d
+
+    # --- Operaciones sobre la BD ---
+
+    def review_card(
+        self,
+        session,
+        card: Card,
+        rating: int,
+        response_seconds: Optional[float] = None,
+        source: str = "tui",
+        now: Optional[datetime] = None
+    ) -> ReviewLog:
+        """
+        Aplica una calificación FSRS a la tarjeta y registra el repaso en review_log.
+        No commitea — responsabilidad del llamador.
+        """
+        now = now or _utcnow()
+        last = _naive(card.last_review)
+        elapsed = (now - last).total_seconds() / 86400 if last else 0.0
+        s_before = float(card.stability or 0.0)
+        d_before = float(card.difficulty or 0.0)
+
+        new_s, new_d = self.next_states(s_before, d_before, elapsed, rating)
+        new_s, new_d = float(new_s), float(new_d)
+        interval = int(self.intervals(new_s))
+
+        card.stability = new_s
+        card.difficulty = new_d
+        card.last_review = now
+        card.next_review = now + timedelta(days=interval)
+
+        log = ReviewLog(
+            card_id=card.id,
+            reviewed_at=now,
+            rating=int(rating),
+            elapsed_days=elapsed,
+            scheduled_days=interval,
+            stability_before=s_before,
+            difficulty_before=d_before,
+            stability_after=new_s,
+            difficulty_after=new_d,
+            response_seconds=response_seconds,
+            source=source
+        )
+        session.add(log)
+        return log
+
+    def reschedule_all(self, session, batch_size: int = 5000) -> int:
+        """
+        Recalcula next_review de todas las tarjetas ya repasadas con los parámetros
+        actuales (p. ej. tras optimizar o cambiar la retención deseada). No commitea.
+        """
+        rows = session.execute(
+            select(Card.id, Card.stability, Card.last_review).where(Card.stability > 0, Card.last_review.isnot(None))
+        ).all()
+        if not rows:
+            return 0
+        ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+        stab = np.fromiter((r[1] for r in rows), dtype=np.float64, count=len(rows))
+        days = self.intervals(stab)
+
+        updates = [
+            {"id": int(card_id), "next_review": _naive(row[2]) + timedelta(days=int(d))}
+            for card_id, row, d in zip(ids, rows, days)
+        ]
+        for i in range(0, len(updates), batch_size):
+            session.execute(update(Card), updates[i:i + batch_size])
+        return len(updates)
+
+    def simulate_workload(self, session, days: int = 30, rating: int = 3, now: Optional[datetime] = None) -> list:
+        """
+        Pronóstico de repasos por día durante 'days' días, asumiendo que cada tarjeta
+        vencida se repasa ese día con la calificación 'rating'. Retorna [n_día0, n_día1, ...].
+        """
+        now = now or _utcnow()
+        rows = session.execute(select(Card.stability, Card.difficulty, Card.next_review)).all()
+        if not rows:
+            return [0] * days
+
+        stab = np.array([r[0] or 0.0 for r in rows], dtype=np.float64)
+        diff = np.array([r[1] or 0.0 for r in rows], dtype=np.float64)
+        # Día (relativo a hoy) del próximo repaso; nunca repasadas o vencidas = día 0
+        due_day = np.array([
+            max(0.0, (_naive(r[2]) - now).total_seconds() / 86400) if r[2] else 0.0 for r in rows
+        ], dtype=np.float64)
+        last_day = np.where(stab > 0, due_day - self.intervals(np.maximum(stab, 0.01)), 0.0)
+
+        forecast = []
+        for day in range(days):
+            due = due_day < day + 1
+            forecast.append(int(due.sum()))
+            if not due.any():
+                continue
+            elapsed = np.maximum(day - last_day[due], 0.0)
+            new_s, new_d = self.next_states(stab[due], diff[due], elapsed, rating)
+            stab[due], diff[due] = new_s, new_d
+            last_day[due] = day
+            due_day[due] = day + self.intervals(new_s)
+        return forecast
+
+# ----------------------------------------------------------------------------
+# Optimización offline de parámetros sobre review_log
+# ----------------------------------------------------------------------------
+
+MIN_REVIEWS_TO_OPTIMIZE = 50
+MAX_HISTORY = 64  # Repasos por tarjeta considerados (los más antiguos)
+
+def _load_histories(session):
+    """Historias de repaso como matrices (tarjetas x pasos) de calificación y días transcurridos."""
+    rows = session.execute(
+        select(ReviewLog.card_id, ReviewLog.rating, ReviewLog.elapsed_days)
+        .order_by(ReviewLog.card_id, ReviewLog.reviewed_at, ReviewLog.id)
+    ).all()
+    if not rows:
+        return None, None, None, 0
+
+    sequences = {}
+    for card_id, rating, elapsed in rows:
+        seq = sequences.setdefault(card_id, [])
+        if len(seq) < MAX_HISTORY:
+            seq.append((rating, elapsed or 0.0))
+
+    n_cards = len(sequences)
+    max_len = max(len(s) for s in sequences.values())
+    ratings = np.zeros((n_cards, max_len), dtype=np.int64)
+    elapsed = np.zeros((n_cards, max_len), dtype=np.float64)
+    mask = np.zeros((n_cards, max_len), dtype=bool)
+    for i, seq in enumerate(sequences.values()):
+        ratings[i, :len(seq)] = [g for g, _ in seq]
+        elapsed[i, :len(seq)] = [t for _, t in seq]
+        mask[i, :len(seq)] = True
+    return ratings, elapsed, mask, len(rows)
+
+def _log_loss(scheduler: FSRSScheduler, w: np.ndarray, ratings, elapsed, mask) -> float:
+    """Entropía cruzada de la retención predicha vs. real, reproduciendo todas las historias en paralelo."""
+    n_cards, n_steps = ratings.shape
+    s = np.zeros(n_cards)
+    d = np.zeros(n_cards)
+    total, count = 0.0, 0
+    for k in range(n_steps):
+        valid = mask[:, k]
+        if not valid.any():
+            break
+        if k > 0:
+            scored = valid & (elapsed[:, k] >= 1.0)  # Repasos del mismo día no miden memoria a largo plazo
+            if scored.any():
+                r = np.clip(scheduler.retrievability(elapsed[scored, k], s[scored]), 1e-6, 1 - 1e-6)
+                y = (ratings[scored, k] > 1).astype(np.float64)
+                total -= float(np.sum(y * np.log(r) + (1 - y) * np.log(1 - r)))
+                count += int(scored.sum())
+        new_s, new_d = scheduler.next_states(s[valid], d[valid], elapsed[valid, k], ratings[valid, k], w=w)
+        s[valid], d[valid] = new_s, new_d
+    return total / count if count else float("inf")
+
+def optimize_parameters(session, iterations: int = 40, scheduler: Optional[FSRSScheduler] = None) -> dict:
+    """
+    Ajusta los 17 pesos FSRS a la historia de review_log mediante búsqueda por coordenadas
+    (sin dependencias más allá de NumPy). Retorna {'weights', 'loss_before', 'loss_after', 'reviews'}.
+    """
+    scheduler = scheduler or FSRSScheduler.load()
+    ratings, elapsed, mask, n_reviews = _load_histories(session)
+    if n_reviews < MIN_REVIEWS_TO_OPTIMIZE:
+        return {"weights": scheduler.w.tolist(), "loss_before": None, "loss_after": None, "reviews": n_reviews}
+
+    w = scheduler.w.copy()
+    lower = np.array([b[0] for b in WEIGHT_BOUNDS])
+    upper = np.array([b[1] for b in WEIGHT_BOUNDS])
+    best = _log_loss(scheduler, w, ratings, elapsed, mask)
+    loss_before = best
+    step = 0.2 * (upper - lower) / 10
+
+    for _ in range(iterations):
+        improved = False
+        for i in range(len(w)):
+            for direction in (1.0, -1.0):
+                candidate = w.copy()
+                candidate[i] = np.clip(candidate[i] + direction * step[i], lower[i], upper[i])
+                if candidate[i] == w[i]:
+                    continue
+                loss = _log_loss(scheduler, candidate, ratings, elapsed, mask)
+                if loss < best:
+                    w, best, improved = candidate, loss, True
+                    break
+        if not improved:
+            step *= 0.5
+            if step.max() < 1e-4:
+                break
+
+    return {"weights": w.tolist(), "loss_before": loss_before, "loss_after": best, "reviews": n_reviews}
+
+# Instancia compartida (TUI + API web)
+scheduler = FSRSScheduler.load()
@@ -10,6 +10,8 @@ from rich.prompt import Prompt
 # Asumiendo que el script principal establece la raíz del proyecto para importaciones
 from core.database import nx_db, Card, Registry
 from core.exceptions import ReturnToMain
+from modules.study_queue import get_due_card_ids, load_cards
+from modules.srs_scheduler import FSRSScheduler, scheduler as shared_scheduler, TUI_GRADE_TO_RATING, SLOW_EASY_SECONDS
 
 from rich.theme import Theme
 
@@ -24,39 +26,38 @@ custom_theme = Theme({
 console = Console(theme=custom_theme)
 
 class SRSEngine:
-    def __init__(self):
-        pass
+    """
+    Fachada del TUI sobre el planificador FSRS compartido (modules/srs_scheduler).
+    Traduce la escala del TUI (1 Malo, 2 Bueno, 3 Fácil) a la escala FSRS.
+    """
+    def __init__(self, fsrs: FSRSScheduler = None):
+        self.fsrs = fsrs or shared_scheduler
+
+    def grade_to_rating(self, grade: int, elapsed_seconds: float) -> int:
+        # Penalizar 'Fácil' si tomó mucho tiempo: cuenta como 'Bueno'
+        if grade == 3 and elapsed_seconds > SLOW_EASY_SECONDS:
+            return TUI_GRADE_TO_RATING[2]
+        return TUI_GRADE_TO_RATING.get(grade, 3)
 
-    def calculate_next_review(self, card: Card, grade: int, elapsed_seconds: float):
+    def calculate_next_review(self, card: Card, grade: int, elapsed_seconds: float, session=None):
         """
         Calcula y actualiza los factores SRS de la tarjeta (stability, difficulty, dates)
-        incorporando el tiempo de respuesta. Si el usuario tardó mucho pero marcó 'Fácil', 
-        se penaliza la respuesta para no incrementar tanto el intervalo de retención.
+        incorporando el tiempo de respuesta. Con 'session' además registra el repaso
+        en review_log (no commitea — responsabilidad del llamador).
         """
-        # Grade: 1 (Difícil), 2 (Bien), 3 (Fácil)
-        # Ajuste penalizando 'Fácil' si tomó mucho tiempo (ej > 15 segs)
-        if grade == 3 and elapsed_seconds > 15.0:
-            # Penalizar convirtiendo en un "Bien" virtual para el cálculo de estabilidad
-            grade_calc = 2.5
-        else:
-            grade_calc = float(grade)
-        
-        # Algoritmo simple inspirado en FSRS/SM-2
-        
-        if card.stability == 0.0 or card.stability is None:
-             # Valores iniciales (en días)
-             initial_stability = {1: 1.0, 2: 3.0, 3: 5.0, 2.5: 4.0}
-             card.stability = initial_stability.get(grade_calc, 3.0)
-             card.difficulty = 5.0 - grade_calc # 1 -> 4, 2 -> 3, 3 -> 2
-        else:
-             modifier = {1: 0.5, 2: 1.5, 2.5: 1.8, 3: 2.5}.get(grade_calc, 1.5)
-             card.stability = max(1.0, card.stability * modifier)
-             card.difficulty = max(1.0, min(10.0, card.difficulty + (2.0 - grade_calc) * 0.5))
+        rating = self.grade_to_rating(grade, elapsed_seconds)
+        if session is not None:
+            return self.fsrs.review_card(session, card, rating, response_seconds=elapsed_seconds, source="tui")
 
-        # Calcular próxima fecha
-        interval_days = card.stability
-        card.last_review = datetime.now(timezone.utc)
-        card.next_review = card.last_review + timedelta(days=interval_days)
+        # Sin sesión (p. ej. tarjetas simuladas): solo se actualiza el estado en memoria
+        now = datetime.now(timezone.utc)
+        last = card.last_review
+        elapsed_days = (now.replace(tzinfo=None) - last.replace(tzinfo=None)).total_seconds() / 86400 if last else 0.0
+        new_s, new_d = self.fsrs.next_states(card.stability or 0.0, card.difficulty or 0.0, elapsed_days, rating)
+        card.stability = float(new_s)
+        card.difficulty = float(new_d)
+        card.last_review = now
+        card.next_review = now + timedelta(days=int(self.fsrs.intervals(card.stability)))
 
 
 def open_source_material(registry):
@@ -122,27 +123,11 @@ def open_source_material(registry):
 def get_due_cards(session, adelantar=False, topic_id=None, shuffled=False, card_limit=None):
     """
     Obtiene las tarjetas programadas para repaso, filtrando opcionalmente por un Registro/Tema.
+    El orden, el muestreo aleatorio y el límite se resuelven en SQL (modules/study_queue);
+    solo se cargan como ORM las tarjetas que entran en la sesión.
     """
-    now = datetime.now(timezone.utc)
-    query = session.query(Card)
-    if topic_id is not None:
-        query = query.filter(Card.parent_id == topic_id)
-        
-    if not adelantar:
-        # Filtra las que no tengan fecha o cuya fecha esté en el pasado/presente
-        query = query.filter((Card.next_review == None) | (Card.next_review <= now))
-    
-    if shuffled:
-        import random
-        cards = query.all()
-        random.shuffle(cards)
-    else:
-        cards = query.order_by(Card.next_review).all()
-
-    if card_limit and card_limit > 0:
-        cards = cards[:card_limit]
-        
-    return cards
+    card_ids = get_due_card_ids(session, adelantar=adelantar, topic_id=topic_id, shuffled=shuffled, limit=card_limit)
+    return load_cards(session, card_ids)
 
 def start_pomodoro_session(pomodoro_minutes: int = 25, adelantar: bool = False, topic_id: int = None, skip_first_source_prompt: bool = False, shuffled: bool = False, card_limit: int = None):
     """
@@ -394,7 +379,7 @@ def start_pomodoro_session(pomodoro_minutes: int = 25, adelantar: bool = False,
             grade = int(grade_str)
             
             # 6. Actualizar BD
-            srs.calculate_next_review(card, grade, elapsed_seconds)
+            srs.calculate_next_review(card, grade, elapsed_seconds, session=session)
             cards_to_mutate.append(card.id) 
             session.commit()
             
@@ -0,0 +1,130 @@
+import random
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Sequence
+
+from sqlalchemy import select, func, cast, Integer
+
+from core.database import Card, Registry
+
+# ----------------------------------------------------------------------------
+# Cola de estudio: todo se resuelve en SQL sobre ix_cards_next_review /
+# ix_cards_parent_next_review. Solo viajan IDs y conteos; las tarjetas completas
+# se cargan después, y únicamente las que entran en la sesión.
+# ----------------------------------------------------------------------------
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def due_condition(now: Optional[datetime] = None):
+    """Tarjetas sin fecha (nunca repasadas) o con next_review vencido."""
+    now = now or _utcnow()
+    return (Card.next_review == None) | (Card.next_review <= now)
+
+def get_due_card_ids(
+    session,
+    adelantar: bool = False,
+    topic_id: Optional[int] = None,
+    shuffled: bool = False,
+    limit: Optional[int] = None,
+    now: Optional[datetime] = None
+) -> List[int]:
+    """
+    IDs de la cola de repaso con el LIMIT aplicado en SQL.
+    shuffled=True toma una muestra al azar sin ordenar por random() todas las pendientes
+    (ver _sample_ids); sin límite se barajan los IDs en Python.
+    """
+    conditions = []
+    if topic_id is not None:
+        conditions.append(Card.parent_id == topic_id)
+    if not adelantar:
+        conditions.append(due_condition(now))
+
+    if shuffled:
+        if limit and limit > 0:
+            return _sample_ids(session, conditions, limit)
+        ids = list(session.execute(select(Card.id).where(*conditions)).scalars())
+        random.shuffle(ids)
+        return ids
+
+    stmt = select(Card.id).where(*conditions).order_by(Card.next_review, Card.id)
+    if limit and limit > 0:
+        stmt = stmt.limit(limit)
+    return list(session.execute(stmt).scalars())
+
+def _sample_ids(session, conditions: list, limit: int) -> List[int]:
+    """
+    Muestra aleatoria de hasta 'limit' IDs que cumplen 'conditions'. Recorre la clave primaria
+    desde un pivote al azar con un filtro de Bernoulli (~2·limit filas esperadas en la vuelta
+    completa) y corta con LIMIT en cuanto hay suficientes; si no llegan, da la vuelta desde el
+    inicio y, en último caso, completa con las primeras que falten.
+    """
+    total, lo, hi = session.execute(
+        select(func.count(Card.id), func.min(Card.id), func.max(Card.id)).where(*conditions)
+    ).one()
+    if total <= limit:
+        ids = list(session.execute(select(Card.id).where(*conditions)).scalars())
+        random.shuffle(ids)
+        return ids
+
+    # abs() del resto y no del random(): abs(-2^63) desborda en SQLite
+    picked = func.abs(func.random() % total) < min(total, 2 * limit + 8)
+    pivot = random.randint(lo, hi)
+    ids: List[int] = []
+    for window in (Card.id >= pivot, Card.id < pivot):
+        stmt = select(Card.id).where(*conditions, window, picked).order_by(Card.id).limit(limit - len(ids))
+        ids.extend(session.execute(stmt).scalars())
+        if len(ids) >= limit:
+            break
+    if len(ids) < limit:
+        stmt = select(Card.id).where(*conditions, Card.id.notin_(ids)).limit(limit - len(ids))
+        ids.extend(session.execute(stmt).scalars())
+    random.shuffle(ids)
+    return ids
+
+def load_cards(session, card_ids: Sequence[int]) -> List[Card]:
+    """Carga las tarjetas de 'card_ids' en una sola consulta IN(...), respetando su orden."""
+    if not card_ids:
+        return []
+    by_id = {c.id: c for c in session.query(Card).filter(Card.id.in_(list(card_ids))).all()}
+    return [by_id[cid] for cid in card_ids if cid in by_id]
+
+def due_counts_by_topic(session, now: Optional[datetime] = None) -> List[tuple]:
+    """
+    Conteo de tarjetas pendientes por tema en una sola consulta agrupada.
+    Retorna [(registry_id, title, pendientes), ...] ordenado de mayor a menor carga.
+    """
+    due_count = func.count(Card.id)
+    stmt = select(Card.parent_id, Registry.title, due_count).join(
+        Registry, Registry.id == Card.parent_id
+    ).where(due_condition(now)).group_by(Card.parent_id, Registry.title).order_by(due_count.desc(), Card.parent_id)
+    return [tuple(row) for row in session.execute(stmt)]
+
+def forecast_due_counts(
+    session,
+    days: int = 14,
+    topic_id: Optional[int] = None,
+    now: Optional[datetime] = None
+) -> List[int]:
+    """
+    Tarjetas que vencen cada día de los próximos 'days' días según next_review actual.
+    El día 0 incluye las vencidas, las nunca repasadas y las que vencen en las próximas 24 h.
+    Una sola consulta agrupada.
+    """
+    now = now or _utcnow()
+    horizon = now + timedelta(days=days)
+    # Día relativo a 'now' (vencidas y NULL -> 0)
+    day_expr = func.max(0, func.coalesce(
+        cast(func.julianday(Card.next_review) - func.julianday(now), Integer), 0
+    ))
+    stmt = select(day_expr.label("day"), func.count(Card.id)).where(
+        (Card.next_review == None) | (Card.next_review < horizon)
+    )
+    if topic_id is not None:
+        stmt = stmt.where(Card.parent_id == topic_id)
+    stmt = stmt.group_by("day")
+
+    forecast = [0] * days
+    for day, count in session.execute(stmt):
+        if 0 <= day < days:
+            forecast[day] += count
+    return forecast
@@ -1,6 +1,10 @@
 import re
-from urllib.parse import urlparse, parse_qs
+from typing import Optional
+from urllib.parse import urlparse
 from core.database import nx_db, RegistryCreate, TagCreate
+from core.instrumentation import timed
+from core.fingerprint import youtube_video_id
+from core.outbound import outbound
 from rich.console import Console
 
 console = Console()
@@ -22,6 +26,20 @@ try:
 except ImportError:
     yt_dlp = None
 
+# Añadir cabeceras comunes para evitar bloqueos básicos de web servers (403 Prohibidden)
+WEB_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+# Los agentes resumen por trozos (core.chunking), así que transcripciones y páginas se
+# guardan completas; el tope solo protege la BD de directos de muchas horas o volcados enormes.
+MAX_CONTENT_CHARS = 500_000
+
+def is_youtube_domain(domain: str) -> bool:
+    """True si el dominio (netloc) pertenece a YouTube."""
+    return "youtube.com" in domain or "youtu.be" in domain
+
+@timed("ingest", source="web")
 def ingest_web_resource(url: str, tags: list[str], db_target=nx_db):
     """
     Determina si la URL es de YouTube o una página web genérica,
@@ -31,10 +49,18 @@ def ingest_web_resource(url: str, tags: list[str], db_target=nx_db):
         console.print("[bold white on red]Faltan librerías. Por favor instala: requests y beautifulsoup4[/]")
         return None
 
+    # Corte temprano: misma URL canónica / mismo video ya indexado -> sin descarga ni tokens de IA
+    existing = _find_existing(url, db_target)
+    if existing is not None:
+        console.print(f"[cyan]↺ Ya indexado como ID {existing.id} ({existing.title}). Se omite la descarga.[/cyan]")
+        for t in tags:
+            db_target.add_tag(existing.id, TagCreate(value=t))
+        return existing
+
     parsed_url = urlparse(url)
     domain = parsed_url.netloc.lower()
 
-    if "youtube.com" in domain or "youtu.be" in domain:
+    if is_youtube_domain(domain):
         try:
             return _ingest_youtube(url, parsed_url, tags, db_target)
         except KeyboardInterrupt:
@@ -47,18 +73,32 @@ def ingest_web_resource(url: str, tags: list[str], db_target=nx_db):
             console.print("\n[bold yellow]⚠️  Descarga web interrumpida (Ctrl+C).[/bold yellow]")
             return None
 
+def _find_existing(url: str, db_target):
+    """Registro que ya representa 'url' en el destino (destinos sin la API de búsqueda: None)."""
+    finder = getattr(db_target, "find_registry_by_url", None)
+    if finder is None:
+        return None
+    try:
+        return finder(url)
+    except Exception:
+        return None
+
+def _http_get(url: str):
+    """GET con raise_for_status dentro de la llamada planificada (429/5xx se reintentan)."""
+    res = requests.get(url, headers=WEB_HEADERS, timeout=10)
+    res.raise_for_status()
+    return res
+
 def _get_youtube_video_id(url: str, parsed_url) -> str:
-    """Extrae el ID del video de YouTube a partir de la URL."""
-    if "youtu.be" in parsed_url.netloc:
-        return parsed_url.path.lstrip('/')
-    if "youtube.com" in parsed_url.netloc:
-        qs = parse_qs(parsed_url.query)
-        if 'v' in qs:
-            return qs['v'][0]
-    return ""
+    """Extrae el ID del video de YouTube a partir de la URL (watch, youtu.be, shorts, embed, live)."""
+    return youtube_video_id(url) or ""
 
-def _ingest_youtube(url: str, parsed_url, tags: list[str], db_target):
-    """Extrae título y subtítulos de un video de YouTube."""
+@timed("ingest_step", step="youtube_extract")
+def _extract_youtube(url: str, parsed_url) -> Optional[RegistryCreate]:
+    """
+    Extrae título, metadatos y subtítulos de un video de YouTube (bloqueante: yt-dlp + transcript).
+    No toca la base de datos; retorna el RegistryCreate listo para guardar.
+    """
     if not YouTubeTranscriptApi or not yt_dlp:
         console.print("[bold white on red]Faltan librerías para YouTube. Instala: youtube-transcript-api y yt-dlp[/]")
         return None
@@ -87,7 +127,7 @@ def _ingest_youtube(url: str, parsed_url, tags: list[str], db_target):
             'skip_download': True,
         }
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info_dict = ydl.extract_info(url, download=False)
+            info_dict = outbound.call("youtube", ydl.extract_info, url, download=False)
             if info_dict:
                 title = info_dict.get('title', title)
                 meta_info.update({
@@ -105,7 +145,7 @@ def _ingest_youtube(url: str, parsed_url, tags: list[str], db_target):
     try:
         # Intenta primero español, luego inglés si falla u otros.
         ytt_api = YouTubeTranscriptApi()
-        transcript_list = ytt_api.list(video_id)
+        transcript_list = outbound.call("youtube", ytt_api.list, video_id)
         
         # Buscar transcript manual antes de los generados (idioma es o en)
         try:
@@ -118,28 +158,31 @@ def _ingest_youtube(url: str, parsed_url, tags: list[str], db_target):
                 # Si no hay es/en, agarrar el primero disponible
                 transcript = next(iter(transcript_list))
             
-        full_transcript = transcript.fetch()
+        full_transcript = outbound.call("youtube", transcript.fetch)
         
         text_fragments = [item.text if hasattr(item, "text") else item["text"] for item in full_transcript]
         content_raw = " ".join(text_fragments)
         
-        if len(content_raw) > 50000:
-            content_raw = content_raw[:49997] + "..."
+        if len(content_raw) > MAX_CONTENT_CHARS:
+            content_raw = content_raw[:MAX_CONTENT_CHARS - 3] + "..."
             
     except Exception as e:
         error_msg = str(e).split('\n')[0] or type(e).__name__
         console.print(f"[yellow]Aviso: No se pudo obtener la transcripción. Se guardará sin texto base. ({error_msg})[/yellow]")
         content_raw = "(Video guardado sin Transcripción Disponible)."
 
-    # Insertar en BD
+    return RegistryCreate(
+        type="youtube",
+        title=title,
+        path_url=url,
+        content_raw=content_raw,
+        meta_info=meta_info
+    )
+
+@timed("ingest_step", step="save")
+def _save_resource(data: RegistryCreate, tags: list[str], db_target):
+    """Guarda un RegistryCreate y sus tags en la base de datos destino."""
     try:
-        data = RegistryCreate(
-            type="youtube",
-            title=title,
-            path_url=url,
-            content_raw=content_raw,
-            meta_info=meta_info
-        )
         reg = db_target.create_registry(data)
         
         # Asociar tags
@@ -151,6 +194,13 @@ def _ingest_youtube(url: str, parsed_url, tags: list[str], db_target):
         console.print(f"[bold white on red]Error guardando en base de datos: {e}[/]")
         return None
 
+def _ingest_youtube(url: str, parsed_url, tags: list[str], db_target):
+    """Extrae título y subtítulos de un video de YouTube."""
+    data = _extract_youtube(url, parsed_url)
+    if data is None:
+        return None
+    return _save_resource(data, tags, db_target)
+
 def get_playlist_video_urls(playlist_url: str):
     """
     Usa yt-dlp para obtener todas las URLs de videos de una playlist.
@@ -170,7 +220,7 @@ def get_playlist_video_urls(playlist_url: str):
             'skip_download': True,
         }
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            playlist_info = ydl.extract_info(playlist_url, download=False)
+            playlist_info = outbound.call("youtube", ydl.extract_info, playlist_url, download=False)
             if 'entries' in playlist_info:
                 for entry in playlist_info['entries']:
                     if entry.get('url'):
@@ -183,11 +233,30 @@ def get_playlist_video_urls(playlist_url: str):
         console.print(f"[red]Error extrayendo playlist: {e}[/]")
     return urls
 
-def batch_ingest_urls(urls_list: list[str], tags: list[str], db_target=nx_db):
+def batch_ingest_urls(urls_list: list[str], tags: list[str], db_target=nx_db,
+                      max_concurrency: int = None, per_domain: int = None):
     """
-    Procesa un lote de URLs secuencialmente.
-    Retorna (un proceso exitoso, un proceso fallido).
+    Procesa un lote de URLs en paralelo con el motor asyncio (modules.ingest_engine),
+    respetando un límite global y otro por dominio. Si httpx no está instalado
+    se procesa secuencialmente como antes.
+    Retorna (IDs/registros exitosos, URLs fallidas).
     """
+    try:
+        from modules import ingest_engine
+    except ImportError:
+        ingest_engine = None
+
+    if ingest_engine is not None and ingest_engine.httpx is not None and BeautifulSoup is not None:
+        engine_opts = {}
+        if max_concurrency: engine_opts['max_concurrency'] = max_concurrency
+        if per_domain: engine_opts['per_domain'] = per_domain
+        try:
+            return ingest_engine.ingest_urls_concurrently(urls_list, tags, db_target=db_target, **engine_opts)
+        except KeyboardInterrupt:
+            console.print("\n[bold yellow]⚠️  Proceso de ingesta por lote interrumpido por el usuario (Ctrl+C).[/bold yellow]")
+            console.print("[white]Los registros ya descargados se guardaron antes de salir.[/white]")
+            return [], []
+
     total = len(urls_list)
     success = []
     failed = []
@@ -210,29 +279,16 @@ def batch_ingest_urls(urls_list: list[str], tags: list[str], db_target=nx_db):
     return success, failed
 
 
-def _ingest_generic_web(url: str, tags: list[str], db_target):
-    """Extrae título y párrafos limpiados de una página web."""
-    try:
-        # Añadir cabeceras comunes para evitar bloqueos básicos de web servers (403 Prohibidden)
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        res = requests.get(url, headers=headers, timeout=10)
-        res.raise_for_status()
-    except Exception as e:
-        console.print(f"[yellow]Aviso: Ocurrió un error conectando a la página (puede requerir JS o estar bloqueada). Se guardará la URL huérfana. Error: {str(e)}[/yellow]")
-        # Guardado básico de rescate para url
-        try:
-            reg = db_target.create_registry(RegistryCreate(
-                type="web", title=url, path_url=url, content_raw="Error al raspar el contenido web."
-            ))
-            for t in tags:
-                db_target.add_tag(reg.id, TagCreate(value=t))
-            return reg
-        except:
-             return None
-             
-    soup = BeautifulSoup(res.text, 'html.parser')
+def _orphan_web_record(url: str) -> RegistryCreate:
+    """Registro de rescate para URLs que no se pudieron raspar (se guarda la URL huérfana)."""
+    return RegistryCreate(
+        type="web", title=url, path_url=url, content_raw="Error al raspar el contenido web."
+    )
+
+@timed("ingest_step", step="web_parse")
+def _parse_generic_web(url: str, html: str) -> RegistryCreate:
+    """Extrae título y párrafos limpiados del HTML de una página web."""
+    soup = BeautifulSoup(html, 'html.parser')
 
     # Obtener el Título
     title = soup.title.string.strip() if soup.title and soup.title.string else url
@@ -245,23 +301,31 @@ def _ingest_generic_web(url: str, tags: list[str], db_target):
     paragraphs = soup.find_all(['p', 'h1', 'h2', 'h3', 'li'])
     content_raw = "\n\n".join([p.get_text(separator=' ', strip=True) for p in paragraphs if p.get_text(strip=True)])
     
-    if len(content_raw) > 50000:
-            content_raw = content_raw[:49997] + "..."
-            
+    if len(content_raw) > MAX_CONTENT_CHARS:
+        content_raw = content_raw[:MAX_CONTENT_CHARS - 3] + "..."
+
+    return RegistryCreate(
+        type="web",
+        title=title,
+        path_url=url,
+        content_raw=content_raw,
+        meta_info={"platform": "web"}
+    )
+
+def _ingest_generic_web(url: str, tags: list[str], db_target):
+    """Extrae título y párrafos limpiados de una página web."""
     try:
-        data = RegistryCreate(
-            type="web",
-            title=title,
-            path_url=url,
-            content_raw=content_raw,
-            meta_info={"platform": "web"}
-        )
-        reg = db_target.create_registry(data)
-        
-        for t in tags:
-            db_target.add_tag(reg.id, TagCreate(value=t))
-            
-        return reg
+        with timed("ingest_step", step="web_fetch"):
+            res = outbound.call("web", _http_get, url)
     except Exception as e:
-        console.print(f"[bold white on red]Error guardando en base de datos: {e}[/]")
-        return None
+        console.print(f"[yellow]Aviso: Ocurrió un error conectando a la página (puede requerir JS o estar bloqueada). Se guardará la URL huérfana. Error: {str(e)}[/yellow]")
+        # Guardado básico de rescate para url
+        try:
+            reg = db_target.create_registry(_orphan_web_record(url))
+            for t in tags:
+                db_target.add_tag(reg.id, TagCreate(value=t))
+            return reg
+        except:
+             return None
+             
+    return _save_resource(_parse_generic_web(url, res.text), tags, db_target)
@@ -5,6 +5,8 @@ from googleapiclient.discovery import build
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
 
+from core.outbound import outbound
+
 # Permisos necesarios para gestionar playlists (Lectura y Escritura)
 SCOPES = ['https://www.googleapis.com/auth/youtube.force-ssl']
 
@@ -49,7 +51,7 @@ class YouTubeManager:
             playlistId=playlist_id,
             maxResults=50
         )
-        response = request.execute()
+        response = outbound.call("youtube_api", request.execute)
 
         for item in response.get('items', []):
             video_id = item['contentDetails']['videoId']
@@ -66,7 +68,7 @@ class YouTubeManager:
     def remove_video_from_playlist(self, playlist_item_id):
         """Elimina un video de la playlist usando su ID de item (no el ID de video)."""
         try:
-            self.youtube.playlistItems().delete(id=playlist_item_id).execute()
+            outbound.call("youtube_api", self.youtube.playlistItems().delete(id=playlist_item_id).execute)
             return True
         except Exception as e:
             print(f"Error al eliminar video de la playlist: {e}")
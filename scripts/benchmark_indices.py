@@ -0,0 +1,144 @@
+
+import os
+import sys
+import time
+import random
+import tempfile
+from datetime import datetime, timedelta
+
+# Setup paths
+current_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(current_dir)
+if root_dir not in sys.path:
+    sys.path.insert(0, root_dir)
+
+from sqlalchemy import create_engine, text
+from rich.console import Console
+from rich.table import Table
+from rich import box
+
+from core.database import Base, ensure_indexes
+
+console = Console()
+
+# Consultas calientes del sistema (ver get_due_cards, get_global_metrics, create_registry, search_registry)
+HOT_QUERIES = {
+    "Cola SRS (next_review)": (
+        "SELECT id FROM cards WHERE next_review IS NULL OR next_review <= :now ORDER BY next_review",
+        {"now": "2026-01-15 00:00:00"}
+    ),
+    "Tarjetas por registro": (
+        "SELECT count(id) FROM cards WHERE parent_id = :pid",
+        {"pid": 777}
+    ),
+    "Pendientes por registro": (
+        "SELECT count(id) FROM cards WHERE parent_id = :pid AND (next_review IS NULL OR next_review <= :now)",
+        {"pid": 777, "now": "2026-01-15 00:00:00"}
+    ),
+    "Duplicado path_url": (
+        "SELECT id FROM registry WHERE path_url = :url LIMIT 1",
+        {"url": "https://www.youtube.com/watch?v=vid4242"}
+    ),
+    "Explorador por tipo": (
+        "SELECT id FROM registry WHERE type = 'youtube' ORDER BY modified_at DESC LIMIT 50",
+        {}
+    ),
+    "Explorador (orden defecto)": (
+        "SELECT id FROM registry ORDER BY modified_at DESC LIMIT 50",
+        {}
+    ),
+    "Etiquetas únicas": (
+        "SELECT count(DISTINCT value) FROM tags",
+        {}
+    ),
+    "Registros con etiqueta": (
+        "SELECT registry_id FROM tags WHERE value = :tag",
+        {"tag": "tema_7"}
+    ),
+}
+
+def populate(conn, n_registry: int, seed: int = 42):
+    """Genera un corpus sintético determinista directamente con executemany."""
+    rnd = random.Random(seed)
+    base = datetime(2025, 1, 1)
+    types = ["youtube", "web", "file", "note"]
+
+    regs = []
+    for i in range(1, n_registry + 1):
+        r_type = rnd.choice(types)
+        url = f"https://www.youtube.com/watch?v=vid{i}" if r_type == "youtube" else f"nexus://{r_type}/{i}"
+        ts = (base + timedelta(minutes=rnd.randint(0, 600_000))).strftime("%Y-%m-%d %H:%M:%S")
+        regs.append({"id": i, "type": r_type, "title": f"Registro {i}", "path_url": url, "ts": ts})
+    conn.execute(text(
+        "INSERT INTO registry (id, type, title, path_url, created_at, modified_at, is_flashcard_source) "
+        "VALUES (:id, :type, :title, :path_url, :ts, :ts, 0)"
+    ), regs)
+
+    tags = [{"rid": i, "v": f"tema_{rnd.randint(0, 200)}"} for i in range(1, n_registry + 1)]
+    conn.execute(text("INSERT OR IGNORE INTO tags (registry_id, value) VALUES (:rid, :v)"), tags)
+
+    cards = []
+    for i in range(1, n_registry + 1):
+        for _ in range(rnd.randint(0, 6)):
+            nr = base + timedelta(days=rnd.randint(0, 400))
+            cards.append({"pid": i, "nr": nr.strftime("%Y-%m-%d %H:%M:%S")})
+    conn.execute(text(
+        "INSERT INTO cards (parent_id, question, answer, type, difficulty, stability, next_review) "
+        "VALUES (:pid, 'Q', 'A', 'Factual', 0, 0, :nr)"
+    ), cards)
+    conn.commit()
+
+def measure(conn, repeat: int = 20) -> dict:
+    """Retorna {nombre: (plan, ms_promedio)} para cada consulta caliente."""
+    results = {}
+    for name, (sql, params) in HOT_QUERIES.items():
+        plan_rows = conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"), params).fetchall()
+        plan = " | ".join(row[-1] for row in plan_rows)
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            conn.execute(text(sql), params).fetchall()
+        elapsed_ms = (time.perf_counter() - t0) * 1000 / repeat
+        results[name] = (plan, elapsed_ms)
+    return results
+
+def run_benchmark(n_registry: int = 20000):
+    tmp_dir = tempfile.mkdtemp(prefix="nexus_bench_")
+    db_file = os.path.join(tmp_dir, "bench.db")
+    engine = create_engine(f"sqlite:///{db_file}")
+
+    console.print(f"[bold cyan]Generando corpus sintético de {n_registry} registros en {db_file}...[/bold cyan]")
+    Base.metadata.create_all(bind=engine)
+
+    with engine.connect() as conn:
+        # Simular una BD heredada: eliminar los índices declarados
+        for table in Base.metadata.sorted_tables:
+            for idx in table.indexes:
+                conn.execute(text(f"DROP INDEX IF EXISTS {idx.name}"))
+        conn.commit()
+
+        populate(conn, n_registry)
+        conn.execute(text("ANALYZE"))
+        before = measure(conn)
+
+        created = ensure_indexes(conn)
+        console.print(f"[green]Índices creados por la migración:[/green] {', '.join(created)}")
+        after = measure(conn)
+
+    table = Table(title=f"Planes de consulta ({n_registry} registros)", box=box.ROUNDED, show_lines=True)
+    table.add_column("Consulta", style="bold bright_white")
+    table.add_column("Plan ANTES", style="red")
+    table.add_column("ms", justify="right")
+    table.add_column("Plan DESPUÉS", style="green")
+    table.add_column("ms", justify="right")
+    for name in HOT_QUERIES:
+        p_b, t_b = before[name]
+        p_a, t_a = after[name]
+        table.add_row(name, p_b, f"{t_b:.2f}", p_a, f"{t_a:.2f}")
+    console.print(table)
+
+    engine.dispose()
+    return before, after
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    run_benchmark(n)
@@ -0,0 +1,91 @@
+import os
+import sys
+import argparse
+
+# Setup paths
+current_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(current_dir)
+if root_dir not in sys.path:
+    sys.path.insert(0, root_dir)
+
+from core.database import SessionLocal, Registry, init_db
+from modules.dedup import (
+    backfill_fingerprints, find_exact_duplicates, find_near_duplicates,
+    merge_registries_in_session, pick_survivor
+)
+from core.fingerprint import NEAR_DUPLICATE_DISTANCE
+from rich.console import Console
+from rich.table import Table
+from rich import box
+
+console = Console()
+
+def _titles(session, ids):
+    return dict(session.query(Registry.id, Registry.title).filter(Registry.id.in_(ids)).all())
+
+def _print_groups(session, groups, title):
+    if not groups:
+        console.print(f"[green]Sin {title.lower()}.[/green]")
+        return
+    table = Table(title=f"{title} ({len(groups)} grupos)", box=box.ROUNDED)
+    table.add_column("IDs", style="bold yellow")
+    table.add_column("Títulos", style="white")
+    for group in groups[:50]:
+        titles = _titles(session, group)
+        table.add_row(", ".join(map(str, group)), " | ".join((titles.get(i) or "")[:40] for i in group[:3]))
+    console.print(table)
+
+def main():
+    parser = argparse.ArgumentParser(description="Detecta y fusiona registros duplicados en Nexus.")
+    parser.add_argument("--near", action="store_true", help="Buscar también casi-duplicados (SimHash)")
+    parser.add_argument("--distance", type=int, default=NEAR_DUPLICATE_DISTANCE, help="Distancia de Hamming máxima")
+    parser.add_argument("--id", type=int, help="Solo casi-duplicados de este registro")
+    parser.add_argument("--merge-exact", action="store_true", help="Fusionar los grupos con la misma clave canónica")
+    parser.add_argument("--merge", type=int, nargs="+", metavar="ID", help="Fusionar: el primer ID sobrevive, el resto se absorben")
+    args = parser.parse_args()
+
+    init_db()
+    with SessionLocal() as session:
+        with console.status("[dim]Calculando huellas pendientes...[/dim]", spinner="dots"):
+            filled = backfill_fingerprints(session)
+        if filled:
+            console.print(f"[green]✓ Huellas calculadas para {filled} registros.[/green]")
+
+        if args.merge:
+            if len(args.merge) < 2:
+                console.print("[red]--merge necesita al menos dos IDs.[/red]")
+                return
+            result = merge_registries_in_session(session, args.merge[0], args.merge[1:])
+            session.commit()
+            console.print(f"[bold green]✓ Fusionados {result['merged']} en ID {result['kept']}[/bold green] "
+                          f"(tarjetas {result['cards']}, tags {result['tags']}, vínculos {result['links']})")
+            return
+
+        canonical_groups = find_exact_duplicates(session, by="canonical_key")
+        _print_groups(session, canonical_groups, "Duplicados por URL canónica")
+        _print_groups(session, find_exact_duplicates(session, by="content_hash"), "Duplicados por contenido idéntico")
+
+        if args.near or args.id:
+            pairs = find_near_duplicates(session, registry_id=args.id, max_distance=args.distance)
+            table = Table(title=f"Casi-duplicados (distancia ≤ {args.distance})", box=box.ROUNDED)
+            table.add_column("A", style="bold yellow")
+            table.add_column("B", style="bold yellow")
+            table.add_column("Dist.", justify="right")
+            table.add_column("Títulos", style="white")
+            titles = _titles(session, {p["a"] for p in pairs} | {p["b"] for p in pairs})
+            for p in pairs:
+                table.add_row(str(p["a"]), str(p["b"]), str(p["distance"]),
+                              f"{(titles.get(p['a']) or '')[:40]} | {(titles.get(p['b']) or '')[:40]}")
+            console.print(table)
+
+        if args.merge_exact and canonical_groups:
+            merged = 0
+            for group in canonical_groups:
+                keep = pick_survivor(session, group)
+                merge_registries_in_session(session, keep, [i for i in group if i != keep])
+                merged += len(group) - 1
+            session.commit()
+            console.print(f"[bold green]✓ {merged} registros duplicados fusionados en {len(canonical_groups)} supervivientes.[/bold green]")
+
+if __name__ == "__main__":
+    main()
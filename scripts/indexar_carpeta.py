@@ -0,0 +1,54 @@
+import os
+import sys
+import time
+import argparse
+
+# Setup paths
+current_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(current_dir)
+if root_dir not in sys.path:
+    sys.path.insert(0, root_dir)
+
+from core.database import init_db
+from modules.folder_indexer import FolderIndexer, DEFAULT_IGNORE, DEFAULT_MAX_THREADS, DEFAULT_BATCH_SIZE
+from rich.console import Console
+
+console = Console()
+
+def main():
+    parser = argparse.ArgumentParser(description="Indexa (o reindexa de forma incremental) una carpeta en Nexus.")
+    parser.add_argument("carpeta", help="Directorio raíz a indexar")
+    parser.add_argument("--tags", default="", help="Tags para los archivos nuevos, separados por coma")
+    parser.add_argument("--ext", default="", help="Extensiones a incluir, separadas por coma (por defecto todas)")
+    parser.add_argument("--ignore", action="append", default=[], help="Patrón glob adicional a ignorar (repetible)")
+    parser.add_argument("--threads", type=int, default=DEFAULT_MAX_THREADS)
+    parser.add_argument("--batch", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--keep-missing", action="store_true", help="No eliminar registros de archivos que ya no existen")
+    args = parser.parse_args()
+
+    init_db()
+    indexer = FolderIndexer(
+        args.carpeta,
+        tags=[t for t in args.tags.split(",") if t.strip()],
+        extensions=[e for e in args.ext.split(",") if e.strip()] or None,
+        ignore=DEFAULT_IGNORE + tuple(args.ignore),
+        max_threads=args.threads,
+        batch_size=args.batch,
+        prune_missing=not args.keep_missing
+    )
+
+    start = time.perf_counter()
+    with console.status("[dim]Escaneando...[/dim]", spinner="dots") as status:
+        report = indexer.run(progress=lambda done, total: status.update(f"[dim]Procesando {done}/{total}...[/dim]"))
+    elapsed = time.perf_counter() - start
+
+    console.print(
+        f"[bold green]✓ {report.scanned} archivos en {elapsed:.1f}s[/bold green] — "
+        f"sin cambios {report.unchanged}, nuevos {report.created}, modificados {report.updated}, "
+        f"solo fecha {report.touched}, eliminados {report.deleted}"
+    )
+    for err in report.errors:
+        console.print(f"[yellow]⚠ {err}[/yellow]")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+import os
+import sys
+import argparse
+
+# Setup paths
+current_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(current_dir)
+if root_dir not in sys.path:
+    sys.path.insert(0, root_dir)
+
+from core.database import SessionLocal, Registry, init_db
+from core.embeddings import embedding_store
+from rich.console import Console
+from rich.progress import Progress
+from rich.table import Table
+from rich import box
+
+console = Console()
+
+def _print_ranking(title: str, ranking):
+    with SessionLocal() as session:
+        titles = dict(session.query(Registry.id, Registry.title).filter(Registry.id.in_([r for r, _ in ranking])).all())
+    table = Table(title=title, box=box.ROUNDED)
+    table.add_column("ID", justify="right", style="bold yellow")
+    table.add_column("Similitud", justify="right", style="green")
+    table.add_column("Título", style="white")
+    for rid, score in ranking:
+        table.add_row(str(rid), f"{score:.0%}", (titles.get(rid) or "")[:70])
+    console.print(table)
+
+def main():
+    parser = argparse.ArgumentParser(description="Construye/actualiza el índice vectorial de Nexus y consulta parecidos.")
+    parser.add_argument("--sugerir", type=int, metavar="ID", help="Sugerir vínculos para este registro")
+    parser.add_argument("--buscar", metavar="TEXTO", help="Registros más parecidos a un texto")
+    parser.add_argument("-k", type=int, default=10, help="Número de resultados")
+    args = parser.parse_args()
+
+    init_db()
+    stats = embedding_store.stats()
+    console.print(f"[cyan]Proveedor:[/cyan] {stats['provider']} ({stats['dim']} dims) │ "
+                  f"{stats['embedded']} vectores, {stats['pending']} pendientes")
+
+    if stats["pending"]:
+        with Progress(console=console) as progress:
+            task = progress.add_task("[cyan]Embebiendo registros...", total=stats["pending"])
+            done = embedding_store.refresh(progress=lambda n, total: progress.update(task, completed=n, total=total))
+        console.print(f"[bold green]✓ {done} registros embebidos.[/bold green]")
+
+    if args.sugerir:
+        _print_ranking(f"Sugerencias de vínculo para ID {args.sugerir}", embedding_store.suggest_links(args.sugerir, k=args.k))
+    if args.buscar:
+        _print_ranking(f"Parecidos a «{args.buscar}»", embedding_store.search(args.buscar, k=args.k))
+
+if __name__ == "__main__":
+    main()
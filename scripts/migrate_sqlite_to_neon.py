@@ -16,7 +16,7 @@ if not NEON_DATABASE_URL:
     print("Error: DATABASE_URL no encontrada en cloud_backend/.env")
     sys.exit(1)
 
-from core.database import Base as CoreBase, Registry, Tag, NexusLink, Card, DB_PATH
+from core.database import Base as CoreBase, Registry, RegistryContent, Tag, NexusLink, Card, DB_PATH
 from cloud_backend.database import Base as CloudBase
 
 sqlite_engine = create_engine(f"sqlite:///{DB_PATH}")
@@ -114,6 +114,8 @@ def migrate_data(progress_callback=None):
         report("\n[2/2] Migrando datos...")
 
         migrate_table("Registry",   sqlite_db.query(Registry).all(),   neon_db.merge)
+        # Texto de los registros (content_raw/summary): en Neon se guarda sin comprimir
+        migrate_table("RegistryContent", sqlite_db.query(RegistryContent).all(), neon_db.merge)
         migrate_table("Tags",       sqlite_db.query(Tag).all(),        neon_db.merge)
         migrate_table("NexusLinks", sqlite_db.query(NexusLink).all(),  neon_db.merge)
         migrate_table("Cards",      sqlite_db.query(Card).all(),       neon_db.merge)
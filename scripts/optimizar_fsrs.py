@@ -0,0 +1,55 @@
+import os
+import sys
+
+# Setup paths
+current_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(current_dir)
+if root_dir not in sys.path:
+    sys.path.insert(0, root_dir)
+
+from core.database import SessionLocal, init_db
+from modules.srs_scheduler import FSRSScheduler, optimize_parameters, PARAMS_PATH, MIN_REVIEWS_TO_OPTIMIZE
+from rich.console import Console
+from rich.table import Table
+from rich import box
+
+console = Console()
+
+def optimize_fsrs(reschedule: bool = False, forecast_days: int = 14):
+    """
+    Ajuste offline de parámetros FSRS sobre review_log.
+    Guarda los pesos en fsrs_params.json y, opcionalmente, reprograma todas las tarjetas.
+    """
+    init_db()
+    scheduler = FSRSScheduler.load()
+
+    with SessionLocal() as session:
+        with console.status("[dim]Optimizando parámetros sobre el historial de repasos...[/dim]", spinner="dots"):
+            result = optimize_parameters(session, scheduler=scheduler)
+
+        if result["loss_before"] is None:
+            console.print(f"[yellow]Historial insuficiente: {result['reviews']} repasos (mínimo {MIN_REVIEWS_TO_OPTIMIZE}). Se mantienen los parámetros actuales.[/yellow]")
+        else:
+            console.print(f"[bold green]✓ {result['reviews']} repasos analizados.[/bold green] "
+                          f"Log-loss: {result['loss_before']:.4f} → [bold]{result['loss_after']:.4f}[/bold]")
+            scheduler = FSRSScheduler(result["weights"], desired_retention=scheduler.desired_retention, maximum_interval=scheduler.maximum_interval)
+            scheduler.save(PARAMS_PATH, reviews=result["reviews"], loss=result["loss_after"])
+            console.print(f"[green]Parámetros guardados en {PARAMS_PATH}[/green]")
+
+        if reschedule:
+            n = scheduler.reschedule_all(session)
+            session.commit()
+            console.print(f"[bold cyan]🔁 {n} tarjetas reprogramadas con los nuevos parámetros.[/bold cyan]")
+
+        forecast = scheduler.simulate_workload(session, days=forecast_days)
+
+    table = Table(title=f"Carga de repaso simulada ({forecast_days} días)", box=box.ROUNDED)
+    table.add_column("Día", justify="right", style="bright_cyan")
+    table.add_column("Tarjetas", justify="right", style="bold white")
+    for day, count in enumerate(forecast):
+        table.add_row(f"+{day}", str(count))
+    console.print(table)
+
+if __name__ == "__main__":
+    # --reschedule: recalcula next_review de todas las tarjetas con los pesos ajustados
+    optimize_fsrs(reschedule="--reschedule" in sys.argv)
@@ -2,8 +2,8 @@
 import os
 import sys
 import json
-import time
 import logging
+import argparse
 from datetime import datetime
 
 # Setup paths
@@ -12,9 +12,12 @@ root_dir = os.path.dirname(current_dir)
 if root_dir not in sys.path:
     sys.path.insert(0, root_dir)
 
-from core.database import SessionLocal, Registry, Card, Tag
+from core.database import SessionLocal, init_db
 from agents.deepseek_agent import deepseek_agent
+from core.llm_cache import llm_cache
+from modules.ai_batch import AIBatchProcessor, classify_ai_work, DEFAULT_WORKERS, DEFAULT_COMMIT_EVERY
 from rich.console import Console
+from rich.progress import Progress
 
 # Forzar salida UTF-8 para evitar errores de charmap en Windows
 if sys.platform == "win32":
@@ -35,81 +38,82 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
-def optimize_nexus_ia():
-    db = SessionLocal()
-    
-    # 1. Identificar registros que necesitan trabajo de IA
-    all_yt = db.query(Registry).filter(Registry.type == 'youtube').all()
-    
-    targets = []
-    for reg in all_yt:
-        # Detectar si tiene contenido real y no mensajes de bloqueo
-        has_transcript = reg.content_raw and "Transcripcion Disponible" not in reg.content_raw and "IpBlocked" not in reg.content_raw and len(reg.content_raw) > 200
-        has_summary = reg.summary and len(reg.summary) > 50 and "Sin resumen" not in reg.summary
-        
-        card_count = db.query(Card).filter(Card.parent_id == reg.id).count()
-        has_cards = card_count > 0
-        
-        job = None
-        if has_transcript and not has_summary:
-            job = "FULL_IA"
-        elif has_summary and not has_cards and has_transcript:
-            job = "ONLY_CARDS"
-        elif has_transcript and not has_cards:
-            job = "ONLY_CARDS"
-            
-        if job:
-            targets.append({'reg': reg, 'job': job})
+BATCH_NAME = "optimizar_ia"
+
+def optimize_nexus_ia(workers: int = DEFAULT_WORKERS, commit_every: int = DEFAULT_COMMIT_EVERY, retry_failed: bool = False):
+    processor = AIBatchProcessor(BATCH_NAME, max_workers=workers, commit_every=commit_every)
+
+    # 1. Identificar registros que necesitan trabajo de IA (una sola consulta agrupada)
+    with SessionLocal() as db:
+        targets = classify_ai_work(db)
 
     if not targets:
         console.print("[bold green]Todo al dia! No hay videos con transcripcion que necesiten IA actualmente.[/bold green]")
         return
 
-    console.print(f"[bold cyan]Se encontraron {len(targets)} videos para optimizar con DeepSeek.[/bold cyan]")
-    
-    success_count = 0
-    
-    try:
-        for item in targets:
-            reg = item['reg']
-            job = item['job']
-            
-            # Limpiar ttulo para evitar errores de renderizado
-            clean_title = reg.title.encode('ascii', 'ignore').decode('ascii')[:60]
-            console.print(f"\n[bold]Trabajando en ID {reg.id}:[/bold] {clean_title}...")
-            console.print(f"  Tarea: [yellow]{job}[/yellow]")
-            
-            if job == "FULL_IA":
-                resumen, cards = deepseek_agent.process_content(reg.title, reg.content_raw)
-                if resumen and "Sin resumen" not in resumen:
-                    reg.summary = resumen
-                    db.query(Card).filter(Card.parent_id == reg.id).delete()
-                    for c in cards:
-                        db.add(Card(parent_id=reg.id, question=c['question'], answer=c['answer'], type="DeepSeek_AI"))
-                    success_count += 1
-                    console.print("  [green]Resumen y Flashcards generados.[/green]")
-                else:
-                    console.print("  [red]DeepSeek fallo en generar contenido completo.[/red]")
-
-            elif job == "ONLY_CARDS":
-                _, cards = deepseek_agent.process_content(reg.title, reg.content_raw)
-                if cards:
-                    db.query(Card).filter(Card.parent_id == reg.id).delete()
-                    for c in cards:
-                        db.add(Card(parent_id=reg.id, question=c['question'], answer=c['answer'], type="DeepSeek_AI"))
-                    success_count += 1
-                    console.print("  [green]Flashcards generadas exitosamente.[/green]")
-                else:
-                    console.print("  [red]No se pudieron generar las flashcards.[/red]")
-            
-            db.commit()
-            time.sleep(2)
-
-    except KeyboardInterrupt:
-        console.print("\n[yellow]Proceso pausado por el usuario.[/yellow]")
-    finally:
-        db.close()
-        console.print(f"\n[bold green]Fin del proceso. Actualizados: {success_count} registros.[/bold green]")
+    full = sum(1 for _, job in targets if job == "FULL_IA")
+    console.print(f"[bold cyan]Se encontraron {len(targets)} videos para optimizar con DeepSeek[/bold cyan] "
+                  f"(FULL_IA: {full}, ONLY_CARDS: {len(targets) - full}) │ {workers} en paralelo")
+    logging.info(f"Objetivos: {len(targets)} (FULL_IA {full}). Workers: {workers}")
+
+    # 2. Llamadas en paralelo; resultados guardados por lotes y checkpoint en ai_batch_jobs
+    with Progress(console=console) as progress:
+        task = progress.add_task("[cyan]Generando IA...", total=len(targets))
+
+        def on_result(r):
+            progress.advance(task)
+            if r.ok:
+                logging.info(f"ID {r.registry_id} ({r.task}): OK, {len(r.cards)} flashcards")
+            else:
+                logging.warning(f"ID {r.registry_id} ({r.task}): {r.error}")
+
+        report = processor.run(targets, retry_failed=retry_failed, on_result=on_result)
+
+    if report.interrupted:
+        console.print("\n[yellow]Proceso pausado por el usuario. Lo pendiente se retoma en la próxima ejecución.[/yellow]")
+    if report.halted:
+        console.print(f"\n[yellow]Detenido: {report.halted}. {report.deferred} registros quedan pendientes para más tarde.[/yellow]")
+    if report.skipped:
+        console.print(f"[dim]{report.skipped} registros saltados tras fallar repetidamente (usa --retry-failed).[/dim]")
+    console.print(
+        f"\n[bold green]Fin del proceso. Actualizados: {report.done} registros[/bold green] "
+        f"({report.cards} flashcards, {report.failed} fallidos, {report.elapsed_s:.1f}s)"
+    )
+    llm_cache.print_stats()
+
+def start_mock_llm(latency: float):
+    """Arranca benchmarks/mock_llm.py en proceso y apunta DeepSeekAgent a él."""
+    from benchmarks.mock_llm import MockLLMServer
+    server = MockLLMServer(latency=latency).start()
+    deepseek_agent.base_url = server.url
+    deepseek_agent.api_key = deepseek_agent.api_key or "mock"
+    # Las respuestas simuladas no deben quedar en la caché LLM real
+    llm_cache.bypass = True
+    # Sin límite de ritmo real que respetar (salvo que se fije a mano)
+    os.environ.setdefault("NEXUS_RATE_DEEPSEEK", "100/100")
+    console.print(f"[magenta]Mock LLM activo en {server.url} (latencia {latency}s).[/magenta]")
+    return server
 
 if __name__ == "__main__":
-    optimize_nexus_ia()
+    parser = argparse.ArgumentParser(description="Genera resúmenes y flashcards con DeepSeek para los videos pendientes.")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Llamadas simultáneas a DeepSeek")
+    parser.add_argument("--commit-every", type=int, default=DEFAULT_COMMIT_EVERY, help="Resultados por transacción")
+    # --no-cache: fuerza llamadas reales a DeepSeek ignorando la caché LLM
+    parser.add_argument("--no-cache", action="store_true", help="Ignorar la caché LLM")
+    parser.add_argument("--retry-failed", action="store_true", help="Reintentar también los que agotaron sus intentos")
+    parser.add_argument("--reset", action="store_true", help="Borrar el checkpoint del lote antes de empezar")
+    parser.add_argument("--mock", action="store_true", help="Usar un servidor LLM simulado local (pruebas)")
+    parser.add_argument("--mock-latency", type=float, default=0.2, help="Latencia del servidor simulado (s)")
+    args = parser.parse_args()
+
+    if args.no_cache:
+        llm_cache.bypass = True
+    init_db()
+    mock = start_mock_llm(args.mock_latency) if args.mock else None
+    try:
+        if args.reset:
+            AIBatchProcessor(BATCH_NAME).reset()
+        optimize_nexus_ia(args.workers, args.commit_every, args.retry_failed)
+    finally:
+        if mock:
+            mock.stop()
@@ -1,9 +1,10 @@
 
 import os
 import sys
-import time
 import json
 import logging
+import argparse
+from types import SimpleNamespace
 from datetime import datetime
 
 # Setup paths
@@ -12,10 +13,16 @@ root_dir = os.path.dirname(current_dir)
 if root_dir not in sys.path:
     sys.path.insert(0, root_dir)
 
-from core.database import SessionLocal, Registry, Card, Tag, RegistryCreate, CardCreate, nx_db
+from core.database import SessionLocal, init_db
 from agents.deepseek_agent import deepseek_agent
+from core.llm_cache import llm_cache
 from modules.web_scraper import ingest_web_resource
 from modules.youtube_manager import YouTubeManager
+from core.outbound import outbound, CircuitOpenError
+from modules.ai_batch import (
+    AIBatchProcessor, BatchResult, classify_failed_videos, valid_cards,
+    DEFAULT_WORKERS, DEFAULT_COMMIT_EVERY, MAX_ATTEMPTS
+)
 from rich.console import Console
 
 console = Console()
@@ -31,8 +38,52 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
-def reprocess_incomplete_videos():
-    db = SessionLocal()
+BATCH_NAME = "reprocesar_fallidos"
+# Menos hilos que optimizar_ia: cada uno empieza descargando de YouTube
+REPROCESS_WORKERS = min(4, DEFAULT_WORKERS)
+
+class CaptureDB:
+    """Captura los datos del scraping sin guardar en la BD real (lo persiste el procesador por lotes)."""
+    def create_registry(self, data):
+        # Retornamos un objeto que simula tener un ID para evitar el error en web_scraper
+        mock_reg = SimpleNamespace(**data.model_dump())
+        mock_reg.id = 999
+        return mock_reg
+    def find_registry_by_url(self, url): return None
+    def add_tag(self, id, tag): pass
+
+def reprocess_handler(item: dict) -> BatchResult:
+    """Re-scraping del video + DeepSeek. Se ejecuta en un hilo del pool (sin tocar la BD)."""
+    # 2. Re-scrape transcript
+    try:
+        new_data = ingest_web_resource(item['path_url'], ["reproceso"], db_target=CaptureDB())
+    except CircuitOpenError:
+        raise
+    except Exception as e:
+        return BatchResult(item['id'], item['task'], False, error=f"Error en scraping: {e}")
+
+    content = getattr(new_data, 'content_raw', None) or ""
+    if outbound.is_open("youtube"):
+        # Bloqueo de IP en curso: el video queda pendiente sin gastar intento
+        raise CircuitOpenError("Circuito de YouTube abierto")
+    if "IpBlocked" in content or len(content) <= 100:
+        return BatchResult(item['id'], item['task'], False, error="Sigue bloqueado o sin transcripcion")
+
+    # 3. Generate IA Content
+    resumen, cards = deepseek_agent.process_content(new_data.title, content)
+    if resumen is None and outbound.is_open("deepseek"):
+        raise CircuitOpenError("Circuito de DeepSeek abierto")
+    if not resumen or "Sin resumen" in resumen:
+        return BatchResult(item['id'], item['task'], False, error="DeepSeek no pudo generar contenido util todavia")
+
+    # 4. Update Database (lo hace el procesador en la siguiente transacción por lotes)
+    return BatchResult(
+        item['id'], item['task'], True,
+        summary=resumen, cards=valid_cards(cards),
+        content_raw=content, title=new_data.title  # Update title if it was fallback
+    )
+
+def reprocess_incomplete_videos(workers: int = REPROCESS_WORKERS, commit_every: int = DEFAULT_COMMIT_EVERY, retry_failed: bool = False):
     yt_manager = None
     
     # Authenticate YouTube for deletion
@@ -48,89 +99,57 @@ def reprocess_incomplete_videos():
 
     # 1. Identify videos to re-process (IpBlocked or no summary)
     # We look for those with "IpBlocked" in content_raw or very short content
-    target_videos = db.query(Registry).filter(
-        Registry.type == 'youtube',
-        (Registry.content_raw.like('%IpBlocked%') | 
-         Registry.content_raw.like('%Sin Transcripción Disponible%') |
-         (Registry.summary == None) | (Registry.summary == ''))
-    ).all()
-
-    console.print(f"[cyan]Iniciando reprocesamiento de {len(target_videos)} videos...[/cyan]")
+    with SessionLocal() as db:
+        target_videos = classify_failed_videos(db)
+
+    console.print(f"[cyan]Iniciando reprocesamiento de {len(target_videos)} videos ({workers} en paralelo)...[/cyan]")
     logging.info(f"Iniciando reprocesamiento de {len(target_videos)} videos.")
+    if not target_videos:
+        return
 
-    success_count = 0
-    
-    for reg in target_videos:
-        console.print(f"\n[bold]Intentando corregir:[/bold] {reg.title[:60]}... (ID: {reg.id})")
-        logging.info(f"Procesando ID {reg.id}: {reg.path_url}")
-        
-        # Clase Mock para capturar datos sin guardar en la BD real durante el scraping
-        class MockDB:
-            def create_registry(self, data): 
-                # Retornamos un objeto que simula tener un ID para evitar el error en web_scraper
-                from types import SimpleNamespace
-                mock_reg = SimpleNamespace(**data.model_dump())
-                mock_reg.id = 999
-                return mock_reg
-            def add_tag(self, id, tag): pass
-
-        # 2. Re-scrape transcript
-        try:
-            # Ahora pasamos el MockDB para obtener el RegistryCreate object
-            new_data = ingest_web_resource(reg.path_url, ["reproceso"], db_target=MockDB()) 
-        except Exception as e:
-            console.print(f"  [red]Error en scraping: {e}[/red]")
-            new_data = None
-        
-        if new_data and hasattr(new_data, 'content_raw') and "IpBlocked" not in new_data.content_raw and len(new_data.content_raw) > 100:
-            console.print("  [green]✓ Transcripcion recuperada exitosamente.[/green]")
-            logging.info(f"ID {reg.id}: Transcripcion recuperada.")
-            
-            # 3. Generate IA Content
-            console.print("  • Generando Inteligencia con DeepSeek...")
-            resumen, cards = deepseek_agent.process_content(new_data.title, new_data.content_raw)
-            
-            if resumen and "Sin resumen" not in resumen:
-                # 4. Update Database
-                reg.content_raw = new_data.content_raw
-                reg.summary = resumen
-                reg.title = new_data.title # Update title if it was fallback
-                
-                # Delete old cards if any
-                db.query(Card).filter(Card.parent_id == reg.id).delete()
-                
-                # Add new cards
-                for c in cards:
-                    db.add(Card(
-                        parent_id=reg.id,
-                        question=c['question'],
-                        answer=c['answer'],
-                        type="DeepSeek_AI"
-                    ))
-                
-                db.commit()
-                console.print(f"  [bold green]✅ Registro actualizado con éxito.[/bold green]")
-                logging.info(f"ID {reg.id}: IA Generada y DB actualizada.")
-                success_count += 1
-                
-                # 5. Optional: Deletion from YouTube
-                # This is tricky because we don't have the playlist_item_id anymore.
-                # However, if it's the Watch Later or a known playlist, we could search for it.
-                # Since the user asked to "borra del historial de youtube los videos que se han bajao en totalidad",
-                # and deletion needs a specific playlistItem_id, we'll log that we need manual deletion if not found.
-                logging.info(f"ID {reg.id}: Listo para eliminacion manual o futura.")
-            else:
-                console.print("  [yellow]⚠️ DeepSeek no pudo generar contenido util todavia.[/yellow]")
-                logging.warning(f"ID {reg.id}: DeepSeek fallo o devolvio vacio.")
+    # 2-4. Re-scrape + IA + actualización por lotes, con checkpoint en ai_batch_jobs.
+    # Sin pausa fija: core.outbound espacia las llamadas a YouTube y DeepSeek (y se frena ante 429)
+    processor = AIBatchProcessor(BATCH_NAME, handler=reprocess_handler, max_workers=workers, commit_every=commit_every)
+
+    def on_result(r):
+        if r.ok:
+            console.print(f"  [bold green]✅ ID {r.registry_id}: transcripcion recuperada y registro actualizado.[/bold green]")
+            logging.info(f"ID {r.registry_id}: IA Generada y DB actualizada.")
+            # 5. Optional: Deletion from YouTube
+            # This is tricky because we don't have the playlist_item_id anymore.
+            # However, if it's the Watch Later or a known playlist, we could search for it.
+            # Since the user asked to "borra del historial de youtube los videos que se han bajao en totalidad",
+            # and deletion needs a specific playlistItem_id, we'll log that we need manual deletion if not found.
+            logging.info(f"ID {r.registry_id}: Listo para eliminacion manual o futura.")
         else:
-            console.print("  [yellow]ℹ Sigue bloqueado o sin transcripcion.[/yellow]")
-            logging.error(f"ID {reg.id}: Fallo re-scraped (Sigue Bloqueado).")
+            console.print(f"  [yellow]ℹ ID {r.registry_id}: {r.error}[/yellow]")
+            logging.error(f"ID {r.registry_id}: {r.error}")
 
-        time.sleep(10) # Delay aumentado a 10s para intentar evitar bloqueos de IP
+    report = processor.run(target_videos, retry_failed=retry_failed, on_result=on_result)
 
-    db.close()
-    console.print(f"\n[bold green]🏁 Reproceso finalizado. Exitosos: {success_count}/{len(target_videos)}[/bold green]")
+    if report.interrupted:
+        console.print("\n[yellow]Reproceso pausado. Lo pendiente se retoma en la próxima ejecución.[/yellow]")
+    if report.halted:
+        console.print(f"\n[yellow]Detenido: {report.halted}. {report.deferred} videos quedan pendientes para más tarde.[/yellow]")
+    if report.skipped:
+        console.print(f"[dim]{report.skipped} videos saltados tras fallar {MAX_ATTEMPTS} veces (usa --retry-failed).[/dim]")
+    console.print(f"\n[bold green]🏁 Reproceso finalizado. Exitosos: {report.done}/{report.planned}[/bold green]")
+    llm_cache.print_stats()
     console.print(f"Ver log detallado en: {LOG_FILE}")
 
 if __name__ == "__main__":
-    reprocess_incomplete_videos()
+    parser = argparse.ArgumentParser(description="Reintenta el scraping y la IA de los videos bloqueados o sin resumen.")
+    parser.add_argument("--workers", type=int, default=REPROCESS_WORKERS, help="Videos procesados a la vez")
+    parser.add_argument("--commit-every", type=int, default=DEFAULT_COMMIT_EVERY, help="Resultados por transacción")
+    # --no-cache: fuerza llamadas reales a DeepSeek ignorando la caché LLM
+    parser.add_argument("--no-cache", action="store_true", help="Ignorar la caché LLM")
+    parser.add_argument("--retry-failed", action="store_true", help="Reintentar también los que agotaron sus intentos")
+    parser.add_argument("--reset", action="store_true", help="Borrar el checkpoint del lote antes de empezar")
+    args = parser.parse_args()
+
+    if args.no_cache:
+        llm_cache.bypass = True
+    init_db()
+    if args.reset:
+        AIBatchProcessor(BATCH_NAME).reset()
+    reprocess_incomplete_videos(args.workers, args.commit_every, args.retry_failed)
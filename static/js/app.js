@@ -89,15 +89,25 @@ document.addEventListener('DOMContentLoaded', () => {
                     body: JSON.stringify({ url, tags })
                 });
 
-                const result = await response.json();
+                const queued = await response.json();
+                if (!response.ok) throw new Error(queued.detail || "API Ingest fail");
+
+                // La ingesta corre en segundo plano: consultar el estado del trabajo
+                let job = queued;
+                while (job.status === 'queued' || job.status === 'running') {
+                    await new Promise(r => setTimeout(r, 1000));
+                    const jobResponse = await fetch(`/api/jobs/${queued.job_id}`);
+                    job = await jobResponse.json();
+                }
 
                 ingestStatus.querySelector('.loader').classList.add('hidden');
                 btnCloseIngestStatus.classList.remove('hidden');
 
-                if (result.status === 'ok') {
+                if (job.status === 'done') {
+                    const result = job.result;
                     ingestStatusText.innerHTML = `<span style="color:#69f0ae">✓ ${result.message}</span><br><br>ID: ${result.id}<br>Título: ${result.title}`;
                 } else {
-                    ingestStatusText.innerHTML = `<span style="color:#ff5252">❌ Error: ${result.message}</span>`;
+                    ingestStatusText.innerHTML = `<span style="color:#ff5252">❌ Error: ${job.error || job.detail}</span>`;
                 }
             } catch (err) {
                 console.error("Error en ingesta:", err);
@@ -148,7 +158,8 @@ document.addEventListener('DOMContentLoaded', () => {
     async function fetchRecords(query = "") {
         explorerGrid.innerHTML = '<div class="loader">Consultando al cerebro...</div>';
         try {
-            const response = await fetch(`/api/records?q=${encodeURIComponent(query)}`);
+            // Solo las columnas de la lista: sin content_raw ni resumen
+            const response = await fetch(`/api/records?q=${encodeURIComponent(query)}&fields=id,type,title,modified_at`);
             const data = await response.json();
             renderRecords(data);
         } catch (err) {
@@ -53,16 +53,22 @@ def get_key() -> str:
     return ""
 
 from modules.file_manager import ingest_local_file
+from modules.folder_indexer import FolderIndexer
 from modules.web_scraper import ingest_web_resource
 from modules.pkm_manager import create_note
-from core.search_engine import search_registry, parse_query_string
-from core.database import SessionLocal, nx_db, CardCreate, NexusLinkCreate
+from core.search_engine import search_registry, search_registry_page, parse_query_string
+from core.database import SessionLocal, nx_db, CardCreate, NexusLinkCreate, Registry
+from core.embeddings import embedding_store
+from core.graph import link_graph, registry_titles
 from agents.relationship_agent import generate_relationship_cards
 from modules.study_engine import start_pomodoro_session, open_source_material
 from modules.analytics import get_global_metrics
-from modules.exporter import export_to_google_drive
+from modules.study_queue import due_counts_by_topic, forecast_due_counts
+from modules.exporter import export_to_google_drive, DEFAULT_EXPORT_DIR as EXPORT_DIR
 from core.staging_db import staging_db, STAGING_DB_PATH
 from modules.pipeline_manager import run_youtube_pipeline
+from core import instrumentation
+from core.outbound import outbound
 
 import logging
 
@@ -92,9 +98,10 @@ def show_header():
     console.print(Panel(header_content, box=box.DOUBLE, border_style="bright_cyan", expand=False))
     console.print()
 
-def get_stats_panel(active_filters: str = "") -> Panel:
-    """Retorna un Panel Rich con estadísticas reales consultadas desde la BD."""
-    metrics = get_global_metrics()
+def get_stats_panel(active_filters: str = "", metrics: dict = None) -> Panel:
+    """Retorna un Panel Rich con estadísticas reales (cacheadas hasta la próxima escritura en la BD)."""
+    if metrics is None:
+        metrics = get_global_metrics()
     
     from rich.columns import Columns
     
@@ -154,11 +161,12 @@ def menu_agregar():
         console.print("  [bold bright_cyan][2][/] 🌐 Añadir URL (Web/YouTube) [dim](manual / Lote de URLs)[/]")
         console.print("  [bold bright_cyan][3][/] 📝 Escribir Nota Libre [dim](abre editor externo)[/]")
         console.print("  [bold bright_cyan][4][/] ⚙️  Añadir Aplicación / Herramienta")
+        console.print("  [bold bright_cyan][5][/] 📁 Indexar Carpeta [dim](incremental: solo archivos nuevos, modificados o borrados)[/]")
         console.print("  [bold bright_cyan][6][/] 🤖 Pipeline Automatizado (YouTube) [dim](playlists, descarga, resumen, flashcards)[/]")
         console.print(f"  [bold yellow][S][/] Cambiar Destino → {'Buffer G:' if current_target=='local' else 'Nexus Core'}")
         console.print("  [bold white][0][/] 🔙 Volver al Menú Principal\n")
 
-        opcion = Prompt.ask("Selecciona una opción", choices=["0", "1", "2", "3", "4", "6", "s", "S"], show_choices=False, console=console).lower()
+        opcion = Prompt.ask("Selecciona una opción", choices=["0", "1", "2", "3", "4", "5", "6", "s", "S"], show_choices=False, console=console).lower()
 
         if opcion == "0":
             break
@@ -356,6 +364,44 @@ def menu_agregar():
                     time.sleep(1)
                     break
                 
+        elif opcion == "5":
+            # Las rutas locales siempre van al Core local (igual que la opción 1)
+            try:
+                carpeta = Prompt.ask("\n[bold]Ruta absoluta de la carpeta[/bold]", console=console).strip().strip('"')
+                if not carpeta or not os.path.isdir(carpeta):
+                    console.print("[yellow]⚠ La ruta no es una carpeta válida. Operación cancelada.[/yellow]")
+                    time.sleep(1.5)
+                    continue
+                ext_input = Prompt.ask("[bold]Extensiones a incluir[/bold] (ej. pdf,md,docx — Enter = todas)", default="", console=console)
+                tags_input = Prompt.ask("[bold]Tags para los archivos nuevos (separados por coma)[/bold]", default="", console=console)
+                extensions = [e.strip() for e in ext_input.split(',') if e.strip()] or None
+                tags_list = [t.strip() for t in tags_input.split(',')] if tags_input else []
+
+                indexer = FolderIndexer(carpeta, tags=tags_list, extensions=extensions)
+                with console.status("[white]Escaneando carpeta y comparando con la BD...[/white]", spinner="dots") as status:
+                    report = indexer.run(progress=lambda done, total: status.update(f"[white]Leyendo archivos nuevos/modificados: {done}/{total}[/white]"))
+
+                t_idx = Table(title="📁 Indexación de Carpeta", box=box.ROUNDED, style="bright_cyan")
+                t_idx.add_column("Resultado", justify="left")
+                t_idx.add_column("Archivos", justify="right", style="bold white")
+                t_idx.add_row("Escaneados", str(report.scanned))
+                t_idx.add_row("Sin cambios", str(report.unchanged))
+                t_idx.add_row("[green]Nuevos[/]", str(report.created))
+                t_idx.add_row("[yellow]Modificados[/]", str(report.updated))
+                t_idx.add_row("Solo fecha (mismo contenido)", str(report.touched))
+                t_idx.add_row("[red]Eliminados de la BD[/]", str(report.deleted))
+                console.print(t_idx)
+                for err in report.errors[:10]:
+                    console.print(f"[yellow]⚠ {_safe(err, 150)}[/yellow]")
+                if len(report.errors) > 10:
+                    console.print(f"[yellow]... y {len(report.errors) - 10} avisos más.[/yellow]")
+            except (KeyboardInterrupt, EOFError):
+                console.print("\n[yellow]Operación abortada por usuario -> Redireccionando...[/yellow]")
+            except Exception as e:
+                console.print(f"\n[bold red]❌ Error de indexación:[/] {e}")
+                logger.exception("Fallo en FolderIndexer")
+            Prompt.ask("\n[bold]Enter para continuar...[/bold]", default="", console=console)
+
         elif opcion == "6":
             # 1.6 Pipeline Automatizado (YouTube)
             console.print("\n[bold bright_cyan]Iniciando Pipeline Automatizado de YouTube...[/]")
@@ -450,9 +496,11 @@ def menu_gestionar(initial_query: str = ""):
     """
     page = 0
     items_per_page = 10  # Reducido para acomodar más columnas
+    # Paginación keyset: cursor de inicio de cada página visitada (la página 0 no tiene cursor)
+    page_cursors = {0: None}
 
     filtros = {
-        'inc_name': "", 'exc_name': "", 'inc_tags': "", 'exc_tags': "",
+        'inc_name': "", 'exc_name': "", 'inc_content': "", 'inc_tags': "", 'exc_tags': "",
         'inc_exts': "", 'exc_exts': "", 'has_info': "", 'inc_ids': "", 'is_source': "",
         'order_by': ""
     }
@@ -473,15 +521,18 @@ def menu_gestionar(initial_query: str = ""):
         exc_exts_list = [e.strip() for e in filtros['exc_exts'].split(',')] if filtros['exc_exts'] else None
 
         with SessionLocal() as db_session:
-            # Evaluate bounds first if we are deep in paging
-            # We must count to clamp max_pages dynamically to fix out of bounds crashes
-            limit_var = items_per_page + 1
-            offset_var = page * items_per_page
-            
-            results = search_registry(
+            # Cada página arranca en el cursor guardado: costo constante sin importar la profundidad
+            if page not in page_cursors:
+                page = 0
+            results, next_cursor = search_registry_page(
                 db_session=db_session,
+                page_size=items_per_page,
+                cursor=page_cursors[page],
+                with_tags=True,
                 inc_name_path=filtros['inc_name'],
                 exc_name_path=filtros['exc_name'],
+                inc_content=filtros['inc_content'],
+                similar_to=filtros.get('similar'),
                 inc_tags=filtros['inc_tags'],
                 exc_tags=filtros['exc_tags'],
                 inc_extensions=inc_exts_list,
@@ -489,9 +540,7 @@ def menu_gestionar(initial_query: str = ""):
                 has_info=filtros['has_info'],
                 record_ids_str=filtros['inc_ids'],
                 is_flashcard_source=filtros['is_source'],
-                order_by=filtros['order_by'],
-                limit=limit_var,
-                offset=offset_var
+                order_by=filtros['order_by']
             )
             
             # Auto-revert logic: if empty results and page > 0, rewind by 1 and re-fetch.
@@ -499,8 +548,8 @@ def menu_gestionar(initial_query: str = ""):
                 page -= 1
                 continue
 
-        has_next = len(results) > items_per_page
-        display_results = results[:items_per_page]
+        has_next = next_cursor is not None
+        display_results = results
 
         # Excluir order_by del cálculo de filtros activos reales para evitar falsos positivos
         filtros_activos_str = 'Sí' if any(v for k, v in filtros.items() if k != 'order_by' and v) else 'No'
@@ -523,37 +572,35 @@ def menu_gestionar(initial_query: str = ""):
         table.add_column("Tags",  style="yellow",   ratio=2)
         table.add_column("Área",  style="bright_blue", ratio=1)
 
-        with SessionLocal() as s_tags:
-            from core.database import Tag as TagModel
-            for reg in display_results:
-                tag_objs = s_tags.query(TagModel).filter(TagModel.registry_id == reg.id).all()
-                tags_str  = ", ".join(t.value for t in tag_objs) if tag_objs else ""
-                tags_disp = (tags_str[:28] + "…") if len(tags_str) > 28 else tags_str
+        # Tags precargados en lote por search_registry (with_tags=True)
+        for reg in display_results:
+            tags_str  = ", ".join(reg.tags)
+            tags_disp = (tags_str[:28] + "…") if len(tags_str) > 28 else tags_str
 
-                # Área: busca una tag que parezca tema (sin ":", puro texto)
-                area_tags = [t.value for t in tag_objs if ":" not in t.value and len(t.value) > 2]
-                area_disp = area_tags[0] if area_tags else ""
+            # Área: busca una tag que parezca tema (sin ":", puro texto)
+            area_tags = [t for t in reg.tags if ":" not in t and len(t) > 2]
+            area_disp = area_tags[0] if area_tags else ""
 
-                d_desc = (reg.content_raw or "").replace("\n", " ")[:40]
-                if len(reg.content_raw or "") > 40: d_desc += "…"
+            d_desc = (reg.content_raw or "").replace("\n", " ")[:40]
+            if len(reg.content_raw or "") > 40: d_desc += "…"
 
-                i_info = reg.path_url or ""
-                if len(i_info) > 38: i_info = "…" + i_info[-35:]
+            i_info = reg.path_url or ""
+            if len(i_info) > 38: i_info = "…" + i_info[-35:]
 
-                m_date = reg.modified_at.strftime("%y-%m-%d") if reg.modified_at else "--"
-                e_state = "[green]✓[/]" if reg.is_flashcard_source else "[red]✗[/]"
+            m_date = reg.modified_at.strftime("%y-%m-%d") if reg.modified_at else "--"
+            e_state = "[green]✓[/]" if reg.is_flashcard_source else "[red]✗[/]"
 
-                tipo = reg.type
-                if reg.metadata_dict and 'extension' in reg.metadata_dict:
-                    tipo += f"({reg.metadata_dict['extension']})"
+            tipo = reg.type
+            if reg.metadata_dict and 'extension' in reg.metadata_dict:
+                tipo += f"({reg.metadata_dict['extension']})"
 
-                table.add_row(
-                    str(reg.id), _safe(tipo, 12),
-                    _safe(reg.title or "N/A", 50),
-                    _safe(d_desc, 42), _safe(i_info, 40),
-                    m_date, e_state,
-                    _safe(tags_disp, 30), _safe(area_disp, 20)
-                )
+            table.add_row(
+                str(reg.id), _safe(tipo, 12),
+                _safe(reg.title or "N/A", 50),
+                _safe(d_desc, 42), _safe(i_info, 40),
+                m_date, e_state,
+                _safe(tags_disp, 30), _safe(area_disp, 20)
+            )
 
         console.print(table)
         console.print(
@@ -572,7 +619,9 @@ def menu_gestionar(initial_query: str = ""):
 
         # ── Paginación con flechas (get_key no aplica aquí; usamos Prompt + detección de texto)
         elif cmd_lower in ('→', 'right', 'n', '>'):
-            if has_next: page += 1
+            if has_next:
+                page += 1
+                page_cursors[page] = next_cursor
             else:
                 console.print("[yellow]Ya estás en la última página.[/]")
                 time.sleep(0.8)
@@ -582,7 +631,7 @@ def menu_gestionar(initial_query: str = ""):
         # ── Filtros
         elif cmd_lower == 'q':
             console.print("\n[bold yellow]🔍 Filtro Inteligente[/]")
-            console.print("[white]t:etiqueta  e:ext  i:ID  s:y(solo recall)  -excluir  término(título)[/white]")
+            console.print("[white]t:etiqueta  c:contenido  sim:ID|texto  e:ext  i:ID  s:y(solo recall)  -excluir  término(título)[/white]")
             query = Prompt.ask("[bold bright_cyan]Filtrar[/]", default="", console=console)
             if query.strip():
                 filtros = parse_query_string(query)
@@ -591,6 +640,7 @@ def menu_gestionar(initial_query: str = ""):
             else:
                 for k in filtros: filtros[k] = ""
                 initial_query = ""
+                page = 0
         elif cmd_lower == 'l':
             for k in filtros: filtros[k] = ""
             initial_query = ""
@@ -609,6 +659,8 @@ def menu_gestionar(initial_query: str = ""):
                     all_filtered = search_registry(
                         db_session=curr_session,
                         inc_name_path=filtros['inc_name'], exc_name_path=filtros['exc_name'],
+                        inc_content=filtros['inc_content'],
+                        similar_to=filtros.get('similar'),
                         inc_tags=filtros['inc_tags'], exc_tags=filtros['exc_tags'],
                         inc_extensions=inc_exts_list, exc_extensions=exc_exts_list,
                         has_info=filtros['has_info'], limit=None, offset=0
@@ -868,7 +920,7 @@ def _show_record_detail(rec_id: int):
                         f"{reg.content_raw}",
                         title=f"[bold yellow]📖 Modo Lectura - {reg.title}[/]",
                         border_style="bright_yellow", padding=(1, 4),
-                        subtitle="[white]Pulsa 'Enter' para salir o 'vID' para saltar a un nodo relacionado[/white]"
+                        subtitle="[white]Pulsa 'Enter' para salir, 'vID' para saltar a un nodo relacionado o 'r2' para ver la red a 2 saltos[/white]"
                     )
                     console.print(content_panel)
                     
@@ -876,18 +928,20 @@ def _show_record_detail(rec_id: int):
                     enlaces_entrantes = db_session.query(NexusLink).filter(NexusLink.target_id == rec_id).all()
                     
                     if enlaces_salientes or enlaces_entrantes:
+                        # Títulos de todos los extremos en una consulta (antes: una por vínculo)
+                        titulos = registry_titles(db_session, {ln.target_id for ln in enlaces_salientes} | {ln.source_id for ln in enlaces_entrantes})
                         console.print("\n[bold yellow]🕸️ Red Neuronal (Vínculos Directos):[/]")
                         for ln in enlaces_salientes:
-                            tg = db_session.query(Registry).filter(Registry.id == ln.target_id).first()
-                            if tg: console.print(f"  [bright_cyan]v{tg.id}[/] ➔ {tg.title} [white]({ln.relation_type})[/white]")
+                            if ln.target_id in titulos: console.print(f"  [bright_cyan]v{ln.target_id}[/] ➔ {titulos[ln.target_id]} [white]({ln.relation_type})[/white]")
                         for ln in enlaces_entrantes:
-                            src = db_session.query(Registry).filter(Registry.id == ln.source_id).first()
-                            if src: console.print(f"  [bright_cyan]v{src.id}[/] ⬅ {src.title} [white]({ln.relation_type})[/white]")
+                            if ln.source_id in titulos: console.print(f"  [bright_cyan]v{ln.source_id}[/] ⬅ {titulos[ln.source_id]} [white]({ln.relation_type})[/white]")
                     
                     cmd_foco = Prompt.ask("\n[bold bright_cyan]Acción[/]", console=console).strip().lower()
                     
                     if not cmd_foco:
                         break  # Termina repaso
+                    elif cmd_foco.startswith('r') and cmd_foco[1:].isdigit():
+                        _mostrar_vecindario(rec_id, int(cmd_foco[1:]))
                     elif cmd_foco.startswith('v') and cmd_foco[1:].isdigit():
                         salto_id = int(cmd_foco[1:])
                         _show_record_detail(salto_id) # Salto recursivo
@@ -1184,9 +1238,12 @@ def menu_adelantar_repaso():
                 table.add_column("Tarjetas", justify="center")
                 
                 with SessionLocal() as db_session:
+                    # Conteo de tarjetas de toda la página en una consulta agrupada
+                    counts = dict(db_session.query(Card.parent_id, func.count(Card.id)).filter(
+                        Card.parent_id.in_([reg.id for reg in results])
+                    ).group_by(Card.parent_id).all()) if results else {}
                     for reg in results:
-                        count = db_session.query(func.count(Card.id)).filter(Card.parent_id == reg.id).scalar()
-                        table.add_row(str(reg.id), reg.type.upper(), reg.title or "Sin Título", str(count))
+                        table.add_row(str(reg.id), reg.type.upper(), reg.title or "Sin Título", str(counts.get(reg.id, 0)))
                 
                 console.print(table)
                 console.print(f"\n[white]Página {page+1} | Total temas: {total_count}[/white]")
@@ -1227,13 +1284,15 @@ def menu_active_recall():
     """Puente hacia módulos de estudio y SRS, fusionado con un Explorador Gestor de Flashcards (Lotes)"""
     from core.database import Registry, Card
     from sqlalchemy import func
+    from sqlalchemy.orm import selectinload
     from datetime import datetime, timezone
-    from agents.study_agent import generate_deck_from_registry
+    from agents.study_agent import generate_decks_batch
+    from core.database import BULK_IN_CHUNK
     
     page = 0
     items_per_page = 8
     filtros = {
-        'inc_name': "", 'exc_name': "", 'inc_tags': "", 'exc_tags': "",
+        'inc_name': "", 'exc_name': "", 'inc_content': "", 'inc_tags': "", 'exc_tags': "",
         'inc_exts': "", 'exc_exts': "", 'has_info': "", 'inc_ids': "", 'is_source': ""
     }
 
@@ -1244,16 +1303,15 @@ def menu_active_recall():
         # --- 1. Banner Superior: Status de Pomodoros Pendientes ---
         now = datetime.now(timezone.utc)
         with nx_db.Session() as db_session:
-            due_cards = db_session.query(Card).filter((Card.next_review == None) | (Card.next_review <= now)).subquery()
-            topics_today = db_session.query(Registry.id, Registry.title, func.count(due_cards.c.id)).join(
-                due_cards, due_cards.c.parent_id == Registry.id
-            ).group_by(Registry.id).all()
+            topics_today = due_counts_by_topic(db_session)
+            forecast = forecast_due_counts(db_session, days=7)
+            forecast_str = " · ".join(f"+{d}d: {n}" for d, n in enumerate(forecast[1:], start=1))
             
             if topics_today:
                 c_total = sum([c for _, _, c in topics_today])
-                console.print(Panel(f"[bold bright_cyan]🔥 Motor Pomodoro Listo:[/] Tienes [bold white on red]{c_total} tarjetas pendientes[/] distribuidas en {len(topics_today)} temas para hoy.", box=box.ROUNDED, border_style="bright_cyan"))
+                console.print(Panel(f"[bold bright_cyan]🔥 Motor Pomodoro Listo:[/] Tienes [bold white on red]{c_total} tarjetas pendientes[/] distribuidas en {len(topics_today)} temas para hoy.\n[white]Próximos días → {forecast_str}[/]", box=box.ROUNDED, border_style="bright_cyan"))
             else:
-                console.print(Panel("[green]🎉 Tu mente está al día. No tienes repasos pendientes hoy.[/]", box=box.ROUNDED, border_style="green"))
+                console.print(Panel(f"[green]🎉 Tu mente está al día. No tienes repasos pendientes hoy.[/]\n[white]Próximos días → {forecast_str}[/]", box=box.ROUNDED, border_style="green"))
 
         # --- 2. Explorador de Fuentes de Flashcards ---
         # Si el usuario NO tiene filtros activos, forzamos mostrar solo los temas pendientes para hacer Pomodoro hoy
@@ -1272,14 +1330,29 @@ def menu_active_recall():
             results = search_registry(
                 db_session=curr_session,
                 inc_name_path=filtros['inc_name'], exc_name_path=filtros['exc_name'],
+                inc_content=filtros['inc_content'],
+                similar_to=filtros.get('similar'),
                 inc_tags=filtros['inc_tags'], exc_tags=filtros['exc_tags'],
                 inc_extensions=inc_exts_list, exc_extensions=exc_exts_list,
                 has_info=filtros['has_info'], record_ids_str=ids_a_buscar,
-                is_flashcard_source=filtros['is_source'], limit=items_per_page + 1, offset=page * items_per_page
+                is_flashcard_source=filtros['is_source'], limit=items_per_page + 1, offset=page * items_per_page,
+                with_tags=True, with_card_stats=True
             )
             
         has_next = len(results) > items_per_page
         display_results = results[:items_per_page]
+
+        # Preview: primera flashcard pendiente de cada fuente, en una sola consulta agrupada
+        preview_by_parent = {}
+        if display_results:
+            with nx_db.Session() as s_aux:
+                first_due_ids = s_aux.query(func.min(Card.id)).filter(
+                    Card.parent_id.in_([r.id for r in display_results]),
+                    (Card.next_review == None) | (Card.next_review <= now)
+                ).group_by(Card.parent_id)
+                preview_by_parent = dict(
+                    s_aux.query(Card.parent_id, Card.question).filter(Card.id.in_(first_due_ids)).all()
+                )
         
         table = Table(
             title=f"[bold yellow]🧠 ACTIVE RECALL — Selector de Fuentes (Pág. {page + 1})[/] | Filtros: {'Sí' if any(filtros.values()) else 'No'}  │  ←→ Navegar  Q Filtrar  L Limpiar  0 Salir",
@@ -1292,40 +1365,30 @@ def menu_active_recall():
         table.add_column("Pend/Tot",      justify="center", no_wrap=True, width=10)  # d
         table.add_column("💳 Flashcard a Evaluar", justify="left", style="bright_yellow", ratio=4)  # columna nueva
 
-        with nx_db.Session() as s_aux:
-            for reg in display_results:
-                from core.database import Tag
-                tag_list = s_aux.query(Tag).filter(Tag.registry_id == reg.id).all()
-                tags_str = ", ".join([t.value for t in tag_list]) if tag_list else ""
-                
-                total_cards = s_aux.query(func.count(Card.id)).filter(Card.parent_id == reg.id).scalar()
-                pending_cards = s_aux.query(func.count(Card.id)).filter(
-                    Card.parent_id == reg.id,
-                    (Card.next_review == None) | (Card.next_review <= now)
-                ).scalar()
-                
-                titulo_list = (reg.title[:40] + "...") if len(reg.title or "") > 40 else (reg.title or "")
-                desc_list = (reg.content_raw.replace('\n', ' ')[:45] + "...") if len(reg.content_raw or "") > 45 else (reg.content_raw or "")
-                tags_list_view = (tags_str[:28] + "...") if len(tags_str) > 28 else tags_str
-
-                # Obtener la primera flashcard pendiente como preview
-                flashcard_preview = ""
-                first_card = s_aux.query(Card).filter(
-                    Card.parent_id == reg.id,
-                    (Card.next_review == None) | (Card.next_review <= now)
-                ).first()
-                if first_card:
-                    q_disp = (first_card.question[:60] + "...") if len(first_card.question or "") > 60 else (first_card.question or "")
-                    flashcard_preview = f"[bold]Q:[/] {q_disp}"
-
-                table.add_row(
-                    str(reg.id),
-                    titulo_list,
-                    desc_list,
-                    tags_list_view,
-                    f"[bold yellow]{pending_cards}[/]/[white]{total_cards}[/]",
-                    flashcard_preview
-                )
+        for reg in display_results:
+            tags_str = ", ".join(reg.tags)
+            total_cards = reg.card_count or 0
+            pending_cards = reg.due_count or 0
+
+            titulo_list = (reg.title[:40] + "...") if len(reg.title or "") > 40 else (reg.title or "")
+            desc_list = (reg.content_raw.replace('\n', ' ')[:45] + "...") if len(reg.content_raw or "") > 45 else (reg.content_raw or "")
+            tags_list_view = (tags_str[:28] + "...") if len(tags_str) > 28 else tags_str
+
+            # Primera flashcard pendiente como preview
+            flashcard_preview = ""
+            first_question = preview_by_parent.get(reg.id)
+            if first_question:
+                q_disp = (first_question[:60] + "...") if len(first_question) > 60 else first_question
+                flashcard_preview = f"[bold]Q:[/] {q_disp}"
+
+            table.add_row(
+                str(reg.id),
+                titulo_list,
+                desc_list,
+                tags_list_view,
+                f"[bold yellow]{pending_cards}[/]/[white]{total_cards}[/]",
+                flashcard_preview
+            )
 
         console.print(table)
         
@@ -1356,7 +1419,7 @@ def menu_active_recall():
             page = 0
         elif cmd_lower == 'q':
             console.print("\n[bold yellow]🔍 Filtro Inteligente (Recall)[/]")
-            console.print("[white]t:etiqueta  e:ext  i:ID  s:y(solo recall)  término[/white]")
+            console.print("[white]t:etiqueta  c:contenido  sim:ID|texto  e:ext  i:ID  s:y(solo recall)  término[/white]")
             query = Prompt.ask("[bold bright_cyan]Filtrar[/]", default="", console=console)
             if query.strip():
                 filtros = parse_query_string(query)
@@ -1518,6 +1581,8 @@ def menu_active_recall():
                     all_filtered = search_registry(
                         db_session=curr_session,
                         inc_name_path=filtros['inc_name'], exc_name_path=filtros['exc_name'],
+                        inc_content=filtros['inc_content'],
+                        similar_to=filtros.get('similar'),
                         inc_tags=filtros['inc_tags'], exc_tags=filtros['exc_tags'],
                         inc_extensions=inc_exts_list, exc_extensions=exc_exts_list,
                         has_info=filtros['has_info'], record_ids_str=filtros['inc_ids'],
@@ -1549,20 +1614,29 @@ def menu_active_recall():
             if confirm == 's':
                 success_generations = 0
                 total_cards_made = 0
-                for d_id in target_ids:
-                    reg_obj_ia = nx_db.get_registry(d_id)
-                    if reg_obj_ia:
-                        console.print(f"\n[white]Procesando Registro ID {d_id}: '{reg_obj_ia.title}'[/white]")
-                        # Invocado a IA (Mockup solo si el cliente no está disponible, ya confirmamos el lote arriba)
-                        cards_generated = generate_deck_from_registry(reg_obj_ia, mockup_only=False)
+                with SessionLocal() as lote_session:
+                    registros_ia = []
+                    for i in range(0, len(target_ids), BULK_IN_CHUNK):
+                        registros_ia.extend(lote_session.query(Registry).options(selectinload(Registry.text_row)).filter(Registry.id.in_(target_ids[i:i + BULK_IN_CHUNK])).all())
+                    registros_ia.sort(key=lambda r: r.id)
+
+                    # Notas cortas agrupadas en peticiones multi-registro; las largas, una a una
+                    # (mockup solo si el cliente no está disponible, ya confirmamos el lote arriba)
+                    with console.status("[white]Generando mazos con IA...[/white]", spinner="dots") as status:
+                        decks = generate_decks_batch(registros_ia, progress=lambda done, total: status.update(f"[white]Generando mazos con IA: {done}/{total} registros[/white]"))
+
+                    for reg_obj_ia in registros_ia:
+                        d_id = reg_obj_ia.id
+                        cards_generated = decks.get(d_id) or []
                         if cards_generated:
                             for card in cards_generated:
-                                nx_db.create_card(CardCreate(parent_id=d_id, question=card.question, answer=card.answer, type=card.card_type))
+                                nx_db.create_card_in_session(lote_session, CardCreate(parent_id=d_id, question=card.question, answer=card.answer, type=card.card_type))
                             success_generations += 1
                             total_cards_made += len(cards_generated)
-                            console.print(f"[bold green]✓ {len(cards_generated)} tarjetas anidadas a ID {d_id}[/bold green]")
+                            console.print(f"[bold green]✓ {len(cards_generated)} tarjetas anidadas a ID {d_id}[/bold green] [white]'{_safe(reg_obj_ia.title or '', 50)}'[/white]")
                         else:
                             console.print(f"[yellow]⚠ IA omitió ID {d_id} (Falta de info o error API).[/yellow]")
+                    lote_session.commit()
                 
                 console.print(f"\n[bold magenta]🎉 OPERACIÓN IA LOTE FINALIZADA:[/]\n  ‣ Registros Exitosos: {success_generations}/{len(target_ids)}\n  ‣ Total Flashcards Agregadas al Sistema: {total_cards_made}")
                 Prompt.ask("\n[bold]Presiona Enter para continuar...[/]")
@@ -1585,6 +1659,8 @@ def menu_active_recall():
                         all_filtered = search_registry(
                             db_session=curr_session,
                             inc_name_path=filtros['inc_name'], exc_name_path=filtros['exc_name'],
+                            inc_content=filtros['inc_content'],
+                            similar_to=filtros.get('similar'),
                             inc_tags=filtros['inc_tags'], exc_tags=filtros['exc_tags'],
                             inc_extensions=inc_exts_list, exc_extensions=exc_exts_list,
                             has_info=filtros['has_info'], record_ids_str=filtros['inc_ids'],
@@ -1639,12 +1715,122 @@ def menu_active_recall():
             time.sleep(1)
 
 
+def _sugerir_vinculos(raw_id: str) -> str:
+    """Tabla de registros parecidos a 'raw_id' sin vínculo. Retorna el comando elegido o ''."""
+    if not raw_id.isdigit():
+        console.print("[bold red]Error: Indica un ID. Ej: sug 42[/]")
+        time.sleep(1.5)
+        return ''
+    origin = int(raw_id)
+    rec = nx_db.get_registry(origin)
+    if not rec:
+        console.print("[bold red]El ID no existe.[/]")
+        time.sleep(1.5)
+        return ''
+
+    with console.status("[dim]Buscando registros parecidos (índice vectorial)...[/dim]", spinner="dots"):
+        suggestions = embedding_store.suggest_links(origin, k=10)
+    if not suggestions:
+        console.print("[yellow]Sin sugerencias: no hay registros suficientemente parecidos sin vincular.[/yellow]")
+        time.sleep(1.5)
+        return ''
+
+    with SessionLocal() as db_session:
+        info = {
+            rid: (title, r_type) for rid, title, r_type in db_session.query(Registry.id, Registry.title, Registry.type)
+            .filter(Registry.id.in_([rid for rid, _ in suggestions]))
+        }
+    table = Table(title=f"🧭 Sugerencias de vínculo para ID {origin}: {_safe(rec.title or '', 50)}", box=box.ROUNDED, border_style="bright_magenta")
+    table.add_column("#", justify="right", style="white")
+    table.add_column("ID", justify="right", style="bright_cyan")
+    table.add_column("Título", style="bold bright_white")
+    table.add_column("Tipo", style="yellow")
+    table.add_column("Similitud", justify="right", style="bold green")
+    for n, (rid, score) in enumerate(suggestions, start=1):
+        title, r_type = info.get(rid, ("N/A", "?"))
+        table.add_row(str(n), str(rid), _safe(title or "N/A", 60), r_type, f"{score:.0%}")
+    console.print(table)
+
+    choice = Prompt.ask(
+        "[bold]# para IA Match, m# para vínculo manual (ej. 2 o m2), Enter para volver[/]",
+        default="", console=console
+    ).strip().lower()
+    manual = choice.startswith('m')
+    pick = choice[1:] if manual else choice
+    if pick.isdigit() and 1 <= int(pick) <= len(suggestions):
+        return f"{'m' if manual else 'ia'} {origin} {suggestions[int(pick) - 1][0]}"
+    return ''
+
+def _mostrar_vecindario(origin: int, hops: int = 2):
+    """Registros a como mucho 'hops' saltos de 'origin' (grafo de vínculos no dirigido)."""
+    graph = link_graph.get()
+    vecinos = graph.neighbourhood(origin, hops=hops)
+    if not vecinos:
+        console.print(f"[yellow]El ID {origin} no tiene vínculos.[/yellow]")
+        Prompt.ask("\n[dim]Enter para volver[/dim]", default="", console=console)
+        return
+    rank = {rid: graph.centrality(rid) for rid in vecinos}
+    with SessionLocal() as db_session:
+        titulos = registry_titles(db_session, vecinos)
+    table = Table(title=f"🕸️ Red de ID {origin} a {hops} saltos ({len(vecinos)} registros)", box=box.ROUNDED, border_style="bright_magenta")
+    table.add_column("Saltos", justify="right", style="yellow")
+    table.add_column("ID", justify="right", style="bright_cyan")
+    table.add_column("Título", style="bold bright_white")
+    table.add_column("Vínculos", justify="right", style="white")
+    table.add_column("Centralidad (1 = media)", justify="right", style="green")
+    orden = sorted(vecinos, key=lambda rid: (vecinos[rid], -rank[rid]))
+    for rid in orden[:50]:
+        table.add_row(str(vecinos[rid]), str(rid), _safe(titulos.get(rid) or "N/A", 60), str(graph.degree(rid)), f"{rank[rid] * graph.n:.2f}")
+    console.print(table)
+    if len(orden) > 50:
+        console.print(f"[dim]... y {len(orden) - 50} más.[/dim]")
+    Prompt.ask("\n[dim]Enter para volver[/dim]", default="", console=console)
+
+def _explorar_grafo(cmd: str):
+    """Comandos de grafo del linker: 'red ID [saltos]', 'ruta ID1 ID2' y 'centro'."""
+    parts = cmd.split()
+    if parts[0] == 'red' and len(parts) >= 2 and all(p.isdigit() for p in parts[1:3]):
+        _mostrar_vecindario(int(parts[1]), min(int(parts[2]) if len(parts) > 2 else 2, 6))
+        return
+    if parts[0] == 'ruta' and len(parts) == 3 and parts[1].isdigit() and parts[2].isdigit():
+        ruta = link_graph.get().shortest_path(int(parts[1]), int(parts[2]))
+        if not ruta:
+            console.print("[yellow]No hay camino entre esos registros en la red de vínculos.[/yellow]")
+        else:
+            with SessionLocal() as db_session:
+                titulos = registry_titles(db_session, ruta)
+            console.print(f"\n[bold bright_magenta]🧭 Ruta más corta ({len(ruta) - 1} saltos):[/]")
+            for paso, rid in enumerate(ruta):
+                console.print(f"  {'  ' * paso}[bright_cyan]{rid}[/] {_safe(titulos.get(rid) or 'N/A', 70)}")
+        Prompt.ask("\n[dim]Enter para volver[/dim]", default="", console=console)
+        return
+    if parts[0] == 'centro':
+        graph = link_graph.get()
+        stats = graph.stats()
+        central = graph.top_central(15)
+        with SessionLocal() as db_session:
+            titulos = registry_titles(db_session, [rid for rid, _ in central])
+        table = Table(title="⭐ Registros más centrales (PageRank sobre vínculos)", box=box.ROUNDED, border_style="bright_magenta")
+        table.add_column("ID", justify="right", style="bright_cyan")
+        table.add_column("Título", style="bold bright_white")
+        table.add_column("Vínculos", justify="right", style="white")
+        table.add_column("Centralidad (1 = media)", justify="right", style="green")
+        for rid, score in central:
+            table.add_row(str(rid), _safe(titulos.get(rid) or "N/A", 60), str(graph.degree(rid)), f"{score * graph.n:.2f}")
+        console.print(table)
+        console.print(f"[cyan]{stats['nodes']} registros vinculados, {stats['edges']} vínculos, "
+                      f"{stats['components']} islas (mayor: {stats['largest_component']}), grado medio {stats['avg_degree']}[/cyan]")
+        Prompt.ask("\n[dim]Enter para volver[/dim]", default="", console=console)
+        return
+    console.print("[bold red]Uso: red ID [saltos] | ruta ID1 ID2 | centro[/]")
+    time.sleep(1.5)
+
 def menu_conectar():
     """Centro de Vinculación Neuronal (Cockpit de Enlaces)"""
     page = 0
     items_per_page = 10
     filtros = {
-        'inc_name': "", 'exc_name': "", 'inc_tags': "", 'exc_tags': "",
+        'inc_name': "", 'exc_name': "", 'inc_content': "", 'inc_tags': "", 'exc_tags': "",
         'inc_exts': "", 'exc_exts': "", 'has_info': "", 'inc_ids': "", 'is_source': ""
     }
 
@@ -1660,6 +1846,8 @@ def menu_conectar():
             results = search_registry(
                 db_session=db_session,
                 inc_name_path=filtros['inc_name'],
+                inc_content=filtros['inc_content'],
+                similar_to=filtros.get('similar'),
                 inc_tags=filtros['inc_tags'],
                 inc_extensions=inc_exts_list,
                 limit=items_per_page + 1,
@@ -1686,11 +1874,20 @@ def menu_conectar():
         console.print("\n[bold yellow]Comandos de Conexión:[/]")
         console.print("  [bold]ia ID1 ID2[/] 🤖 IA Match (Crea vínculo + tarjetas comparativas)")
         console.print("  [bold]m ID1 ID2[/]  🔗 Vínculo Manual (Crea relación simple)")
-        console.print("  [bold]s [query][/]  🔍 Filtrar lista | [bold]n/p[/] Pág | [bold]0[/] Volver al Menú Principal\n")
+        console.print("  [bold]sug ID[/]     🧭 Sugerir vínculos (registros parecidos aún sin conectar)")
+        console.print("  [bold]red ID [n][/] 🕸️ Red a n saltos | [bold]ruta ID1 ID2[/] Camino más corto | [bold]centro[/] Nodos clave")
+        console.print("  [bold]s [query][/]  🔍 Filtrar lista (sim:ID = parecidos) | [bold]n/p[/] Pág | [bold]0[/] Volver al Menú Principal\n")
         
         cmd = Prompt.ask("Nexus Linker", console=console).strip().lower()
+        if cmd.startswith('sug '):
+            # La vista de sugerencias devuelve el comando elegido (ia/m) o '' para volver
+            cmd = _sugerir_vinculos(cmd[4:].strip())
         
-        if cmd == '0':
+        if cmd == '' or cmd.startswith('sug '):
+            continue
+        elif cmd.split()[0] in ('red', 'ruta', 'centro'):
+            _explorar_grafo(cmd)
+        elif cmd == '0':
             break
         elif cmd == 'n' and has_next: page += 1
         elif cmd == 'p' and page > 0: page -= 1
@@ -1790,7 +1987,7 @@ def menu_conectar():
 def menu_estadisticas():
     """[4] ESTADÍSTICAS
     Visualizar salud del sistema, composición de la base de conocimiento y métricas de aprendizaje.
-    G=Sincronizar con Google Drive | S=Filtrar por área/tag | Enter=Volver
+    G=Sincronizar con Google Drive | S=Filtrar por área/tag | D=Diagnóstico | Enter=Volver
     """
     filtro_activo = ""
     
@@ -1798,11 +1995,12 @@ def menu_estadisticas():
         console.clear()
         show_header()
 
-        console.print(Align.center(get_stats_panel(active_filters=filtro_activo)))
-        console.print()
-
+        # Una sola consulta (cacheada) alimenta el panel y las tablas; 'filtro_activo' acota por área/tag/tipo
         with console.status("[white]Consultando datos...[/white]", spinner="dots"):
-            metrics = get_global_metrics()
+            metrics = get_global_metrics(filtro_activo)
+
+        console.print(Align.center(get_stats_panel(active_filters=filtro_activo, metrics=metrics)))
+        console.print()
 
         # Panel 4.1: Composición del Cerebro
         t_reg = Table(title="🗄️ 4.1 Composición del Cerebro", box=box.ROUNDED, style="bright_cyan")
@@ -1842,15 +2040,15 @@ def menu_estadisticas():
             console.print(f"[yellow]🔍 Filtro activo: {filtro_activo}[/yellow]")
 
         action = Prompt.ask(
-            "\n[bold][G][/] Sincronizar Google Drive  [bold][S][/] Filtrar por área/tag  [bold][Enter][/] Volver",
-            choices=["g", "G", "s", "S", ""], show_choices=False, default="", console=console
+            "\n[bold][G][/] Sincronizar Google Drive  [bold][S][/] Filtrar por área/tag  [bold][D][/] Diagnóstico  [bold][Enter][/] Volver",
+            choices=["g", "G", "s", "S", "d", "D", ""], show_choices=False, default="", console=console
         ).lower()
 
         if action == "g":
             # 4.4 Sincronización
             console.print("\n[bright_cyan]Iniciando exportación a Google Drive...[/]")
             try:
-                with console.status("[white]Copiando base de datos y generando CSV en G:/Mi unidad/Nexus_Data...[/white]", spinner="dots"):
+                with console.status(f"[white]Copiando base de datos y generando CSV en {EXPORT_DIR}...[/white]", spinner="dots"):
                     success, message = export_to_google_drive()
             except Exception as e:
                 success, message = False, str(e)
@@ -1869,9 +2067,96 @@ def menu_estadisticas():
                 default="", console=console
             ).strip()
 
+        elif action == "d":
+            menu_diagnostico()
+
         else:  # Enter → volver
             break
 
+def menu_diagnostico():
+    """4.5 DIAGNÓSTICO
+    Tiempos de las rutas calientes (búsqueda, CRUD, IA, ingesta), sentencias SQL
+    más costosas y sospechas de N+1 acumuladas en esta sesión del TUI.
+    A=Activar/Desactivar | R=Reiniciar métricas | Enter=Volver
+    """
+    while True:
+        console.clear()
+        show_header()
+        snap = instrumentation.snapshot(top=12)
+
+        estado = "[bold green]ACTIVA[/]" if snap["enabled"] else "[bold white on red]DESACTIVADA[/]"
+        console.print(Align.center(Panel(f"Instrumentación: {estado}", title="🩺 4.5 Diagnóstico", border_style="bright_cyan", expand=False)))
+        console.print()
+
+        t_timers = Table(title="⏱️ Rutas calientes", box=box.ROUNDED, style="bright_cyan")
+        t_timers.add_column("Métrica", justify="left")
+        t_timers.add_column("Etiquetas", justify="left", style="white")
+        t_timers.add_column("Llamadas", justify="right")
+        t_timers.add_column("Total (s)", justify="right", style="bold yellow")
+        t_timers.add_column("Media (ms)", justify="right", style="bold white")
+        for t in snap["timers"]:
+            labels = ", ".join(f"{k}={v}" for k, v in t["labels"].items())
+            t_timers.add_row(t["name"], _safe(labels, 40), str(t["calls"]), f"{t['total_s']:.3f}", f"{t['avg_ms']:.1f}")
+
+        t_sql = Table(title="🗄️ SQL más costoso", box=box.ROUNDED, style="yellow")
+        t_sql.add_column("Sentencia", justify="left", style="white")
+        t_sql.add_column("Veces", justify="right")
+        t_sql.add_column("Total (s)", justify="right", style="bold yellow")
+        t_sql.add_column("Máx (ms)", justify="right")
+        for st in snap["statements"]:
+            t_sql.add_row(_safe(st["sql"], 90), str(st["calls"]), f"{st['total_s']:.3f}", f"{st['max_ms']:.1f}")
+
+        console.print(t_timers)
+        console.print(t_sql)
+
+        if snap["n_plus_one"]:
+            t_n1 = Table(title="⚠️ Sospechas de N+1", box=box.ROUNDED, style="red")
+            t_n1.add_column("Ámbito", justify="left")
+            t_n1.add_column("Sentencia repetida", justify="left", style="white")
+            t_n1.add_column("Repeticiones", justify="right", style="bold white on red")
+            for n1 in snap["n_plus_one"]:
+                t_n1.add_row(n1["scope"], _safe(n1["sql"], 80), str(n1["repeats"]))
+            console.print(t_n1)
+        elif snap["enabled"]:
+            console.print("[green]Sin patrones N+1 detectados.[/green]")
+
+        providers = outbound.stats()
+        if providers:
+            t_out = Table(title="🌐 Llamadas externas", box=box.ROUNDED, style="magenta")
+            t_out.add_column("Proveedor", justify="left")
+            t_out.add_column("Circuito", justify="center")
+            t_out.add_column("Fichas", justify="right")
+            t_out.add_column("OK", justify="right", style="bold green")
+            t_out.add_column("Reintentos", justify="right")
+            t_out.add_column("Errores", justify="right", style="bold red")
+            t_out.add_column("Rechazadas", justify="right")
+            t_out.add_column("Frenadas", justify="right")
+            t_out.add_column("Espera (s)", justify="right", style="bold yellow")
+            for name, st in sorted(providers.items()):
+                circuito = {"closed": "[green]cerrado[/]", "half_open": "[yellow]prueba[/]"}.get(
+                    st["state"], f"[bold white on red]abierto ({st['retry_in_s']:.0f}s)[/]"
+                )
+                t_out.add_row(
+                    name, circuito, f"{st['tokens']:.1f}/{st['burst']}", str(st["ok"]), str(st["retries"]),
+                    str(st["errors"]), str(st["rejected"]), str(st["throttled"]), f"{st['waited_s']:.1f}"
+                )
+            console.print(t_out)
+
+        action = Prompt.ask(
+            "\n[bold][A][/] Activar/Desactivar  [bold][R][/] Reiniciar métricas  [bold][Enter][/] Volver",
+            choices=["a", "A", "r", "R", ""], show_choices=False, default="", console=console
+        ).lower()
+
+        if action == "a":
+            if snap["enabled"]:
+                instrumentation.disable()
+            else:
+                instrumentation.enable()
+        elif action == "r":
+            instrumentation.reset()
+        else:
+            break
+
 
 
 # ----------------------------------------------------------------------------
@@ -1880,6 +2165,9 @@ def menu_estadisticas():
 
 def main_loop():
     """Bucle infinito del Dashboard Principal — Arquitectura de 5 Componentes."""
+    # El buscador (sim:) solo lee el índice vectorial: se pone al día en segundo plano
+    embedding_store.watch_writes()
+    embedding_store.refresh_in_background()
     while True:
         console.clear()
         show_header()
@@ -1,22 +1,72 @@
 
 import os
 import sys
-from fastapi import FastAPI, HTTPException, Query
+import time
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, Response
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, PlainTextResponse
 from typing import List, Optional
 from pydantic import BaseModel
 from datetime import datetime
+from sqlalchemy import select, func
+from sqlalchemy.orm import Session
 
 # Asegurar que el directorio raíz de Nexus esté en el PYTHONPATH
 current_dir = os.path.dirname(os.path.abspath(__file__))
 if current_dir not in sys.path:
     sys.path.insert(0, current_dir)
 
-from core.database import SessionLocal, Registry, Card, Tag, nx_db
-from core.search_engine import search_registry, parse_query_string
+from core.database import Registry, Card, Tag, get_db
+from core.search_engine import search_registry_page, parse_query_string
+from modules.srs_scheduler import scheduler as srs_scheduler, WEB_QUALITY_TO_RATING
+from modules.study_queue import get_due_card_ids, due_counts_by_topic, forecast_due_counts
+from modules.background_jobs import job_manager
+from core.http_cache import TTLCache, add_compression, conditional, make_etag, parse_fields, project
+from core.models import ResourceRecord
+from core import instrumentation
+from core.outbound import outbound
+from core.graph import link_graph, registry_titles
+from core.embeddings import embedding_store
 
 app = FastAPI(title="Nexus Hybrid API")
+add_compression(app)
+
+# El servidor expone /api/metrics, así que la instrumentación viene encendida
+# salvo que se desactive explícitamente con NEXUS_INSTRUMENTATION=0
+if os.environ.get("NEXUS_INSTRUMENTATION", "1") != "0":
+    instrumentation.enable()
+
+@app.middleware("http")
+async def instrument_requests(request: Request, call_next):
+    """Latencia por ruta y un ámbito de perfilado SQL por petición (detección de N+1)."""
+    if not instrumentation.is_enabled():
+        return await call_next(request)
+    start = time.perf_counter()
+    with instrumentation.profile_scope(f"{request.method} {request.url.path}"):
+        response = await call_next(request)
+    route = request.scope.get("route")
+    instrumentation.observe(
+        "http_request", time.perf_counter() - start,
+        method=request.method, route=getattr(route, "path", "unmatched"), status=response.status_code
+    )
+    return response
+
+# Índice vectorial (sim:): las búsquedas solo lo leen; se pone al día en segundo plano
+# al arrancar y tras cada commit con escrituras en nexus.db
+embedding_store.watch_writes()
+embedding_store.refresh_in_background()
+
+# /api/stats: se recalcula como mucho cada STATS_TTL s, o antes si hubo escrituras
+STATS_TTL = 30.0
+stats_cache = TTLCache(ttl=STATS_TTL)
+
+RECORD_FIELDS = tuple(ResourceRecord.model_fields)
+RECORD_DETAIL_FIELDS = ("id", "type", "title", "path_url", "content_raw", "summary", "meta_info", "tags", "cards")
+
+# Las rutas con acceso a BD son 'def' (no 'async def'): FastAPI las ejecuta en su
+# threadpool, así una consulta SQLite síncrona nunca bloquea el event loop.
+# La sesión llega inyectada con Depends(get_db) y se cierra al terminar la petición.
+# Las operaciones largas (ingesta) se lanzan como trabajos en segundo plano.
 
 # Montar archivos estáticos
 app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -26,135 +76,245 @@ async def read_index():
     return FileResponse('static/index.html')
 
 @app.get("/api/records")
-async def get_records(q: str = ""):
-    db = SessionLocal()
+def get_records(
+    request: Request,
+    response: Response,
+    q: str = "",
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    fields: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Lista paginada por cursor (keyset). El cursor de la página siguiente viaja en la
+    cabecera 'X-Next-Cursor' (ausente en la última página) para no alterar el cuerpo.
+    'fields' proyecta cada registro (p. ej. fields=id,type,title,modified_at) para que
+    las vistas de lista no descarguen transcripciones completas.
+    """
+    filtros = parse_query_string(q)
+    # Convertir filtros de string a listas si es necesario (el search_engine lo hace por dentro)
     try:
-        filtros = parse_query_string(q)
-        # Convertir filtros de string a listas si es necesario (el search_engine lo hace por dentro)
-        results = search_registry(
+        selected = parse_fields(fields, RECORD_FIELDS)
+        results, next_cursor = search_registry_page(
             db_session=db,
+            page_size=limit,
+            cursor=cursor,
             inc_name_path=filtros.get('inc_name'),
             exc_name_path=filtros.get('exc_name'),
+            inc_content=filtros.get('inc_content'),
+            similar_to=filtros.get('similar'),
             inc_tags=filtros.get('inc_tags'),
             exc_tags=filtros.get('exc_tags'),
-            limit=50
+            order_by=filtros.get('order_by'),
+            with_tags=True,
+            with_card_stats=True,
+            with_content=selected is None or "content_raw" in selected
         )
-        return results
-    finally:
-        db.close()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+
+    # La página cambia si cambia cualquiera de sus registros (modified_at), sus tags o sus tarjetas
+    etag = make_etag(
+        sorted(selected) if selected else None, next_cursor,
+        [(r.id, r.modified_at, r.tags, r.card_count, r.due_count) for r in results]
+    )
+    last_modified = max((r.modified_at for r in results if r.modified_at), default=None)
+    cached = conditional(request, response, etag, last_modified)
+    if cached is not None:
+        return cached
+    return [project(r, selected) for r in results]
 
 @app.get("/api/records/{record_id}")
-async def get_record(record_id: int):
-    db = SessionLocal()
+def get_record(request: Request, response: Response, record_id: int, fields: Optional[str] = None, db: Session = Depends(get_db)):
     try:
-        reg = db.query(Registry).filter(Registry.id == record_id).first()
-        if not reg:
-            raise HTTPException(status_code=404, detail="Registro no encontrado")
-        
-        # Obtener tags
-        tags = db.query(Tag).filter(Tag.registry_id == record_id).all()
-        # Obtener cards
-        cards = db.query(Card).filter(Card.parent_id == record_id).all()
-        
-        return {
-            "id": reg.id,
-            "type": reg.type,
-            "title": reg.title,
-            "path_url": reg.path_url,
-            "content_raw": reg.content_raw,
-            "summary": reg.summary,
-            "meta_info": reg.meta_info,
-            "tags": [t.value for t in tags],
-            "cards": [{"id": c.id, "question": c.question, "answer": c.answer} for c in cards]
-        }
-    finally:
-        db.close()
+        selected = parse_fields(fields, RECORD_DETAIL_FIELDS)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-@app.get("/api/stats")
-async def get_stats():
-    db = SessionLocal()
-    try:
-        total_records = db.query(Registry).count()
-        total_cards = db.query(Card).count()
+    # Validadores baratos antes de cargar content_raw y las tarjetas:
+    # modified_at del registro + huella de sus tags y tarjetas
+    version = db.execute(
+        select(
+            Registry.modified_at,
+            select(func.group_concat(Tag.value)).where(Tag.registry_id == record_id).scalar_subquery(),
+            select(func.count(Card.id)).where(Card.parent_id == record_id).scalar_subquery(),
+            select(func.max(Card.id)).where(Card.parent_id == record_id).scalar_subquery()
+        ).where(Registry.id == record_id)
+    ).first()
+    if not version:
+        raise HTTPException(status_code=404, detail="Registro no encontrado")
+
+    etag = make_etag(record_id, sorted(selected) if selected else None, *version)
+    cached = conditional(request, response, etag, version[0])
+    if cached is not None:
+        return cached
+
+    reg = db.query(Registry).filter(Registry.id == record_id).first()
+    
+    # Obtener tags
+    tags = db.query(Tag).filter(Tag.registry_id == record_id).all()
+    # Obtener cards
+    cards = db.query(Card).filter(Card.parent_id == record_id).all()
+    
+    return project({
+        "id": reg.id,
+        "type": reg.type,
+        "title": reg.title,
+        "path_url": reg.path_url,
+        "content_raw": reg.content_raw,
+        "summary": reg.summary,
+        "meta_info": reg.meta_info,
+        "tags": [t.value for t in tags],
+        "cards": [{"id": c.id, "question": c.question, "answer": c.answer} for c in cards]
+    }, selected)
+
+def _compute_stats(db: Session) -> dict:
+    """Conteos del panel en un solo SELECT (subconsultas escalares)."""
+    total_records, total_cards, processed_ai = db.execute(select(
+        select(func.count(Registry.id)).scalar_subquery(),
+        select(func.count(Card.id)).scalar_subquery(),
         # Contar videos con IA (resumen)
-        processed_ai = db.query(Registry).filter(
+        select(func.count(Registry.id)).where(
             Registry.type == 'youtube',
             Registry.summary != None,
             Registry.summary != '',
             ~Registry.summary.like('Sin resumen%')
-        ).count()
-        
-        # Simulación de progreso de estudio (en una versión real consultaría los registros de repaso)
-        study_progress = {
-            "total_reviewed": 124, 
-            "mastered": 45,
-            "pending": total_cards - 45
-        }
-        
-        return {
-            "total_records": total_records,
-            "total_cards": total_cards,
-            "processed_ai": processed_ai,
-            "study_progress": study_progress,
-            "last_update": datetime.now().strftime("%Y-%m-%d %H:%M")
-        }
-    finally:
-        db.close()
+        ).scalar_subquery()
+    )).one()
+    
+    # Simulación de progreso de estudio (en una versión real consultaría los registros de repaso)
+    study_progress = {
+        "total_reviewed": 124, 
+        "mastered": 45,
+        "pending": total_cards - 45
+    }
+    
+    return {
+        "total_records": total_records,
+        "total_cards": total_cards,
+        "processed_ai": processed_ai,
+        "study_progress": study_progress,
+        "last_update": datetime.now().strftime("%Y-%m-%d %H:%M")
+    }
+
+@app.get("/api/stats")
+def get_stats(request: Request, response: Response, db: Session = Depends(get_db)):
+    stats = stats_cache.get_or_compute("stats", lambda: _compute_stats(db))
+    cached = conditional(request, response, make_etag(sorted(stats.items())))
+    if cached is not None:
+        return cached
+    return stats
 
 @app.get("/api/recall/cards")
-async def get_recall_cards(limit: int = 10):
-    db = SessionLocal()
-    try:
-        # Por ahora, simplemente obtener tarjetas aleatorias o próximas a revisión
-        # Primero intentamos las que tienen next_review vencido o nulo
-        cards = db.query(Card).order_by(Card.next_review.asc()).limit(limit).all()
-        
-        result = []
-        for c in cards:
-            # Obtener el registro padre para contexto
-            parent = db.query(Registry).filter(Registry.id == c.parent_id).first()
-            result.append({
-                "id": c.id,
-                "question": c.question,
-                "answer": c.answer,
-                "parent_title": parent.title if parent else "Desconocido",
-                "difficulty": c.difficulty
-            })
-        return result
-    finally:
-        db.close()
+def get_recall_cards(limit: int = Query(10, ge=1, le=200), topic_id: Optional[int] = None, shuffled: bool = False, db: Session = Depends(get_db)):
+    # Cola de repaso (vencidas o nunca repasadas) resuelta en SQL con LIMIT;
+    # si no hay pendientes se adelantan las próximas a revisión
+    card_ids = get_due_card_ids(db, topic_id=topic_id, shuffled=shuffled, limit=limit)
+    if not card_ids:
+        card_ids = get_due_card_ids(db, adelantar=True, topic_id=topic_id, shuffled=shuffled, limit=limit)
+
+    # El título del registro padre viaja en el mismo SELECT (JOIN) en vez de una consulta por tarjeta
+    rows = db.query(Card, Registry.title).outerjoin(
+        Registry, Registry.id == Card.parent_id
+    ).filter(Card.id.in_(card_ids)).all() if card_ids else []
+    by_id = {c.id: (c, parent_title) for c, parent_title in rows}
+    
+    result = []
+    for cid in card_ids:
+        if cid not in by_id:
+            continue
+        c, parent_title = by_id[cid]
+        result.append({
+            "id": c.id,
+            "question": c.question,
+            "answer": c.answer,
+            "parent_title": parent_title if parent_title is not None else "Desconocido",
+            "difficulty": c.difficulty
+        })
+    return result
+
+@app.get("/api/recall/queue")
+def get_recall_queue(days: int = Query(14, ge=1, le=365), topic_id: Optional[int] = None, db: Session = Depends(get_db)):
+    """Pendientes por tema (una consulta agrupada) y pronóstico de vencimientos por día."""
+    topics = due_counts_by_topic(db)
+    return {
+        "due_total": sum(n for _, _, n in topics),
+        "topics": [{"id": tid, "title": title, "due": n} for tid, title, n in topics],
+        "forecast": forecast_due_counts(db, days=days, topic_id=topic_id)
+    }
 
 @app.post("/api/recall/answer")
-async def post_recall_answer(card_id: int, quality: int):
+def post_recall_answer(card_id: int, quality: int, db: Session = Depends(get_db)):
     """
     quality: 0 (olvidado), 1 (difícil), 2 (bien), 3 (fácil)
+    Usa el mismo planificador FSRS que el TUI y registra el repaso en review_log.
     """
-    db = SessionLocal()
-    try:
-        card = db.query(Card).filter(Card.id == card_id).first()
-        if not card:
-            raise HTTPException(status_code=404, detail="Tarjeta no encontrada")
-        
-        # Lógica simplificada de Spaced Repetition (después podemos meter FSRS o Anki logic)
-        card.last_review = datetime.now()
-        
-        # Ajuste básico de estabilidad (días hasta el próximo repaso)
-        days = 1
-        if quality == 3: days = 4
-        elif quality == 2: days = 2
-        elif quality == 1: days = 1
-        else: days = 0 # Repasar hoy mismo
-        
-        from datetime import timedelta
-        card.next_review = datetime.now() + timedelta(days=days)
-        
-        db.commit()
-        return {"status": "ok", "next_review": card.next_review}
-    finally:
-        db.close()
+    if quality not in WEB_QUALITY_TO_RATING:
+        raise HTTPException(status_code=400, detail="quality debe estar entre 0 y 3")
+    card = db.query(Card).filter(Card.id == card_id).first()
+    if not card:
+        raise HTTPException(status_code=404, detail="Tarjeta no encontrada")
+    
+    srs_scheduler.review_card(db, card, WEB_QUALITY_TO_RATING[quality], source="web")
+    db.commit()
+    return {"status": "ok", "next_review": card.next_review}
+
+@app.get("/api/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Métricas de instrumentación en formato de texto Prometheus."""
+    return PlainTextResponse(
+        instrumentation.render_prometheus(),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+@app.get("/api/outbound")
+async def get_outbound():
+    """Estado del planificador de llamadas externas: circuito, fichas y contadores por proveedor."""
+    return outbound.stats()
+
+@app.get("/api/graph/stats")
+def get_graph_stats():
+    """Tamaño del grafo de vínculos: nodos, aristas y componentes."""
+    return link_graph.get().stats()
+
+@app.get("/api/graph/neighbors/{record_id}")
+def get_graph_neighbors(record_id: int, hops: int = Query(1, ge=1, le=6), directed: bool = False, db: Session = Depends(get_db)):
+    """Registros a como mucho 'hops' saltos (directed=true solo sigue vínculos salientes)."""
+    graph = link_graph.get()
+    found = graph.neighbourhood(record_id, hops=hops, directed=directed)
+    titles = registry_titles(db, found)
+    return [
+        {"id": rid, "title": titles.get(rid), "hops": d, "degree": graph.degree(rid), "pagerank": graph.centrality(rid)}
+        for rid, d in sorted(found.items(), key=lambda kv: (kv[1], kv[0]))
+    ]
+
+@app.get("/api/graph/path")
+def get_graph_path(source: int, target: int, directed: bool = False, db: Session = Depends(get_db)):
+    """Ruta más corta (en saltos) entre dos registros."""
+    path = link_graph.get().shortest_path(source, target, directed=directed)
+    if path is None:
+        raise HTTPException(status_code=404, detail="No hay camino entre esos registros")
+    titles = registry_titles(db, path)
+    return {"hops": len(path) - 1, "path": [{"id": rid, "title": titles.get(rid)} for rid in path]}
+
+@app.get("/api/graph/central")
+def get_graph_central(limit: int = Query(20, ge=1, le=500), db: Session = Depends(get_db)):
+    """Registros con mayor PageRank sobre los vínculos."""
+    graph = link_graph.get()
+    central = graph.top_central(limit)
+    titles = registry_titles(db, [rid for rid, _ in central])
+    return [{"id": rid, "title": titles.get(rid), "pagerank": score, "degree": graph.degree(rid)} for rid, score in central]
+
+@app.get("/api/graph/components")
+def get_graph_components(min_size: int = Query(2, ge=1), limit: int = Query(50, ge=1, le=1000)):
+    """Componentes conexas (islas de conocimiento) como listas de IDs, de mayor a menor."""
+    groups = link_graph.get().component_groups(min_size=min_size)
+    return {"total": len(groups), "components": [{"size": len(g), "ids": g} for g in groups[:limit]]}
 
 @app.get("/api/pipeline/status")
-async def get_pipeline_status():
+def get_pipeline_status():
     from core.staging_db import StagingSessionLocal, staging_engine
     
     status = {
@@ -185,29 +345,40 @@ async def get_pipeline_status():
     
     return status
 
-@app.post("/api/ingest")
+def _ingest_job(url: str, tags: list) -> dict:
+    """Cuerpo del trabajo de ingesta (se ejecuta en el pool de job_manager)."""
+    from modules.web_scraper import ingest_web_resource
+
+    reg = ingest_web_resource(url, tags)
+    if not reg:
+        raise RuntimeError("No se pudo procesar el recurso. Verifica la URL.")
+    return {"id": reg.id, "title": reg.title, "message": "Recurso indexado correctamente."}
+
+@app.post("/api/ingest", status_code=202)
 async def post_ingest(data: dict):
+    """
+    Encola la ingesta y responde de inmediato con el ID del trabajo.
+    El progreso se consulta en /api/jobs/{job_id}.
+    """
     url = data.get("url")
     tags = data.get("tags", [])
     if not url:
         raise HTTPException(status_code=400, detail="URL requerida")
-    
-    from modules.web_scraper import ingest_web_resource
-    
-    try:
-        # Procesar recurso
-        reg = ingest_web_resource(url, tags)
-        if reg:
-            return {
-                "status": "ok", 
-                "id": reg.id, 
-                "title": reg.title,
-                "message": "Recurso indexado correctamente."
-            }
-        else:
-            return {"status": "error", "message": "No se pudo procesar el recurso. Verifica la URL."}
-    except Exception as e:
-        return {"status": "error", "message": f"Error interno: {str(e)}"}
+
+    job_id = job_manager.submit("ingest", _ingest_job, url, tags)
+    return {"status": "queued", "job_id": job_id, "message": "Ingesta encolada."}
+
+@app.get("/api/jobs")
+async def get_jobs(limit: int = Query(50, ge=1, le=500)):
+    return job_manager.list(limit=limit)
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Estado de un trabajo: queued | running | done (con 'result') | error (con 'error')."""
+    job = job_manager.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    return job
 
 if __name__ == "__main__":
     import uvicorn